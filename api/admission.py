@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Admission control for /api/generate
+
+Each client (X-API-Key, or the client address) has a token bucket: a
+request takes one token and tokens refill at ADMISSION_RATE per second up
+to ADMISSION_BURST (ADMISSION_RATE=0, the default, turns the buckets off).
+Requests are also refused while ADMISSION_MAX_QUEUE jobs are already
+waiting for a backend. Either way the caller gets 429 with a Retry-After
+estimate instead of a place at the end of an unbounded queue.
+
+Admitted jobs carry a priority class; the scheduler always dispatches
+waiting interactive jobs before batch jobs. The queue bound counts only
+the jobs of the request's own class and the more urgent ones, so a batch
+backlog never locks interactive requests out.
+"""
+
+import math
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CLASSES = ('interactive', 'batch')   # dispatch order
+
+
+def priority_rank(name: str) -> int:
+    """Scheduler rank of a priority class (lower runs first)"""
+    return PRIORITY_CLASSES.index(name)
+
+
+class TokenBucket:
+    """Refilling request allowance of one client"""
+
+    def __init__(self, rate: float, burst: float, now: float = None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def refill(self, now: float):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated = max(self.updated, now)
+
+    def wait_seconds(self) -> float:
+        """Time until one token is available"""
+        if self.tokens >= 1:
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (1 - self.tokens) / self.rate
+
+
+@dataclass
+class Decision:
+    """Outcome of an admission check"""
+    admitted: bool
+    retry_after: int = 0
+    reason: Optional[str] = None
+
+
+class AdmissionRejected(Exception):
+    """Raised where a refused admission must unwind a request"""
+
+    def __init__(self, decision: Decision):
+        super().__init__(decision.reason)
+        self.decision = decision
+
+
+class AdmissionController:
+    """Per-client token buckets plus a bound on waiting jobs"""
+
+    def __init__(
+        self,
+        depth: Callable[[int], int],
+        slots: Callable[[], int] = None,
+        rate: float = 0.0,
+        burst: float = 10.0,
+        max_queue: int = 64,
+        quotas: Dict[str, Dict] = None,
+        job_seconds: float = 10.0,
+        max_clients: int = 10000
+    ):
+        self.depth = depth
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.quotas = quotas or {}
+        self.max_clients = max_clients
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+        # Mean job duration (EWMA) over the slots draining the queue, for Retry-After
+        self.job_seconds = job_seconds
+        self.slots = slots or (lambda: 1)
+
+        self.admitted = {name: 0 for name in PRIORITY_CLASSES}
+        self.rejected_rate = 0
+        self.rejected_queue = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 or self.max_queue > 0
+
+    def _bucket(self, client: str, now: float) -> TokenBucket:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= self.max_clients:
+                self._forget_idle(now)
+            quota = self.quotas.get(client, {})
+            bucket = TokenBucket(quota.get('rate', self.rate), quota.get('burst', self.burst), now)
+            self._buckets[client] = bucket
+        bucket.refill(now)
+        return bucket
+
+    def _forget_idle(self, now: float):
+        """Drop buckets that have refilled completely (caller holds the lock)"""
+        for client, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self._buckets[client]
+
+    def admit(self, client: str, priority: str = 'interactive') -> Decision:
+        """Take a token for client unless it is over quota or the queue is full"""
+        # depth(rank): jobs waiting at this priority or a more urgent one
+        depth = self.depth(priority_rank(priority))
+        with self._lock:
+            if self.max_queue > 0 and depth >= self.max_queue:
+                self.rejected_queue += 1
+                excess = depth - self.max_queue + 1
+                wait = self.job_seconds * excess / max(self.slots(), 1)
+                return Decision(False, max(1, math.ceil(wait)), f'Queue full ({depth} jobs waiting)')
+
+            if self.rate > 0 or client in self.quotas:
+                bucket = self._bucket(client, time.monotonic())
+                if bucket.tokens < 1:
+                    self.rejected_rate += 1
+                    wait = bucket.wait_seconds()
+                    retry = 3600 if math.isinf(wait) else max(1, math.ceil(wait))
+                    return Decision(False, retry, 'Rate limit exceeded')
+                bucket.tokens -= 1
+
+            self.admitted[priority] += 1
+        return Decision(True)
+
+    def observe(self, seconds: float, alpha: float = 0.2):
+        """Record how long a job took to run"""
+        if seconds > 0:
+            self.job_seconds += alpha * (seconds - self.job_seconds)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            clients = len(self._buckets)
+        return {
+            'enabled': self.enabled,
+            'rate_per_second': self.rate,
+            'burst': self.burst,
+            'max_queue': self.max_queue,
+            'depth': self.depth(len(PRIORITY_CLASSES) - 1),
+            'clients': clients,
+            'admitted': dict(self.admitted),
+            'rejected_rate_limit': self.rejected_rate,
+            'rejected_queue_full': self.rejected_queue,
+            'job_seconds': round(self.job_seconds, 2),
+        }
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Asyncio server for the ComfyUI REST API
+
+Serves the same routes as comfyui_rest_api.py on aiohttp. The routes clients
+poll or hold open (/api/health, /api/status, /api/stream, /api/image) run on
+the event loop, so an open SSE stream costs one AsyncSubscriber instead of a
+thread. Every other route is handed to the Flask app through a bounded
+thread pool (WSGI), keeping a single implementation of it; responses Flask
+streams (batch results and archives) are relayed chunk by chunk.
+
+That includes /api/generate, /api/batch and the queue and cancel routes:
+they are not asynchronous. Each holds a pool thread until it returns and
+reaches ComfyUI through the blocking requests sessions, so
+ASYNC_WSGI_THREADS bounds how many run at once. They only queue work, so
+the thread is released long before the image is done.
+
+Upstream calls made on the event loop share one aiohttp session with a
+bounded keep-alive connection pool per backend and per-call timeouts.
+
+Usage:
+  python async_server.py          (or ./start-with-api.sh --async)
+"""
+
+import asyncio
+import functools
+import io
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict
+
+import aiohttp
+from aiohttp import web
+from multidict import CIMultiDict
+
+import comfyui_rest_api as api
+from comfyui_events import TERMINAL_EVENTS, format_sse
+from image_variants import etag_matches, image_headers
+
+logger = api.logger
+
+# Threads for routes served by Flask and for blocking job store reads
+ASYNC_WSGI_THREADS = int(os.environ.get('ASYNC_WSGI_THREADS', 32))
+
+UPSTREAM_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+# ============================================================================
+# Async ComfyUI Client
+# ============================================================================
+
+def upstream_call(method):
+    """Async twin of api.upstream_call: same latency and error series"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(self, *args, **kwargs)
+        except Exception as e:
+            api.UPSTREAM_ERRORS.inc(backend=self.name, method=method.__name__, error=type(e).__name__)
+            raise
+        finally:
+            api.UPSTREAM_LATENCY.observe(time.perf_counter() - started, backend=self.name, method=method.__name__)
+    return wrapper
+
+
+class AsyncComfyUIClient:
+    """Read-only ComfyUI calls used by the event-loop routes"""
+
+    def __init__(self, base_url: str, session: aiohttp.ClientSession):
+        self.base_url = base_url
+        self.session = session
+        self.name = api.backend_name(base_url, 0)
+
+    async def _get_json(self, path: str) -> Dict:
+        async with self.session.get(f'{self.base_url}{path}') as response:
+            response.raise_for_status()
+            return await response.json()
+
+    @upstream_call
+    async def get_history(self, prompt_id: str) -> Dict:
+        return await self._get_json(f'/history/{prompt_id}')
+
+    @upstream_call
+    async def get_system_stats(self) -> Dict:
+        return await self._get_json('/system_stats')
+
+    @upstream_call
+    async def get_image(self, filename: str, subfolder: str = '', folder_type: str = 'output') -> aiohttp.ClientResponse:
+        """Open an output image on /view (caller releases the response)"""
+        response = await self.session.get(
+            f'{self.base_url}/view',
+            params={'filename': filename, 'subfolder': subfolder, 'type': folder_type}
+        )
+        if response.status >= 400:
+            response.release()
+            response.raise_for_status()
+        return response
+
+
+def create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=api.COMFYUI_POOL_SIZE * len(api.backend_pool.backends),
+        limit_per_host=api.COMFYUI_POOL_SIZE,
+        keepalive_timeout=60
+    )
+    timeout = aiohttp.ClientTimeout(
+        sock_connect=api.COMFYUI_CONNECT_TIMEOUT,
+        sock_read=api.COMFYUI_READ_TIMEOUT
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+# ============================================================================
+# Helpers
+# ============================================================================
+
+executor = ThreadPoolExecutor(max_workers=ASYNC_WSGI_THREADS, thread_name_prefix='api-worker')
+clients: Dict[str, AsyncComfyUIClient] = {}
+
+
+async def run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+def client_for(backend: api.Backend) -> AsyncComfyUIClient:
+    return clients[backend.name]
+
+
+def error_response(message: str, status: int) -> web.Response:
+    return web.json_response({'error': message}, status=status)
+
+
+# ============================================================================
+# Event-loop Routes
+# ============================================================================
+
+async def health_check(request: web.Request) -> web.Response:
+    """Health check endpoint"""
+    backend = api.backend_pool.primary()
+    stats = None
+    try:
+        if backend.healthy:
+            stats = await client_for(backend).get_system_stats()
+    except UPSTREAM_ERRORS as e:
+        logger.error(f'Health check failed: {e}')
+
+    body, code = api.health_payload(stats)
+    return web.json_response(body, status=code)
+
+
+async def get_status(request: web.Request) -> web.Response:
+    """Get generation status (see comfyui_rest_api.get_status)"""
+    status = await run_blocking(api._get_job, request.match_info['job_id'])
+    if status is None:
+        return error_response('Job not found', 404)
+
+    # Progress is pushed by the websocket listener; only hit /history when it is down
+    backend = api._backend_for(status)
+    if status.prompt_id and status.status not in api.TERMINAL_STATES and not backend.connected:
+        try:
+            with api.tracer.span('history_lookup', parent=api.job_traces.span(status.job_id), prompt_id=status.prompt_id):
+                history = (await client_for(backend).get_history(status.prompt_id)).get(status.prompt_id)
+            if history:
+                await run_blocking(api.apply_history, status, history)
+        except UPSTREAM_ERRORS as e:
+            logger.warning(f'Could not fetch history: {e}')
+
+    with api.jobs_lock:
+        body = asdict(status)
+    return web.json_response(body)
+
+
+async def stream_info(request: web.Request) -> web.Response:
+    """Stream connection info"""
+    return web.json_response({
+        'client_id': api.backend_pool.client_id,
+        'connected': api.backend_pool.connected
+    })
+
+
+async def stream_job(request: web.Request) -> web.StreamResponse:
+    """Stream generation progress as Server-Sent Events (see comfyui_rest_api.stream_job)"""
+    try:
+        max_seconds = api.stream_timeout(request.query.get('timeout'))
+    except ValueError as e:
+        return error_response(str(e), 400)
+    status, key = await run_blocking(api.resolve_stream, request.match_info['job_id'])
+    send_previews = request.query.get('previews', '1') != '0'
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    await response.prepare(request)
+
+    async def send(message: str):
+        await response.write(message.encode('utf-8'))
+
+    subscriber = api.event_broker.subscribe_async(key)
+    try:
+        # Snapshot after subscribing so no event falls between the two
+        snapshot, final = api.stream_opening(status, key)
+        await send(format_sse('status', snapshot))
+        if final is not None:
+            await send(format_sse(*final))
+            return response
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_seconds
+        while loop.time() < deadline:
+            try:
+                event, data = await subscriber.get(timeout=api.STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                await send(': keepalive\n\n')
+                continue
+
+            if event == 'preview' and not send_previews:
+                continue
+            await send(format_sse(event, data))
+            if event in TERMINAL_EVENTS:
+                return response
+
+        await send(format_sse('timeout', {'id': key, 'seconds': max_seconds}))
+    except ConnectionResetError:
+        pass  # client went away
+    finally:
+        api.event_broker.unsubscribe(key, subscriber)
+    return response
+
+
+async def download_image(request: web.Request) -> web.StreamResponse:
+    """Download generated image (see comfyui_rest_api.download_image)"""
+    filename = request.match_info['filename']
+    try:
+        variant = api.image_variants.resolve(
+            request.query.get('format'),
+            request.query.get('size'),
+            request.headers.get('Accept', '')
+        )
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    try:
+        file_path = api.local_image(filename)
+        if file_path is not None:
+            if variant is None:
+                headers = image_headers(file_path, filename, attachment=True, max_age=api.IMAGE_MAX_AGE)
+            else:
+                fmt, size, negotiated = variant
+                file_path, future = api.image_variants.submit(file_path, fmt, size)
+                if future is not None:
+                    try:
+                        await asyncio.wait_for(
+                            asyncio.shield(asyncio.wrap_future(future)), api.image_variants.wait_seconds
+                        )
+                    except asyncio.TimeoutError:
+                        return web.json_response(
+                            {'status': 'rendering', 'retry_after': api.IMAGE_RETRY_AFTER},
+                            status=202, headers={'Retry-After': str(api.IMAGE_RETRY_AFTER)}
+                        )
+                headers = image_headers(
+                    file_path, Path(filename).stem + file_path.suffix, fmt,
+                    max_age=api.IMAGE_MAX_AGE, negotiated=negotiated
+                )
+            if etag_matches(headers['ETag'], request.headers.get('If-None-Match')):
+                headers.pop('Content-Type')
+                return web.Response(status=304, headers=headers)
+            # FileResponse: sendfile and Range; it sets the same ETag from the file's stat
+            return web.FileResponse(file_path, headers=headers)
+
+        # Produced on another backend: proxy it from that ComfyUI instance
+        backend = await run_blocking(api._backend_for_image, filename)
+        if backend is None:
+            return error_response('Image not found', 404)
+        upstream = await client_for(backend).get_image(filename)
+        try:
+            response = web.StreamResponse(headers={
+                'Content-Type': upstream.headers.get('Content-Type', 'image/png'),
+                'Content-Disposition': f'attachment; filename="{filename}"'
+            })
+            await response.prepare(request)
+            async for chunk in upstream.content.iter_chunked(65536):
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+        finally:
+            upstream.release()
+    except Exception as e:
+        logger.error(f'Download error: {e}')
+        return error_response(str(e), 500)
+
+
+# ============================================================================
+# Flask Routes (WSGI on the worker pool)
+# ============================================================================
+
+def _wsgi_environ(request: web.Request, body: bytes) -> Dict:
+    host, port = (request.host.split(':', 1) + [str(api.API_PORT)])[:2]
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': request.path,
+        'QUERY_STRING': request.query_string,
+        'CONTENT_TYPE': request.headers.get('Content-Type', ''),
+        'CONTENT_LENGTH': str(len(body)),
+        'SERVER_NAME': host,
+        'SERVER_PORT': port,
+        'SERVER_PROTOCOL': f'HTTP/{request.version.major}.{request.version.minor}',
+        'REMOTE_ADDR': request.remote or '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in request.headers.items():
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        if key not in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _call_flask(environ: Dict):
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+
+    result = api.app(environ, start_response)
+    return started['status'], started['headers'], result
+
+
+def _read_all(result) -> bytes:
+    try:
+        return b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+async def flask_route(request: web.Request) -> web.StreamResponse:
+    body = await request.read()
+    status, headers, result = await run_blocking(_call_flask, _wsgi_environ(request, body))
+    headers = CIMultiDict(headers)
+    if 'Content-Length' in headers:
+        content = await run_blocking(_read_all, result)
+        del headers['Content-Length']
+        return web.Response(status=status, headers=headers, body=content)
+
+    # Streamed by Flask (batch results, archives): relay chunk by chunk
+    response = web.StreamResponse(status=status, headers=headers)
+    chunks = iter(result)
+    try:
+        await response.prepare(request)
+        while True:
+            chunk = await run_blocking(next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await response.write(chunk)
+        await response.write_eof()
+    except ConnectionResetError:
+        pass  # client went away
+    finally:
+        if hasattr(result, 'close'):
+            await run_blocking(result.close)
+    return response
+
+
+# ============================================================================
+# Application
+# ============================================================================
+
+@web.middleware
+async def _observe_request(request: web.Request, handler):
+    """Request metrics for the routes served on the event loop (Flask records its own)"""
+    if request.match_info.handler is flask_route:
+        return await handler(request)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        # Same route labels as Flask: /api/status/<job_id>
+        route = re.sub(r'\{(\w+)\}', r'<\1>', request.match_info.route.resource.canonical)
+        api.observe_request(request.method, route, status, time.perf_counter() - started)
+
+
+async def _add_cors(request: web.Request, response: web.StreamResponse):
+    # Flask-CORS defaults for the routes served on the event loop
+    if 'Origin' in request.headers and 'Access-Control-Allow-Origin' not in response.headers:
+        response.headers['Access-Control-Allow-Origin'] = '*'
+
+
+async def _startup(app: web.Application):
+    session = create_session()
+    app['session'] = session
+    for backend in api.backend_pool.backends.values():
+        clients[backend.name] = AsyncComfyUIClient(backend.url, session)
+    await run_blocking(api.initialize_directories)
+    await run_blocking(api.initialize_services)
+
+
+async def _cleanup(app: web.Application):
+    await app['session'].close()
+    executor.shutdown(wait=False)
+
+
+def create_app() -> web.Application:
+    app = web.Application(client_max_size=64 * 1024 ** 2, middlewares=[_observe_request])
+    app.router.add_get('/api/health', health_check)
+    app.router.add_get('/api/status/{job_id}', get_status)
+    app.router.add_get('/api/stream', stream_info)
+    app.router.add_get('/api/stream/{job_id}', stream_job)
+    app.router.add_get('/api/image/{filename}', download_image)
+    app.router.add_route('*', '/{tail:.*}', flask_route)
+    app.on_response_prepare.append(_add_cors)
+    app.on_startup.append(_startup)
+    app.on_cleanup.append(_cleanup)
+    return app
+
+
+if __name__ == '__main__':
+    logger.info(f'Starting async REST API on {api.API_HOST}:{api.API_PORT}')
+    logger.info(f'ComfyUI backends: {", ".join(api.COMFYUI_URLS)}')
+    web.run_app(create_app(), host=api.API_HOST, port=api.API_PORT, print=None)
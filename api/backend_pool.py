@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Pool of ComfyUI backends with load-aware dispatch
+
+Each backend is one ComfyUI instance (a pod, or one process per GPU on a
+multi-GPU box) with its own API client and websocket listener. All
+listeners share one client_id, so prompts submitted by comfy-run.sh with
+that id are routed back to the REST API whichever backend runs them.
+
+Dispatch picks the healthy backend with the lowest score:
+
+  queue depth                    (websocket status events, /queue on health check)
+  + BACKEND_MODEL_SWAP_COST      if a different model set is loaded
+  + BACKEND_MEMORY_WEIGHT * used VRAM fraction
+
+Backends that fail BACKEND_MAX_FAILURES consecutive health checks (or a
+submission) are ejected and re-admitted once a health check passes again.
+Health checks also ask each backend once (and again after re-admission)
+whether it has the optional node classes in probe_nodes, so supports()
+tells whether every healthy backend can run a workflow using them.
+"""
+
+import threading
+import time
+import uuid
+import logging
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from comfyui_events import ComfyUIEventListener
+
+logger = logging.getLogger(__name__)
+
+
+class Backend:
+    """One ComfyUI instance and its live load state"""
+
+    def __init__(self, name: str, url: str, client, listener: ComfyUIEventListener = None):
+        self.name = name
+        self.url = url
+        self.client = client
+        self.listener = listener
+        self.healthy = True
+        self.failures = 0
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.queue_remaining = 0
+        self.vram_total = 0
+        self.vram_free = 0
+        self.system_stats: Dict = {}             # last /system_stats answer
+        self.loaded_models: Tuple[str, ...] = ()
+        self.tail_models: Tuple[str, ...] = ()   # models of the last prompt submitted
+        self.node_classes: Dict[str, bool] = {}  # probed class_type -> installed
+        self.submitted = 0
+
+    @property
+    def connected(self) -> bool:
+        return bool(self.listener and self.listener.connected)
+
+    @property
+    def memory_used_fraction(self) -> float:
+        if not self.vram_total:
+            return 0.0
+        return max(0.0, 1.0 - self.vram_free / self.vram_total)
+
+    def update_system_stats(self, stats: Dict):
+        self.system_stats = stats
+        devices = stats.get('devices') or []
+        self.vram_total = sum(int(d.get('vram_total', 0)) for d in devices)
+        self.vram_free = sum(int(d.get('vram_free', 0)) for d in devices)
+
+    def update_queue(self, queue_status: Dict):
+        self.queue_remaining = (
+            len(queue_status.get('queue_running', [])) +
+            len(queue_status.get('queue_pending', []))
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'url': self.url,
+            'healthy': self.healthy,
+            'event_stream': 'connected' if self.connected else 'disconnected',
+            'queue_remaining': self.queue_remaining,
+            'vram_total': self.vram_total,
+            'vram_free': self.vram_free,
+            'loaded_models': list(self.loaded_models),
+            'node_classes': dict(self.node_classes),
+            'submitted': self.submitted,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
+
+
+def backend_name(url: str, index: int) -> str:
+    """Stable short name for a backend URL (host:port)"""
+    return urlparse(url).netloc or f'backend-{index}'
+
+
+class BackendPool:
+    """Load-aware dispatch across ComfyUI backends"""
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        client_factory: Callable[[str], object],
+        handler: Callable[[Backend, str, Dict], None],
+        client_id: str = None,
+        health_interval: float = 10.0,
+        max_failures: int = 3,
+        model_swap_cost: float = 3.0,
+        memory_weight: float = 1.0,
+        probe_nodes: Sequence[str] = ()
+    ):
+        if not urls:
+            raise ValueError('At least one ComfyUI backend URL is required')
+
+        self.client_id = client_id or str(uuid.uuid4())
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        self.model_swap_cost = model_swap_cost
+        self.memory_weight = memory_weight
+        self.probe_nodes = tuple(probe_nodes)
+        self.handler = handler
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.backends: Dict[str, Backend] = {}
+        for index, url in enumerate(urls):
+            url = url.rstrip('/')
+            name = backend_name(url, index)
+            backend = Backend(name, url, client_factory(url))
+            backend.listener = ComfyUIEventListener(
+                url,
+                self._listener_handler(backend),
+                client_id=self.client_id
+            )
+            self.backends[name] = backend
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start every listener and the health check thread (idempotent)"""
+        for backend in self.backends.values():
+            backend.listener.start()
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._health_loop,
+            name='comfyui-backend-health',
+            daemon=True
+        )
+        self._thread.start()
+        logger.info(f'Backend pool started: {", ".join(self.backends)}')
+
+    def stop(self):
+        self._stop.set()
+        for backend in self.backends.values():
+            backend.listener.stop()
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def get(self, name: Optional[str]) -> Optional[Backend]:
+        return self.backends.get(name) if name else None
+
+    def primary(self) -> Backend:
+        """First healthy backend (or the first backend if none is healthy)"""
+        for backend in self.backends.values():
+            if backend.healthy:
+                return backend
+        return next(iter(self.backends.values()))
+
+    def healthy_backends(self) -> List[Backend]:
+        return [backend for backend in self.backends.values() if backend.healthy]
+
+    @property
+    def connected(self) -> bool:
+        """True when every healthy backend has a live event stream"""
+        healthy = self.healthy_backends()
+        return bool(healthy) and all(backend.connected for backend in healthy)
+
+    def supports(self, class_type: str) -> bool:
+        """True when every healthy backend has a probed node class"""
+        healthy = self.healthy_backends()
+        return bool(healthy) and all(backend.node_classes.get(class_type) for backend in healthy)
+
+    # ------------------------------------------------------------------
+    # Dispatch
+    # ------------------------------------------------------------------
+
+    def score(self, backend: Backend, models: Sequence[str] = ()) -> float:
+        """Lower is better"""
+        score = float(backend.queue_remaining)
+        current = backend.tail_models or backend.loaded_models
+        if models and current and tuple(models) != current:
+            score += self.model_swap_cost
+        score += self.memory_weight * backend.memory_used_fraction
+        return score
+
+    def select(self, models: Sequence[str] = (), candidates: Sequence[Backend] = None) -> Optional[Backend]:
+        """Least loaded healthy backend for a model set (among candidates)"""
+        if candidates is None:
+            candidates = self.healthy_backends()
+        if not candidates:
+            return None
+        return min(candidates, key=lambda b: (self.score(b, models), b.submitted))
+
+    def reserve(self, backend: Backend, models: Sequence[str] = ()):
+        """Count a submission against a backend until its queue state catches up"""
+        with self._lock:
+            # Optimistic: the next status event / health check corrects it
+            backend.queue_remaining += 1
+            backend.submitted += 1
+            if models:
+                backend.tail_models = tuple(models)
+
+    def release(self, backend: Backend):
+        """Undo a reservation whose submission failed"""
+        with self._lock:
+            backend.queue_remaining = max(0, backend.queue_remaining - 1)
+            backend.submitted = max(0, backend.submitted - 1)
+
+    def mark_failed(self, backend: Backend, error: Exception):
+        """Eject a backend immediately (e.g. connection refused on submit)"""
+        with self._lock:
+            backend.failures = max(backend.failures + 1, self.max_failures)
+            backend.last_error = str(error)
+            if backend.healthy:
+                backend.healthy = False
+                logger.warning(f'Backend {backend.name} ejected: {error}')
+
+    def note_models(self, backend: Backend, models: Sequence[str]):
+        """Record the model set a backend started executing"""
+        if models:
+            backend.loaded_models = tuple(models)
+
+    # ------------------------------------------------------------------
+    # Health
+    # ------------------------------------------------------------------
+
+    def check(self, backend: Backend) -> bool:
+        """Probe one backend and eject / re-admit it"""
+        try:
+            backend.update_system_stats(backend.client.get_system_stats())
+            backend.update_queue(backend.client.get_queue())
+            if not backend.healthy:
+                backend.node_classes = {}   # restarted, perhaps with other custom nodes
+            for class_type in self.probe_nodes:
+                if class_type not in backend.node_classes:
+                    backend.node_classes[class_type] = backend.client.has_node(class_type)
+        except Exception as e:
+            with self._lock:
+                backend.failures += 1
+                backend.last_error = str(e)
+                if backend.healthy and backend.failures >= self.max_failures:
+                    backend.healthy = False
+                    logger.warning(f'Backend {backend.name} ejected after {backend.failures} failed checks: {e}')
+            return False
+        finally:
+            backend.last_check = time.time()
+
+        with self._lock:
+            if not backend.healthy:
+                logger.info(f'Backend {backend.name} re-admitted')
+            backend.healthy = True
+            backend.failures = 0
+            backend.last_error = None
+        return True
+
+    def check_all(self):
+        for backend in self.backends.values():
+            self.check(backend)
+
+    def _health_loop(self):
+        while not self._stop.is_set():
+            self.check_all()
+            self._stop.wait(self.health_interval)
+
+    def _listener_handler(self, backend: Backend) -> Callable[[str, Dict], None]:
+        def handle(event_type: str, data: Dict):
+            if event_type == 'status':
+                exec_info = (data.get('status') or {}).get('exec_info') or {}
+                if 'queue_remaining' in exec_info:
+                    backend.queue_remaining = int(exec_info['queue_remaining'])
+            self.handler(backend, event_type, data)
+        return handle
+
+    def to_dict(self) -> Dict:
+        return {
+            'client_id': self.client_id,
+            'backends': [backend.to_dict() for backend in self.backends.values()],
+            'healthy': len(self.healthy_backends()),
+            'total': len(self.backends),
+        }
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Bulk generation batches
+
+A batch is a list of generate requests stored in the job store. BatchRunner
+starts its items as ordinary jobs, in order, keeping at most BATCH_WINDOW of
+them queued or running at a time, so a batch of thousands of prompts neither
+floods the scheduler nor starves interactive requests. Progress lives in the
+database: after a restart the runner picks up where it left off.
+
+Finished images are bundled by stream_zip / stream_tar, which produce the
+archive chunk by chunk without holding it (or a whole file) in memory.
+"""
+
+import io
+import tarfile
+import threading
+import time
+import zipfile
+import logging
+from typing import Callable, Dict, Iterable, Iterator, Tuple
+
+from job_store import JobStore, TERMINAL_STATES
+
+logger = logging.getLogger(__name__)
+
+# Item states that no longer occupy the window ('expired': job pruned)
+SETTLED_STATES = TERMINAL_STATES + ('expired',)
+
+# Archive member: (name, size in bytes, chunks)
+ArchiveEntry = Tuple[str, int, Iterable[bytes]]
+
+
+class BatchRunner:
+    """Feeds the items of running batches into the job queue"""
+
+    def __init__(
+        self,
+        store: JobStore,
+        start_item: Callable[[Dict, str], str],
+        window: int = 16,
+        interval: float = 1.0
+    ):
+        self.store = store
+        self.start_item = start_item     # (request, priority) -> job_id
+        self.window = window
+        self.interval = interval
+        self.started = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start (or resume) feeding batches in a background thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='batch-runner', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.advance()
+            except Exception as e:
+                logger.error(f'Batch runner error: {e}', exc_info=True)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def advance(self):
+        """Start as many items as the window allows, oldest batch first"""
+        batches = []
+        live = 0
+        for batch in self.store.running_batches():
+            counts = self.store.batch_counts(batch['batch_id'])
+            pending = counts.get('pending', 0)
+            running = sum(n for state, n in counts.items() if state not in SETTLED_STATES + ('pending',))
+            if not pending and not running:
+                self.store.set_batch_status(batch['batch_id'], 'completed')
+                logger.info(f"Batch {batch['batch_id']} completed ({batch['total']} items)")
+                continue
+            live += running
+            if pending:
+                batches.append(batch)
+
+        for batch in batches:
+            room = self.window - live
+            if room <= 0:
+                return
+            for index, request in self.store.unstarted_items(batch['batch_id'], room):
+                job_id = self.start_item(request, batch['priority'])
+                self.store.set_item_job(batch['batch_id'], index, job_id)
+                self.started += 1
+                live += 1
+
+    def stats(self) -> Dict:
+        return {
+            'window': self.window,
+            'running_batches': len(self.store.running_batches()),
+            'items_started': self.started,
+        }
+
+
+# ============================================================================
+# Archive streaming
+# ============================================================================
+
+class _Sink(io.RawIOBase):
+    """Unseekable file that hands written bytes to a generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+    """ZIP archive of entries (stored: PNGs do not compress further)"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, size, chunks in entries:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            with archive.open(info, 'w', force_zip64=size >= zipfile.ZIP64_LIMIT) as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    data = sink.take()
+                    if data:
+                        yield data
+            yield sink.take()
+    yield sink.take()
+
+
+def stream_tar(entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+    """POSIX (pax) tar archive of entries"""
+    for name, size, chunks in entries:
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(time.time())
+        info.mode = 0o644
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+        written = 0
+        for chunk in chunks:
+            written += len(chunk)
+            yield chunk
+        if written != size:
+            # The header is already sent: a short member would corrupt the rest
+            raise IOError(f'{name}: expected {size} bytes, got {written}')
+        remainder = size % tarfile.BLOCKSIZE
+        if remainder:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+
+# format -> (writer, MIME type)
+ARCHIVE_FORMATS: Dict[str, Tuple[Callable, str]] = {
+    'zip': (stream_zip, 'application/zip'),
+    'tar': (stream_tar, 'application/x-tar'),
+}
+
+
+def file_chunks(path, chunk_size: int = 65536) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
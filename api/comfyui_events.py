@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+ComfyUI websocket event listener and streaming broker
+
+Keeps one long-lived connection to ComfyUI's /ws endpoint per process and
+demultiplexes execution events (progress, executing, executed,
+execution_error, ...) to a handler callback. Prompts must be submitted with
+the listener's client_id so ComfyUI routes their events to this connection.
+
+EventBroker fans the resulting per-prompt events out to streaming clients
+(Server-Sent Events on /api/stream/<job_id>). Subscribers are thread
+queues for the Flask server or AsyncSubscribers for the asyncio server.
+"""
+
+import asyncio
+import json
+import queue
+import struct
+import threading
+import uuid
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import websocket
+
+logger = logging.getLogger(__name__)
+
+# Binary frame types sent by ComfyUI (server.py BinaryEventTypes)
+BINARY_PREVIEW_IMAGE = 1
+BINARY_PREVIEW_IMAGE_WITH_METADATA = 4
+
+PREVIEW_FORMATS = {1: 'jpeg', 2: 'png'}
+
+
+def websocket_url(base_url: str, client_id: str) -> str:
+    """Build the ComfyUI websocket URL for an http(s) base URL"""
+    parsed = urlparse(base_url)
+    scheme = 'wss' if parsed.scheme == 'https' else 'ws'
+    return f'{scheme}://{parsed.netloc}{parsed.path.rstrip("/")}/ws?clientId={client_id}'
+
+
+class ComfyUIEventListener:
+    """Background listener for ComfyUI execution events"""
+
+    def __init__(
+        self,
+        base_url: str,
+        handler: Callable[[str, Dict], None],
+        client_id: str = None,
+        reconnect_delay: float = 2.0,
+        recv_timeout: float = 30.0
+    ):
+        self.base_url = base_url
+        self.handler = handler
+        self.client_id = client_id or str(uuid.uuid4())
+        self.reconnect_delay = reconnect_delay
+        self.recv_timeout = recv_timeout
+        self.connected = False
+        self.current_prompt_id: Optional[str] = None
+        self._ws = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return websocket_url(self.base_url, self.client_id)
+
+    def start(self):
+        """Start the listener thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='comfyui-event-listener',
+            daemon=True
+        )
+        self._thread.start()
+        logger.info(f'Event listener started (client_id: {self.client_id})')
+
+    def stop(self):
+        """Stop the listener and close the connection"""
+        self._stop.set()
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+
+    def _run(self):
+        """Connect, receive and reconnect until stopped"""
+        while not self._stop.is_set():
+            try:
+                self._ws = websocket.create_connection(self.url, timeout=10)
+                self._ws.settimeout(self.recv_timeout)
+                self.connected = True
+                logger.info(f'Connected to ComfyUI websocket: {self.url}')
+                self._emit('connected', {'client_id': self.client_id})
+
+                while not self._stop.is_set():
+                    try:
+                        message = self._ws.recv()
+                    except websocket.WebSocketTimeoutException:
+                        continue
+                    if isinstance(message, bytes):
+                        self._dispatch_binary(message)
+                    elif message:
+                        self._dispatch_text(message)
+
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.warning(f'ComfyUI websocket error: {e}')
+            finally:
+                was_connected = self.connected
+                self.connected = False
+                self.current_prompt_id = None
+                if self._ws is not None:
+                    try:
+                        self._ws.close()
+                    except Exception:
+                        pass
+                    self._ws = None
+                if was_connected:
+                    self._emit('disconnected', {'client_id': self.client_id})
+
+            self._stop.wait(self.reconnect_delay)
+
+    def _dispatch_text(self, message: str):
+        """Route a JSON event to the handler"""
+        try:
+            event = json.loads(message)
+        except json.JSONDecodeError:
+            logger.debug(f'Ignoring non-JSON websocket message: {message[:100]}')
+            return
+
+        event_type = event.get('type')
+        data = event.get('data') or {}
+
+        # Track which prompt is executing so binary previews can be attributed
+        if event_type in ('execution_start', 'executing', 'progress'):
+            prompt_id = data.get('prompt_id')
+            if prompt_id:
+                self.current_prompt_id = prompt_id
+            if event_type == 'executing' and data.get('node') is None:
+                self.current_prompt_id = None
+        elif event_type in ('execution_success', 'execution_error', 'execution_interrupted'):
+            if data.get('prompt_id') == self.current_prompt_id:
+                self.current_prompt_id = None
+
+        self._emit(event_type, data)
+
+    def _dispatch_binary(self, payload: bytes):
+        """Decode a binary preview frame and route it to the handler"""
+        if len(payload) < 8:
+            return
+
+        event_type = struct.unpack('>I', payload[:4])[0]
+
+        if event_type == BINARY_PREVIEW_IMAGE:
+            image_type = struct.unpack('>I', payload[4:8])[0]
+            self._emit('preview', {
+                'prompt_id': self.current_prompt_id,
+                'format': PREVIEW_FORMATS.get(image_type, 'jpeg'),
+                'image': payload[8:]
+            })
+
+        elif event_type == BINARY_PREVIEW_IMAGE_WITH_METADATA:
+            metadata_length = struct.unpack('>I', payload[4:8])[0]
+            try:
+                metadata = json.loads(payload[8:8 + metadata_length])
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                metadata = {}
+            mime = metadata.get('image_type', 'image/jpeg')
+            self._emit('preview', {
+                'prompt_id': metadata.get('prompt_id') or self.current_prompt_id,
+                'node': metadata.get('node_id'),
+                'format': mime.split('/')[-1],
+                'image': payload[8 + metadata_length:]
+            })
+
+    def _emit(self, event_type: str, data: Dict):
+        """Invoke the handler, never letting it kill the listener thread"""
+        try:
+            self.handler(event_type, data)
+        except Exception as e:
+            logger.error(f'Event handler failed for {event_type}: {e}', exc_info=True)
+
+
+# ============================================================================
+# Streaming Broker
+# ============================================================================
+
+TERMINAL_EVENTS = ('completed', 'failed', 'cancelled')
+
+
+class AsyncSubscriber:
+    """Subscriber queue owned by an event loop, fed from listener threads"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def put_nowait(self, item: Tuple[str, Dict]):
+        try:
+            self._loop.call_soon_threadsafe(self._put, item)
+        except RuntimeError:
+            pass  # loop closed
+
+    def _put(self, item: Tuple[str, Dict]):
+        if self._queue.full():
+            # Slow consumer: drop the oldest event (usually a preview frame)
+            self._queue.get_nowait()
+        self._queue.put_nowait(item)
+
+    async def get(self, timeout: float) -> Tuple[str, Dict]:
+        """Next (event, data); raises asyncio.TimeoutError after timeout seconds"""
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+
+class EventBroker:
+    """Fan-out of per-prompt events to streaming subscribers"""
+
+    def __init__(self, max_queue: int = 256, retain: int = 1024):
+        self.max_queue = max_queue
+        self.retain = retain
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[queue.Queue]] = {}
+        self._outputs: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._final: "OrderedDict[str, Tuple[str, Dict]]" = OrderedDict()
+
+    def subscribe(self, key: str) -> queue.Queue:
+        """Register a subscriber queue; receives (event, data) tuples"""
+        subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(key, []).append(subscriber)
+        return subscriber
+
+    def subscribe_async(self, key: str) -> AsyncSubscriber:
+        """Register a subscriber for the running event loop"""
+        subscriber = AsyncSubscriber(asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(key, []).append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, key: str, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(key, [])
+            if subscriber in subscribers:
+                subscribers.remove(subscriber)
+            if not subscribers:
+                self._subscribers.pop(key, None)
+
+    def final_event(self, key: str) -> Optional[Tuple[str, Dict]]:
+        """Terminal event already published for key (for late subscribers)"""
+        with self._lock:
+            return self._final.get(key)
+
+    def outputs(self, key: str) -> List[Dict]:
+        """Output descriptors collected for key so far"""
+        with self._lock:
+            return list(self._outputs.get(key, []))
+
+    def add_outputs(self, key: str, descriptors: List[Dict]):
+        with self._lock:
+            self._outputs.setdefault(key, []).extend(descriptors)
+            self._outputs.move_to_end(key)
+            while len(self._outputs) > self.retain:
+                self._outputs.popitem(last=False)
+
+    def publish(self, key: str, event: str, data: Dict):
+        """Deliver an event to every subscriber of key"""
+        with self._lock:
+            if key in self._final:
+                return
+            if event in TERMINAL_EVENTS:
+                self._final[key] = (event, data)
+                self._outputs.pop(key, None)
+                while len(self._final) > self.retain:
+                    self._final.popitem(last=False)
+            subscribers = list(self._subscribers.get(key, []))
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # Slow consumer: drop the oldest event (usually a preview frame)
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait((event, data))
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def has_subscribers(self, key: str) -> bool:
+        with self._lock:
+            return bool(self._subscribers.get(key))
+
+
+def format_sse(event: str, data: Dict) -> str:
+    """Serialize one Server-Sent Events message"""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
@@ -5,29 +5,64 @@ Provides HTTP endpoints for automated image generation and workflow control
 
 Endpoints:
   POST   /api/generate       - Generate image from text prompt
-  GET    /api/status         - Check generation status and queue
+  GET    /api/status/{id}    - Check generation status (pushed via ComfyUI websocket)
+  GET    /api/stream/{id}    - Stream progress, previews and outputs (Server-Sent Events)
   DELETE /api/queue/{id}     - Cancel specific job
   POST   /api/queue/clear    - Clear entire queue
   GET    /api/history        - Get generation history
   GET    /api/image/{filename} - Download generated image
+  GET    /api/backends       - ComfyUI backend pool state
+  GET    /api/scheduler      - Pending queue and model swap metrics
+  GET    /api/cache          - Result cache statistics
+  GET    /api/ready          - Model readiness of every workflow (503 until the default one is ready)
+  GET    /api/ready/{workflow} - Model readiness of one workflow
+  GET    /metrics            - Prometheus metrics
 """
 
+import atexit
+import functools
 import json
 import os
 import sys
 import time
+import queue
+import base64
+import shutil
+import signal
 import uuid
+import threading
 import requests
-import asyncio
-import websocket
+from requests.adapters import HTTPAdapter
 from pathlib import Path
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass, asdict, field, fields, replace
 from datetime import datetime
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
 import logging
 
+# Trace spans are shared with the runners (workflows/comfy_runner/tracing.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'workflows'))
+
+from admission import AdmissionController, AdmissionRejected, Decision, PRIORITY_CLASSES, priority_rank
+from backend_pool import Backend, BackendPool, backend_name
+from batch_runner import ARCHIVE_FORMATS, SETTLED_STATES, BatchRunner, file_chunks
+from comfyui_events import EventBroker, TERMINAL_EVENTS, format_sse
+from job_scheduler import AffinityScheduler, PendingJob
+from image_variants import ImageVariants, image_headers
+from job_tracing import JobTraces
+from job_store import JobStore
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, ExecutionTimeline, Registry
+from micro_batcher import MicroBatcher
+from model_readiness import ModelReadiness
+from output_index import OutputIndex
+from result_cache import ResultCache, cache_key
+from workflow_templates import (
+    WorkflowTemplate, WorkflowTemplateRegistry, BATCH_ITEM_CLASSES, CONDITIONING_CACHE_CLASSES
+)
+from comfy_runner import tracing
+from comfy_runner.journal import GenerationJournal, make_record, seconds_between
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -46,9 +81,116 @@ API_PORT = int(os.environ.get('API_PORT', 5000))
 WORKSPACE_PATH = Path(os.environ.get('WORKSPACE_PATH', '/workspace'))
 OUTPUT_DIR = WORKSPACE_PATH / 'ComfyUI' / 'output'
 WORKFLOWS_DIR = Path(__file__).parent.parent / 'workflows'
+DEFAULT_WORKFLOW = os.environ.get('DEFAULT_WORKFLOW', 'flux2_turbo_parametric_api')
 
 COMFYUI_API_URL = f'http://{COMFYUI_HOST}:{COMFYUI_PORT}'
 
+# Comma-separated ComfyUI base URLs (pods, or one instance per GPU);
+# defaults to the single COMFYUI_HOST:COMFYUI_PORT instance
+COMFYUI_URLS = [
+    url.strip() for url in os.environ.get('COMFYUI_URLS', '').split(',') if url.strip()
+] or [COMFYUI_API_URL]
+
+# Backend pool dispatch and health checks
+BACKEND_HEALTH_INTERVAL = float(os.environ.get('BACKEND_HEALTH_INTERVAL', 10))
+BACKEND_MAX_FAILURES = int(os.environ.get('BACKEND_MAX_FAILURES', 3))
+BACKEND_MODEL_SWAP_COST = float(os.environ.get('BACKEND_MODEL_SWAP_COST', 3.0))
+BACKEND_MEMORY_WEIGHT = float(os.environ.get('BACKEND_MEMORY_WEIGHT', 1.0))
+
+# Model-affinity scheduling: jobs wait in the API's queue and are reordered
+# within the fairness window so prompts sharing a model set run back-to-back
+SCHEDULER_FAIRNESS_SECONDS = float(os.environ.get('SCHEDULER_FAIRNESS_SECONDS', 30))
+SCHEDULER_MAX_INFLIGHT = int(os.environ.get('SCHEDULER_MAX_INFLIGHT', 1))
+SCHEDULER_SWAP_SECONDS = float(os.environ.get('SCHEDULER_SWAP_SECONDS', 20))
+
+# Micro-batching: requests without an explicit seed that would wait for a
+# backend are held up to the wait window and share one ComfyUI prompt
+# (MICROBATCH_MAX_SIZE=1 disables). With the bundled batch nodes
+# (custom_nodes/ComfyUI-Batch-Items) on every backend and a sampler that
+# draws no noise while sampling, each keeps its own seed and (KSampler
+# workflows) prompt (MICROBATCH_PER_ITEM=false merges identical prompts only)
+MICROBATCH_MAX_WAIT_MS = int(os.environ.get('MICROBATCH_MAX_WAIT_MS', 100))
+MICROBATCH_MAX_SIZE = int(os.environ.get('MICROBATCH_MAX_SIZE', 4))
+MICROBATCH_PER_ITEM = os.environ.get('MICROBATCH_PER_ITEM', 'true').lower() == 'true'
+BATCH_ITEM_NODES = tuple(sorted({replacement for replacement, _, _ in BATCH_ITEM_CLASSES.values()}))
+
+# Result cache for requests with an explicit seed (RESULT_CACHE=false disables)
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE', 'true').lower() == 'true'
+RESULT_CACHE_DIR = Path(os.environ.get('RESULT_CACHE_DIR', WORKSPACE_PATH / 'api_cache'))
+RESULT_CACHE_MAX_MB = int(os.environ.get('RESULT_CACHE_MAX_MB', 10240))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 10000))
+
+# Conditioning cache: render text encoders as the bundled CachedCLIPTextEncode
+# node (custom_nodes/ComfyUI-Conditioning-Cache). auto uses it once every
+# healthy backend reports the node, true always, false never
+CONDITIONING_CACHE = os.environ.get('CONDITIONING_CACHE', 'auto').lower()
+# The replacements render the same images, so result cache keys treat them as the original
+CACHE_EQUIVALENT_CLASSES = {cached: original for original, cached in CONDITIONING_CACHE_CLASSES.items()}
+
+# Admission control: per-client token buckets (a configured X-API-Key or the
+# client address) and a bound on jobs waiting for a backend; 0 disables either
+# check, and the buckets are off by default. Behind the RunPod proxy (or any reverse proxy)
+# every client has the proxy's address: set ADMISSION_TRUST_PROXY=true to key
+# buckets by X-Forwarded-For, or give clients X-API-Keys.
+# ADMISSION_QUOTAS overrides rate/burst per key: {"key": {"rate": 2, "burst": 20}}
+ADMISSION_RATE = float(os.environ.get('ADMISSION_RATE', 0))
+ADMISSION_BURST = float(os.environ.get('ADMISSION_BURST', 10))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 64))
+ADMISSION_QUOTAS = json.loads(os.environ.get('ADMISSION_QUOTAS') or '{}')
+ADMISSION_TRUST_PROXY = os.environ.get('ADMISSION_TRUST_PROXY', 'false').lower() == 'true'
+
+# Persistent job store (SQLite, WAL); finished jobs are pruned after the TTL
+JOB_DB_PATH = Path(os.environ.get('JOB_DB_PATH', WORKSPACE_PATH / 'api_jobs.sqlite3'))
+JOB_TTL_HOURS = float(os.environ.get('JOB_TTL_HOURS', 72))
+JOB_PAGE_SIZE = 50
+JOB_PAGE_MAX = 500
+
+# Generation journal: one JSON record per finished job, in the rotated
+# segments the runners also write (comfy_runner/journal.py);
+# GENERATION_JOURNAL=false disables
+GENERATION_JOURNAL_DIR = Path(os.environ.get('GENERATION_JOURNAL_DIR', WORKSPACE_PATH / 'logs' / 'journal'))
+
+# Bulk batches (/api/batch): items queued or running at once across all
+# batches, and the largest batch accepted
+BATCH_WINDOW = int(os.environ.get('BATCH_WINDOW', 16))
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 100000))
+BATCH_POLL_SECONDS = 1.0
+
+# /api/outputs index (stored in the job database), rescanned periodically
+OUTPUT_INDEX_RECONCILE_SECONDS = float(os.environ.get('OUTPUT_INDEX_RECONCILE_SECONDS', 300))
+OUTPUT_PAGE_SIZE = 100
+OUTPUT_PAGE_MAX = 1000
+
+# /api/image: thumbnails and WebP/JPEG/AVIF transcodes rendered on demand
+IMAGE_VARIANTS_DIR = Path(os.environ.get('IMAGE_VARIANTS_DIR', OUTPUT_DIR.parent / 'output_variants'))
+IMAGE_THUMBNAIL_SIZES = [int(s) for s in os.environ.get('IMAGE_THUMBNAIL_SIZES', '128,256,512,1024').split(',')]
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 85))
+IMAGE_MAX_AGE = int(os.environ.get('IMAGE_MAX_AGE', 86400))
+# A variant still rendering after this long is answered with 202 and Retry-After
+IMAGE_VARIANT_WAIT_SECONDS = float(os.environ.get('IMAGE_VARIANT_WAIT_SECONDS', 2))
+# Variant cache budget; variants not served for IMAGE_VARIANTS_MAX_AGE_DAYS go (0 keeps them)
+IMAGE_VARIANTS_MAX_MB = int(os.environ.get('IMAGE_VARIANTS_MAX_MB', 2048))
+IMAGE_VARIANTS_MAX_AGE_DAYS = float(os.environ.get('IMAGE_VARIANTS_MAX_AGE_DAYS', 30))
+IMAGE_RETRY_AFTER = 1
+
+# Upstream HTTP to ComfyUI: per-call timeouts and a bounded keep-alive pool
+# per backend (shared by the sync client and the async server)
+COMFYUI_CONNECT_TIMEOUT = float(os.environ.get('COMFYUI_CONNECT_TIMEOUT', 5))
+COMFYUI_READ_TIMEOUT = float(os.environ.get('COMFYUI_READ_TIMEOUT', 30))
+COMFYUI_POOL_SIZE = int(os.environ.get('COMFYUI_POOL_SIZE', 32))
+
+# Model readiness: jobs wait in the scheduler until the model files their
+# workflow loads are in MODELS_DIR (written by model_downloader.py at startup).
+# Inactive when MODELS_DIR is not on this host; MODEL_READINESS=false disables
+MODELS_DIR = Path(os.environ.get('MODELS_DIR', WORKSPACE_PATH / 'ComfyUI' / 'models'))
+MODELS_MANIFEST = Path(os.environ.get('MODELS_MANIFEST', MODELS_DIR / 'models-manifest.json'))
+MODEL_READINESS_ENABLED = os.environ.get('MODEL_READINESS', 'true').lower() == 'true'
+
+# Server-Sent Events streaming
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_MAX_SECONDS = int(os.environ.get('STREAM_MAX_SECONDS', 3600))
+
 # ============================================================================
 # Data Models
 # ============================================================================
@@ -59,14 +201,17 @@ class GenerationRequest:
     prompt: str
     negative_prompt: str = ""
     steps: int = 25
-    cfg: float = 3.5
+    cfg: Optional[float] = None        # None keeps the workflow's own value
     width: int = 1024
     height: int = 1024
-    lora_strength: float = 1.0
+    lora_strength: Optional[float] = None
     seed: int = None
-    sampler: str = "euler_ancestral"
-    scheduler: str = "karras"
+    sampler: Optional[str] = None
+    scheduler: Optional[str] = None
     batch_size: int = 1
+    workflow: str = DEFAULT_WORKFLOW
+    cache: bool = True                 # False: never serve or store a cached result
+    priority: str = 'interactive'      # 'interactive' or 'batch' (see admission)
 
     def __post_init__(self):
         if self.seed is None:
@@ -77,21 +222,83 @@ class GenerationRequest:
 class GenerationStatus:
     """Status of a generation job"""
     job_id: str
-    status: str  # queued, processing, completed, failed
+    status: str  # queued, processing, completed, failed, cancelled
     prompt: str
+    prompt_id: Optional[str] = None
+    workflow: Optional[str] = None
+    backend: Optional[str] = None
+    seed: Optional[int] = None
+    batch_size: int = 1
+    width: Optional[int] = None
+    height: Optional[int] = None
+    batch_index: Optional[int] = None    # set when micro-batched with other jobs
+    cache_key: Optional[str] = None      # set when the result may be cached
+    cache_hit: bool = False
     progress: float = 0.0
     current_step: int = 0
     total_steps: int = 0
+    current_node: Optional[str] = None
     output_image: Optional[str] = None
+    outputs: List[Dict] = field(default_factory=list)
     error: Optional[str] = None
     created_at: str = None
+    started_at: Optional[str] = None
     completed_at: Optional[str] = None
+    trace_id: Optional[str] = None       # set while tracing is on
 
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.now().isoformat()
 
 
+# ============================================================================
+# Metrics
+# ============================================================================
+
+metrics = Registry()
+HTTP_REQUESTS = metrics.counter(
+    'comfyapi_http_requests_total', 'API requests by route and status', ('method', 'route', 'status')
+)
+HTTP_LATENCY = metrics.histogram(
+    'comfyapi_http_request_duration_seconds', 'API request latency by route', ('method', 'route')
+)
+UPSTREAM_LATENCY = metrics.histogram(
+    'comfyapi_upstream_request_duration_seconds', 'ComfyUI HTTP call latency by client method',
+    ('backend', 'method')
+)
+UPSTREAM_ERRORS = metrics.counter(
+    'comfyapi_upstream_errors_total', 'Failed ComfyUI HTTP calls by client method and error',
+    ('backend', 'method', 'error')
+)
+execution_timeline = ExecutionTimeline(metrics)
+
+# Spans go to TRACE_FILE and/or an OTLP collector (OTEL_EXPORTER_OTLP_ENDPOINT)
+tracer = tracing.configure('comfyui-rest-api')
+job_traces = JobTraces(tracer)
+TRACED_METHODS = ('POST', 'DELETE')
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    """Record one API request (route is the URL rule, not the URL)"""
+    HTTP_REQUESTS.inc(method=method, route=route, status=status)
+    HTTP_LATENCY.observe(seconds, method=method, route=route)
+
+
+def upstream_call(method):
+    """Time a ComfyUIClient call and count its failures"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(backend=self.name, method=method.__name__, error=type(e).__name__)
+            raise
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, backend=self.name, method=method.__name__)
+    return wrapper
+
+
 # ============================================================================
 # ComfyUI API Client
 # ============================================================================
@@ -99,60 +306,97 @@ class GenerationStatus:
 class ComfyUIClient:
     """Client for ComfyUI API"""
 
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, templates: WorkflowTemplateRegistry = None):
         self.base_url = base_url
+        self.name = backend_name(base_url, 0)
+        self.timeout = (COMFYUI_CONNECT_TIMEOUT, COMFYUI_READ_TIMEOUT)
+        # The session is shared by request threads; block rather than open extra connections
         self.session = requests.Session()
+        self.session.mount(base_url, HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=COMFYUI_POOL_SIZE,
+            pool_block=True
+        ))
+        self.templates = templates or WorkflowTemplateRegistry(WORKFLOWS_DIR)
         self.queue = {}
         self.history = {}
 
-    def load_workflow(self, workflow_name: str = 'flux2_turbo_default') -> Dict:
-        """Load workflow from JSON file"""
-        workflow_path = WORKFLOWS_DIR / f'{workflow_name}.json'
-        if not workflow_path.exists():
-            raise FileNotFoundError(f'Workflow not found: {workflow_path}')
-
-        with open(workflow_path, 'r') as f:
-            return json.load(f)
+    def load_workflow(self, workflow_name: str = DEFAULT_WORKFLOW) -> Dict:
+        """Load workflow nodes from the template cache (shared, do not mutate)"""
+        return self.templates.get(workflow_name).nodes
 
     def prepare_workflow(
         self,
         prompt: str,
         negative_prompt: str = "",
         steps: int = 25,
-        cfg: float = 3.5,
+        cfg: float = None,
         width: int = 1024,
         height: int = 1024,
-        lora_strength: float = 1.0,
+        lora_strength: float = None,
         seed: int = None,
-        sampler: str = "euler_ancestral",
-        scheduler: str = "karras"
+        sampler: str = None,
+        scheduler: str = None,
+        batch_size: int = 1,
+        workflow: str = DEFAULT_WORKFLOW,
+        filename_prefix: str = None,
+        substitutions: Dict[str, str] = None
     ) -> Dict:
-        """Prepare workflow with user parameters"""
-        workflow = self.load_workflow()
-
-        # Update image dimensions (node 8: EmptyLatentImage)
-        workflow['8']['inputs']['width'] = width
-        workflow['8']['inputs']['height'] = height
-
-        # Update positive prompt (node 3: CLIPTextEncode positive)
-        workflow['3']['inputs']['text'] = prompt
-
-        # Update negative prompt (node 4: CLIPTextEncode negative)
-        workflow['4']['inputs']['text'] = negative_prompt
-
-        # Update KSampler parameters (node 5)
-        workflow['5']['inputs']['steps'] = steps
-        workflow['5']['inputs']['cfg'] = cfg
-        workflow['5']['inputs']['seed'] = seed or int(time.time() * 1000) % 2**32
-        workflow['5']['inputs']['sampler_name'] = sampler
-        workflow['5']['inputs']['scheduler'] = scheduler
-
-        # Update LoRA strength (node 2: LoraLoader)
-        workflow['2']['inputs']['strength_model'] = lora_strength
-        workflow['2']['inputs']['strength_clip'] = lora_strength * 0.9
+        """Prepare workflow with user parameters
+
+        Parameters are mapped to node inputs by class_type when the template
+        is parsed; None leaves the workflow's own value in place.
+        substitutions swaps node classes for drop-in replacements.
+        """
+        return self.templates.render(workflow, self.workflow_params(
+            prompt, negative_prompt, steps, cfg, width, height, lora_strength,
+            seed, sampler, scheduler, batch_size, filename_prefix
+        ), substitutions)
+
+    def prepare_batch_workflow(
+        self,
+        items: List[Dict],
+        workflow: str = DEFAULT_WORKFLOW,
+        substitutions: Dict[str, str] = None
+    ) -> Dict:
+        """Prepare one workflow whose batch item i renders items[i]
+        (prepare_workflow keyword arguments differing only in prompt and seed)"""
+        return self.templates.get(workflow).render_batch(
+            [self.workflow_params(**item) for item in items], substitutions
+        )
 
-        return workflow
+    @staticmethod
+    def workflow_params(
+        prompt: str,
+        negative_prompt: str = "",
+        steps: int = 25,
+        cfg: float = None,
+        width: int = 1024,
+        height: int = 1024,
+        lora_strength: float = None,
+        seed: int = None,
+        sampler: str = None,
+        scheduler: str = None,
+        batch_size: int = 1,
+        filename_prefix: str = None
+    ) -> Dict:
+        """Template parameters of a request"""
+        return {
+            'prompt': prompt,
+            'negative_prompt': negative_prompt,
+            'steps': steps,
+            'cfg': cfg,
+            'width': width,
+            'height': height,
+            'lora_strength': lora_strength,
+            'seed': seed if seed is not None else int(time.time() * 1000) % 2**32,
+            'sampler': sampler,
+            'scheduler': scheduler,
+            'batch_size': batch_size,
+            'filename_prefix': filename_prefix or 'api',
+        }
 
+    @upstream_call
     def submit_workflow(self, workflow: Dict, client_id: str = None) -> str:
         """Submit workflow to ComfyUI queue"""
         if client_id is None:
@@ -165,7 +409,8 @@ class ComfyUIClient:
 
         response = self.session.post(
             f'{self.base_url}/prompt',
-            json=payload
+            json=payload,
+            timeout=self.timeout
         )
         response.raise_for_status()
 
@@ -175,44 +420,79 @@ class ComfyUIClient:
         logger.info(f'Workflow submitted: {prompt_id}')
         return prompt_id
 
+    @upstream_call
     def get_queue(self) -> Dict:
         """Get current queue status"""
-        response = self.session.get(f'{self.base_url}/queue')
+        response = self.session.get(f'{self.base_url}/queue', timeout=self.timeout)
         response.raise_for_status()
         return response.json()
 
-    def get_history(self, prompt_id: str = None) -> Dict:
+    @upstream_call
+    def get_history(self, prompt_id: str = None, max_items: int = None) -> Dict:
         """Get execution history"""
         if prompt_id:
-            response = self.session.get(f'{self.base_url}/history/{prompt_id}')
+            response = self.session.get(f'{self.base_url}/history/{prompt_id}', timeout=self.timeout)
         else:
-            response = self.session.get(f'{self.base_url}/history')
+            params = {'max_items': max_items} if max_items else None
+            response = self.session.get(f'{self.base_url}/history', params=params, timeout=self.timeout)
 
         response.raise_for_status()
         return response.json()
 
+    @upstream_call
+    def has_node(self, class_type: str) -> bool:
+        """Whether a node class is installed (/object_info/<class_type>)"""
+        response = self.session.get(f'{self.base_url}/object_info/{class_type}', timeout=self.timeout)
+        if response.status_code == 404:
+            return False    # no per-class route: an old ComfyUI, assume it is missing
+        response.raise_for_status()
+        return class_type in response.json()
+
+    @upstream_call
     def get_system_stats(self) -> Dict:
         """Get system statistics"""
-        response = self.session.get(f'{self.base_url}/system')
+        response = self.session.get(f'{self.base_url}/system_stats', timeout=self.timeout)
         response.raise_for_status()
         return response.json()
 
-    def cancel_queue_item(self, item_id: str) -> bool:
-        """Cancel a queued item"""
+    @upstream_call
+    def cancel_queue_item(self, prompt_id: str, running: bool = False) -> bool:
+        """Cancel a prompt: drop it from the pending queue, interrupt it if running"""
         response = self.session.post(
-            f'{self.base_url}/interrupt',
-            json={}
+            f'{self.base_url}/queue',
+            json={'delete': [prompt_id]},
+            timeout=self.timeout
         )
+        if running:
+            response = self.session.post(
+                f'{self.base_url}/interrupt',
+                json={'prompt_id': prompt_id},
+                timeout=self.timeout
+            )
         return response.status_code == 200
 
+    @upstream_call
     def clear_queue(self) -> bool:
         """Clear the entire queue"""
         response = self.session.post(
             f'{self.base_url}/queue',
-            json={'clear': True}
+            json={'clear': True},
+            timeout=self.timeout
         )
         return response.status_code == 200
 
+    @upstream_call
+    def get_image(self, filename: str, subfolder: str = '', folder_type: str = 'output') -> requests.Response:
+        """Stream an output image from ComfyUI's /view endpoint"""
+        response = self.session.get(
+            f'{self.base_url}/view',
+            params={'filename': filename, 'subfolder': subfolder, 'type': folder_type},
+            stream=True,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response
+
 
 # ============================================================================
 # Flask REST API
@@ -221,41 +501,1003 @@ class ComfyUIClient:
 app = Flask(__name__)
 CORS(app)
 
-# Initialize ComfyUI client
-try:
-    comfyui = ComfyUIClient(COMFYUI_API_URL)
-    logger.info(f'Connected to ComfyUI at {COMFYUI_API_URL}')
-except Exception as e:
-    logger.error(f'Failed to connect to ComfyUI: {e}')
-    comfyui = None
+workflow_templates = WorkflowTemplateRegistry(WORKFLOWS_DIR)
+model_readiness = ModelReadiness(
+    MODELS_DIR,
+    MODELS_MANIFEST,
+    workflow_templates,
+    enabled=MODEL_READINESS_ENABLED
+)
 
-# In-memory job tracking (replace with database for production)
+# Jobs in flight; every job is also persisted in job_store, and finished
+# jobs are only read back from there
 jobs: Dict[str, GenerationStatus] = {}
+job_store = JobStore(JOB_DB_PATH, ttl_hours=JOB_TTL_HOURS)
+output_index = OutputIndex(OUTPUT_DIR, JOB_DB_PATH, reconcile_interval=OUTPUT_INDEX_RECONCILE_SECONDS)
+
+# ComfyUI prompt_id -> job_ids (several when micro-batched), used to demultiplex websocket events
+prompt_jobs: Dict[str, List[str]] = {}
+jobs_lock = threading.Lock()
+
+TERMINAL_STATES = ('completed', 'failed', 'cancelled')
+
+
+# ============================================================================
+# ComfyUI Event Handling
+# ============================================================================
+
+STATUS_FIELDS = {f.name for f in fields(GenerationStatus)}
+
+
+def _status_from_dict(data: Dict) -> GenerationStatus:
+    return GenerationStatus(**{k: v for k, v in data.items() if k in STATUS_FIELDS})
+
+
+def _get_job(job_id: str) -> Optional[GenerationStatus]:
+    """In-flight job from memory, finished job from the job store"""
+    with jobs_lock:
+        status = jobs.get(job_id)
+    if status is not None:
+        return status
+    data = job_store.get(job_id)
+    return _status_from_dict(data) if data else None
+
+
+def _retire(status: GenerationStatus) -> Dict:
+    """Snapshot a job for the store; finished jobs leave memory (caller holds jobs_lock)"""
+    snapshot = asdict(status)
+    if status.status in TERMINAL_STATES and jobs.get(status.job_id) is status:
+        del jobs[status.job_id]
+        job_traces.finish(status.job_id, status.status, status.error, images=len(status.outputs))
+        _journal(snapshot)
+        members = prompt_jobs.get(status.prompt_id)
+        if members is not None and not any(job_id in jobs for job_id in members):
+            del prompt_jobs[status.prompt_id]
+    return snapshot
+
+
+def _persist(snapshots: List[Dict]):
+    """Write job snapshots to the store (outside jobs_lock)"""
+    try:
+        job_store.save_many(snapshots)
+    except Exception as e:
+        logger.error(f'Job store write failed: {e}')
+
+
+# ============================================================================
+# Generation Journal
+# ============================================================================
+
+journal: Optional[GenerationJournal] = None
+journal_records: "queue.Queue[Dict]" = queue.Queue(maxsize=10000)
+
+
+def _epoch(value: Optional[str]) -> Optional[float]:
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def journal_record(snapshot: Dict) -> Dict:
+    """Journal record of a finished job's snapshot"""
+    created = _epoch(snapshot.get('created_at'))
+    started = _epoch(snapshot.get('started_at'))
+    completed = _epoch(snapshot.get('completed_at'))
+    timings = {
+        'queue': seconds_between(created, started),
+        'execution': seconds_between(started, completed),
+        'total': seconds_between(created, completed),
+    }
+    return make_record(
+        'rest-api',
+        snapshot['status'],
+        id=snapshot['job_id'],
+        prompt_id=snapshot.get('prompt_id'),
+        workflow=snapshot.get('workflow'),
+        prompt=snapshot.get('prompt'),
+        seed=snapshot.get('seed'),
+        steps=snapshot.get('total_steps') or None,
+        width=snapshot.get('width'),
+        height=snapshot.get('height'),
+        batch_size=snapshot.get('batch_size'),
+        batch_index=snapshot.get('batch_index'),
+        timings={name: value for name, value in timings.items() if value is not None},
+        outputs=[output['filename'] for output in snapshot.get('outputs') or ()] or None,
+        error=snapshot.get('error'),
+        backend=snapshot.get('backend'),
+        models=list(_workflow_models(snapshot.get('workflow'))) or None,
+        cache_hit=snapshot.get('cache_hit') or None,
+        trace_id=snapshot.get('trace_id'),
+    )
+
+
+def _journal(snapshot: Dict):
+    """Queue a finished job for the journal writer (callers may hold jobs_lock)"""
+    if journal is None:
+        return
+    try:
+        journal_records.put_nowait(snapshot)
+    except queue.Full:
+        logger.warning(f"Generation journal backlog full, dropped job {snapshot['job_id']}")
+
+
+def _write_journal(snapshot: Dict):
+    try:
+        journal.append(journal_record(snapshot))
+    except Exception as e:
+        logger.error(f'Generation journal write failed: {e}')
+
+
+def _journal_writer():
+    while True:
+        _write_journal(journal_records.get())
+
+
+def _drain_journal():
+    """Write what is still queued (at exit)"""
+    while True:
+        try:
+            snapshot = journal_records.get_nowait()
+        except queue.Empty:
+            return
+        _write_journal(snapshot)
+
+
+def start_journal():
+    global journal
+    try:
+        journal = GenerationJournal.from_env(str(GENERATION_JOURNAL_DIR))
+    except OSError as e:
+        logger.warning(f'Generation journal disabled ({GENERATION_JOURNAL_DIR}: {e})')
+        return
+    if journal is not None:
+        threading.Thread(target=_journal_writer, name='generation-journal', daemon=True).start()
+        atexit.register(_drain_journal)
+        logger.info(f'Generation journal: {journal.directory}')
+
+
+def _jobs_for_prompt(prompt_id: Optional[str]) -> List[GenerationStatus]:
+    """Resolve the jobs tracking a ComfyUI prompt (caller holds jobs_lock)"""
+    if not prompt_id:
+        return []
+    return [jobs[job_id] for job_id in prompt_jobs.get(prompt_id, ()) if job_id in jobs]
+
+
+def _member_images(status: GenerationStatus, images: List[Dict]) -> List[Dict]:
+    """A micro-batched job only owns the image at its batch index"""
+    if status.batch_index is None or len(images) != status.batch_size:
+        return images
+    return [images[status.batch_index]]
+
+
+def _member_event(status: GenerationStatus, event_type: str, data: Dict) -> Dict:
+    if event_type != 'executed' or status.batch_index is None:
+        return data
+    output = data.get('output') or {}
+    images = _member_images(status, output.get('images', []))
+    return {**data, 'output': {**output, 'images': images}}
+
+
+def _image_descriptors(output: Dict) -> List[Dict]:
+    """Extract image descriptors from a node output"""
+    descriptors = []
+    for image in (output or {}).get('images', []):
+        if not image.get('filename'):
+            continue
+        descriptor = {
+            'filename': image['filename'],
+            'subfolder': image.get('subfolder', ''),
+            'type': image.get('type', 'output')
+        }
+        if descriptor['type'] == 'output' and not descriptor['subfolder']:
+            descriptor['url'] = f"/api/image/{descriptor['filename']}"
+        descriptors.append(descriptor)
+    return descriptors
+
+
+def _mark_completed(status: GenerationStatus):
+    status.status = 'completed'
+    status.progress = 1.0
+    status.current_node = None
+    if status.total_steps:
+        status.current_step = status.total_steps
+    status.completed_at = datetime.now().isoformat()
+
+
+def _execution_error_message(data: Dict) -> str:
+    return (
+        f"{data.get('node_type', 'node')} {data.get('node_id', '')}: "
+        f"{data.get('exception_message', 'Unknown error')}"
+    ).strip()
+
+
+def _apply_event(status: GenerationStatus, event_type: str, data: Dict):
+    """Update a job from one ComfyUI event (caller holds jobs_lock)"""
+    if event_type == 'execution_start':
+        status.status = 'processing'
+        status.started_at = datetime.now().isoformat()
+
+    elif event_type == 'executing':
+        if data.get('node') is None:
+            # node=None marks the end of the prompt on older ComfyUI builds
+            _mark_completed(status)
+        else:
+            status.status = 'processing'
+            status.current_node = data.get('display_node') or data.get('node')
+
+    elif event_type == 'progress':
+        value = int(data.get('value', 0))
+        maximum = int(data.get('max', 0)) or 1
+        status.status = 'processing'
+        status.current_step = value
+        status.total_steps = maximum
+        status.progress = round(value / maximum, 4)
+
+    elif event_type == 'executed':
+        images = _image_descriptors(data.get('output'))
+        status.outputs.extend(images)
+        if images and status.output_image is None:
+            status.output_image = images[0]['filename']
+
+    elif event_type == 'execution_success':
+        _mark_completed(status)
+
+    elif event_type == 'execution_error':
+        status.status = 'failed'
+        status.error = _execution_error_message(data)
+        status.completed_at = datetime.now().isoformat()
+
+    elif event_type == 'execution_interrupted':
+        status.status = 'cancelled'
+        status.completed_at = datetime.now().isoformat()
+
+
+def _workflow_models(workflow: Optional[str]) -> tuple:
+    """Model set a workflow loads, () if unknown"""
+    if not workflow:
+        return ()
+    try:
+        return workflow_templates.get(workflow).models
+    except (FileNotFoundError, ValueError):
+        return ()
+
+
+PERSISTED_EVENTS = ('execution_start', 'executed', 'execution_success', 'execution_error', 'execution_interrupted')
+
+
+def handle_comfyui_event(backend: Backend, event_type: str, data: Dict):
+    """Apply a ComfyUI websocket event to its job and fan it out to streams"""
+    prompt_id = data.get('prompt_id')
+    execution_timeline.event(event_type, data)
+    job_traces.event(event_type, data)
+    updates = []
+    completed = []
+    snapshots = []
+    job_id = None
+    workflow = None
+    run_seconds = None
+
+    with jobs_lock:
+        for status in _jobs_for_prompt(prompt_id):
+            member_data = _member_event(status, event_type, data)
+            if status.status not in TERMINAL_STATES:
+                _apply_event(status, event_type, member_data)
+                if status.status == 'completed' and status.cache_key:
+                    completed.append((status.cache_key, list(status.outputs), status.backend, status.workflow))
+                if status.status == 'completed' and status.started_at and run_seconds is None:
+                    run_seconds = (
+                        datetime.fromisoformat(status.completed_at) - datetime.fromisoformat(status.started_at)
+                    ).total_seconds()
+                # Per-step progress stays in memory; state changes are persisted
+                if event_type in PERSISTED_EVENTS or status.status in TERMINAL_STATES:
+                    snapshots.append(_retire(status))
+            updates.append((status.job_id, member_data, list(status.outputs)))
+            if job_id is None:
+                job_id = status.job_id       # the scheduler tracks a batch by its first job
+                workflow = status.workflow
+
+    if event_type == 'status':
+        # Queue length changed on this backend: a slot may have freed up
+        scheduler.wake()
+    elif job_id and event_type == 'execution_start':
+        backend_pool.note_models(backend, _workflow_models(workflow))
+        scheduler.note_started(job_id)
+    elif job_id and event_type == 'progress':
+        scheduler.note_progress(job_id)
+
+    if run_seconds is not None:
+        admission.observe(run_seconds)
+
+    _persist(snapshots)
+    for key, outputs, backend_name, workflow_name in completed:
+        store_result(key, outputs, backend_pool.get(backend_name) or backend, workflow_name)
+
+    # Streams of API jobs are keyed by job_id, foreign prompts by prompt_id
+    for key, member_data, outputs in updates:
+        publish_stream_event(key, event_type, member_data, outputs)
+    if prompt_id and not updates:
+        publish_stream_event(prompt_id, event_type, data, None)
+
+
+def publish_stream_event(key: str, event_type: str, data: Dict, outputs: Optional[List[Dict]]):
+    """Translate a ComfyUI event into a /api/stream event (key: job_id or prompt_id)"""
+    if event_type == 'progress':
+        value = int(data.get('value', 0))
+        maximum = int(data.get('max', 0)) or 1
+        event_broker.publish(key, 'progress', {
+            'value': value,
+            'max': maximum,
+            'progress': round(value / maximum, 4),
+            'node': data.get('node')
+        })
+
+    elif event_type == 'executing' and data.get('node') is not None:
+        event_broker.publish(key, 'executing', {
+            'node': data.get('display_node') or data.get('node')
+        })
+
+    elif event_type == 'executed':
+        images = _image_descriptors(data.get('output'))
+        event_broker.add_outputs(key, images)
+        event_broker.publish(key, 'executed', {
+            'node': data.get('display_node') or data.get('node'),
+            'images': images
+        })
+
+    elif event_type == 'preview':
+        # Encoding is the expensive part, skip it when nobody is listening
+        if event_broker.has_subscribers(key):
+            event_broker.publish(key, 'preview', {
+                'format': data.get('format', 'jpeg'),
+                'image': base64.b64encode(data.get('image', b'')).decode('ascii')
+            })
+
+    elif event_type == 'execution_success' or (event_type == 'executing' and data.get('node') is None):
+        event_broker.publish(key, 'completed', {
+            'outputs': outputs if outputs is not None else event_broker.outputs(key)
+        })
+
+    elif event_type == 'execution_error':
+        event_broker.publish(key, 'failed', {
+            'error': _execution_error_message(data),
+            'node_id': data.get('node_id'),
+            'node_type': data.get('node_type')
+        })
+
+    elif event_type == 'execution_interrupted':
+        event_broker.publish(key, 'cancelled', {})
+
+
+def refresh_job_from_history(status: GenerationStatus):
+    """Fallback for when the websocket is down: reconcile one job with /history"""
+    if not status.prompt_id or status.status in TERMINAL_STATES:
+        return
+
+    with tracer.span('history_lookup', parent=job_traces.span(status.job_id), prompt_id=status.prompt_id):
+        history = _client_for(status).get_history(status.prompt_id).get(status.prompt_id)
+    if history:
+        apply_history(status, history)
+
+
+def apply_history(status: GenerationStatus, history: Dict):
+    """Merge a prompt's /history entry into its job"""
+    with jobs_lock:
+        if status.status in TERMINAL_STATES:
+            return
+        for output in history.get('outputs', {}).values():
+            for image in _member_images(status, _image_descriptors(output)):
+                if image not in status.outputs:
+                    status.outputs.append(image)
+        if status.outputs and status.output_image is None:
+            status.output_image = status.outputs[0]['filename']
+
+        history_status = history.get('status', {})
+        if history_status.get('status_str') == 'error':
+            status.status = 'failed'
+            status.error = 'Execution failed (see ComfyUI history)'
+            status.completed_at = datetime.now().isoformat()
+        elif history_status.get('completed', True):
+            _mark_completed(status)
+        snapshot = _retire(status)
+    _persist([snapshot])
+
+
+def _in_comfyui_queue(status: GenerationStatus) -> bool:
+    queue_status = _client_for(status).get_queue()
+    return any(
+        len(item) > 1 and item[1] == status.prompt_id
+        for key in ('queue_running', 'queue_pending')
+        for item in queue_status.get(key, [])
+    )
+
+
+def recover_jobs():
+    """Re-attach jobs left unfinished by a previous run of the API"""
+    attached, lost = [], []
+    for data in job_store.unfinished():
+        status = _status_from_dict(data)
+        if status.prompt_id:
+            attached.append(status)
+        else:
+            # Its rendered workflow only lived in the scheduler's memory
+            status.status = 'failed'
+            status.error = 'API restarted before the job was submitted to ComfyUI'
+            status.completed_at = datetime.now().isoformat()
+            lost.append(asdict(status))
+
+    attached.sort(key=lambda s: (s.prompt_id, s.batch_index or 0))
+    with jobs_lock:
+        for status in attached:
+            jobs[status.job_id] = status
+            prompt_jobs.setdefault(status.prompt_id, []).append(status.job_id)
+    _persist(lost)
+
+    if attached or lost:
+        logger.info(f'Recovered {len(attached)} in-flight jobs, {len(lost)} lost before submission')
+    if attached:
+        threading.Thread(
+            target=_reconcile_recovered,
+            args=(attached,),
+            name='job-recovery',
+            daemon=True
+        ).start()
+
+
+def _reconcile_recovered(statuses: List[GenerationStatus], attempts: int = 30, delay: float = 10.0):
+    """Settle recovered jobs against /history and /queue, waiting for ComfyUI to come up"""
+    pending = list(statuses)
+    for _ in range(attempts):
+        remaining = []
+        for status in pending:
+            try:
+                refresh_job_from_history(status)
+                if status.status in TERMINAL_STATES or _in_comfyui_queue(status):
+                    continue
+            except requests.RequestException:
+                remaining.append(status)
+                continue
+
+            with jobs_lock:
+                if status.status in TERMINAL_STATES:
+                    continue
+                status.status = 'failed'
+                status.error = 'Prompt not found in ComfyUI queue or history after API restart'
+                status.completed_at = datetime.now().isoformat()
+                snapshot = _retire(status)
+            _persist([snapshot])
+            event_broker.publish(status.job_id, 'failed', {'error': status.error})
+
+        pending = remaining
+        if not pending:
+            return
+        time.sleep(delay)
+    logger.warning(f'{len(pending)} recovered jobs could not be reconciled (ComfyUI unreachable)')
+
+
+def _backend_for(status: GenerationStatus) -> Backend:
+    """Backend a job was dispatched to (jobs stay sticky to it)"""
+    return backend_pool.get(status.backend) or backend_pool.primary()
+
+
+def _client_for(status: GenerationStatus) -> ComfyUIClient:
+    return _backend_for(status).client
+
+
+def submit_pending_job(job: PendingJob, backend: Backend) -> bool:
+    """Scheduler callback: submit a job to ComfyUI, False to put it back in the queue"""
+    failed = None
+    with jobs_lock:
+        members = [jobs.get(job_id) for job_id in job.job_ids]
+        live = [status for status in members if status and status.status not in TERMINAL_STATES]
+        if not live:
+            return True  # cancelled while waiting
+
+        # Registered under the lock so no early event is dropped
+        span = tracer.start_span('submit_workflow', parent=job_traces.span(job.job_id), backend=backend.name)
+        try:
+            prompt_id = backend.client.submit_workflow(job.workflow, client_id=backend_pool.client_id)
+        except requests.ConnectionError as e:
+            span.end(error=f'ConnectionError: {e}')
+            backend_pool.mark_failed(backend, e)
+            return False
+        except Exception as e:
+            failed = f'Submission failed: {e}'
+            span.end(error=failed)
+            job_traces.dispatched(job.job_ids, end_ns=span.start_ns, backend=backend.name)
+            for status in live:
+                status.status = 'failed'
+                status.error = failed
+                status.completed_at = datetime.now().isoformat()
+            snapshots = [_retire(status) for status in live]
+        else:
+            for status in members:
+                if status is not None:
+                    status.prompt_id = prompt_id
+                    status.backend = backend.name
+            prompt_jobs[prompt_id] = list(job.job_ids)
+            snapshots = [asdict(status) for status in live]
+            execution_timeline.submitted(
+                prompt_id,
+                (datetime.now() - datetime.fromisoformat(live[0].created_at)).total_seconds(),
+                job.workflow
+            )
+            span.set(prompt_id=prompt_id)
+            span.end()
+            job_traces.dispatched(job.job_ids, end_ns=span.start_ns, backend=backend.name)
+            job_traces.submitted(prompt_id, job.job_ids, job.workflow, backend=backend.name)
+
+    _persist(snapshots)
+    if failed:
+        logger.error(f'Job {job.job_id} rejected by {backend.name}: {failed}')
+        for status in live:
+            event_broker.publish(status.job_id, 'failed', {'error': failed})
+    else:
+        logger.info(f'Job {job.job_id} submitted to {backend.name} as {prompt_id} ({len(job.job_ids)} job(s))')
+    return True
+
+
+# GenerationRequest fields that are workflow parameters
+WORKFLOW_FIELDS = (
+    'prompt', 'negative_prompt', 'steps', 'cfg', 'width', 'height', 'lora_strength',
+    'seed', 'sampler', 'scheduler', 'batch_size',
+)
+
+
+def prepare_request_workflow(gen_request: GenerationRequest, **overrides) -> Dict:
+    """Render a request's workflow; overrides replace request fields"""
+    params = {**asdict(gen_request), **overrides}
+    return backend_pool.primary().client.prepare_workflow(
+        **{name: params[name] for name in WORKFLOW_FIELDS},
+        workflow=params['workflow'],
+        substitutions=node_substitutions()
+    )
+
+
+def prepare_batch_request_workflow(gen_requests: List[GenerationRequest]) -> Dict:
+    """Render micro-batched requests as one prompt, item i being gen_requests[i]"""
+    return backend_pool.primary().client.prepare_batch_workflow(
+        [{name: getattr(gen_request, name) for name in WORKFLOW_FIELDS} for gen_request in gen_requests],
+        workflow=gen_requests[0].workflow,
+        substitutions=node_substitutions()
+    )
+
+
+def node_substitutions() -> Dict[str, str]:
+    """Node classes to render as their cached drop-in replacements"""
+    if CONDITIONING_CACHE == 'true':
+        return CONDITIONING_CACHE_CLASSES
+    if CONDITIONING_CACHE == 'auto':
+        return {
+            original: replacement for original, replacement in CONDITIONING_CACHE_CLASSES.items()
+            if backend_pool.supports(replacement)
+        }
+    return {}
+
+
+def batch_items_supported(template: WorkflowTemplate) -> bool:
+    """True when a template's micro-batches may mix prompts and seeds"""
+    return (
+        MICROBATCH_PER_ITEM and template.batchable and
+        all(backend_pool.supports(class_type) for class_type in template.batch_classes)
+    )
+
+
+def batch_item_parameters(template: WorkflowTemplate, gen_request: GenerationRequest) -> Tuple[str, ...]:
+    """Parameters each request of a micro-batch keeps for itself; with none
+    the batch shares the seed of its first request"""
+    if not batch_items_supported(template):
+        return ()
+    return template.batch_item_parameters(gen_request.sampler)
+
+
+def _batch_key(gen_request: GenerationRequest, per_item: Tuple[str, ...]) -> tuple:
+    """Requests with equal keys can share one prompt
+
+    Keys leave out the per_item parameters, which the batch nodes set per
+    item, and the server-chosen seed, which a shared-seed batch ignores.
+    """
+    varying = set(per_item) | {'seed'}
+    return (('per_item', per_item),) + tuple(
+        (k, v) for k, v in sorted(asdict(gen_request).items()) if k not in varying
+    )
+
+
+def _distinct_seeds(gen_requests: List[GenerationRequest]) -> List[int]:
+    """Each request's seed, bumped where server-chosen seeds collided"""
+    seeds = []
+    for gen_request in gen_requests:
+        seed = gen_request.seed
+        while seed in seeds:
+            seed = (seed + 1) % 2**32
+        seeds.append(seed)
+    return seeds
+
+
+def _fail_jobs(job_ids: List[str], error: str):
+    snapshots = []
+    with jobs_lock:
+        for job_id in job_ids:
+            if job_id in jobs:
+                jobs[job_id].status = 'failed'
+                jobs[job_id].error = error
+                jobs[job_id].completed_at = datetime.now().isoformat()
+                snapshots.append(_retire(jobs[job_id]))
+    _persist(snapshots)
+    for job_id in job_ids:
+        event_broker.publish(job_id, 'failed', {'error': error})
+
+
+def flush_micro_batch(key: tuple, items: List[tuple]):
+    """Micro-batcher callback: submit (job_id, request) items as one prompt"""
+    job_ids = [job_id for job_id, _ in items]
+    gen_requests = [gen_request for _, gen_request in items]
+    gen_request = gen_requests[0]
+    size = len(items)
+    per_item = key[0][1]
+
+    if per_item and size > 1 and not set(per_item) <= set(
+            batch_item_parameters(workflow_templates.get(gen_request.workflow), gen_request)):
+        # A backend without the batch nodes joined the pool while the group waited
+        for item in items:
+            flush_micro_batch(_batch_key(item[1], per_item=()), [item])
+        return
+
+    seeds = _distinct_seeds(gen_requests) if per_item else [gen_request.seed] * size
+    try:
+        # One render for the whole batch, traced under its first job
+        with tracer.span('prepare_workflow', parent=job_traces.span(job_ids[0]), batch_size=size):
+            if per_item and size > 1:
+                workflow = prepare_batch_request_workflow([
+                    replace(request, seed=seed) for request, seed in zip(gen_requests, seeds)
+                ])
+            else:
+                workflow = prepare_request_workflow(gen_request, batch_size=size)
+    except Exception as e:
+        _fail_jobs(job_ids, str(e))
+        return
+
+    # Item i is batch index i. Per-item batches give each item its own seed;
+    # a shared seed only reproduces batch index 0 on its own, so the other
+    # items report none.
+    snapshots = []
+    with jobs_lock:
+        for index, job_id in enumerate(job_ids):
+            status = jobs.get(job_id)
+            if status is not None:
+                status.seed = seeds[index] if per_item or index == 0 else None
+                status.batch_size = size
+                status.batch_index = index if size > 1 else None
+                snapshots.append(asdict(status))
+    _persist(snapshots)
+
+    if size > 1:
+        prompts = len({request.prompt for request in gen_requests})
+        logger.info(
+            f'Micro-batched {size} jobs ({prompts} prompt(s)) into one prompt '
+            f'({gen_request.width}x{gen_request.height})'
+        )
+    scheduler.enqueue(PendingJob(
+        job_id=job_ids[0],
+        workflow=workflow,
+        models=_workflow_models(gen_request.workflow),
+        members=job_ids if size > 1 else [],
+        priority=priority_rank(gen_request.priority)
+    ))
+
+
+def store_result(key: str, outputs: List[Dict], backend: Backend, workflow: str = None):
+    """Copy a completed job's saved images into the result cache (background)"""
+    outputs = [output for output in outputs if output.get('type') == 'output']
+    if not outputs:
+        return
+
+    def fetch(descriptor: Dict, dest: Path):
+        local = OUTPUT_DIR / descriptor.get('subfolder', '') / descriptor['filename']
+        if local.exists():
+            try:
+                os.link(local, dest)
+            except OSError:
+                shutil.copy2(local, dest)
+            return
+        upstream = backend.client.get_image(descriptor['filename'], descriptor.get('subfolder', ''))
+        with open(dest, 'wb') as f:
+            for chunk in upstream.iter_content(chunk_size=65536):
+                f.write(chunk)
+
+    result_cache.put_async(key, outputs, fetch, workflow)
+
+
+def _backend_for_image(filename: str) -> Optional[Backend]:
+    """Backend holding an output image, found through the jobs that produced it"""
+    with jobs_lock:
+        for status in jobs.values():
+            if status.backend and any(o['filename'] == filename for o in status.outputs):
+                return backend_pool.get(status.backend)
+    data = job_store.find_output(filename)
+    return backend_pool.get(data.get('backend')) if data else None
+
+
+event_broker = EventBroker()
+backend_pool = BackendPool(
+    COMFYUI_URLS,
+    client_factory=lambda url: ComfyUIClient(url, templates=workflow_templates),
+    handler=handle_comfyui_event,
+    health_interval=BACKEND_HEALTH_INTERVAL,
+    max_failures=BACKEND_MAX_FAILURES,
+    model_swap_cost=BACKEND_MODEL_SWAP_COST,
+    memory_weight=BACKEND_MEMORY_WEIGHT,
+    probe_nodes=(
+        (tuple(CONDITIONING_CACHE_CLASSES.values()) if CONDITIONING_CACHE == 'auto' else ()) +
+        (BATCH_ITEM_NODES if MICROBATCH_PER_ITEM else ())
+    )
+)
+scheduler = AffinityScheduler(
+    backend_pool,
+    submit=submit_pending_job,
+    fairness_seconds=SCHEDULER_FAIRNESS_SECONDS,
+    max_inflight=SCHEDULER_MAX_INFLIGHT,
+    swap_seconds=SCHEDULER_SWAP_SECONDS,
+    ready=lambda job: model_readiness.ready(job.workflow)
+)
+result_cache = ResultCache(
+    RESULT_CACHE_DIR,
+    max_bytes=RESULT_CACHE_MAX_MB * 1024 ** 2,
+    max_entries=RESULT_CACHE_MAX_ENTRIES
+)
+micro_batcher = MicroBatcher(
+    flush=flush_micro_batch,
+    max_wait=MICROBATCH_MAX_WAIT_MS / 1000.0,
+    max_size=MICROBATCH_MAX_SIZE
+)
+image_variants = ImageVariants(
+    IMAGE_VARIANTS_DIR,
+    sizes=IMAGE_THUMBNAIL_SIZES,
+    workers=IMAGE_WORKERS,
+    quality=IMAGE_QUALITY,
+    wait_seconds=IMAGE_VARIANT_WAIT_SECONDS,
+    max_bytes=IMAGE_VARIANTS_MAX_MB * 1024 ** 2,
+    max_age=IMAGE_VARIANTS_MAX_AGE_DAYS * 86400
+)
+admission = AdmissionController(
+    depth=lambda rank: scheduler.depth(rank) + micro_batcher.pending(
+        lambda item: priority_rank(item[1].priority) <= rank
+    ),
+    slots=lambda: len(backend_pool.healthy_backends()) * SCHEDULER_MAX_INFLIGHT,
+    rate=ADMISSION_RATE,
+    burst=ADMISSION_BURST,
+    max_queue=ADMISSION_MAX_QUEUE,
+    quotas={f'key:{api_key}': quota for api_key, quota in ADMISSION_QUOTAS.items()}
+)
+
+
+def start_batch_item(data: Dict, priority: str) -> str:
+    """BatchRunner callback: start one batch item as a job, returning its job_id"""
+    try:
+        gen_request = parse_generation_request({**data, 'priority': priority})
+        return start_generation(gen_request, explicit_seed=data.get('seed') is not None).job_id
+    except Exception as e:
+        # Recorded as a failed job so the item still gets a result line
+        status = GenerationStatus(
+            job_id=str(uuid.uuid4()),
+            status='failed',
+            prompt=str(data.get('prompt', '')),
+            workflow=data.get('workflow', DEFAULT_WORKFLOW),
+            error=str(e),
+            completed_at=datetime.now().isoformat()
+        )
+        _persist([asdict(status)])
+        return status.job_id
+
+
+batch_runner = BatchRunner(job_store, start_batch_item, window=BATCH_WINDOW)
 
 
 # ============================================================================
 # API Endpoints
 # ============================================================================
 
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    # Requests that start or stop work join the caller's trace (traceparent header)
+    if tracer.enabled and request.method in TRACED_METHODS:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        span = tracer.start_span(
+            f'{request.method} {route}', parent=request.headers.get('traceparent'),
+            **{'http.method': request.method, 'http.route': route}
+        )
+        g.request_span = span.__enter__()
+
+
+@app.after_request
+def _observe_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+    span = g.get('request_span')
+    if span is not None:
+        span.set(**{'http.status_code': response.status_code})
+        response.headers['X-Trace-Id'] = span.trace_id
+    return response
+
+
+@app.teardown_request
+def _end_request_span(exc):
+    span = g.pop('request_span', None)
+    if span is not None:
+        span.__exit__(type(exc) if exc else None, exc, None)
+
+def health_payload(stats: Optional[Dict]):
+    """Health response body and code; stats is None when ComfyUI did not answer"""
+    pool = backend_pool.to_dict()
+    if stats is None:
+        return {
+            'status': 'unhealthy',
+            'error': 'ComfyUI not responding',
+            'backends': pool['backends']
+        }, 503
+    return {
+        'status': 'healthy' if pool['healthy'] == pool['total'] else 'degraded',
+        'comfyui': 'connected',
+        'event_stream': 'connected' if backend_pool.connected else 'disconnected',
+        'output_dir': str(OUTPUT_DIR),
+        'system': stats,
+        'backends': pool['backends']
+    }, 200
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    backend = backend_pool.primary()
+    stats = None
     try:
-        if comfyui:
-            stats = comfyui.get_system_stats()
-            return jsonify({
-                'status': 'healthy',
-                'comfyui': 'connected',
-                'output_dir': str(OUTPUT_DIR),
-                'system': stats
-            })
+        if backend.healthy:
+            stats = backend.client.get_system_stats()
     except Exception as e:
         logger.error(f'Health check failed: {e}')
 
-    return jsonify({
-        'status': 'unhealthy',
-        'error': 'ComfyUI not responding'
-    }), 503
+    body, code = health_payload(stats)
+    return jsonify(body), code
+
+
+def parse_generation_request(data: Dict) -> GenerationRequest:
+    """Validate a generate request body
+
+    Raises ValueError for invalid fields and FileNotFoundError for an
+    unknown workflow.
+    """
+    if not isinstance(data, dict) or not data.get('prompt'):
+        raise ValueError('Missing required field: prompt')
+
+    gen_request = GenerationRequest(
+        prompt=data['prompt'],
+        negative_prompt=data.get('negative_prompt', ''),
+        steps=int(data.get('steps', 25)),
+        cfg=float(data['cfg']) if data.get('cfg') is not None else None,
+        width=int(data.get('width', 1024)),
+        height=int(data.get('height', 1024)),
+        lora_strength=float(data['lora_strength']) if data.get('lora_strength') is not None else None,
+        seed=data.get('seed'),
+        sampler=data.get('sampler'),
+        scheduler=data.get('scheduler'),
+        batch_size=int(data.get('batch_size', 1)),
+        workflow=data.get('workflow', DEFAULT_WORKFLOW),
+        cache=bool(data.get('cache', True)),
+        priority=data.get('priority', 'interactive')
+    )
+    if gen_request.priority not in PRIORITY_CLASSES:
+        raise ValueError(f'priority must be one of: {", ".join(PRIORITY_CLASSES)}')
+    workflow_templates.get(gen_request.workflow)
+    return gen_request
+
+
+def start_generation(gen_request: GenerationRequest, explicit_seed: bool,
+                     admit: Callable[[], Decision] = None) -> GenerationStatus:
+    """Register a job and queue it, or complete it at once from the result cache
+
+    admit is asked only for jobs that will be queued, so cache hits cost no
+    admission token; a refusal raises AdmissionRejected.
+    """
+    template = workflow_templates.get(gen_request.workflow)
+    job_id = str(uuid.uuid4())
+    job_span = job_traces.begin(
+        job_id, workflow=gen_request.workflow, steps=gen_request.steps, width=gen_request.width,
+        height=gen_request.height, priority=gen_request.priority
+    )
+    status = GenerationStatus(
+        job_id=job_id,
+        status='queued',
+        prompt=gen_request.prompt,
+        workflow=gen_request.workflow,
+        seed=gen_request.seed,
+        batch_size=gen_request.batch_size,
+        width=gen_request.width,
+        height=gen_request.height,
+        total_steps=gen_request.steps,
+        trace_id=job_span.trace_id if job_span.recording else None
+    )
+
+    # A server-chosen seed can come from a shared batch; an explicit one cannot
+    batchable = (
+        micro_batcher.enabled and not explicit_seed and
+        gen_request.batch_size == 1 and 'batch_size' in template.bindings
+    )
+
+    workflow = None
+    if not batchable:
+        # Cached template, only parameterised nodes are copied
+        try:
+            with tracer.span('prepare_workflow', parent=job_span):
+                workflow = prepare_request_workflow(gen_request)
+        except Exception as e:
+            job_traces.finish(job_id, 'failed', str(e))
+            raise
+
+        # An explicit seed makes the graph deterministic, so its hash names the result
+        cacheable = RESULT_CACHE_ENABLED and gen_request.cache and explicit_seed
+        status.cache_key = cache_key(workflow, CACHE_EQUIVALENT_CLASSES) if cacheable else None
+        entry = result_cache.get(status.cache_key) if status.cache_key else None
+
+        if entry is not None:
+            status.cache_hit = True
+            status.outputs = [dict(output) for output in entry.outputs]
+            status.output_image = status.outputs[0]['filename']
+            _mark_completed(status)
+            snapshot = asdict(status)
+            _persist([snapshot])
+            _journal(snapshot)
+            job_traces.finish(job_id, 'completed', cache_hit=True, images=len(status.outputs))
+            event_broker.publish(job_id, 'completed', {'outputs': status.outputs, 'cache_hit': True})
+            logger.info(f'Cache hit for job {job_id}: {gen_request.prompt}')
+            return status
+
+    if admit is not None:
+        decision = admit()
+        if not decision.admitted:
+            job_traces.finish(job_id, 'rejected', decision.reason)
+            raise AdmissionRejected(decision)
+
+    with jobs_lock:
+        jobs[job_id] = status
+    _persist([asdict(status)])
+    if batchable:
+        # Held for peers only while it would wait for a backend anyway
+        micro_batcher.add(
+            _batch_key(gen_request, per_item=batch_item_parameters(template, gen_request)),
+            (job_id, gen_request),
+            wait=not scheduler.idle()
+        )
+    else:
+        scheduler.enqueue(PendingJob(
+            job_id=job_id,
+            workflow=workflow,
+            models=template.models,
+            priority=priority_rank(gen_request.priority)
+        ))
+    logger.info(f'Generated job {job_id}: {gen_request.prompt}')
+    return status
+
+
+def _client_key() -> str:
+    """Admission identity of the caller
+
+    Only keys configured in ADMISSION_QUOTAS identify a client; any other
+    X-API-Key is ignored, so inventing keys cannot mint fresh buckets.
+    """
+    api_key = request.headers.get('X-API-Key')
+    if api_key and api_key in ADMISSION_QUOTAS:
+        return f'key:{api_key}'
+    address = request.remote_addr or 'unknown'
+    if ADMISSION_TRUST_PROXY and request.headers.get('X-Forwarded-For'):
+        address = request.headers['X-Forwarded-For'].split(',')[0].strip()
+    return f'ip:{address}'
+
+
+def _rejected(decision: Decision):
+    """429 response of a refused admission"""
+    response = jsonify({'error': decision.reason, 'retry_after': decision.retry_after})
+    response.headers['Retry-After'] = str(decision.retry_after)
+    return response, 429
 
 
 @app.route('/api/generate', methods=['POST'])
@@ -275,77 +1517,83 @@ def generate_image():
         "seed": 12345,
         "sampler": "euler_ancestral",
         "scheduler": "karras",
-        "batch_size": 1
+        "batch_size": 1,
+        "workflow": "flux2_turbo_parametric_api",
+        "cache": true,
+        "priority": "interactive"
     }
 
+    cfg, lora_strength, sampler and scheduler default to the values in the
+    workflow itself. With an explicit seed the result is deterministic and
+    is served from the result cache when available (200, "cache_hit": true,
+    "status": "completed"); "cache": false opts out.
+
+    Requests over the client's quota (X-API-Key header, else client address)
+    or arriving while the queue is full get 429 with Retry-After; cache hits
+    are served without an admission check. Waiting "interactive" jobs are
+    dispatched before "batch" ones, and only jobs of the same or a more
+    urgent class count against the queue bound.
+
+    The job waits in the scheduler's queue until a backend has a free slot;
+    jobs whose models are already loaded there are preferred (see
+    job_scheduler). prompt_id and backend appear in /api/status once the
+    job has been submitted to ComfyUI.
+
+    While the pod is still downloading models, a job whose workflow needs a
+    file that has not landed yet stays queued until it does (see /api/ready);
+    "waiting_for_models" lists those files.
+
     Response:
     {
         "job_id": "uuid",
         "status": "queued",
         "prompt": "a beautiful landscape",
+        "cache_hit": false,
+        "waiting_for_models": [],
         "message": "Image generation queued"
     }
     """
-    if not comfyui:
+    if not backend_pool.healthy_backends():
         return jsonify({'error': 'ComfyUI not connected'}), 503
 
     try:
         data = request.get_json()
-
-        # Validate required fields
-        if not data.get('prompt'):
-            return jsonify({'error': 'Missing required field: prompt'}), 400
-
-        # Create generation request
-        gen_request = GenerationRequest(
-            prompt=data['prompt'],
-            negative_prompt=data.get('negative_prompt', ''),
-            steps=int(data.get('steps', 25)),
-            cfg=float(data.get('cfg', 3.5)),
-            width=int(data.get('width', 1024)),
-            height=int(data.get('height', 1024)),
-            lora_strength=float(data.get('lora_strength', 1.0)),
-            seed=data.get('seed'),
-            sampler=data.get('sampler', 'euler_ancestral'),
-            scheduler=data.get('scheduler', 'karras'),
-            batch_size=int(data.get('batch_size', 1))
-        )
-
-        # Prepare workflow
-        workflow = comfyui.prepare_workflow(
-            prompt=gen_request.prompt,
-            negative_prompt=gen_request.negative_prompt,
-            steps=gen_request.steps,
-            cfg=gen_request.cfg,
-            width=gen_request.width,
-            height=gen_request.height,
-            lora_strength=gen_request.lora_strength,
-            seed=gen_request.seed,
-            sampler=gen_request.sampler,
-            scheduler=gen_request.scheduler
-        )
-
-        # Submit to ComfyUI
-        job_id = str(uuid.uuid4())
-        prompt_id = comfyui.submit_workflow(workflow, client_id=job_id)
-
-        # Track job
-        status = GenerationStatus(
-            job_id=job_id,
-            status='queued',
-            prompt=gen_request.prompt,
-            total_steps=gen_request.steps
-        )
-        jobs[job_id] = status
-
-        logger.info(f'Generated job {job_id}: {gen_request.prompt}')
-
+        try:
+            with tracer.span('parse_request'):
+                gen_request = parse_generation_request(data)
+        except FileNotFoundError as e:
+            return jsonify({'error': str(e)}), 404
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        client = _client_key()
+        try:
+            status = start_generation(
+                gen_request,
+                explicit_seed=data.get('seed') is not None,
+                admit=lambda: admission.admit(client, gen_request.priority)
+            )
+        except AdmissionRejected as e:
+            return _rejected(e.decision)
+        if status.cache_hit:
+            return jsonify({
+                'job_id': status.job_id,
+                'status': 'completed',
+                'prompt': gen_request.prompt,
+                'cache_hit': True,
+                'outputs': status.outputs,
+                'output_image': status.output_image,
+                'message': 'Served from result cache'
+            }), 200
+
+        waiting = model_readiness.workflow(gen_request.workflow)['missing']
         return jsonify({
-            'job_id': job_id,
-            'prompt_id': prompt_id,
+            'job_id': status.job_id,
             'status': 'queued',
             'prompt': gen_request.prompt,
-            'message': 'Image generation queued'
+            'cache_hit': False,
+            'waiting_for_models': waiting,
+            'message': 'Queued until models finish downloading' if waiting else 'Image generation queued'
         }), 202
 
     except Exception as e:
@@ -370,21 +1618,160 @@ def get_status(job_id):
         "error": null
     }
     """
-    if job_id not in jobs:
+    status = _get_job(job_id)
+    if status is None:
         return jsonify({'error': 'Job not found'}), 404
 
-    status = jobs[job_id]
+    # Progress is pushed by the websocket listener; only hit /history when it is down
+    if status.status not in TERMINAL_STATES and not _backend_for(status).connected:
+        try:
+            refresh_job_from_history(status)
+        except Exception as e:
+            logger.warning(f'Could not fetch history: {e}')
+
+    with jobs_lock:
+        return jsonify(asdict(status)), 200
+
+
+def _terminal_stream_event(status: GenerationStatus):
+    """Final stream event for a job that already finished"""
+    if status.status == 'completed':
+        return 'completed', {'outputs': list(status.outputs)}
+    if status.status == 'failed':
+        return 'failed', {'error': status.error}
+    return 'cancelled', {}
 
-    # Fetch latest from ComfyUI history
+
+def resolve_stream(job_id: str):
+    """(job, broker key) for a job_id or ComfyUI prompt_id; job is None for foreign prompts"""
+    with jobs_lock:
+        status = jobs.get(job_id)
+        if status is None and prompt_jobs.get(job_id):
+            status = jobs.get(prompt_jobs[job_id][0])
+    if status is None:
+        # Finished jobs are only in the job store
+        data = job_store.get(job_id) or next(iter(job_store.find_by_prompt(job_id)), None)
+        status = _status_from_dict(data) if data else None
+    return status, (status.job_id if status else job_id)
+
+
+def stream_timeout(value: Optional[str]) -> int:
+    """Seconds from a timeout query parameter, at most STREAM_MAX_SECONDS
+
+    Raises ValueError for anything but a positive integer.
+    """
+    if value is None:
+        return STREAM_MAX_SECONDS
     try:
-        if status.status == 'queued' or status.status == 'processing':
-            history = comfyui.get_history(job_id)
-            if history:
-                logger.info(f'Updated status for {job_id}')
-    except Exception as e:
-        logger.warning(f'Could not fetch history: {e}')
+        seconds = int(value)
+    except ValueError:
+        raise ValueError('timeout must be an integer number of seconds')
+    if seconds <= 0:
+        raise ValueError('timeout must be positive')
+    return min(seconds, STREAM_MAX_SECONDS)
+
+
+def stream_opening(status: Optional[GenerationStatus], key: str):
+    """Initial status snapshot and, if the job already ended, its final event"""
+    with jobs_lock:
+        if status is not None:
+            snapshot = asdict(status)
+            final = _terminal_stream_event(status) if status.status in TERMINAL_STATES else None
+        else:
+            snapshot = {'job_id': None, 'prompt_id': key, 'status': 'unknown'}
+            final = None
+    return snapshot, event_broker.final_event(key) or final
+
+
+@app.route('/api/stream', methods=['GET'])
+def stream_info():
+    """
+    Stream connection info
 
-    return jsonify(asdict(status)), 200
+    Prompts submitted straight to ComfyUI with this client_id can be
+    followed on /api/stream/<prompt_id> (used by comfy-run.sh --stream-url).
+    """
+    return jsonify({
+        'client_id': backend_pool.client_id,
+        'connected': backend_pool.connected
+    }), 200
+
+
+@app.route('/api/stream/<job_id>', methods=['GET'])
+def stream_job(job_id):
+    """
+    Stream generation progress as Server-Sent Events
+
+    Accepts a job_id or a ComfyUI prompt_id. Query parameters:
+      previews=0   Do not send latent preview frames
+      timeout=N    Close the stream after N seconds (default and maximum: STREAM_MAX_SECONDS)
+
+    Events:
+      status      Job snapshot when the stream opens
+      executing   {"node": "6"}
+      progress    {"value": 2, "max": 4, "progress": 0.5, "node": "6"}
+      preview     {"format": "jpeg", "image": "<base64>"}
+      executed    {"node": "10", "images": [{"filename": ..., "url": ...}]}
+      completed   {"outputs": [...]}                      (stream ends)
+      failed      {"error": "...", "node_id": ..., ...}   (stream ends)
+      cancelled   {}                                      (stream ends)
+    """
+    try:
+        max_seconds = stream_timeout(request.args.get('timeout'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    status, key = resolve_stream(job_id)
+    send_previews = request.args.get('previews', '1') != '0'
+
+    def generate():
+        subscriber = event_broker.subscribe(key)
+        try:
+            # Snapshot after subscribing so no event falls between the two
+            snapshot, final = stream_opening(status, key)
+            yield format_sse('status', snapshot)
+            if final is not None:
+                yield format_sse(*final)
+                return
+
+            deadline = time.monotonic() + max_seconds
+            while time.monotonic() < deadline:
+                try:
+                    event, data = subscriber.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+
+                if event == 'preview' and not send_previews:
+                    continue
+                yield format_sse(event, data)
+                if event in TERMINAL_EVENTS:
+                    return
+
+            yield format_sse('timeout', {'id': key, 'seconds': max_seconds})
+        finally:
+            event_broker.unsubscribe(key, subscriber)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def _job_page(statuses: List[str] = None):
+    """One page of jobs from the store, with live progress for jobs in flight"""
+    if statuses is None:
+        statuses = [s for s in request.args.get('status', '').split(',') if s]
+    workflow = request.args.get('workflow') or None
+    limit = min(max(int(request.args.get('limit', JOB_PAGE_SIZE)), 1), JOB_PAGE_MAX)
+    offset = max(int(request.args.get('offset', 0)), 0)
+
+    page = job_store.query(statuses, workflow, limit=limit, offset=offset)
+    total = job_store.count(statuses, workflow)
+    # Per-step progress is only kept in memory
+    with jobs_lock:
+        page = [asdict(jobs[job['job_id']]) if job['job_id'] in jobs else job for job in page]
+    return page, total, limit, offset
 
 
 @app.route('/api/queue', methods=['GET'])
@@ -392,19 +1779,47 @@ def get_queue():
     """
     Get queue status
 
+    Jobs are listed newest first from the job store. Query parameters:
+      status=queued,processing   Only jobs in these states
+      workflow=NAME              Only jobs of this workflow
+      limit=50                   Page size (max 500)
+      offset=0                   Jobs to skip
+
     Response:
     {
-        "queue_pending": [...],
-        "queue_running": [...],
-        "jobs": {...}
+        "queue": {"queue_pending": [...], "queue_running": [...]},
+        "scheduler": {"pending": [...], "stats": {...}},
+        "admission": {"depth": 3, "max_queue": 64, ...},
+        "jobs": {...},
+        "total_jobs": 120,
+        "limit": 50,
+        "offset": 0
     }
     """
     try:
-        queue_status = comfyui.get_queue()
+        queue_status = {'queue_running': [], 'queue_pending': []}
+        backends = {}
+        for backend in backend_pool.healthy_backends():
+            backend_queue = backend.client.get_queue()
+            backend.update_queue(backend_queue)
+            backends[backend.name] = backend.queue_remaining
+            for key in queue_status:
+                queue_status[key].extend(backend_queue.get(key, []))
+        job_page, total, limit, offset = _job_page()
         return jsonify({
             'queue': queue_status,
-            'jobs': {job_id: asdict(status) for job_id, status in jobs.items()},
-            'total_jobs': len(jobs)
+            'backends': backends,
+            'scheduler': {
+                'pending': scheduler.pending(),
+                'stats': scheduler.stats(),
+                'micro_batching': micro_batcher.stats()
+            },
+            'admission': admission.stats(),
+            'batches': batch_runner.stats(),
+            'jobs': {job['job_id']: job for job in job_page},
+            'total_jobs': total,
+            'limit': limit,
+            'offset': offset
         }), 200
     except Exception as e:
         logger.error(f'Queue fetch error: {e}')
@@ -415,8 +1830,21 @@ def get_queue():
 def clear_queue():
     """Clear entire queue"""
     try:
-        result = comfyui.clear_queue()
-        jobs.clear()
+        # Stop running batches first so they do not refill the queue
+        for batch in job_store.running_batches():
+            job_store.set_batch_status(batch['batch_id'], 'cancelled')
+        micro_batcher.remove(lambda item: True)
+        scheduler.clear()
+        result = all([backend.client.clear_queue() for backend in backend_pool.healthy_backends()])
+        with jobs_lock:
+            pending = [job for job in jobs.values() if job.status not in TERMINAL_STATES]
+            for status in pending:
+                status.status = 'cancelled'
+                status.completed_at = datetime.now().isoformat()
+            snapshots = [_retire(status) for status in pending]
+        _persist(snapshots)
+        for pending_job_id in [status.job_id for status in pending]:
+            event_broker.publish(pending_job_id, 'cancelled', {})
         return jsonify({
             'status': 'success' if result else 'failed',
             'message': 'Queue cleared'
@@ -426,15 +1854,46 @@ def clear_queue():
         return jsonify({'error': str(e)}), 500
 
 
+def cancel_in_flight(job_id: str) -> bool:
+    """Cancel a job wherever it is waiting or running; False if it already finished"""
+    # Still waiting in the micro-batcher or scheduler: ComfyUI never saw it
+    micro_batcher.remove(lambda item: item[0] == job_id)
+    scheduler.remove(job_id)
+
+    # Marked first so a submission racing with us is skipped
+    with jobs_lock:
+        status = jobs.get(job_id)
+        if status is None or status.status in TERMINAL_STATES:
+            return False
+        running = status.status == 'processing'
+        status.status = 'cancelled'
+        status.completed_at = datetime.now().isoformat()
+        prompt_id = status.prompt_id
+        # A batched prompt keeps running while other jobs still need it
+        shared = prompt_id and any(
+            other.status not in TERMINAL_STATES for other in _jobs_for_prompt(prompt_id)
+        )
+        snapshot = _retire(status)
+    _persist([snapshot])
+    if prompt_id and not shared:
+        _client_for(status).cancel_queue_item(prompt_id, running=running)
+    event_broker.publish(job_id, 'cancelled', {})
+    return True
+
+
 @app.route('/api/queue/<job_id>', methods=['DELETE'])
 def cancel_job(job_id):
     """Cancel a specific job"""
-    if job_id not in jobs:
+    with jobs_lock:
+        in_flight = job_id in jobs
+    if not in_flight:
+        if job_store.get(job_id):
+            return jsonify({'error': f'Job {job_id} has already finished'}), 409
         return jsonify({'error': 'Job not found'}), 404
 
     try:
-        comfyui.cancel_queue_item(job_id)
-        jobs[job_id].status = 'cancelled'
+        if not cancel_in_flight(job_id):
+            return jsonify({'error': f'Job {job_id} has already finished'}), 409
         return jsonify({
             'status': 'success',
             'message': f'Job {job_id} cancelled'
@@ -446,48 +1905,434 @@ def cancel_job(job_id):
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
-    """Get generation history"""
+    """
+    Get generation history
+
+    "history" is ComfyUI's own history (at most limit items per backend);
+    "jobs" is a page of finished API jobs from the job store, taking the
+    same status / workflow / limit / offset parameters as /api/queue.
+    """
     try:
-        history = comfyui.get_history()
+        statuses = [s for s in request.args.get('status', '').split(',') if s] or list(TERMINAL_STATES)
+        job_page, total, limit, offset = _job_page(statuses)
+        history = {}
+        for backend in backend_pool.healthy_backends():
+            history.update(backend.client.get_history(max_items=limit))
         return jsonify({
             'history': history,
-            'total_items': len(history)
+            'total_items': len(history),
+            'jobs': job_page,
+            'total_jobs': total,
+            'limit': limit,
+            'offset': offset
         }), 200
     except Exception as e:
         logger.error(f'History fetch error: {e}')
         return jsonify({'error': str(e)}), 500
 
 
+def _batch_summary(batch: Dict) -> Dict:
+    counts = job_store.batch_counts(batch['batch_id'])
+    if batch['status'] == 'cancelled':
+        # Items never started count as cancelled
+        counts['cancelled'] = counts.get('cancelled', 0) + counts.pop('pending', 0)
+    batch_id = batch['batch_id']
+    return {
+        **batch,
+        'counts': counts,
+        'done': sum(n for state, n in counts.items() if state in SETTLED_STATES),
+        'results_url': f'/api/batch/{batch_id}/results',
+        'archive_url': f'/api/batch/{batch_id}/archive'
+    }
+
+
+def _batch_result(item: Dict, batch_status: str) -> Optional[Dict]:
+    """Result line of a settled batch item, None while it is still pending"""
+    job = item['job']
+    if job is None:
+        if item['job_id'] is not None:
+            state = 'expired'
+        elif batch_status == 'cancelled':
+            state = 'cancelled'
+        else:
+            return None
+        return {'index': item['index'], 'job_id': item['job_id'], 'status': state}
+    if job['status'] not in TERMINAL_STATES:
+        return None
+    return {
+        'index': item['index'],
+        'job_id': item['job_id'],
+        'status': job['status'],
+        'seed': job.get('seed'),
+        'outputs': job.get('outputs') or [],
+        'error': job.get('error'),
+        'cache_hit': job.get('cache_hit', False)
+    }
+
+
+@app.route('/api/batch', methods=['POST'])
+def create_batch():
+    """
+    Queue a batch of generation requests
+
+    The body is JSON Lines: one /api/generate request object per line.
+    Every line is validated before anything is queued. Query parameters:
+      priority=batch|interactive   Priority class of all items (default: batch)
+
+    The batch takes one admission token; its items are then started
+    BATCH_WINDOW at a time, in order, and survive API restarts.
+    """
+    if not backend_pool.healthy_backends():
+        return jsonify({'error': 'ComfyUI not connected'}), 503
+
+    priority = request.args.get('priority', 'batch')
+    if priority not in PRIORITY_CLASSES:
+        return jsonify({'error': f'priority must be one of: {", ".join(PRIORITY_CLASSES)}'}), 400
+
+    try:
+        items, errors = [], []
+        for number, line in enumerate(request.stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if len(items) >= BATCH_MAX_ITEMS:
+                return jsonify({'error': f'Batch exceeds {BATCH_MAX_ITEMS} items'}), 413
+            try:
+                data = json.loads(line)
+                parse_generation_request({**data, 'priority': priority})
+            except (ValueError, TypeError, FileNotFoundError) as e:
+                errors.append({'line': number, 'error': str(e)})
+                if len(errors) >= 20:
+                    break
+                continue
+            data.pop('priority', None)
+            items.append(data)
+
+        if errors:
+            return jsonify({'error': 'Invalid batch, nothing was queued', 'errors': errors}), 400
+        if not items:
+            return jsonify({'error': 'Empty batch'}), 400
+
+        client = _client_key()
+        decision = admission.admit(client, priority)
+        if not decision.admitted:
+            return _rejected(decision)
+
+        batch = job_store.create_batch(str(uuid.uuid4()), items, priority, client=client)
+        batch_runner.wake()
+        logger.info(f"Batch {batch['batch_id']}: {len(items)} items ({priority})")
+        return jsonify(_batch_summary(batch)), 202
+
+    except Exception as e:
+        logger.error(f'Batch error: {e}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/batch/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """Batch progress: item counts per status"""
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify(_batch_summary(batch)), 200
+
+
+@app.route('/api/batch/<batch_id>', methods=['DELETE'])
+def cancel_batch(batch_id):
+    """Cancel a batch: items not started are dropped, queued and running ones cancelled"""
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    if batch['status'] != 'running':
+        return jsonify({'error': f"Batch {batch_id} has already {batch['status']}"}), 409
+
+    try:
+        job_store.set_batch_status(batch_id, 'cancelled')
+        cancelled = 0
+        start = 0
+        while True:
+            items = job_store.batch_items(batch_id, start, 1000)
+            if not items:
+                break
+            for item in items:
+                if item['job_id'] and cancel_in_flight(item['job_id']):
+                    cancelled += 1
+            start = items[-1]['index'] + 1
+        return jsonify({
+            'status': 'success',
+            'message': f'Batch {batch_id} cancelled ({cancelled} jobs in flight)'
+        }), 200
+    except Exception as e:
+        logger.error(f'Batch cancel error: {e}')
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/batch/<batch_id>/results', methods=['GET'])
+def stream_batch_results(batch_id):
+    """
+    Stream per-item results as JSON Lines, in item order
+
+    Each line is written once its item has finished:
+      {"index": 0, "job_id": ..., "status": "completed", "seed": ..., "outputs": [...], "error": null}
+
+    While the next item is still running, {"heartbeat": true, "next": N}
+    lines keep the connection alive. The stream ends after the last item,
+    or with {"timeout": true, "next": N} after STREAM_MAX_SECONDS; resume
+    with from=N. Query parameters:
+      from=N      First item index (default: 0)
+      timeout=N   Close the stream after N seconds (at most STREAM_MAX_SECONDS)
+    Either one out of range is rejected with 400.
+    """
+    try:
+        start = int(request.args.get('from', 0))
+    except ValueError:
+        return jsonify({'error': 'from must be an integer item index'}), 400
+    if start < 0:
+        return jsonify({'error': 'from must not be negative'}), 400
+    try:
+        max_seconds = stream_timeout(request.args.get('timeout'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+
+    def generate():
+        index = start
+        deadline = time.monotonic() + max_seconds
+        last_line = time.monotonic()
+        while index < batch['total']:
+            status = job_store.get_batch(batch_id)['status']
+            sent = False
+            for item in job_store.batch_items(batch_id, index, 100):
+                result = _batch_result(item, status)
+                if result is None:
+                    break
+                yield json.dumps(result) + '\n'
+                index = item['index'] + 1
+                sent = True
+            if sent:
+                last_line = time.monotonic()
+                continue
+
+            now = time.monotonic()
+            if now >= deadline:
+                yield json.dumps({'timeout': True, 'next': index}) + '\n'
+                return
+            if now - last_line >= STREAM_KEEPALIVE_SECONDS:
+                yield json.dumps({'heartbeat': True, 'next': index}) + '\n'
+                last_line = now
+            time.sleep(BATCH_POLL_SECONDS)
+
+    return Response(
+        generate(),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def _archive_source(output: Dict):
+    """(size, chunks) of an output image, from disk or from its backend"""
+    filename = output['filename']
+    file_path = local_image(filename)
+    if file_path is not None:
+        return file_path.stat().st_size, file_chunks(file_path)
+
+    backend = _backend_for_image(filename)
+    if backend is None:
+        return None
+    response = backend.client.get_image(filename, output.get('subfolder', ''), output.get('type', 'output'))
+    length = response.headers.get('Content-Length')
+    if length is None:
+        return len(response.content), [response.content]
+    return int(length), response.iter_content(65536)
+
+
+def _batch_archive_entries(batch_id: str):
+    """Archive members for the finished images of a batch, then manifest.jsonl"""
+    manifest = []
+    start = 0
+    while True:
+        items = job_store.batch_items(batch_id, start, 500)
+        if not items:
+            break
+        start = items[-1]['index'] + 1
+        for item in items:
+            job = item['job']
+            if not job or job['status'] != 'completed':
+                continue
+            for output in job.get('outputs') or []:
+                if output.get('type', 'output') != 'output':
+                    continue
+                name = f"{item['index']:06d}_{output['filename']}"
+                try:
+                    source = _archive_source(output)
+                except requests.RequestException as e:
+                    logger.warning(f'Batch archive: skipping {output["filename"]}: {e}')
+                    continue
+                if source is None:
+                    continue
+                manifest.append({
+                    'file': name,
+                    'index': item['index'],
+                    'job_id': item['job_id'],
+                    'prompt': job.get('prompt'),
+                    'seed': job.get('seed')
+                })
+                yield name, source[0], source[1]
+
+    data = ''.join(json.dumps(line) + '\n' for line in manifest).encode('utf-8')
+    yield 'manifest.jsonl', len(data), [data]
+
+
+@app.route('/api/batch/<batch_id>/archive', methods=['GET'])
+def download_batch_archive(batch_id):
+    """
+    Download the images a batch has finished so far as one archive
+
+    Query parameters:
+      format=zip|tar   Archive format (default: zip)
+
+    Images are streamed into the archive one at a time, never buffered as
+    a whole; manifest.jsonl at the end maps each file to its item.
+    """
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    fmt = request.args.get('format', 'zip')
+    if fmt not in ARCHIVE_FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(ARCHIVE_FORMATS)}'}), 400
+
+    writer, content_type = ARCHIVE_FORMATS[fmt]
+    return Response(
+        writer(_batch_archive_entries(batch_id)),
+        mimetype=content_type,
+        headers={'Content-Disposition': f'attachment; filename=batch-{batch_id}.{fmt}'}
+    )
+
+
+def local_image(filename: str) -> Optional[Path]:
+    """Output image on this pod: the output folder, else the result cache"""
+    file_path = OUTPUT_DIR / filename
+    if file_path.exists():
+        return file_path
+    return result_cache.find_file(filename)
+
+
 @app.route('/api/image/<filename>', methods=['GET'])
 def download_image(filename):
-    """Download generated image"""
+    """
+    Download generated image
+
+    Query parameters:
+      size=256       Thumbnail fitting a 256x256 box (rounded up to IMAGE_THUMBNAIL_SIZES)
+      format=webp    png, jpeg, webp, avif, or auto (best the Accept header allows)
+
+    The original is sent as an attachment, variants inline. Responses carry
+    a strong ETag, answer If-None-Match with 304 and support Range requests.
+    A variant still rendering after IMAGE_VARIANT_WAIT_SECONDS gets 202 with
+    Retry-After; request it again.
+    """
     try:
-        file_path = OUTPUT_DIR / filename
-        if not file_path.exists():
-            return jsonify({'error': 'Image not found'}), 404
-
-        return send_file(
-            file_path,
-            mimetype='image/png',
-            as_attachment=True,
-            download_name=filename
+        variant = image_variants.resolve(
+            request.args.get('format'),
+            request.args.get('size'),
+            request.headers.get('Accept', '')
         )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        file_path = local_image(filename)
+        if file_path is None:
+            # Produced on another backend: proxy it from that ComfyUI instance
+            backend = _backend_for_image(filename)
+            if backend is None:
+                return jsonify({'error': 'Image not found'}), 404
+            upstream = backend.client.get_image(filename)
+            return Response(
+                upstream.iter_content(chunk_size=65536),
+                mimetype=upstream.headers.get('Content-Type', 'image/png'),
+                headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+            )
+
+        if variant is None:
+            headers = image_headers(file_path, filename, attachment=True, max_age=IMAGE_MAX_AGE)
+        else:
+            fmt, size, negotiated = variant
+            file_path = image_variants.get(file_path, fmt, size)
+            if file_path is None:
+                return variant_pending()
+            headers = image_headers(
+                file_path, Path(filename).stem + file_path.suffix, fmt,
+                max_age=IMAGE_MAX_AGE, negotiated=negotiated
+            )
+
+        # Headers (ETag included) come from image_headers, as in the async server
+        response = send_file(file_path, mimetype=headers['Content-Type'], conditional=False, etag=False)
+        response.headers.update(headers)
+        return response.make_conditional(request, accept_ranges=True, complete_length=file_path.stat().st_size)
     except Exception as e:
         logger.error(f'Download error: {e}')
         return jsonify({'error': str(e)}), 500
 
 
+def variant_pending():
+    """202 for an image variant that is still being rendered"""
+    response = jsonify({'status': 'rendering', 'retry_after': IMAGE_RETRY_AFTER})
+    response.status_code = 202
+    response.headers['Retry-After'] = str(IMAGE_RETRY_AFTER)
+    return response
+
+
 @app.route('/api/outputs', methods=['GET'])
 def list_outputs():
-    """List all generated images"""
+    """
+    List generated images from the output index
+
+    Query parameters:
+      sort=filename     filename, mtime or size
+      order=desc        desc or asc
+      limit=100         Page size (max 1000)
+      cursor=...        next_cursor of the previous page
+      prefix=Flux2_     Filename prefix
+      seed=12345        Seed read from the image metadata
+      job_id=...        Images of one API job
+      q=mountain        Prompt substring
+      since=1767225600  Modified at or after (Unix time)
+      count=true        Count the matches of a filtered listing ("total"
+                        is null otherwise; unfiltered listings always
+                        report the index size)
+    """
     try:
-        if not OUTPUT_DIR.exists():
-            return jsonify({'images': [], 'total': 0}), 200
+        filters = {
+            'prefix': request.args.get('prefix') or None,
+            'seed': int(request.args['seed']) if request.args.get('seed') else None,
+            'job_id': request.args.get('job_id') or None,
+            'q': request.args.get('q') or None,
+            'since': float(request.args['since']) if request.args.get('since') else None,
+        }
+        limit = min(max(int(request.args.get('limit', OUTPUT_PAGE_SIZE)), 1), OUTPUT_PAGE_MAX)
+        items, next_cursor = output_index.query(
+            sort=request.args.get('sort', 'filename'),
+            descending=request.args.get('order', 'desc') != 'asc',
+            limit=limit,
+            cursor=request.args.get('cursor'),
+            **filters
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-        images = [f.name for f in OUTPUT_DIR.glob('*.png')]
+    try:
+        filtered = any(value is not None for value in filters.values())
+        counted = not filtered or request.args.get('count', '').lower() in ('1', 'true', 'yes')
         return jsonify({
-            'images': sorted(images, reverse=True),
-            'total': len(images),
+            'images': [item['filename'] for item in items],
+            'items': items,
+            'total': output_index.count(**filters) if counted else None,
+            'next_cursor': next_cursor,
+            'indexing': output_index.indexing,
             'output_dir': str(OUTPUT_DIR)
         }), 200
     except Exception as e:
@@ -497,11 +2342,24 @@ def list_outputs():
 
 @app.route('/api/workflows', methods=['GET'])
 def list_workflows():
-    """List available workflows"""
+    """List available workflows and the request parameters each one accepts"""
     try:
-        workflows = [f.stem for f in WORKFLOWS_DIR.glob('*.json')]
+        workflows = []
+        templates = {}
+        for name, template, error in workflow_templates.available():
+            workflows.append(name)
+            if template is not None:
+                templates[name] = {
+                    'parameters': template.parameters,
+                    'api_compatible': True,
+                    'ready': model_readiness.workflow(name)['ready']
+                }
+            else:
+                templates[name] = {'parameters': [], 'api_compatible': False, 'error': error}
         return jsonify({
             'workflows': workflows,
+            'templates': templates,
+            'default': DEFAULT_WORKFLOW,
             'total': len(workflows)
         }), 200
     except Exception as e:
@@ -509,17 +2367,172 @@ def list_workflows():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/ready', methods=['GET'])
+def get_ready():
+    """
+    Model readiness of every API-format workflow
+
+    200 once the default workflow can run, 503 while its models are still
+    downloading (usable as a readiness probe). Other workflows may already
+    be ready; requests for them are served immediately.
+
+    Response:
+    {
+        "ready": false,
+        "default": "flux2_turbo_parametric_api",
+        "workflows": {"flux2_klein_simple_parametric_api": {"ready": true, "missing": []}, ...},
+        "files": [{"name": "flux2_dev_fp8mixed.safetensors", "state": "downloading",
+                   "progress": 0.42, ...}]
+    }
+    """
+    summary = model_readiness.summary()
+    workflow = summary['workflows'].get(DEFAULT_WORKFLOW)
+    ready = workflow['ready'] if workflow else not summary['active']
+    return jsonify({'ready': ready, 'default': DEFAULT_WORKFLOW, **summary}), 200 if ready else 503
+
+
+@app.route('/api/ready/<workflow>', methods=['GET'])
+def get_workflow_ready(workflow):
+    """Model readiness of one workflow: 200 when it can run, 503 while files are missing"""
+    try:
+        report = model_readiness.workflow(workflow)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(report), 200 if report['ready'] else 503
+
+
+JOBS_BY_STATE = metrics.gauge('comfyapi_jobs', 'Jobs in the job store by state', ('state',))
+SCHEDULER_PENDING = metrics.gauge(
+    'comfyapi_scheduler_pending', 'Jobs waiting in the scheduler', ('reason',)
+)
+BACKEND_HEALTHY = metrics.gauge(
+    'comfyui_backend_healthy', 'Backend passes health checks (1) or is ejected (0)', ('backend',)
+)
+BACKEND_QUEUE = metrics.gauge('comfyui_queue_remaining', 'Prompts running or pending on the backend', ('backend',))
+GPU_VRAM_TOTAL = metrics.gauge('comfyui_vram_total_bytes', 'GPU memory per device', ('backend', 'device', 'name'))
+GPU_VRAM_FREE = metrics.gauge('comfyui_vram_free_bytes', 'Free GPU memory per device', ('backend', 'device', 'name'))
+GPU_TORCH_VRAM_TOTAL = metrics.gauge(
+    'comfyui_torch_vram_total_bytes', 'GPU memory reserved by PyTorch per device', ('backend', 'device', 'name')
+)
+GPU_TORCH_VRAM_FREE = metrics.gauge(
+    'comfyui_torch_vram_free_bytes', 'Free memory inside the PyTorch reservation per device',
+    ('backend', 'device', 'name')
+)
+RAM_TOTAL = metrics.gauge('comfyui_ram_total_bytes', 'System memory of the backend host', ('backend',))
+RAM_FREE = metrics.gauge('comfyui_ram_free_bytes', 'Free system memory of the backend host', ('backend',))
+
+
+def _collect_jobs():
+    for state in ('queued', 'processing') + TERMINAL_STATES:
+        JOBS_BY_STATE.set(job_store.count([state]), state=state)
+    stats = scheduler.stats()
+    SCHEDULER_PENDING.set(stats['pending'] - stats['waiting_for_models'], reason='backend_slot')
+    SCHEDULER_PENDING.set(stats['waiting_for_models'], reason='models')
+    SCHEDULER_PENDING.set(micro_batcher.pending(), reason='micro_batch')
+
+
+def _collect_backends():
+    """GPU and memory gauges from the system stats of the last health check"""
+    gauges = (BACKEND_HEALTHY, BACKEND_QUEUE, GPU_VRAM_TOTAL, GPU_VRAM_FREE,
+              GPU_TORCH_VRAM_TOTAL, GPU_TORCH_VRAM_FREE, RAM_TOTAL, RAM_FREE)
+    for gauge in gauges:
+        gauge.clear()
+    for backend in backend_pool.backends.values():
+        BACKEND_HEALTHY.set(1 if backend.healthy else 0, backend=backend.name)
+        BACKEND_QUEUE.set(backend.queue_remaining, backend=backend.name)
+        system = backend.system_stats.get('system') or {}
+        if 'ram_total' in system:
+            RAM_TOTAL.set(system['ram_total'], backend=backend.name)
+            RAM_FREE.set(system.get('ram_free', 0), backend=backend.name)
+        for index, device in enumerate(backend.system_stats.get('devices') or []):
+            labels = {
+                'backend': backend.name,
+                'device': str(device.get('index', index)),
+                'name': device.get('name', '')
+            }
+            GPU_VRAM_TOTAL.set(device.get('vram_total', 0), **labels)
+            GPU_VRAM_FREE.set(device.get('vram_free', 0), **labels)
+            GPU_TORCH_VRAM_TOTAL.set(device.get('torch_vram_total', 0), **labels)
+            GPU_TORCH_VRAM_FREE.set(device.get('torch_vram_free', 0), **labels)
+
+
+metrics.add_collector(_collect_jobs)
+metrics.add_collector(_collect_backends)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Prometheus metrics (text exposition format)
+
+    Request rate and latency per route, job stage timings (api_queue,
+    comfyui_queue, first_node, execution, total) and node execution time by
+    class_type from the ComfyUI events, ComfyUI call latency and errors per
+    client method, jobs by state, and GPU/VRAM from the backends' system
+    stats (refreshed by the health check every BACKEND_HEALTH_INTERVAL).
+    """
+    return Response(metrics.render(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+
 @app.route('/api/system', methods=['GET'])
 def get_system():
-    """Get system information"""
+    """Get system information (?backend=<name>, default: first healthy backend)"""
     try:
-        stats = comfyui.get_system_stats()
+        backend = backend_pool.get(request.args.get('backend')) or backend_pool.primary()
+        stats = backend.client.get_system_stats()
         return jsonify(stats), 200
     except Exception as e:
         logger.error(f'System stats error: {e}')
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/scheduler', methods=['GET'])
+def get_scheduler():
+    """
+    Model-affinity scheduler state
+
+    Response:
+    {
+        "pending": [{"job_id": "uuid", "models": [...], "waiting_seconds": 1.2}],
+        "stats": {"model_swaps": 3, "model_swaps_avoided": 12,
+                  "swap_seconds": 18.4, "time_saved_seconds": 220.8, ...}
+    }
+    """
+    return jsonify({
+        'pending': scheduler.pending(),
+        'stats': scheduler.stats(),
+        'micro_batching': micro_batcher.stats()
+    }), 200
+
+
+@app.route('/api/cache', methods=['GET'])
+def get_cache():
+    """Result cache statistics"""
+    return jsonify({
+        'enabled': RESULT_CACHE_ENABLED,
+        **result_cache.stats()
+    }), 200
+
+
+@app.route('/api/backends', methods=['GET'])
+def get_backends():
+    """
+    ComfyUI backend pool state
+
+    Response:
+    {
+        "client_id": "uuid",
+        "backends": [{"name": "gpu0:8188", "healthy": true, "queue_remaining": 2,
+                      "vram_free": ..., "loaded_models": [...], ...}],
+        "healthy": 1,
+        "total": 1
+    }
+    """
+    return jsonify(backend_pool.to_dict()), 200
+
+
 # ============================================================================
 # Initialization & Main
 # ============================================================================
@@ -532,11 +2545,32 @@ def initialize_directories():
     logger.info(f'Workflows directory: {WORKFLOWS_DIR}')
 
 
+def initialize_services():
+    """Start per-process background services"""
+    if RESULT_CACHE_ENABLED:
+        result_cache.load()
+    job_store.open()
+    job_store.start_pruning()
+    start_journal()
+    output_index.start()
+    # Before the listeners start, so events for recovered prompts find their jobs
+    recover_jobs()
+    backend_pool.start()
+    scheduler.start()
+    if micro_batcher.enabled:
+        micro_batcher.start()
+    batch_runner.start()
+
+
 if __name__ == '__main__':
     initialize_directories()
+    initialize_services()
 
     logger.info(f'Starting REST API on {API_HOST}:{API_PORT}')
-    logger.info(f'ComfyUI endpoint: {COMFYUI_API_URL}')
+    logger.info(f'ComfyUI backends: {", ".join(COMFYUI_URLS)}')
+
+    # Exit through atexit on SIGTERM so spans still queued for export are written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
     app.run(
         host=API_HOST,
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Thumbnails and format transcodes of output images
+
+/api/image serves originals straight from disk. A request for a size or a
+format other than PNG is served from a variant rendered once by a small
+worker pool and kept in a cache directory next to the output folder.
+Variant names include the source's ETag, so a replaced source never serves
+a stale variant. Sizes are rounded up to a fixed set to bound the cache.
+
+The cache keeps to max_bytes, dropping the least recently served variants
+first, and drops variants not served for max_age seconds.
+
+format=auto (and a size without a format) picks from the Accept header:
+the highest q-value wins, ties going to the smaller format. AVIF and WebP
+must be named explicitly; */* and image/* only vouch for JPEG and PNG, and
+a client accepting neither still gets PNG.
+
+A request whose variant is still being rendered waits at most
+wait_seconds and is then answered with 202 and Retry-After, so a burst of
+thumbnail requests never holds request threads for long.
+
+Both servers take their response headers from image_headers(): the ETag is
+file_etag() ("<mtime_ns hex>-<size hex>", which aiohttp's FileResponse also
+derives on its own), the original is an attachment and variants are inline.
+
+Pillow is optional: without it only original files are served.
+"""
+
+import hashlib
+import os
+import threading
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+    features = None
+
+logger = logging.getLogger(__name__)
+
+# format -> (Pillow format, MIME type, extension)
+FORMATS = {
+    'png': ('PNG', 'image/png', 'png'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'avif': ('AVIF', 'image/avif', 'avif'),
+}
+
+# Preference for format=auto among equal q-values, smallest first
+NEGOTIATION_ORDER = ('avif', 'webp', 'jpeg', 'png')
+
+# Formats a wildcard media range (*/*, image/*) is taken to accept
+WILDCARD_FORMATS = ('jpeg', 'png')
+
+# Seconds between age-based cache sweeps
+PRUNE_INTERVAL = 3600
+
+
+def file_etag(path: Path) -> str:
+    """Strong validator for a file (unquoted)"""
+    st = path.stat()
+    return f'{st.st_mtime_ns:x}-{st.st_size:x}'
+
+
+def mimetype(fmt: str) -> str:
+    return FORMATS[fmt][1]
+
+
+def image_headers(path: Path, download_name: str, fmt: str = 'png', attachment: bool = False,
+                  max_age: int = 0, negotiated: bool = False) -> Dict[str, str]:
+    """Headers of an /api/image response for the file at path"""
+    headers = {
+        'Content-Type': mimetype(fmt),
+        'Content-Disposition': f'{"attachment" if attachment else "inline"}; filename="{download_name}"',
+        'ETag': f'"{file_etag(path)}"',
+        'Cache-Control': f'public, max-age={max_age}',
+    }
+    if negotiated:
+        headers['Vary'] = 'Accept'
+    return headers
+
+
+def parse_accept(accept: Optional[str]) -> Dict[str, float]:
+    """Media range -> q-value of an Accept header"""
+    ranges = {}
+    for part in (accept or '').split(','):
+        media_range, *params = [item.strip() for item in part.split(';')]
+        if not media_range:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        ranges[media_range.lower()] = q
+    return ranges
+
+
+def accept_quality(fmt: str, ranges: Dict[str, float]) -> float:
+    """q-value an Accept header gives a format; the most specific range wins"""
+    mime = mimetype(fmt)
+    if mime in ranges:
+        return ranges[mime]
+    if fmt not in WILDCARD_FORMATS:
+        return 0.0
+    for media_range in (f'{mime.split("/")[0]}/*', '*/*'):
+        if media_range in ranges:
+            return ranges[media_range]
+    return 0.0
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """True when an If-None-Match header names the (quoted) etag"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+class ImageVariants:
+    """On-disk cache of resized / transcoded images"""
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        sizes: Sequence[int] = (128, 256, 512, 1024),
+        workers: int = 2,
+        quality: int = 85,
+        wait_seconds: float = 2.0,
+        max_bytes: int = 2 * 1024 ** 3,
+        max_age: float = 30 * 86400
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.sizes = sorted(sizes)
+        self.quality = quality
+        self.wait_seconds = wait_seconds
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.disk_bytes: Optional[int] = None    # scanned on the first render
+        self._pruned_at = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-variants')
+        self._inflight: Dict[Path, Future] = {}
+        self._lock = threading.Lock()
+
+        self.rendered = 0
+        self.hits = 0
+        self.evictions = 0
+        self.formats = self._available_formats()
+
+    @staticmethod
+    def _available_formats() -> Tuple[str, ...]:
+        if Image is None:
+            return ()
+        return tuple(
+            fmt for fmt in FORMATS
+            if fmt in ('png', 'jpeg') or features.check(fmt)
+        )
+
+    # ------------------------------------------------------------------
+    # Request parsing
+    # ------------------------------------------------------------------
+
+    def resolve(self, fmt: Optional[str], size: Optional[str], accept: str = '') -> Optional[Tuple[str, Optional[int], bool]]:
+        """(format, size, negotiated) for query parameters; None for the original file
+
+        Raises ValueError for a format or size that cannot be served.
+        """
+        if not fmt and not size:
+            return None
+        if not self.formats:
+            raise ValueError('Image variants are unavailable (Pillow is not installed)')
+
+        box = None
+        if size:
+            requested = int(size)
+            if requested <= 0:
+                raise ValueError('size must be positive')
+            box = next((s for s in self.sizes if s >= requested), self.sizes[-1])
+
+        negotiated = not fmt or fmt == 'auto'
+        if negotiated:
+            fmt = self.negotiate(accept)
+        elif fmt == 'jpg':
+            fmt = 'jpeg'
+        if fmt not in self.formats:
+            raise ValueError(f'Unsupported format {fmt!r} (available: {", ".join(self.formats)})')
+        if fmt == 'png' and box is None:
+            return None
+        return fmt, box, negotiated
+
+    def negotiate(self, accept: str) -> str:
+        """Format the client prefers, the smallest among equals; PNG when it
+        accepts none of them"""
+        ranges = parse_accept(accept) if accept else {'*/*': 1.0}
+        best, best_q = 'png', 0.0
+        for fmt in NEGOTIATION_ORDER:
+            q = accept_quality(fmt, ranges) if fmt in self.formats else 0.0
+            if q > best_q:
+                best, best_q = fmt, q
+        return best
+
+    # ------------------------------------------------------------------
+    # Rendering
+    # ------------------------------------------------------------------
+
+    def path_for(self, source: Path, fmt: str, size: Optional[int]) -> Path:
+        shard = hashlib.sha1(source.name.encode('utf-8')).hexdigest()[:2]
+        label = size or 'full'
+        return self.cache_dir / shard / f'{source.stem}.{file_etag(source)}.{label}.{FORMATS[fmt][2]}'
+
+    def submit(self, source: Path, fmt: str, size: Optional[int]) -> Tuple[Path, Optional[Future]]:
+        """(variant path, future of its render); the future is None when the
+        variant is already on disk"""
+        dest = self.path_for(source, fmt, size)
+        try:
+            # The atime orders variants for eviction by last use; the mtime
+            # stays put because the ETag is derived from it
+            os.utime(dest, ns=(time.time_ns(), dest.stat().st_mtime_ns))
+        except FileNotFoundError:
+            pass
+        else:
+            self.hits += 1
+            return dest, None
+
+        created = False
+        with self._lock:
+            future = self._inflight.get(dest)
+            if future is None:
+                future = self._executor.submit(self._render, source, dest, fmt, size)
+                self._inflight[dest] = future
+                created = True
+        if created:
+            # Outside the lock: runs at once if the render already finished
+            future.add_done_callback(lambda _: self._forget(dest))
+        return dest, future
+
+    def get(self, source: Path, fmt: str, size: Optional[int]) -> Optional[Path]:
+        """Path of the variant, None while it is still rendering after wait_seconds"""
+        dest, future = self.submit(source, fmt, size)
+        if future is None:
+            return dest
+        try:
+            return future.result(timeout=self.wait_seconds)
+        except FutureTimeout:
+            return None
+
+    def _forget(self, dest: Path):
+        with self._lock:
+            self._inflight.pop(dest, None)
+
+    def _render(self, source: Path, dest: Path, fmt: str, size: Optional[int]) -> Path:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest.with_name(dest.name + '.tmp')
+        pil_format = FORMATS[fmt][0]
+        with Image.open(source) as image:
+            if size:
+                image.thumbnail((size, size), Image.LANCZOS)
+            if fmt == 'jpeg' and image.mode != 'RGB':
+                image = image.convert('RGB')
+            options = {'optimize': True}
+            if fmt in ('jpeg', 'webp', 'avif'):
+                options = {'quality': self.quality}
+                if fmt == 'jpeg':
+                    options.update(optimize=True, progressive=True)
+            image.save(tmp_path, pil_format, **options)
+        os.replace(tmp_path, dest)
+        self.rendered += 1
+        logger.debug(f'Rendered {dest.name}')
+
+        size_bytes = dest.stat().st_size
+        with self._lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = self._scan()
+            else:
+                self.disk_bytes += size_bytes
+            due = (
+                self.disk_bytes > self.max_bytes or
+                (self.max_age and time.time() - self._pruned_at > PRUNE_INTERVAL)
+            )
+        if due:
+            self.prune()
+        return dest
+
+    # ------------------------------------------------------------------
+    # Disk budget
+    # ------------------------------------------------------------------
+
+    def _files(self) -> List[Tuple[float, int, Path]]:
+        """(last use, size, path) of every cached variant"""
+        files = []
+        try:
+            shards = [d for d in os.scandir(self.cache_dir) if d.is_dir()]
+        except FileNotFoundError:
+            return files
+        for shard in shards:
+            try:
+                entries = list(os.scandir(shard.path))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_atime, stat.st_size, Path(entry.path)))
+        return files
+
+    def _scan(self) -> int:
+        return sum(size for _, size, _ in self._files())
+
+    def prune(self):
+        """Drop variants unused for max_age, then the least recently used
+        ones down to 90% of max_bytes"""
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        cutoff = time.time() - self.max_age if self.max_age else None
+        removed = 0
+        for used, size, path in files:
+            if not (cutoff is not None and used < cutoff) and total <= self.max_bytes * 0.9:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self.disk_bytes = total
+            self._pruned_at = time.time()
+            self.evictions += removed
+        if removed:
+            logger.info(f'Pruned {removed} image variants, {total / 1024 ** 2:.0f} MB on disk')
+
+    def stats(self) -> Dict:
+        return {
+            'formats': list(self.formats),
+            'sizes': self.sizes,
+            'rendered': self.rendered,
+            'hits': self.hits,
+            'evictions': self.evictions,
+            'disk_mb': None if self.disk_bytes is None else round(self.disk_bytes / 1024 ** 2, 1),
+            'max_mb': round(self.max_bytes / 1024 ** 2),
+            'cache_dir': str(self.cache_dir),
+        }
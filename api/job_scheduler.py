@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Model-affinity scheduler for /api/generate jobs
+
+ComfyUI runs its queue first-in first-out, so interleaved Flux.2 dev and
+Klein requests unload and reload tens of GB of weights on every switch.
+Jobs are therefore held in the API's own pending queue and submitted to a
+backend only when it has a free slot (SCHEDULER_MAX_INFLIGHT prompts in
+ComfyUI's queue). When a slot frees up the scheduler submits the oldest
+pending job that uses the model set the backend will have loaded, falling
+back to the oldest job overall. A job that has waited longer than the
+fairness window is always submitted next, whatever its models.
+
+Jobs also carry a priority (0 = interactive, 1 = batch): only the most
+urgent class that has jobs waiting is considered, so batch work never
+delays an interactive request.
+
+Jobs whose model files are still downloading at pod startup (the ready
+callback, see model_readiness) stay in the queue without blocking the
+others: only jobs that are ready take part in the choices above, and the
+rest are picked up within a second of their files landing.
+
+Swaps are counted at dispatch time. Swap cost is measured as the extra time
+between execution_start and the first sampler progress event for prompts
+that followed a swap, and time saved is swaps avoided times that cost.
+"""
+
+import threading
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from backend_pool import Backend, BackendPool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingJob:
+    """A prepared prompt waiting for a backend slot"""
+    job_id: str
+    workflow: Dict
+    models: Tuple[str, ...] = ()
+    members: List[str] = field(default_factory=list)   # jobs sharing a micro-batched prompt
+    priority: int = 0                                    # lower is dispatched first
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def job_ids(self) -> List[str]:
+        return self.members or [self.job_id]
+
+
+class _Mean:
+    """Running mean"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+
+    @property
+    def value(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+
+class AffinityScheduler:
+    """Pending queue that groups jobs sharing a model set"""
+
+    def __init__(
+        self,
+        pool: BackendPool,
+        submit: Callable[[PendingJob, Backend], bool],
+        fairness_seconds: float = 30.0,
+        max_inflight: int = 1,
+        swap_seconds: float = 20.0,
+        retain: int = 1024,
+        ready: Optional[Callable[[PendingJob], bool]] = None
+    ):
+        self.pool = pool
+        self.submit = submit
+        self.fairness_seconds = fairness_seconds
+        self.max_inflight = max_inflight
+        self.default_swap_seconds = swap_seconds
+        self.retain = retain
+        self.ready = ready
+
+        self._pending: List[PendingJob] = []
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # job_id -> swapped, for prompts dispatched but not yet sampling
+        self._dispatched: "OrderedDict[str, bool]" = OrderedDict()
+        self._started: Dict[str, float] = {}
+        self._load_swap = _Mean()
+        self._load_noswap = _Mean()
+
+        self.dispatched = 0
+        self.swaps = 0
+        self.swaps_avoided = 0
+        self.reordered = 0
+        self.fairness_overrides = 0
+        self.dispatched_past_unready = 0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start the dispatcher thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='affinity-scheduler',
+            daemon=True
+        )
+        self._thread.start()
+        logger.info(
+            f'Scheduler started (fairness window {self.fairness_seconds}s, '
+            f'{self.max_inflight} in flight per backend)'
+        )
+
+    def stop(self):
+        self._stop.set()
+        self.wake()
+
+    def wake(self):
+        """Re-evaluate dispatch (new job, queue drained, backend re-admitted)"""
+        with self._cond:
+            self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # Pending queue
+    # ------------------------------------------------------------------
+
+    def enqueue(self, job: PendingJob):
+        with self._cond:
+            self._pending.append(job)
+            self._cond.notify()
+
+    def remove(self, job_id: str) -> bool:
+        """Drop a job that has not been submitted yet
+
+        A micro-batch only loses the member (its prompt still renders every
+        batch index, so the others keep their images) and is dropped once
+        no member is left.
+        """
+        with self._cond:
+            for index, job in enumerate(self._pending):
+                if job_id not in job.job_ids:
+                    continue
+                if job.members:
+                    job.members = [member for member in job.members if member != job_id]
+                if job.members:
+                    job.job_id = job.members[0]
+                else:
+                    del self._pending[index]
+                return True
+        return False
+
+    def idle(self) -> bool:
+        """True when a new job would be submitted at once"""
+        with self._cond:
+            return not self._pending and bool(self._free_backends())
+
+    def depth(self, max_priority: Optional[int] = None) -> int:
+        """Jobs waiting, only those with priority <= max_priority if given
+        (members of a micro-batch count individually)"""
+        with self._cond:
+            return sum(
+                len(job.job_ids) for job in self._pending
+                if max_priority is None or job.priority <= max_priority
+            )
+
+    def clear(self) -> List[str]:
+        """Drop every pending job, returning their ids"""
+        with self._cond:
+            job_ids = [job_id for job in self._pending for job_id in job.job_ids]
+            self._pending.clear()
+        return job_ids
+
+    def pending(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._cond:
+            return [
+                {
+                    'job_id': job.job_id,
+                    'jobs': job.job_ids,
+                    'models': list(job.models),
+                    'priority': job.priority,
+                    'models_ready': self._is_ready(job),
+                    'waiting_seconds': round(now - job.enqueued_at, 2)
+                }
+                for job in self._pending
+            ]
+
+    # ------------------------------------------------------------------
+    # Dispatch
+    # ------------------------------------------------------------------
+
+    def _free_backends(self) -> List[Backend]:
+        return [
+            backend for backend in self.pool.healthy_backends()
+            if backend.queue_remaining < self.max_inflight
+        ]
+
+    def _is_ready(self, job: PendingJob) -> bool:
+        return self.ready is None or self.ready(job)
+
+    def _ready_indexes(self) -> List[int]:
+        """Indexes of the pending jobs whose model files are in place"""
+        return [index for index, job in enumerate(self._pending) if self._is_ready(job)]
+
+    def _head(self, ready: List[int]) -> int:
+        """Index of the oldest ready job in the most urgent priority class"""
+        return min(ready, key=lambda i: (self._pending[i].priority, i))
+
+    def _pick(self, backend: Backend, now: float, head_index: int, ready: List[int]) -> int:
+        """Index of the pending job to submit to backend next"""
+        head = self._pending[head_index]
+        target = backend.tail_models or backend.loaded_models
+        if not target or head.models == target:
+            return head_index
+
+        for index in ready:
+            job = self._pending[index]
+            if job.priority == head.priority and job.models == target:
+                if now - head.enqueued_at >= self.fairness_seconds:
+                    self.fairness_overrides += 1
+                    return head_index
+                return index
+        return head_index
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                ready = []
+                while not self._stop.is_set():
+                    if self._pending and self._free_backends():
+                        ready = self._ready_indexes()
+                        if ready:
+                            break
+                    # Timeout covers capacity freed without a status event
+                    # and model files landing
+                    self._cond.wait(timeout=1.0)
+                if self._stop.is_set():
+                    return
+
+                now = time.monotonic()
+                head_index = self._head(ready)
+                if head_index != 0 and not self._is_ready(self._pending[0]):
+                    self.dispatched_past_unready += 1
+                head = self._pending[head_index]
+                backend = self.pool.select(head.models, candidates=self._free_backends())
+                index = self._pick(backend, now, head_index, ready)
+                job = self._pending.pop(index)
+                target = backend.tail_models or backend.loaded_models
+                swapped = bool(target and job.models and job.models != target)
+
+                if index != head_index:
+                    self.reordered += 1
+                    if not swapped and head.models and head.models != target:
+                        self.swaps_avoided += 1
+
+                self.pool.reserve(backend, job.models)
+
+            try:
+                submitted = self.submit(job, backend)
+            except Exception as e:
+                logger.error(f'Scheduler submit failed for {job.job_id}: {e}', exc_info=True)
+                submitted = True  # submit() owns the job's failure state
+
+            with self._cond:
+                if not submitted:
+                    self.pool.release(backend)
+                    self._pending.insert(0, job)
+                    continue
+                self.dispatched += 1
+                if swapped:
+                    self.swaps += 1
+                    logger.info(f'Model swap on {backend.name} for job {job.job_id}')
+                self._dispatched[job.job_id] = swapped
+                while len(self._dispatched) > self.retain:
+                    self._dispatched.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Swap cost measurement
+    # ------------------------------------------------------------------
+
+    def note_started(self, job_id: str):
+        """execution_start received for a dispatched job"""
+        if job_id in self._dispatched:
+            self._started[job_id] = time.monotonic()
+
+    def note_progress(self, job_id: str):
+        """First sampler progress: model loading for this prompt is done"""
+        started = self._started.pop(job_id, None)
+        if started is None:
+            return
+        swapped = self._dispatched.pop(job_id, False)
+        (self._load_swap if swapped else self._load_noswap).add(time.monotonic() - started)
+
+    @property
+    def swap_seconds(self) -> float:
+        """Measured extra load time of a swap (configured default until measured)"""
+        swap, noswap = self._load_swap.value, self._load_noswap.value
+        if swap is None:
+            return self.default_swap_seconds
+        return max(0.0, swap - (noswap or 0.0))
+
+    def stats(self) -> Dict:
+        with self._cond:
+            oldest = self._pending[0].enqueued_at if self._pending else None
+            pending = len(self._pending)
+            waiting = pending - len(self._ready_indexes())
+        swap_seconds = self.swap_seconds
+        return {
+            'pending': pending,
+            'oldest_wait_seconds': round(time.monotonic() - oldest, 2) if oldest else 0.0,
+            'fairness_seconds': self.fairness_seconds,
+            'max_inflight': self.max_inflight,
+            'dispatched': self.dispatched,
+            'reordered': self.reordered,
+            'fairness_overrides': self.fairness_overrides,
+            'waiting_for_models': waiting,
+            'dispatched_past_unready': self.dispatched_past_unready,
+            'model_swaps': self.swaps,
+            'model_swaps_avoided': self.swaps_avoided,
+            'swap_seconds': round(swap_seconds, 2),
+            'swap_seconds_measured': self._load_swap.count > 0,
+            'time_saved_seconds': round(self.swaps_avoided * swap_seconds, 2),
+        }
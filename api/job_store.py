@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+SQLite-backed job store
+
+Jobs are persisted in a WAL-mode SQLite database so they survive restarts
+and can be listed page by page. The REST API keeps only in-flight jobs in
+memory; each job is written here when it changes state (queued, submitted,
+processing, finished), and finished jobs are read back from here.
+
+Schema: one row per job with the indexed columns used for filtering
+(status, created_at, prompt_id, workflow) and the full GenerationStatus as
+JSON, plus an output filename index for image lookups. Batches (see
+batch_runner.py) keep their requests here, one row per item, and each item
+is linked to its job once started. Finished jobs and batches older than the
+TTL are pruned periodically.
+"""
+
+import json
+import sqlite3
+import threading
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id       TEXT PRIMARY KEY,
+    status       TEXT NOT NULL,
+    prompt_id    TEXT,
+    workflow     TEXT,
+    backend      TEXT,
+    created_at   TEXT NOT NULL,
+    completed_at TEXT,
+    data         TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_prompt_id ON jobs (prompt_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_completed_at ON jobs (completed_at);
+
+CREATE TABLE IF NOT EXISTS job_outputs (
+    filename TEXT NOT NULL,
+    job_id   TEXT NOT NULL REFERENCES jobs (job_id) ON DELETE CASCADE,
+    PRIMARY KEY (filename, job_id)
+);
+CREATE INDEX IF NOT EXISTS idx_job_outputs_job_id ON job_outputs (job_id);
+
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id     TEXT PRIMARY KEY,
+    status       TEXT NOT NULL,
+    client       TEXT,
+    priority     TEXT NOT NULL,
+    total        INTEGER NOT NULL,
+    created_at   TEXT NOT NULL,
+    completed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_batches_status ON batches (status);
+
+CREATE TABLE IF NOT EXISTS batch_items (
+    batch_id TEXT NOT NULL REFERENCES batches (batch_id) ON DELETE CASCADE,
+    idx      INTEGER NOT NULL,
+    request  TEXT NOT NULL,
+    job_id   TEXT,
+    PRIMARY KEY (batch_id, idx)
+);
+'''
+
+TERMINAL_STATES = ('completed', 'failed', 'cancelled')
+
+
+class JobStore:
+    """Persistent, indexed store of job status records"""
+
+    def __init__(self, db_path: Path, ttl_hours: float = 72.0):
+        self.db_path = Path(db_path)
+        self.ttl_hours = ttl_hours
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def open(self):
+        """Open (and create) the database"""
+        if self._conn is not None:
+            return
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.executescript(SCHEMA)
+        self._conn = conn
+        logger.info(f'Job store: {self.db_path}')
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _execute(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        if self._conn is None:
+            self.open()
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write(self, sql: str, params: Sequence = ()) -> int:
+        """Run a statement, returning the number of rows it changed"""
+        if self._conn is None:
+            self.open()
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def save(self, job: Dict):
+        """Insert or update one job (a GenerationStatus as a dict)"""
+        self.save_many([job])
+
+    def save_many(self, jobs: Sequence[Dict]):
+        if not jobs:
+            return
+        if self._conn is None:
+            self.open()
+        rows = [
+            (
+                job['job_id'], job['status'], job.get('prompt_id'), job.get('workflow'),
+                job.get('backend'), job['created_at'], job.get('completed_at'), json.dumps(job)
+            )
+            for job in jobs
+        ]
+        outputs = [
+            (output['filename'], job['job_id'])
+            for job in jobs for output in job.get('outputs') or []
+            if output.get('filename')
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN')
+                self._conn.executemany(
+                    '''INSERT INTO jobs (job_id, status, prompt_id, workflow, backend, created_at, completed_at, data)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (job_id) DO UPDATE SET
+                           status = excluded.status,
+                           prompt_id = excluded.prompt_id,
+                           workflow = excluded.workflow,
+                           backend = excluded.backend,
+                           completed_at = excluded.completed_at,
+                           data = excluded.data''',
+                    rows
+                )
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO job_outputs (filename, job_id) VALUES (?, ?)',
+                    outputs
+                )
+
+    def delete_all(self) -> int:
+        return self._write('DELETE FROM jobs')
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        rows = self._execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,))
+        return json.loads(rows[0]['data']) if rows else None
+
+    def find_by_prompt(self, prompt_id: str) -> List[Dict]:
+        rows = self._execute('SELECT data FROM jobs WHERE prompt_id = ? ORDER BY created_at', (prompt_id,))
+        return [json.loads(row['data']) for row in rows]
+
+    def find_output(self, filename: str) -> Optional[Dict]:
+        """Most recent job that produced an output file"""
+        rows = self._execute(
+            '''SELECT jobs.data FROM job_outputs JOIN jobs USING (job_id)
+               WHERE job_outputs.filename = ? ORDER BY jobs.created_at DESC LIMIT 1''',
+            (filename,)
+        )
+        return json.loads(rows[0]['data']) if rows else None
+
+    def _where(self, statuses: Sequence[str] = None, workflow: str = None,
+               since: str = None) -> Tuple[str, List]:
+        clauses, params = [], []
+        if statuses:
+            clauses.append(f'status IN ({", ".join("?" for _ in statuses)})')
+            params.extend(statuses)
+        if workflow:
+            clauses.append('workflow = ?')
+            params.append(workflow)
+        if since:
+            clauses.append('created_at >= ?')
+            params.append(since)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(
+        self,
+        statuses: Sequence[str] = None,
+        workflow: str = None,
+        since: str = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> List[Dict]:
+        """Jobs matching the filters, newest first"""
+        where, params = self._where(statuses, workflow, since)
+        rows = self._execute(
+            f'SELECT data FROM jobs{where} ORDER BY created_at DESC LIMIT ? OFFSET ?',
+            params + [limit, offset]
+        )
+        return [json.loads(row['data']) for row in rows]
+
+    def count(self, statuses: Sequence[str] = None, workflow: str = None, since: str = None) -> int:
+        where, params = self._where(statuses, workflow, since)
+        return self._execute(f'SELECT COUNT(*) AS n FROM jobs{where}', params)[0]['n']
+
+    def unfinished(self) -> List[Dict]:
+        """Jobs that were not finished when the process stopped"""
+        rows = self._execute(
+            f'SELECT data FROM jobs WHERE status NOT IN ({", ".join("?" for _ in TERMINAL_STATES)}) '
+            f'ORDER BY created_at',
+            TERMINAL_STATES
+        )
+        return [json.loads(row['data']) for row in rows]
+
+    # ------------------------------------------------------------------
+    # Batches
+    # ------------------------------------------------------------------
+
+    def create_batch(self, batch_id: str, requests: Sequence[Dict], priority: str, client: str = None) -> Dict:
+        """Store a batch and its item requests in one transaction"""
+        if self._conn is None:
+            self.open()
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN')
+                self._conn.execute(
+                    '''INSERT INTO batches (batch_id, status, client, priority, total, created_at)
+                       VALUES (?, 'running', ?, ?, ?, ?)''',
+                    (batch_id, client, priority, len(requests), datetime.now().isoformat())
+                )
+                self._conn.executemany(
+                    'INSERT INTO batch_items (batch_id, idx, request) VALUES (?, ?, ?)',
+                    ((batch_id, index, json.dumps(item)) for index, item in enumerate(requests))
+                )
+        return self.get_batch(batch_id)
+
+    def get_batch(self, batch_id: str) -> Optional[Dict]:
+        rows = self._execute('SELECT * FROM batches WHERE batch_id = ?', (batch_id,))
+        return dict(rows[0]) if rows else None
+
+    def running_batches(self) -> List[Dict]:
+        rows = self._execute("SELECT * FROM batches WHERE status = 'running' ORDER BY created_at")
+        return [dict(row) for row in rows]
+
+    def set_batch_status(self, batch_id: str, status: str):
+        completed_at = datetime.now().isoformat() if status in TERMINAL_STATES else None
+        self._write(
+            'UPDATE batches SET status = ?, completed_at = ? WHERE batch_id = ?',
+            (status, completed_at, batch_id)
+        )
+
+    def unstarted_items(self, batch_id: str, limit: int) -> List[Tuple[int, Dict]]:
+        """(index, request) of items without a job yet, in order"""
+        rows = self._execute(
+            'SELECT idx, request FROM batch_items WHERE batch_id = ? AND job_id IS NULL ORDER BY idx LIMIT ?',
+            (batch_id, limit)
+        )
+        return [(row['idx'], json.loads(row['request'])) for row in rows]
+
+    def set_item_job(self, batch_id: str, index: int, job_id: str):
+        self._write(
+            'UPDATE batch_items SET job_id = ? WHERE batch_id = ? AND idx = ?',
+            (job_id, batch_id, index)
+        )
+
+    def batch_counts(self, batch_id: str) -> Dict[str, int]:
+        """Items per job status; 'pending' for items not started yet"""
+        rows = self._execute(
+            '''SELECT CASE WHEN batch_items.job_id IS NULL THEN 'pending'
+                           ELSE COALESCE(jobs.status, 'expired') END AS state,
+                      COUNT(*) AS n
+               FROM batch_items LEFT JOIN jobs USING (job_id)
+               WHERE batch_items.batch_id = ? GROUP BY state''',
+            (batch_id,)
+        )
+        return {row['state']: row['n'] for row in rows}
+
+    def batch_items(self, batch_id: str, start: int = 0, limit: int = 100) -> List[Dict]:
+        """Items from index start on, with their job (None until started or once pruned)"""
+        rows = self._execute(
+            '''SELECT batch_items.idx, batch_items.job_id, jobs.data
+               FROM batch_items LEFT JOIN jobs USING (job_id)
+               WHERE batch_items.batch_id = ? AND batch_items.idx >= ?
+               ORDER BY batch_items.idx LIMIT ?''',
+            (batch_id, start, limit)
+        )
+        return [
+            {'index': row['idx'], 'job_id': row['job_id'], 'job': json.loads(row['data']) if row['data'] else None}
+            for row in rows
+        ]
+
+    # ------------------------------------------------------------------
+    # Pruning
+    # ------------------------------------------------------------------
+
+    def prune(self) -> int:
+        """Delete finished jobs older than the TTL"""
+        cutoff = (datetime.now() - timedelta(hours=self.ttl_hours)).isoformat()
+        placeholders = ', '.join('?' for _ in TERMINAL_STATES)
+        removed = self._write(
+            f'DELETE FROM jobs WHERE status IN ({placeholders}) AND completed_at < ?',
+            TERMINAL_STATES + (cutoff,)
+        )
+        batches = self._write(
+            f'DELETE FROM batches WHERE status IN ({placeholders}) AND completed_at < ?',
+            TERMINAL_STATES + (cutoff,)
+        )
+        if removed or batches:
+            logger.info(f'Pruned {removed} jobs and {batches} batches older than {self.ttl_hours}h')
+        return removed
+
+    def start_pruning(self, interval: float = 3600.0):
+        """Prune periodically in a background thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.prune()
+                except sqlite3.Error as e:
+                    logger.warning(f'Job store pruning failed: {e}')
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name='job-store-prune', daemon=True)
+        self._thread.start()
+
+    def stats(self) -> Dict:
+        rows = self._execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')
+        return {
+            'db_path': str(self.db_path),
+            'ttl_hours': self.ttl_hours,
+            'jobs': {row['status']: row['n'] for row in rows},
+        }
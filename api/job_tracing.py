@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Trace spans of each job's lifecycle
+
+The API's part of a generation trace (see workflows/comfy_runner/tracing.py).
+Every job gets a `job` span from registration to its terminal state with
+children for each stage:
+
+    job
+      scheduler_queue        micro-batch window, then waiting for a backend slot
+      submit_workflow        POST /prompt
+      comfyui_execution      submitted until ComfyUI reports the prompt done
+        comfyui_queue        waiting in ComfyUI's own queue
+        <class_type>         one span per executed node, SaveImage included
+        history_lookup       /history fallback while the websocket is down
+
+The execution spans are built from the same websocket events as
+metrics.ExecutionTimeline. Jobs sharing a micro-batched prompt each get
+their own copy, so every trace is complete on its own.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from comfy_runner.tracing import Span, Tracer
+
+FINISHED_EVENTS = ('execution_success', 'execution_error', 'execution_interrupted')
+
+
+@dataclass
+class _JobSpans:
+    job: Span
+    scheduler_queue: Optional[Span] = None
+    execution: Optional[Span] = None
+    comfyui_queue: Optional[Span] = None
+    node: Optional[Span] = None
+    node_classes: Dict[str, str] = field(default_factory=dict)
+
+    def open_spans(self) -> List[Span]:
+        """Still running, innermost first"""
+        spans = (self.node, self.comfyui_queue, self.execution, self.scheduler_queue)
+        return [span for span in spans if span is not None and span.end_ns is None]
+
+
+class JobTraces:
+    """Open spans of in-flight jobs, keyed by job_id"""
+
+    def __init__(self, tracer: Tracer, retain: int = 4096):
+        self.tracer = tracer
+        self.retain = retain
+        self._jobs: "OrderedDict[str, _JobSpans]" = OrderedDict()
+        self._prompts: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, job_id: str, **attributes) -> Span:
+        """Start a job's span under the current span (the API request) and
+        its scheduler_queue child"""
+        span = self.tracer.start_span('job', job_id=job_id, **attributes)
+        if not span.recording:
+            return span
+        spans = _JobSpans(span, scheduler_queue=self.tracer.start_span('scheduler_queue', parent=span))
+        with self._lock:
+            self._jobs[job_id] = spans
+            while len(self._jobs) > self.retain:
+                self._jobs.popitem(last=False)
+        return span
+
+    def span(self, job_id: str) -> Optional[Span]:
+        """A job's span, to parent work done on its behalf"""
+        with self._lock:
+            spans = self._jobs.get(job_id)
+            if spans is None:
+                return None
+            return spans.execution if spans.execution is not None and spans.execution.end_ns is None else spans.job
+
+    def dispatched(self, job_ids: Iterable[str], end_ns: Optional[int] = None, **attributes):
+        """The jobs left the scheduler's queue (at end_ns, when their last
+        submission attempt started)"""
+        with self._lock:
+            for job_id in job_ids:
+                spans = self._jobs.get(job_id)
+                if spans is not None and spans.scheduler_queue is not None:
+                    spans.scheduler_queue.set(**attributes)
+                    spans.scheduler_queue.end(end_ns=end_ns)
+
+    def submitted(self, prompt_id: str, job_ids: Iterable[str], workflow: Dict[str, Dict], **attributes):
+        """ComfyUI accepted the jobs' prompt"""
+        classes = {str(node_id): node.get('class_type', 'unknown') for node_id, node in workflow.items()}
+        with self._lock:
+            traced = []
+            for job_id in job_ids:
+                spans = self._jobs.get(job_id)
+                if spans is None:
+                    continue
+                spans.job.set(prompt_id=prompt_id, **attributes)
+                spans.execution = self.tracer.start_span(
+                    'comfyui_execution', parent=spans.job, prompt_id=prompt_id, **attributes
+                )
+                spans.comfyui_queue = self.tracer.start_span('comfyui_queue', parent=spans.execution)
+                spans.node_classes = classes
+                traced.append(job_id)
+            if traced:
+                self._prompts[prompt_id] = traced
+
+    def event(self, event_type: str, data: Dict):
+        """Apply a ComfyUI websocket event to the execution spans of its prompt"""
+        prompt_id = data.get('prompt_id')
+        if not prompt_id:
+            return
+        now = time.time_ns()
+        with self._lock:
+            members = [self._jobs[job_id] for job_id in self._prompts.get(prompt_id, ()) if job_id in self._jobs]
+            for spans in members:
+                self._apply(spans, event_type, data, now)
+            if event_type in FINISHED_EVENTS or \
+                    (event_type == 'executing' and data.get('node') is None):
+                self._prompts.pop(prompt_id, None)
+
+    def _apply(self, spans: _JobSpans, event_type: str, data: Dict, now: int):
+        if spans.execution is None or spans.execution.end_ns is not None:
+            return
+
+        if event_type == 'execution_start':
+            spans.comfyui_queue.end(end_ns=now)
+
+        elif event_type == 'execution_cached':
+            spans.execution.set(cached_nodes=len(data.get('nodes') or ()))
+
+        elif event_type == 'executing' and data.get('node') is not None:
+            spans.comfyui_queue.end(end_ns=now)
+            if spans.node is not None:
+                spans.node.end(end_ns=now)
+            node = str(data.get('display_node') or data['node'])
+            class_type = spans.node_classes.get(node) or spans.node_classes.get(str(data['node']), 'unknown')
+            spans.node = self.tracer.start_span(class_type, parent=spans.execution, start_ns=now, node=node)
+
+        elif event_type == 'executed' and spans.node is not None:
+            images = (data.get('output') or {}).get('images')
+            if images:
+                spans.node.set(images=len(images))
+
+        elif event_type in FINISHED_EVENTS or \
+                (event_type == 'executing' and data.get('node') is None):
+            error = None
+            if event_type == 'execution_error':
+                error = data.get('exception_message') or 'execution_error'
+            elif event_type == 'execution_interrupted':
+                error = 'interrupted'
+            for span in spans.open_spans():
+                span.end(error=error if span is spans.execution or span is spans.node else None, end_ns=now)
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None, **attributes):
+        """End a job's spans at its terminal state (completed, failed, cancelled)"""
+        with self._lock:
+            spans = self._jobs.pop(job_id, None)
+        if spans is None:
+            return
+        if status != 'completed':
+            error = error or status
+        for span in spans.open_spans():
+            span.end(error=error)
+        spans.job.set(status=status, **attributes)
+        spans.job.end(error=error if status != 'completed' else None)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Prometheus metrics for the REST API (text exposition format 0.0.4)
+
+A small thread-safe registry of counters, gauges and histograms, rendered by
+GET /metrics. Gauges that mirror state owned elsewhere (jobs by state, VRAM)
+are filled by collectors registered with the registry, which run at scrape
+time only.
+
+ExecutionTimeline turns the ComfyUI websocket events of each submitted
+prompt into stage timings:
+
+    api_queue       job created -> prompt submitted to ComfyUI
+    comfyui_queue   prompt submitted -> execution_start
+    first_node      execution_start -> first node executing
+    execution       execution_start -> prompt finished
+    total           job created -> prompt finished
+
+and into per-node durations labelled by class_type, the time from one
+'executing' event to the next: loaders show model load time, KSampler the
+sampling, VAEDecode the decode.
+"""
+
+import bisect
+import math
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Request latency (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Job stages and node executions (seconds)
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+INF_BUCKET = 'le="+Inf"'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_label_text(self.label_names, key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}   # key -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _label_text(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_bucket{_label_text(self.label_names, key, INF_BUCKET)} {count}')
+            lines.append(f'{self.name}_sum{_label_text(self.label_names, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_label_text(self.label_names, key)} {count}')
+        return lines
+
+
+class Registry:
+    """Metrics in registration order, plus collectors run before each render"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """collector() refreshes gauges from live state at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                # A broken collector must not take the whole endpoint down
+                logger.warning(f'Metrics collector failed: {e}')
+        with self._lock:
+            metrics = list(self._metrics)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+class _Timeline:
+    """Timestamps of one submitted prompt (time.monotonic)"""
+    __slots__ = ('created', 'submitted', 'started', 'node', 'node_class', 'node_started', 'node_classes')
+
+    def __init__(self, created: float, submitted: float, node_classes: Dict[str, str]):
+        self.created = created
+        self.submitted = submitted
+        self.started: Optional[float] = None
+        self.node: Optional[str] = None
+        self.node_class: Optional[str] = None
+        self.node_started: Optional[float] = None
+        self.node_classes = node_classes
+
+
+class ExecutionTimeline:
+    """Stage and per-node-class timings of prompts, from ComfyUI events"""
+
+    def __init__(self, registry: Registry, retain: int = 1024):
+        self.stages = registry.histogram(
+            'comfyapi_job_stage_seconds',
+            'Time spent in each stage of a job (api_queue, comfyui_queue, first_node, execution, total)',
+            ('stage',), STAGE_BUCKETS
+        )
+        self.nodes = registry.histogram(
+            'comfyapi_node_execution_seconds',
+            'Execution time of workflow nodes by class_type',
+            ('class_type',), STAGE_BUCKETS
+        )
+        self.cached_nodes = registry.counter(
+            'comfyapi_node_cached_total',
+            'Workflow nodes skipped because ComfyUI had their output cached',
+            ('class_type',)
+        )
+        self.finished = registry.counter(
+            'comfyapi_prompts_finished_total',
+            'Prompts finished on ComfyUI by outcome',
+            ('outcome',)
+        )
+        self.retain = retain
+        self._prompts: "OrderedDict[str, _Timeline]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submitted(self, prompt_id: str, created_age: float, workflow: Dict[str, Dict]):
+        """A prompt was queued on ComfyUI; created_age: seconds since its job was created"""
+        now = time.monotonic()
+        classes = {str(node_id): node.get('class_type', 'unknown') for node_id, node in workflow.items()}
+        self.stages.observe(max(0.0, created_age), stage='api_queue')
+        with self._lock:
+            self._prompts[prompt_id] = _Timeline(now - max(0.0, created_age), now, classes)
+            while len(self._prompts) > self.retain:
+                self._prompts.popitem(last=False)
+
+    def _close_node(self, timeline: _Timeline, now: float):
+        if timeline.node is not None:
+            self.nodes.observe(now - timeline.node_started, class_type=timeline.node_class)
+            timeline.node = None
+
+    def event(self, event_type: str, data: Dict):
+        prompt_id = data.get('prompt_id')
+        if not prompt_id:
+            return
+        now = time.monotonic()
+        with self._lock:
+            timeline = self._prompts.get(prompt_id)
+            if timeline is None:
+                return
+
+            if event_type == 'execution_start':
+                timeline.started = now
+                self.stages.observe(now - timeline.submitted, stage='comfyui_queue')
+
+            elif event_type == 'execution_cached':
+                for node_id in data.get('nodes') or ():
+                    self.cached_nodes.inc(class_type=timeline.node_classes.get(str(node_id), 'unknown'))
+
+            elif event_type == 'executing' and data.get('node') is not None:
+                if timeline.started is not None and timeline.node_started is None:
+                    self.stages.observe(now - timeline.started, stage='first_node')
+                self._close_node(timeline, now)
+                node = str(data.get('display_node') or data['node'])
+                timeline.node = node
+                timeline.node_class = timeline.node_classes.get(node) or \
+                    timeline.node_classes.get(str(data['node']), 'unknown')
+                timeline.node_started = now
+
+            elif event_type in ('execution_success', 'execution_error', 'execution_interrupted') or \
+                    (event_type == 'executing' and data.get('node') is None):
+                self._close_node(timeline, now)
+                del self._prompts[prompt_id]
+                outcome = {'execution_error': 'failed', 'execution_interrupted': 'cancelled'}.get(event_type, 'completed')
+                self.finished.inc(outcome=outcome)
+                if outcome == 'completed':
+                    if timeline.started is not None:
+                        self.stages.observe(now - timeline.started, stage='execution')
+                    self.stages.observe(now - timeline.created, stage='total')
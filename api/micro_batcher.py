@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Micro-batching of compatible /api/generate requests
+
+Compatible /api/generate requests (same workflow, resolution, steps,
+sampler, ...) that leave the seed to the server are held for up to
+MICROBATCH_MAX_WAIT_MS and merged into one ComfyUI prompt with batch_size
+set on the empty latent node. ComfyUI saves the batch in batch-index order,
+so the caller's job receives the image at its index.
+
+ComfyUI's stock nodes share one conditioning and one noise seed across a
+latent batch. With the per-item batch nodes bundled with the image the
+merged requests may have different prompts and each item keeps its own
+seed; without them only requests with the same prompt are merged. Which
+requests are compatible is the caller's key; this module only groups.
+
+A request is held only when it would wait for a backend anyway: the
+caller passes wait=False while a backend slot is free, and a request with
+no group to join is then flushed at once.
+"""
+
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+
+class _Group:
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.items: List[Any] = []
+
+
+class MicroBatcher:
+    """Collects items by key and flushes them as batches"""
+
+    def __init__(
+        self,
+        flush: Callable[[Hashable, List[Any]], None],
+        max_wait: float = 0.1,
+        max_size: int = 4
+    ):
+        self.flush = flush
+        self.max_wait = max_wait
+        self.max_size = max_size
+        self._groups: "OrderedDict[Hashable, _Group]" = OrderedDict()
+        self._full: List[tuple] = []       # (key, items) of groups closed at max_size
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.batches = 0
+        self.items = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 1 and self.max_wait > 0
+
+    def start(self):
+        """Start the flush thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='micro-batcher',
+            daemon=True
+        )
+        self._thread.start()
+        logger.info(f'Micro-batching enabled (max {self.max_size} items, {self.max_wait * 1000:.0f} ms)')
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+
+    def add(self, key: Hashable, item: Any, wait: bool = True):
+        """Queue an item; its group flushes when full or when max_wait expires.
+        Without wait an item with no group to join flushes at once"""
+        with self._cond:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = _Group(time.monotonic() + self.max_wait if wait else 0.0)
+            group.items.append(item)
+            if len(group.items) >= self.max_size:
+                # Closed: the next item for this key starts a new group
+                del self._groups[key]
+                self._full.append((key, group.items))
+            self._cond.notify()
+
+    def remove(self, predicate: Callable[[Any], bool]) -> bool:
+        """Drop waiting items matching predicate"""
+        removed = False
+        with self._cond:
+            for key, group in list(self._groups.items()):
+                kept = [item for item in group.items if not predicate(item)]
+                if len(kept) != len(group.items):
+                    removed = True
+                    group.items = kept
+                    if not kept:
+                        del self._groups[key]
+            full = []
+            for key, items in self._full:
+                kept = [item for item in items if not predicate(item)]
+                removed = removed or len(kept) != len(items)
+                if kept:
+                    full.append((key, kept))
+            self._full = full
+        return removed
+
+    def pending(self, predicate: Callable[[Any], bool] = None) -> int:
+        """Waiting items, only those matching predicate if given"""
+        with self._cond:
+            groups = [group.items for group in self._groups.values()] + [items for _, items in self._full]
+            return sum(
+                sum(1 for item in items if predicate is None or predicate(item))
+                for items in groups
+            )
+
+    def _due(self, now: float) -> List[tuple]:
+        """Pop full groups and groups whose deadline passed (caller holds the condition)"""
+        due, self._full = self._full, []
+        for key, group in list(self._groups.items()):
+            if group.deadline <= now:
+                del self._groups[key]
+                due.append((key, group.items))
+        return due
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                now = time.monotonic()
+                due = self._due(now)
+                if not due:
+                    timeout = min((g.deadline for g in self._groups.values()), default=now + 1.0) - now
+                    self._cond.wait(timeout=max(timeout, 0.001))
+                    continue
+
+            for key, items in due:
+                self.batches += 1
+                self.items += len(items)
+                try:
+                    self.flush(key, items)
+                except Exception as e:
+                    logger.error(f'Micro-batch flush failed ({len(items)} items): {e}', exc_info=True)
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'max_size': self.max_size,
+            'max_wait_ms': round(self.max_wait * 1000),
+            'waiting': self.pending(),
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Model readiness: which workflows can run with the model files on disk
+
+start.sh downloads models in the background, smallest first, while the API
+is already serving. A workflow is ready once every weights file its loader
+nodes name (unet_name, clip_name, vae_name, lora_name, ...) is in place in
+the ComfyUI models folder. The downloader only renames a file to its final
+name after verifying it, so a file at its final path with the expected size
+is complete; the downloader's manifest (models-manifest.json) adds the
+state of the rest: downloading (with progress), failed or missing.
+
+The scheduler asks ready() for every pending job and holds back jobs whose
+files have not landed yet; jobs for ready workflows dispatch as usual.
+File states are cached for a couple of seconds so that check stays cheap.
+"""
+
+import json
+import os
+import threading
+import time
+import logging
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from workflow_templates import WorkflowTemplateRegistry
+
+logger = logging.getLogger(__name__)
+
+# Loader input -> models subfolders ComfyUI searches for it (first is preferred)
+MODEL_FOLDERS: Dict[str, Tuple[str, ...]] = {
+    'unet_name': ('diffusion_models', 'unet'),
+    'clip_name': ('text_encoders', 'clip'),
+    'clip_name1': ('text_encoders', 'clip'),
+    'clip_name2': ('text_encoders', 'clip'),
+    'vae_name': ('vae',),
+    'lora_name': ('loras',),
+    'ckpt_name': ('checkpoints',),
+}
+
+
+@dataclass
+class ModelFileState:
+    """One weights file a workflow needs"""
+    name: str
+    folder: str
+    state: str                      # ready, downloading, failed, missing
+    path: str
+    size: Optional[int] = None      # expected size, when the manifest knows it
+    progress: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == 'ready'
+
+
+def model_files(nodes: Dict[str, Dict]) -> List[Tuple[str, str]]:
+    """(loader input, file name) for every weights file a workflow graph loads"""
+    files = set()
+    for node in nodes.values():
+        for input_name, value in (node.get('inputs') or {}).items():
+            if input_name in MODEL_FOLDERS and isinstance(value, str) and value:
+                files.add((input_name, value))
+    return sorted(files, key=lambda item: item[1])
+
+
+class ModelReadiness:
+    """Per-file and per-workflow readiness against a local models folder"""
+
+    def __init__(
+        self,
+        models_dir: Path,
+        manifest_path: Path,
+        templates: WorkflowTemplateRegistry,
+        enabled: bool = True,
+        ttl: float = 2.0
+    ):
+        self.models_dir = Path(models_dir)
+        self.manifest_path = Path(manifest_path)
+        self.templates = templates
+        self.enabled = enabled
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._files: Dict[Tuple[str, str], Tuple[float, ModelFileState]] = {}
+        self._manifest: Dict[str, Dict] = {}      # file name -> manifest entry
+        self._manifest_mtime: Optional[float] = None
+        self._disabled_logged = False
+
+    @property
+    def active(self) -> bool:
+        """False when gating is off or the models folder is not on this host
+        (ComfyUI on remote backends): every workflow is then reported ready"""
+        if not self.enabled:
+            return False
+        if self.models_dir.is_dir():
+            return True
+        if not self._disabled_logged:
+            self._disabled_logged = True
+            logger.info(f'Model readiness inactive: {self.models_dir} not found')
+        return False
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        """Downloader manifest keyed by file name, re-read when it changes"""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            return self._manifest
+        if mtime != self._manifest_mtime:
+            try:
+                with open(self.manifest_path, encoding='utf-8') as f:
+                    entries = json.load(f).get('files', [])
+                self._manifest = {os.path.basename(entry['path']): entry for entry in entries}
+                self._manifest_mtime = mtime
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                # Caught mid-rewrite: keep the previous copy
+                logger.debug(f'Model manifest not read: {e}')
+        return self._manifest
+
+    def _check(self, input_name: str, name: str) -> ModelFileState:
+        folders = MODEL_FOLDERS.get(input_name, ())
+        entry = self._load_manifest().get(os.path.basename(name)) or {}
+        size = entry.get('size')
+
+        for folder in folders:
+            path = self.models_dir / folder / name
+            try:
+                on_disk = os.path.getsize(path)
+            except OSError:
+                continue
+            if size is None or on_disk == size:
+                return ModelFileState(name, folder, 'ready', str(path), size, 1.0)
+
+        folder = folders[0] if folders else ''
+        path = self.models_dir / folder / name
+        status = entry.get('status')
+        if status == 'failed':
+            state = 'failed'
+        elif status == 'downloading' or os.path.exists(f'{path}.part'):
+            state = 'downloading'
+        else:
+            state = 'missing'
+        return ModelFileState(
+            name, folder, state, str(path), size,
+            progress=float(entry.get('progress') or 0.0) if state == 'downloading' else 0.0,
+            error=entry.get('error') if state == 'failed' else None
+        )
+
+    def file_state(self, input_name: str, name: str) -> ModelFileState:
+        key = (input_name, name)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._files.get(key)
+            if cached is not None and now - cached[0] < self.ttl:
+                return cached[1]
+            state = self._check(input_name, name)
+            self._files[key] = (now, state)
+            return state
+
+    # ------------------------------------------------------------------
+    # Workflows and jobs
+    # ------------------------------------------------------------------
+
+    def missing(self, nodes: Dict[str, Dict]) -> List[str]:
+        """Names of the files a workflow graph still waits for"""
+        if not self.active:
+            return []
+        return [
+            name for input_name, name in model_files(nodes)
+            if not self.file_state(input_name, name).ready
+        ]
+
+    def ready(self, nodes: Dict[str, Dict]) -> bool:
+        return not self.missing(nodes)
+
+    def workflow(self, name: str) -> Dict:
+        """Readiness of one workflow (FileNotFoundError / ValueError as templates.get)"""
+        template = self.templates.get(name)
+        if not self.active:
+            return {'workflow': template.name, 'ready': True, 'missing': [], 'files': []}
+        files = [self.file_state(input_name, file) for input_name, file in model_files(template.nodes)]
+        return {
+            'workflow': template.name,
+            'ready': all(state.ready for state in files),
+            'missing': [state.name for state in files if not state.ready],
+            'files': [asdict(state) for state in files]
+        }
+
+    def summary(self) -> Dict:
+        """Readiness of every API-format workflow and of the files they use"""
+        workflows = {}
+        files = {}
+        for name, template, error in self.templates.available():
+            if template is None:
+                continue
+            report = self.workflow(name)
+            workflows[name] = {'ready': report['ready'], 'missing': report['missing']}
+            for state in report['files']:
+                files[state['name']] = state
+        return {
+            'active': self.active,
+            'models_dir': str(self.models_dir),
+            'manifest': str(self.manifest_path) if self.manifest_path.exists() else None,
+            'workflows': workflows,
+            'files': sorted(files.values(), key=lambda state: state['name'])
+        }
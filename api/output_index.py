@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Persistent index of generated images
+
+/api/outputs used to glob and sort the whole output folder on every call.
+The index is a table in the job store's SQLite database with one row per
+PNG: size, dimensions, mtime and the seed and prompt read from the
+workflow ComfyUI embeds in the file. The job that produced an image comes
+from the job store's output table.
+
+The index is built once at startup. An inotify watcher keeps it current
+(Linux; other platforms rely on reconciliation alone), and a periodic
+rescan repairs anything the watcher missed (queue overflow, files copied
+while the API was down). Listing pages with a keyset cursor, so a page
+costs the same at any depth. The number of indexed files is kept up to
+date as rows are written, so unfiltered pages report it without a
+COUNT(*); filtered totals are counted only on request.
+"""
+
+import base64
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outputs (
+    filename   TEXT PRIMARY KEY,
+    size       INTEGER NOT NULL,
+    mtime      REAL NOT NULL,
+    width      INTEGER,
+    height     INTEGER,
+    seed       INTEGER,
+    prompt     TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outputs_mtime ON outputs (mtime, filename);
+CREATE INDEX IF NOT EXISTS idx_outputs_size ON outputs (size, filename);
+CREATE INDEX IF NOT EXISTS idx_outputs_seed ON outputs (seed);
+'''
+
+SORT_COLUMNS = ('filename', 'mtime', 'size')
+IMAGE_SUFFIX = '.png'
+
+
+# ============================================================================
+# PNG metadata
+# ============================================================================
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def read_png_info(path: Path) -> Tuple[int, int, Dict[str, str]]:
+    """(width, height, text chunks) of a PNG, reading only its header chunks"""
+    width = height = 0
+    text = {}
+    with open(path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError('not a PNG file')
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, chunk_type = struct.unpack('>I4s', header)
+            if chunk_type in (b'IDAT', b'IEND'):
+                break  # ComfyUI and Pillow write text chunks before the image data
+            if chunk_type not in (b'IHDR', b'tEXt', b'zTXt', b'iTXt'):
+                f.seek(length + 4, os.SEEK_CUR)
+                continue
+            data = f.read(length)
+            f.seek(4, os.SEEK_CUR)  # CRC
+
+            if chunk_type == b'IHDR':
+                width, height = struct.unpack('>II', data[:8])
+            elif chunk_type == b'tEXt':
+                key, _, value = data.partition(b'\0')
+                text[key.decode('latin-1')] = value.decode('latin-1')
+            elif chunk_type == b'zTXt':
+                key, _, value = data.partition(b'\0')
+                text[key.decode('latin-1')] = zlib.decompress(value[1:]).decode('latin-1')
+            else:
+                key, _, rest = data.partition(b'\0')
+                compressed, rest = rest[0], rest[2:]
+                _, _, rest = rest.partition(b'\0')      # language tag
+                _, _, value = rest.partition(b'\0')     # translated keyword
+                if compressed:
+                    value = zlib.decompress(value)
+                text[key.decode('latin-1')] = value.decode('utf-8', 'replace')
+    return width, height, text
+
+
+def _prompt_text(graph: Dict, node_id: str, depth: int = 0) -> Optional[str]:
+    """Follow conditioning links from node_id back to a text encoder"""
+    node = graph.get(str(node_id))
+    if not isinstance(node, dict) or depth > 8:
+        return None
+    inputs = node.get('inputs', {})
+    if isinstance(inputs.get('text'), str):
+        return inputs['text']
+    for name in ('positive', 'conditioning', 'guider'):
+        link = inputs.get(name)
+        if isinstance(link, list) and link:
+            found = _prompt_text(graph, link[0], depth + 1)
+            if found is not None:
+                return found
+    return None
+
+
+def workflow_metadata(text: Dict[str, str]) -> Tuple[Optional[int], Optional[str]]:
+    """(seed, positive prompt) from the API-format graph ComfyUI embeds as "prompt" """
+    try:
+        graph = json.loads(text.get('prompt') or 'null')
+    except json.JSONDecodeError:
+        return None, None
+    if not isinstance(graph, dict):
+        return None, None
+
+    seed = prompt = None
+    for node_id, node in graph.items():
+        inputs = node.get('inputs', {}) if isinstance(node, dict) else {}
+        for name in ('seed', 'noise_seed'):
+            if seed is None and isinstance(inputs.get(name), int):
+                seed = inputs[name]
+        if prompt is None and any(name in inputs for name in ('positive', 'guider')):
+            prompt = _prompt_text(graph, node_id)
+    if prompt is None:
+        prompt = next((
+            node['inputs']['text'] for node in graph.values()
+            if isinstance(node, dict) and isinstance(node.get('inputs', {}).get('text'), str)
+        ), None)
+    return seed, prompt
+
+
+# ============================================================================
+# inotify
+# ============================================================================
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """Reports files written, moved or deleted in one directory"""
+
+    def __init__(self, path: Path, callback: Callable[[str, Optional[str]], None]):
+        self.path = path
+        self.callback = callback   # ('added' | 'removed' | 'overflow', filename)
+        self._fd = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> bool:
+        """Start watching; False when inotify is unavailable"""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+            mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+            if libc.inotify_add_watch(fd, str(self.path).encode(), mask) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+        except (OSError, AttributeError) as e:
+            logger.warning(f'inotify unavailable for {self.path}: {e}')
+            return False
+
+        self._fd = fd
+        self._thread = threading.Thread(target=self._run, name='output-watcher', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([self._fd], [], [], 1.0)
+                if not ready:
+                    continue
+                try:
+                    buffer = os.read(self._fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                offset = 0
+                while offset < len(buffer):
+                    _, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+                    offset += EVENT_HEADER.size
+                    name = buffer[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+                    offset += length
+                    if mask & IN_Q_OVERFLOW:
+                        self.callback('overflow', None)
+                    elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                        self.callback('added', name)
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        self.callback('removed', name)
+        finally:
+            os.close(self._fd)
+
+
+# ============================================================================
+# Index
+# ============================================================================
+
+def encode_cursor(value, filename: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, filename]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        value, filename = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    return value, filename
+
+
+class OutputIndex:
+    """Indexed listing of the output folder"""
+
+    def __init__(self, output_dir: Path, db_path: Path, reconcile_interval: float = 300.0):
+        self.output_dir = Path(output_dir)
+        self.db_path = Path(db_path)
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stop = threading.Event()
+        self._reconcile_now = threading.Event()
+        self._thread = None
+        self.watcher = InotifyWatcher(self.output_dir, self._on_event)
+        self.watching = False
+
+        self.files = 0
+        self.indexing = False
+        self.last_reconcile: Optional[float] = None
+        self.reconcile_seconds: Optional[float] = None
+
+    def open(self):
+        if self._conn is not None:
+            return
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        self.files = conn.execute('SELECT COUNT(*) FROM outputs').fetchone()[0]
+        self._conn = conn
+
+    def start(self):
+        """Build the index in the background, then keep it current (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.open()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # Watch before the first scan so files written during it are not missed
+        self.watching = self.watcher.start()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='output-index', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._reconcile_now.set()
+        self.watcher.stop()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.reconcile()
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f'Output index reconciliation failed: {e}')
+            self._reconcile_now.wait(self.reconcile_interval)
+            self._reconcile_now.clear()
+
+    def _on_event(self, kind: str, filename: Optional[str]):
+        if kind == 'overflow':
+            self._reconcile_now.set()
+        elif filename.endswith(IMAGE_SUFFIX):
+            try:
+                if kind == 'added':
+                    self.add(filename)
+                else:
+                    self.remove(filename)
+            except (OSError, sqlite3.Error) as e:
+                logger.debug(f'Output index update for {filename} failed: {e}')
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def _upsert(self, rows: List[Tuple]):
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN')
+                new = sum(
+                    not self._conn.execute('SELECT 1 FROM outputs WHERE filename = ?', (row[0],)).fetchone()
+                    for row in rows
+                )
+                self._conn.executemany(
+                    '''INSERT OR REPLACE INTO outputs (filename, size, mtime, width, height, seed, prompt)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                    rows
+                )
+            self.files += new
+
+    def add(self, filename: str):
+        path = self.output_dir / filename
+        if path.is_file():
+            self._upsert([self._row_for_path(path)])
+
+    def _row_for_path(self, path: Path) -> Tuple:
+        st = path.stat()
+        width = height = seed = prompt = None
+        try:
+            width, height, text = read_png_info(path)
+            seed, prompt = workflow_metadata(text)
+        except (OSError, ValueError, zlib.error, struct.error) as e:
+            logger.debug(f'No metadata for {path.name}: {e}')
+        return path.name, st.st_size, st.st_mtime, width, height, seed, prompt
+
+    def remove(self, filename: str):
+        with self._lock:
+            self.files -= self._conn.execute('DELETE FROM outputs WHERE filename = ?', (filename,)).rowcount
+
+    def reconcile(self, batch: int = 500):
+        """Bring the index in line with the folder (added, changed and removed files)"""
+        started = time.monotonic()
+        self.indexing = True
+        try:
+            with self._lock:
+                known = {
+                    row['filename']: (row['size'], row['mtime'])
+                    for row in self._conn.execute('SELECT filename, size, mtime FROM outputs')
+                }
+
+            seen = set()
+            pending = []
+            added = 0
+            with os.scandir(self.output_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(IMAGE_SUFFIX) or not entry.is_file():
+                        continue
+                    seen.add(entry.name)
+                    st = entry.stat()
+                    if known.get(entry.name) == (st.st_size, st.st_mtime):
+                        continue
+                    pending.append(self._row_for_path(Path(entry.path)))
+                    if len(pending) >= batch:
+                        self._upsert(pending)
+                        added += len(pending)
+                        pending = []
+            if pending:
+                self._upsert(pending)
+                added += len(pending)
+
+            removed = [(name,) for name in known.keys() - seen]
+            if removed:
+                with self._lock:
+                    with self._conn:
+                        self._conn.execute('BEGIN')
+                        deleted = self._conn.executemany('DELETE FROM outputs WHERE filename = ?', removed).rowcount
+                    self.files -= deleted
+        finally:
+            self.indexing = False
+
+        self.last_reconcile = time.time()
+        self.reconcile_seconds = round(time.monotonic() - started, 3)
+        if added or removed:
+            logger.info(f'Output index: {added} added/updated, {len(removed)} removed ({self.reconcile_seconds}s)')
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def _jobs_joined(self) -> bool:
+        with self._lock:
+            return bool(self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'job_outputs'"
+            ).fetchone())
+
+    def _where(self, prefix: str = None, seed: int = None, job_id: str = None,
+               q: str = None, since: float = None) -> Tuple[List[str], List]:
+        clauses, params = [], []
+        if prefix:
+            clauses.append("filename LIKE ? ESCAPE '\\'")
+            params.append(prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if seed is not None:
+            clauses.append('seed = ?')
+            params.append(seed)
+        if job_id:
+            clauses.append('filename IN (SELECT filename FROM job_outputs WHERE job_id = ?)')
+            params.append(job_id)
+        if q:
+            clauses.append('prompt LIKE ?')
+            params.append(f'%{q}%')
+        if since is not None:
+            clauses.append('mtime >= ?')
+            params.append(since)
+        return clauses, params
+
+    def query(
+        self,
+        sort: str = 'filename',
+        descending: bool = True,
+        limit: int = 100,
+        cursor: str = None,
+        **filters
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """One page of entries and the cursor of the next page (None at the end)"""
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f'sort must be one of: {", ".join(SORT_COLUMNS)}')
+        clauses, params = self._where(**filters)
+
+        op = '<' if descending else '>'
+        if cursor:
+            value, filename = decode_cursor(cursor)
+            if sort == 'filename':
+                clauses.append(f'filename {op} ?')
+                params.append(filename)
+            else:
+                clauses.append(f'({sort} {op} ? OR ({sort} = ? AND filename {op} ?))')
+                params.extend([value, value, filename])
+
+        joined = self._jobs_joined()
+        job_column = (
+            '(SELECT job_id FROM job_outputs WHERE job_outputs.filename = outputs.filename LIMIT 1)'
+            if joined else 'NULL'
+        )
+        if filters.get('job_id') and not joined:
+            return [], None
+
+        where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        direction = 'DESC' if descending else 'ASC'
+        order = 'filename' if sort == 'filename' else f'{sort} {direction}, filename'
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT *, {job_column} AS job_id FROM outputs{where} '
+                f'ORDER BY {order} {direction} LIMIT ?',
+                params + [limit + 1]
+            ).fetchall()
+
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor(last[sort], last['filename'])
+        return items, next_cursor
+
+    def count(self, **filters) -> int:
+        """Entries matching the filters; without any, the maintained file count"""
+        clauses, params = self._where(**filters)
+        if not clauses:
+            return self.files
+        if filters.get('job_id') and not self._jobs_joined():
+            return 0
+        where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM outputs{where}', params).fetchone()[0]
+
+    def stats(self) -> Dict:
+        return {
+            'files': self.files,
+            'indexing': self.indexing,
+            'watcher': 'inotify' if self.watching else 'polling',
+            'reconcile_interval': self.reconcile_interval,
+            'last_reconcile': self.last_reconcile,
+            'reconcile_seconds': self.reconcile_seconds,
+        }
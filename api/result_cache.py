@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of generation results
+
+A rendered workflow with a fixed seed always produces the same images, so
+the SHA-256 of its canonical JSON identifies the result. Completed outputs
+are hard-linked (or copied / downloaded from a remote backend) into the
+cache directory, and the index is kept on disk as JSON so it survives
+restarts. Entries are evicted least recently used first once the cache
+exceeds its entry count or byte budget.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+
+def cache_key(workflow: Dict, equivalents: Dict[str, str] = None) -> str:
+    """Hash of a rendered prompt graph; equivalents maps drop-in node
+    classes to the class they replace, so both render to one key"""
+    if equivalents:
+        workflow = {
+            node_id: {**node, 'class_type': equivalents[node['class_type']]}
+            if node.get('class_type') in equivalents else node
+            for node_id, node in workflow.items()
+        }
+    canonical = json.dumps(workflow, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    """Cached outputs of one prompt graph"""
+    key: str
+    outputs: List[Dict]
+    size: int
+    created_at: float
+    last_used: float
+    hits: int = 0
+    workflow: Optional[str] = None
+    files: List[str] = field(default_factory=list)   # paths relative to the cache dir
+
+
+class ResultCache:
+    """LRU result cache with an on-disk JSON index"""
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_bytes: int = 10 * 1024 ** 3,
+        max_entries: int = 10000,
+        save_interval: float = 30.0
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.index_path = self.cache_dir / 'index.json'
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._files: Dict[str, Path] = {}       # output filename -> cached file
+        self._size = 0
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._dirty = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='result-cache')
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------
+    # Index persistence
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Read the on-disk index, dropping entries whose files are gone"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f'Ignoring unreadable result cache index: {e}')
+            return
+        if data.get('version') != INDEX_VERSION:
+            return
+
+        entries = sorted(
+            (CacheEntry(**entry) for entry in data.get('entries', [])),
+            key=lambda entry: entry.last_used
+        )
+        with self._lock:
+            for entry in entries:
+                if all((self.cache_dir / path).exists() for path in entry.files):
+                    self._add(entry)
+            self._evict()
+        logger.info(f'Result cache: {len(self._entries)} entries, {self._size / 1024 ** 2:.1f} MB')
+
+    def save(self):
+        """Write the index atomically"""
+        with self._lock:
+            data = {
+                'version': INDEX_VERSION,
+                'entries': [asdict(entry) for entry in self._entries.values()]
+            }
+            self._dirty = False
+            self._last_save = time.monotonic()
+        tmp_path = self.index_path.with_suffix('.tmp')
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f'Could not save result cache index: {e}')
+
+    def _maybe_save(self):
+        if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Cached entry for key (marks it most recently used)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not all((self.cache_dir / path).exists() for path in entry.files):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            entry.hits += 1
+            entry.last_used = time.time()
+            self._entries.move_to_end(key)
+            self._dirty = True
+            self.hits += 1
+        self._maybe_save()
+        return entry
+
+    def find_file(self, filename: str) -> Optional[Path]:
+        """Cached copy of an output image, by its ComfyUI filename"""
+        with self._lock:
+            path = self._files.get(filename)
+        return path if path is not None and path.exists() else None
+
+    # ------------------------------------------------------------------
+    # Insertion
+    # ------------------------------------------------------------------
+
+    def put(
+        self,
+        key: str,
+        outputs: List[Dict],
+        fetch: Callable[[Dict, Path], None],
+        workflow: str = None
+    ) -> Optional[CacheEntry]:
+        """Store outputs; fetch(descriptor, dest) materialises each image file"""
+        if not outputs:
+            return None
+
+        entry_dir = self.cache_dir / key[:2] / key
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        files = []
+        size = 0
+        try:
+            for descriptor in outputs:
+                dest = entry_dir / descriptor['filename']
+                if not dest.exists():
+                    fetch(descriptor, dest)
+                size += dest.stat().st_size
+                files.append(str(dest.relative_to(self.cache_dir)))
+        except Exception as e:
+            logger.warning(f'Not caching result {key[:12]}: {e}')
+            self._delete_files(files)
+            return None
+
+        now = time.time()
+        entry = CacheEntry(
+            key=key,
+            outputs=[dict(descriptor) for descriptor in outputs],
+            size=size,
+            created_at=now,
+            last_used=now,
+            workflow=workflow,
+            files=files
+        )
+        with self._lock:
+            if key in self._entries:
+                self._remove(key, delete=False)
+            self._add(entry)
+            self._evict()
+            self._dirty = True
+        self.save()
+        return entry
+
+    def put_async(self, key: str, outputs: List[Dict], fetch: Callable[[Dict, Path], None], workflow: str = None):
+        self._executor.submit(self.put, key, outputs, fetch, workflow)
+
+    # ------------------------------------------------------------------
+    # Bookkeeping (caller holds the lock)
+    # ------------------------------------------------------------------
+
+    def _add(self, entry: CacheEntry):
+        self._entries[entry.key] = entry
+        self._size += entry.size
+        for path in entry.files:
+            self._files[Path(path).name] = self.cache_dir / path
+
+    def _remove(self, key: str, delete: bool = True):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= entry.size
+        for path in entry.files:
+            self._files.pop(Path(path).name, None)
+        if delete:
+            self._delete_files(entry.files)
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def _delete_files(self, files: List[str]):
+        for path in files:
+            try:
+                (self.cache_dir / path).unlink()
+            except OSError:
+                pass
+        if files:
+            try:
+                (self.cache_dir / files[0]).parent.rmdir()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'cache_dir': str(self.cache_dir),
+            }
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Parsed workflow template registry
+
+Each API-format workflow in workflows/ is parsed once and re-parsed only
+when its mtime changes. At parse time the graph is scanned by class_type
+(and by ${PLACEHOLDER} values) to build a map from request parameters
+(prompt, seed, steps, width, height, ...) to the node inputs they control.
+Rendering a request then copies only the touched nodes and patches those
+inputs; every other node is shared with the cached template.
+
+Rendering can also swap node classes for drop-in replacements with the
+same inputs, e.g. CLIPTextEncode for the conditioning-cache node bundled
+with the image (CONDITIONING_CACHE_CLASSES).
+
+render_batch() renders several requests as one latent batch. Their prompt
+and seed may differ: the nodes they are bound to are swapped for the
+per-item variants bundled with the image (BATCH_ITEM_CLASSES), which take
+one value per batch item as a JSON list. batch_item_parameters() says which
+of the two may differ while every item still renders exactly as its own
+single generation would.
+"""
+
+import json
+import os
+import re
+import threading
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# class_type -> {input_name: parameter}
+CLASS_BINDINGS: Dict[str, Dict[str, str]] = {
+    'KSampler': {
+        'seed': 'seed', 'steps': 'steps', 'cfg': 'cfg',
+        'sampler_name': 'sampler', 'scheduler': 'scheduler',
+    },
+    'KSamplerAdvanced': {
+        'noise_seed': 'seed', 'steps': 'steps', 'cfg': 'cfg',
+        'sampler_name': 'sampler', 'scheduler': 'scheduler',
+    },
+    'RandomNoise': {'noise_seed': 'seed'},
+    'KSamplerSelect': {'sampler_name': 'sampler'},
+    'CFGGuider': {'cfg': 'cfg'},
+    'BasicScheduler': {'steps': 'steps', 'scheduler': 'scheduler'},
+    'Flux2Scheduler': {'steps': 'steps', 'width': 'width', 'height': 'height'},
+    'EmptyLatentImage': {'width': 'width', 'height': 'height', 'batch_size': 'batch_size'},
+    'EmptySD3LatentImage': {'width': 'width', 'height': 'height', 'batch_size': 'batch_size'},
+    'EmptyFlux2LatentImage': {'width': 'width', 'height': 'height', 'batch_size': 'batch_size'},
+    'LoraLoader': {'strength_model': 'lora_strength', 'strength_clip': 'lora_strength'},
+    'LoraLoaderModelOnly': {'strength_model': 'lora_strength'},
+    'SaveImage': {'filename_prefix': 'filename_prefix'},
+}
+
+# Text encoders whose 'text' input is bound to prompt / negative_prompt
+TEXT_ENCODERS = ('CLIPTextEncode', 'CachedCLIPTextEncode')
+
+# class_type -> drop-in replacement caching its conditioning
+# (custom_nodes/ComfyUI-Conditioning-Cache)
+CONDITIONING_CACHE_CLASSES = {'CLIPTextEncode': 'CachedCLIPTextEncode'}
+
+# class_type -> (per-item replacement, bound input, list input)
+# (custom_nodes/ComfyUI-Batch-Items)
+BATCH_ITEM_CLASSES: Dict[str, Tuple[str, str, str]] = {
+    'CLIPTextEncode': ('BatchCLIPTextEncode', 'text', 'texts'),
+    'CachedCLIPTextEncode': ('BatchCLIPTextEncode', 'text', 'texts'),
+    'KSampler': ('BatchKSampler', 'seed', 'seeds'),
+    'RandomNoise': ('BatchRandomNoise', 'noise_seed', 'seeds'),
+}
+
+# Inputs a per-item replacement takes to keep the replaced node's behaviour:
+# BatchCLIPTextEncode encodes through the conditioning cache
+BATCH_ITEM_OPTIONS: Dict[str, Dict[str, Any]] = {'CachedCLIPTextEncode': {'cache': True}}
+
+# Parameters render_batch() can vary per batch item
+BATCH_ITEM_PARAMETERS = ('prompt', 'seed')
+
+# Samplers that draw fresh noise while sampling (ancestral, SDE, ...). In a
+# latent batch they draw it for the batch as a whole, so an item would not
+# match a single generation with its seed. custom_nodes/ComfyUI-Batch-Items
+# keeps the same list.
+STOCHASTIC_SAMPLERS = frozenset({'ddpm', 'lcm', 'restart', 'seeds_2', 'seeds_3', 'sa_solver', 'sa_solver_pece'})
+
+# Sampler-side nodes whose positive/negative inputs identify prompt polarity
+CONDITIONING_CONSUMERS = ('KSampler', 'KSamplerAdvanced', 'CFGGuider', 'BasicGuider')
+
+# ${PLACEHOLDER} names used by the parametric workflows and comfy-run.sh
+PLACEHOLDER_PARAMS = {
+    'PROMPT': 'prompt',
+    'NEGATIVE_PROMPT': 'negative_prompt',
+    'SEED': 'seed',
+    'STEPS': 'steps',
+    'WIDTH': 'width',
+    'HEIGHT': 'height',
+    'BATCH_SIZE': 'batch_size',
+    'FILENAME_PREFIX': 'filename_prefix',
+}
+
+PLACEHOLDER_RE = re.compile(r'\$\{([A-Z_][A-Z0-9_]*)\}')
+
+# Loader inputs that name a weights file; together they identify the model set
+MODEL_INPUTS = (
+    'ckpt_name', 'unet_name', 'clip_name', 'clip_name1', 'clip_name2',
+    'vae_name', 'lora_name',
+)
+
+PARAMETERS = (
+    'prompt', 'negative_prompt', 'seed', 'steps', 'cfg', 'width', 'height',
+    'batch_size', 'sampler', 'scheduler', 'lora_strength', 'filename_prefix',
+)
+
+
+@dataclass
+class Binding:
+    """One node input controlled by a request parameter"""
+    node_id: str
+    input_name: str
+    parameter: str
+    scale: float = 1.0              # strength_clip keeps its ratio to strength_model
+    template: Optional[str] = None  # string input with embedded ${PLACEHOLDER}s
+
+
+@dataclass
+class WorkflowTemplate:
+    """A parsed API-format workflow and its parameter bindings"""
+    name: str
+    path: Path
+    mtime: float
+    nodes: Dict[str, Dict]
+    bindings: Dict[str, List[Binding]] = field(default_factory=dict)
+
+    @property
+    def parameters(self) -> List[str]:
+        return sorted(self.bindings)
+
+    @property
+    def class_types(self) -> List[str]:
+        return sorted({node.get('class_type', '') for node in self.nodes.values()})
+
+    @property
+    def models(self) -> Tuple[str, ...]:
+        """Weights files loaded by this workflow (UNET, CLIP, VAE, LoRA)"""
+        names = set()
+        for node in self.nodes.values():
+            for input_name in MODEL_INPUTS:
+                value = node['inputs'].get(input_name)
+                if isinstance(value, str) and value:
+                    names.add(value)
+        return tuple(sorted(names))
+
+    @property
+    def batchable(self) -> bool:
+        """True when render_batch() can vary prompt and seed per item: the
+        latent batch size is bound and so is every prompt/seed input, to a
+        node with a per-item variant"""
+        return 'batch_size' in self.bindings and all(
+            self._batch_item_class(binding) for parameter in BATCH_ITEM_PARAMETERS
+            for binding in self.bindings.get(parameter, [])
+        )
+
+    @property
+    def batch_classes(self) -> Tuple[str, ...]:
+        """Per-item node classes render_batch() may use"""
+        return tuple(sorted({
+            BATCH_ITEM_CLASSES[self.nodes[binding.node_id]['class_type']][0]
+            for parameter in BATCH_ITEM_PARAMETERS for binding in self.bindings.get(parameter, [])
+            if self._batch_item_class(binding)
+        }))
+
+    def batch_item_parameters(self, sampler: Optional[str] = None) -> Tuple[str, ...]:
+        """Parameters render_batch() may vary per item with every item still
+        reproducing its single generation; () when none may
+
+        Nothing may vary under a sampler that draws noise while sampling.
+        Prompts may only differ where BatchKSampler samples each text length
+        on its own; behind RandomNoise the items share one text length.
+        """
+        seed_bindings = self.bindings.get('seed', [])
+        if not self.batchable or not seed_bindings or stochastic_sampler(sampler or self.default('sampler')):
+            return ()
+        if all(self.nodes[binding.node_id]['class_type'] == 'KSampler' for binding in seed_bindings):
+            return BATCH_ITEM_PARAMETERS
+        return ('seed',)
+
+    def default(self, parameter: str) -> Any:
+        """The template's own value of a parameter, None without a literal one"""
+        for binding in self.bindings.get(parameter, []):
+            value = self.nodes[binding.node_id]['inputs'].get(binding.input_name)
+            if value is None or _link_source(value) is not None:
+                continue
+            if binding.template is None and not PLACEHOLDER_RE.search(str(value)):
+                return value
+        return None
+
+    def _batch_item_class(self, binding: Binding) -> bool:
+        entry = BATCH_ITEM_CLASSES.get(self.nodes[binding.node_id]['class_type'])
+        return entry is not None and entry[1] == binding.input_name
+
+    def render(self, params: Dict[str, Any], substitutions: Dict[str, str] = None) -> Dict[str, Dict]:
+        """Build a prompt payload; only nodes with patched inputs or a
+        substituted class_type are copied"""
+        payload = dict(self.nodes)
+        copied = set()
+
+        for parameter, bindings in self.bindings.items():
+            value = params.get(parameter)
+            if value is None:
+                continue
+            for binding in bindings:
+                if binding.node_id not in copied:
+                    node = payload[binding.node_id]
+                    payload[binding.node_id] = {**node, 'inputs': dict(node['inputs'])}
+                    copied.add(binding.node_id)
+                payload[binding.node_id]['inputs'][binding.input_name] = \
+                    self._bound_value(binding, value, params)
+
+        if substitutions:
+            for node_id, node in self.nodes.items():
+                replacement = substitutions.get(node['class_type'])
+                if replacement:
+                    payload[node_id] = {**payload[node_id], 'class_type': replacement}
+
+        return payload
+
+    def render_batch(self, items: List[Dict[str, Any]], substitutions: Dict[str, str] = None) -> Dict[str, Dict]:
+        """Build one prompt whose latent batch item i renders items[i]
+
+        The items must agree on every parameter but prompt and seed. Nodes
+        whose bound value differs between items become their per-item
+        variant with the values as a JSON list; raises ValueError when a
+        differing value is bound to a node without one.
+        """
+        payload = self.render({**items[0], 'batch_size': len(items)}, substitutions)
+        for parameter in BATCH_ITEM_PARAMETERS:
+            for binding in self.bindings.get(parameter, []):
+                values = [self._bound_value(binding, item.get(parameter), item) for item in items]
+                if all(value == values[0] for value in values):
+                    continue
+                if not self._batch_item_class(binding):
+                    raise ValueError(
+                        f'Workflow {self.name} cannot vary {parameter} within a batch '
+                        f'(node {binding.node_id}, {self.nodes[binding.node_id]["class_type"]})'
+                    )
+                replacement, _, list_input = BATCH_ITEM_CLASSES[self.nodes[binding.node_id]['class_type']]
+                node = payload[binding.node_id]
+                payload[binding.node_id] = {
+                    **node,
+                    'class_type': replacement,
+                    'inputs': {
+                        **node['inputs'], list_input: json.dumps(values),
+                        **BATCH_ITEM_OPTIONS.get(node['class_type'], {}),
+                    },
+                }
+        return payload
+
+    @staticmethod
+    def _bound_value(binding: Binding, value: Any, params: Dict[str, Any]) -> Any:
+        if binding.template is not None:
+            def fill(match) -> str:
+                bound = params.get(PLACEHOLDER_PARAMS.get(match.group(1), ''))
+                return '' if bound is None else str(bound)
+            return PLACEHOLDER_RE.sub(fill, binding.template)
+        if binding.scale != 1.0:
+            return round(float(value) * binding.scale, 4)
+        return value
+
+
+def stochastic_sampler(name: Optional[str]) -> bool:
+    """True for samplers that draw noise while sampling, and for an unknown one"""
+    if not name:
+        return True
+    return 'ancestral' in name or 'sde' in name or name in STOCHASTIC_SAMPLERS
+
+
+def _link_source(value: Any) -> Optional[str]:
+    """Node id a link input points at ([node_id, slot]), else None"""
+    if isinstance(value, list) and len(value) == 2 and isinstance(value[1], int):
+        return str(value[0])
+    return None
+
+
+def _trace_encoder(nodes: Dict[str, Dict], node_id: Optional[str], depth: int = 0) -> Optional[str]:
+    """Walk conditioning links upstream until a text encoder is found"""
+    if node_id is None or node_id not in nodes or depth > 16:
+        return None
+    node = nodes[node_id]
+    if node.get('class_type') in TEXT_ENCODERS:
+        return node_id
+    for key in ('conditioning', 'conditioning_1', 'conditioning_to', 'positive'):
+        found = _trace_encoder(nodes, _link_source(node.get('inputs', {}).get(key)), depth + 1)
+        if found:
+            return found
+    return None
+
+
+def _encoder_polarity(nodes: Dict[str, Dict]) -> Dict[str, str]:
+    """Map each text encoder node id to 'prompt' or 'negative_prompt'"""
+    polarity: Dict[str, str] = {}
+    for node in nodes.values():
+        if node.get('class_type') not in CONDITIONING_CONSUMERS:
+            continue
+        inputs = node.get('inputs', {})
+        for key, parameter in (('positive', 'prompt'), ('conditioning', 'prompt'),
+                               ('negative', 'negative_prompt')):
+            encoder = _trace_encoder(nodes, _link_source(inputs.get(key)))
+            if encoder:
+                polarity.setdefault(encoder, parameter)
+
+    # Unreached encoders: first one is the positive prompt, the rest negative
+    for node_id, node in nodes.items():
+        if node.get('class_type') in TEXT_ENCODERS and node_id not in polarity:
+            polarity[node_id] = 'prompt' if 'prompt' not in polarity.values() else 'negative_prompt'
+    return polarity
+
+
+def build_bindings(nodes: Dict[str, Dict]) -> Dict[str, List[Binding]]:
+    """Scan a workflow graph for the inputs each request parameter controls"""
+    bindings: Dict[str, List[Binding]] = {}
+    seen = set()
+
+    def bind(binding: Binding):
+        key = (binding.node_id, binding.input_name)
+        if key not in seen:
+            seen.add(key)
+            bindings.setdefault(binding.parameter, []).append(binding)
+
+    # Placeholders first: they are the template author's explicit intent
+    for node_id, node in nodes.items():
+        for input_name, value in node.get('inputs', {}).items():
+            if not isinstance(value, str):
+                continue
+            names = PLACEHOLDER_RE.findall(value)
+            if not names:
+                continue
+            if value == f'${{{names[0]}}}' and names[0] in PLACEHOLDER_PARAMS:
+                bind(Binding(node_id, input_name, PLACEHOLDER_PARAMS[names[0]]))
+            else:
+                for name in names:
+                    if name in PLACEHOLDER_PARAMS:
+                        bind(Binding(node_id, input_name, PLACEHOLDER_PARAMS[name], template=value))
+                        break
+
+    polarity = _encoder_polarity(nodes)
+    for node_id, node in nodes.items():
+        class_type = node.get('class_type')
+        inputs = node.get('inputs', {})
+
+        if class_type in TEXT_ENCODERS and 'text' in inputs and not _link_source(inputs['text']):
+            bind(Binding(node_id, 'text', polarity[node_id]))
+
+        for input_name, parameter in CLASS_BINDINGS.get(class_type, {}).items():
+            if input_name not in inputs or _link_source(inputs[input_name]):
+                continue
+            scale = 1.0
+            if class_type == 'LoraLoader' and input_name == 'strength_clip':
+                model = inputs.get('strength_model')
+                clip = inputs.get('strength_clip')
+                if isinstance(model, (int, float)) and isinstance(clip, (int, float)) and model:
+                    scale = clip / model
+            bind(Binding(node_id, input_name, parameter, scale=scale))
+
+    return bindings
+
+
+class WorkflowTemplateRegistry:
+    """Parse-once cache of workflow templates, invalidated by file mtime"""
+
+    def __init__(self, workflows_dir: Path):
+        self.workflows_dir = Path(workflows_dir)
+        self._templates: Dict[str, WorkflowTemplate] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, name: str) -> Path:
+        filename = name if name.endswith('.json') else f'{name}.json'
+        path = (self.workflows_dir / filename).resolve()
+        if path.parent != self.workflows_dir.resolve():
+            raise ValueError(f'Invalid workflow name: {name}')
+        return path
+
+    def get(self, name: str) -> WorkflowTemplate:
+        """Return the parsed template, re-parsing only if the file changed"""
+        path = self.path_for(name)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            raise FileNotFoundError(f'Workflow not found: {path}')
+
+        key = path.stem
+        cached = self._templates.get(key)
+        if cached is not None and cached.mtime == mtime:
+            return cached
+
+        with self._lock:
+            cached = self._templates.get(key)
+            if cached is not None and cached.mtime == mtime:
+                return cached
+            template = self._parse(key, path, mtime)
+            self._templates[key] = template
+            logger.info(
+                f'Loaded workflow template {key}: {len(template.nodes)} nodes, '
+                f'parameters: {", ".join(template.parameters)}'
+            )
+            return template
+
+    def render(self, name: str, params: Dict[str, Any], substitutions: Dict[str, str] = None) -> Dict[str, Dict]:
+        return self.get(name).render(params, substitutions)
+
+    def available(self) -> List[Tuple[str, Optional[WorkflowTemplate], Optional[str]]]:
+        """(name, template or None, error) for every workflow file"""
+        results = []
+        for path in sorted(self.workflows_dir.glob('*.json')):
+            try:
+                results.append((path.stem, self.get(path.stem), None))
+            except (ValueError, json.JSONDecodeError) as e:
+                results.append((path.stem, None, str(e)))
+        return results
+
+    @staticmethod
+    def _parse(name: str, path: Path, mtime: float) -> WorkflowTemplate:
+        with open(path, 'r') as f:
+            data = json.load(f)
+
+        if isinstance(data, dict) and isinstance(data.get('prompt'), dict):
+            data = data['prompt']
+
+        if not isinstance(data, dict) or isinstance(data.get('nodes'), list):
+            raise ValueError(
+                f'Workflow {name} is in ComfyUI UI format; export it with '
+                f'"Save (API Format)" to use it with the REST API'
+            )
+
+        nodes = {
+            str(node_id): node for node_id, node in data.items()
+            if isinstance(node, dict) and 'class_type' in node
+        }
+        if not nodes:
+            raise ValueError(f'Workflow {name} has no API-format nodes')
+
+        for node in nodes.values():
+            node.setdefault('inputs', {})
+
+        return WorkflowTemplate(
+            name=name,
+            path=path,
+            mtime=mtime,
+            nodes=nodes,
+            bindings=build_bindings(nodes)
+        )
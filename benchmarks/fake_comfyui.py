@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Fake ComfyUI server for benchmarks and GPU-less testing
+
+Speaks enough of the ComfyUI HTTP and websocket protocol for the REST API
+(api/comfyui_rest_api.py) and comfy-run.sh to run end to end against it:
+
+  POST /prompt               queue an API prompt graph (400 with node_errors on rejection)
+  GET  /prompt               {"exec_info": {"queue_remaining": N}}
+  GET  /queue                running and pending prompts
+  POST /queue                {"delete": [prompt_id, ...]} or {"clear": true}
+  POST /interrupt            interrupt the running prompt
+  GET  /history[/<id>]       finished prompts with their outputs
+  GET  /object_info[/<cls>]  node definitions (the comfy_runner snapshot)
+  GET  /view                 output images (Range requests supported)
+  GET  /system_stats         fake GPU and RAM figures
+  GET  /extensions           []
+  GET  /ws?clientId=...      status, execution_start, execution_cached,
+                             executing, progress, executed, execution_success,
+                             execution_error, execution_interrupted
+
+One worker runs prompts in order, like ComfyUI. Nodes run in dependency
+order, each taking a configurable time: loaders --load-delay, samplers
+--step-delay per step (with a progress event per step), VAE decode
+--decode-delay, everything else --node-delay. A node whose class, inputs and
+upstream nodes match one executed before is reported cached and skipped
+(output nodes always run), so a repeated prompt skips its loaders and text
+encoders the way ComfyUI's cache does.
+
+Save/Preview nodes write real PNGs (width/height taken from the graph) of
+about --image-kb kilobytes to --output-dir, so /view and the API's local
+image serving move realistic payloads.
+
+Failure injection: --reject-rate (POST /prompt answers 400), --fail-rate
+(execution_error at the sampler), --error-rate (HTTP 500 on GET /queue,
+/history and /view) and --latency (added to every HTTP response).
+
+Usage:
+  python3 benchmarks/fake_comfyui.py --port 8188 --step-delay 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import struct
+import tempfile
+import time
+import uuid
+import zlib
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from aiohttp import web, WSMsgType
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('fake_comfyui')
+
+OBJECT_INFO_SNAPSHOT = Path(__file__).resolve().parent.parent / 'workflows' / 'comfy_runner' / 'object_info_snapshot.json'
+
+SAMPLER_CLASSES = {'KSampler', 'KSamplerAdvanced', 'SamplerCustom', 'SamplerCustomAdvanced'}
+OUTPUT_CLASSES = {'SaveImage': 'output', 'PreviewImage': 'temp'}
+DEFAULT_STEPS = 20
+DEFAULT_SIZE = 1024
+
+
+# ============================================================================
+# Images
+# ============================================================================
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def make_png(width: int, height: int, approx_bytes: int) -> bytes:
+    """Valid RGB PNG of about approx_bytes: noise rows (incompressible) then black rows"""
+    row = 3 * width + 1
+    noisy = max(1, min(height, approx_bytes // row))
+    raw = b''.join(b'\x00' + os.urandom(3 * width) for _ in range(noisy))
+    raw += (b'\x00' * row) * (height - noisy)
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header)
+            + _png_chunk(b'IDAT', zlib.compress(raw, 1)) + _png_chunk(b'IEND', b''))
+
+
+# ============================================================================
+# Prompts
+# ============================================================================
+
+class Prompt:
+    def __init__(self, number: int, prompt_id: str, graph: Dict, client_id: Optional[str], extra: Dict):
+        self.number = number
+        self.prompt_id = prompt_id
+        self.graph = graph
+        self.client_id = client_id
+        self.extra = extra
+        self.outputs = [node_id for node_id, node in graph.items() if node.get('class_type') in OUTPUT_CLASSES]
+        self.interrupted = False
+
+    def queue_item(self) -> List:
+        return [self.number, self.prompt_id, self.graph, self.extra, self.outputs]
+
+
+def _links(node: Dict) -> List[str]:
+    """Upstream node ids of a node ([node_id, output_index] inputs)"""
+    return [str(value[0]) for value in (node.get('inputs') or {}).values()
+            if isinstance(value, list) and len(value) == 2 and isinstance(value[1], int)]
+
+
+def execution_order(graph: Dict[str, Dict]) -> List[str]:
+    """Node ids in dependency order (depth-first from every node)"""
+    order: List[str] = []
+    seen: Set[str] = set()
+
+    def visit(node_id: str):
+        if node_id in seen or node_id not in graph:
+            return
+        seen.add(node_id)
+        for upstream in _links(graph[node_id]):
+            visit(upstream)
+        order.append(node_id)
+
+    for node_id in sorted(graph, key=lambda n: (len(n), n)):
+        visit(node_id)
+    return order
+
+
+def validate(graph) -> Dict:
+    """node_errors for a graph ComfyUI would reject outright"""
+    if not isinstance(graph, dict) or not graph:
+        return {'error': {'type': 'invalid_prompt', 'message': 'Cannot execute because prompt is empty'}}
+    for node_id, node in graph.items():
+        if not isinstance(node, dict) or 'class_type' not in node:
+            return {'error': {'type': 'invalid_prompt',
+                              'message': f'Cannot execute because node {node_id} has no class_type'}}
+    if not any(node['class_type'] in OUTPUT_CLASSES for node in graph.values()):
+        return {'error': {'type': 'prompt_no_outputs', 'message': 'Prompt has no outputs'}}
+    return {}
+
+
+def _int_input(graph: Dict, node: Dict, name: str, default: int) -> int:
+    """An int input of the node, else of any node in the graph"""
+    for candidate in [node] + list(graph.values()):
+        value = (candidate.get('inputs') or {}).get(name)
+        if isinstance(value, int) and value > 0:
+            return value
+    return default
+
+
+# ============================================================================
+# Server
+# ============================================================================
+
+class FakeComfyUI:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.output_dir = Path(args.output_dir)
+        self.temp_dir = Path(args.temp_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.temp_dir.mkdir(parents=True, exist_ok=True)
+
+        self.pending: "OrderedDict[str, Prompt]" = OrderedDict()
+        self.running: Optional[Prompt] = None
+        self.history: "OrderedDict[str, Dict]" = OrderedDict()
+        self.sockets: Dict[str, web.WebSocketResponse] = {}
+        self.executed: Set[str] = set()          # node signatures seen (ComfyUI's cache)
+        self.wakeup = asyncio.Event()
+        self.counter = 0
+        self.number = 0
+        self.images: Dict[tuple, bytes] = {}
+        self._object_info = None
+
+    # ------------------------------------------------------------------
+    # Websocket
+    # ------------------------------------------------------------------
+
+    async def send(self, event_type: str, data: Dict, client_id: Optional[str] = None):
+        """To the submitting client when it is connected, else to everyone"""
+        message = json.dumps({'type': event_type, 'data': data})
+        targets = [self.sockets[client_id]] if client_id in self.sockets else list(self.sockets.values())
+        for ws in targets:
+            try:
+                await ws.send_str(message)
+            except (ConnectionError, RuntimeError):
+                pass
+
+    def queue_remaining(self) -> int:
+        return len(self.pending) + (1 if self.running else 0)
+
+    async def send_status(self, client_id: Optional[str] = None):
+        data = {'status': {'exec_info': {'queue_remaining': self.queue_remaining()}}}
+        if client_id:
+            data['sid'] = client_id
+        await self.send('status', data, client_id)
+
+    async def ws_handler(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        client_id = request.query.get('clientId') or uuid.uuid4().hex
+        self.sockets[client_id] = ws
+        await self.send_status(client_id)
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            if self.sockets.get(client_id) is ws:
+                del self.sockets[client_id]
+        return ws
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _signature(self, graph: Dict, node_id: str, memo: Dict[str, str]) -> str:
+        if node_id not in memo:
+            node = graph[node_id]
+            literal = {k: v for k, v in (node.get('inputs') or {}).items() if not isinstance(v, list)}
+            upstream = [self._signature(graph, link, memo) for link in _links(node) if link in graph]
+            memo[node_id] = json.dumps([node['class_type'], literal, upstream], sort_keys=True, default=str)
+        return memo[node_id]
+
+    def _node_delay(self, class_type: str) -> float:
+        if 'Loader' in class_type:
+            return self.args.load_delay
+        if class_type.startswith('VAEDecode'):
+            return self.args.decode_delay
+        return self.args.node_delay
+
+    def _save_images(self, prompt: Prompt, node_id: str) -> List[Dict]:
+        node = prompt.graph[node_id]
+        folder_type = OUTPUT_CLASSES[node['class_type']]
+        prefix = str((node.get('inputs') or {}).get('filename_prefix') or 'ComfyUI')
+        width = _int_input(prompt.graph, node, 'width', DEFAULT_SIZE)
+        height = _int_input(prompt.graph, node, 'height', DEFAULT_SIZE)
+        key = (width, height)
+        if key not in self.images:
+            self.images[key] = make_png(width, height, self.args.image_kb * 1024)
+        subfolder, _, prefix = prefix.rpartition('/')
+        directory = (self.output_dir if folder_type == 'output' else self.temp_dir) / subfolder
+        directory.mkdir(parents=True, exist_ok=True)
+
+        images = []
+        for _ in range(_int_input(prompt.graph, node, 'batch_size', 1)):
+            self.counter += 1
+            filename = f'{prefix}_{self.counter:05d}_.png'
+            (directory / filename).write_bytes(self.images[key])
+            images.append({'filename': filename, 'subfolder': subfolder, 'type': folder_type})
+        return images
+
+    async def execute(self, prompt: Prompt):
+        graph = prompt.graph
+        send = lambda event, data: self.send(event, {**data, 'prompt_id': prompt.prompt_id}, prompt.client_id)
+        messages = []
+        outputs: Dict[str, Dict] = {}
+        started = time.time()
+
+        await send('execution_start', {'timestamp': int(started * 1000)})
+        messages.append(['execution_start', {'prompt_id': prompt.prompt_id, 'timestamp': int(started * 1000)}])
+
+        memo: Dict[str, str] = {}
+        order = execution_order(graph)
+        cached = [n for n in order if graph[n]['class_type'] not in OUTPUT_CLASSES
+                  and self._signature(graph, n, memo) in self.executed]
+        await send('execution_cached', {'nodes': cached, 'timestamp': int(time.time() * 1000)})
+        messages.append(['execution_cached', {'nodes': cached, 'prompt_id': prompt.prompt_id}])
+        fail = self.rng.random() < self.args.fail_rate
+
+        for node_id in order:
+            if node_id in cached:
+                continue
+            class_type = graph[node_id]['class_type']
+            await send('executing', {'node': node_id, 'display_node': node_id})
+
+            if prompt.interrupted:
+                data = {'node_id': node_id, 'node_type': class_type, 'executed': list(outputs)}
+                await send('execution_interrupted', data)
+                return self._finish(prompt, outputs, messages + [['execution_interrupted', data]], 'error')
+
+            if class_type in SAMPLER_CLASSES:
+                steps = _int_input(graph, graph[node_id], 'steps', DEFAULT_STEPS)
+                for step in range(1, steps + 1):
+                    await asyncio.sleep(self.args.step_delay)
+                    if prompt.interrupted:
+                        break
+                    await send('progress', {'value': step, 'max': steps, 'node': node_id})
+                if fail and not prompt.interrupted:
+                    data = {'node_id': node_id, 'node_type': class_type, 'executed': list(outputs),
+                            'exception_message': 'Injected failure (--fail-rate)',
+                            'exception_type': 'RuntimeError', 'traceback': [], 'current_inputs': {},
+                            'current_outputs': {}}
+                    await send('execution_error', data)
+                    return self._finish(prompt, outputs, messages + [['execution_error', data]], 'error')
+            else:
+                await asyncio.sleep(self._node_delay(class_type))
+
+            self.executed.add(self._signature(graph, node_id, memo))
+            if class_type in OUTPUT_CLASSES:
+                output = {'images': self._save_images(prompt, node_id)}
+                outputs[node_id] = output
+                await send('executed', {'node': node_id, 'display_node': node_id, 'output': output})
+
+        await send('execution_success', {'timestamp': int(time.time() * 1000)})
+        await send('executing', {'node': None})
+        messages.append(['execution_success', {'prompt_id': prompt.prompt_id}])
+        return self._finish(prompt, outputs, messages, 'success')
+
+    def _finish(self, prompt: Prompt, outputs: Dict, messages: List, status: str):
+        self.history[prompt.prompt_id] = {
+            'prompt': prompt.queue_item(),
+            'outputs': outputs,
+            'status': {'status_str': status, 'completed': status == 'success', 'messages': messages},
+            'meta': {}
+        }
+        while len(self.history) > self.args.max_history:
+            self.history.popitem(last=False)
+
+    async def worker(self):
+        while True:
+            while not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            _, self.running = self.pending.popitem(last=False)
+            try:
+                await self.execute(self.running)
+            except Exception as e:
+                logger.exception(f'Prompt {self.running.prompt_id} crashed: {e}')
+            self.running = None
+            await self.send_status()
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    @web.middleware
+    async def inject(self, request: web.Request, handler):
+        if self.args.latency:
+            await asyncio.sleep(self.args.latency)
+        if (request.method == 'GET' and request.path.startswith(('/queue', '/history', '/view'))
+                and self.rng.random() < self.args.error_rate):
+            return web.json_response({'error': 'Injected failure (--error-rate)'}, status=500)
+        return await handler(request)
+
+    async def post_prompt(self, request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+        except ValueError:
+            return web.json_response({'error': 'Invalid JSON'}, status=400)
+        graph = body.get('prompt')
+        error = validate(graph)
+        if not error and self.rng.random() < self.args.reject_rate:
+            error = {'error': {'type': 'prompt_outputs_failed_validation',
+                               'message': 'Injected rejection (--reject-rate)'}}
+        if error:
+            return web.json_response({**error, 'node_errors': {}}, status=400)
+
+        self.number += 1
+        prompt = Prompt(self.number, body.get('prompt_id') or str(uuid.uuid4()), graph,
+                        body.get('client_id'), body.get('extra_data') or {})
+        self.pending[prompt.prompt_id] = prompt
+        self.wakeup.set()
+        await self.send_status()
+        return web.json_response({'prompt_id': prompt.prompt_id, 'number': prompt.number, 'node_errors': {}})
+
+    async def get_prompt(self, request: web.Request) -> web.Response:
+        return web.json_response({'exec_info': {'queue_remaining': self.queue_remaining()}})
+
+    async def get_queue(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'queue_running': [self.running.queue_item()] if self.running else [],
+            'queue_pending': [prompt.queue_item() for prompt in self.pending.values()]
+        })
+
+    async def post_queue(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if body.get('clear'):
+            self.pending.clear()
+        for prompt_id in body.get('delete') or []:
+            self.pending.pop(prompt_id, None)
+        await self.send_status()
+        return web.Response(status=200)
+
+    async def interrupt(self, request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+        except ValueError:
+            body = {}
+        if self.running and body.get('prompt_id') in (None, self.running.prompt_id):
+            self.running.interrupted = True
+        return web.Response(status=200)
+
+    async def get_history(self, request: web.Request) -> web.Response:
+        prompt_id = request.match_info.get('prompt_id')
+        if prompt_id:
+            entry = self.history.get(prompt_id)
+            return web.json_response({prompt_id: entry} if entry else {})
+        items = list(self.history.items())
+        max_items = request.query.get('max_items')
+        if max_items and max_items.isdigit():
+            items = items[-int(max_items):]
+        return web.json_response(dict(items))
+
+    def object_info(self) -> Dict:
+        if self._object_info is None:
+            try:
+                with open(OBJECT_INFO_SNAPSHOT, encoding='utf-8') as f:
+                    self._object_info = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f'No object_info snapshot: {e}')
+                self._object_info = {}
+        return self._object_info
+
+    async def get_object_info(self, request: web.Request) -> web.Response:
+        class_type = request.match_info.get('class_type')
+        info = self.object_info()
+        if class_type:
+            return web.json_response({class_type: info[class_type]} if class_type in info else {})
+        return web.json_response(info)
+
+    async def view(self, request: web.Request) -> web.StreamResponse:
+        filename = request.query.get('filename', '')
+        folder = self.temp_dir if request.query.get('type') == 'temp' else self.output_dir
+        path = (folder / request.query.get('subfolder', '') / filename).resolve()
+        if not filename or folder.resolve() not in path.parents or not path.is_file():
+            return web.Response(status=404)
+        return web.FileResponse(path)
+
+    async def system_stats(self, request: web.Request) -> web.Response:
+        used = self.args.vram_used_gb * 1024 ** 3
+        total = self.args.vram_gb * 1024 ** 3
+        return web.json_response({
+            'system': {'os': 'posix', 'ram_total': 64 * 1024 ** 3, 'ram_free': 48 * 1024 ** 3,
+                       'comfyui_version': 'fake', 'python_version': '', 'pytorch_version': '',
+                       'embedded_python': False, 'argv': ['fake_comfyui.py']},
+            'devices': [{'name': 'cuda:0 Fake GPU', 'type': 'cuda', 'index': 0,
+                         'vram_total': total, 'vram_free': total - used,
+                         'torch_vram_total': used, 'torch_vram_free': 0}]
+        })
+
+    async def extensions(self, request: web.Request) -> web.Response:
+        return web.json_response([])
+
+    async def start_worker(self, app: web.Application):
+        app['worker'] = asyncio.create_task(self.worker())
+
+    async def stop_worker(self, app: web.Application):
+        app['worker'].cancel()
+        for ws in list(self.sockets.values()):
+            await ws.close()
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.inject], client_max_size=64 * 1024 ** 2)
+        app.router.add_post('/prompt', self.post_prompt)
+        app.router.add_get('/prompt', self.get_prompt)
+        app.router.add_get('/queue', self.get_queue)
+        app.router.add_post('/queue', self.post_queue)
+        app.router.add_post('/interrupt', self.interrupt)
+        app.router.add_get('/history', self.get_history)
+        app.router.add_get('/history/{prompt_id}', self.get_history)
+        app.router.add_get('/object_info', self.get_object_info)
+        app.router.add_get('/object_info/{class_type}', self.get_object_info)
+        app.router.add_get('/view', self.view)
+        app.router.add_get('/system_stats', self.system_stats)
+        app.router.add_get('/extensions', self.extensions)
+        app.router.add_get('/ws', self.ws_handler)
+        app.on_startup.append(self.start_worker)
+        app.on_cleanup.append(self.stop_worker)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake ComfyUI server for benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8188)
+    parser.add_argument('--output-dir', default=os.path.join(tempfile.gettempdir(), 'fake_comfyui', 'output'))
+    parser.add_argument('--temp-dir', default=os.path.join(tempfile.gettempdir(), 'fake_comfyui', 'temp'))
+    parser.add_argument('--step-delay', type=float, default=0.05, help='Seconds per sampler step')
+    parser.add_argument('--load-delay', type=float, default=1.0, help='Seconds per (uncached) loader node')
+    parser.add_argument('--decode-delay', type=float, default=0.2, help='Seconds per VAE decode')
+    parser.add_argument('--node-delay', type=float, default=0.01, help='Seconds per other node')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every HTTP response')
+    parser.add_argument('--reject-rate', type=float, default=0.0, help='Fraction of /prompt answered 400')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of prompts ending in execution_error')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of GET /queue, /history, /view answered 500')
+    parser.add_argument('--image-kb', type=int, default=1500, help='Approximate size of each output PNG')
+    parser.add_argument('--vram-gb', type=float, default=80.0)
+    parser.add_argument('--vram-used-gb', type=float, default=40.0)
+    parser.add_argument('--max-history', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=None, help='Seed for failure injection')
+    args = parser.parse_args()
+
+    server = FakeComfyUI(args)
+    logger.info(f'Fake ComfyUI on http://{args.host}:{args.port} (output: {server.output_dir})')
+    web.run_app(server.create_app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
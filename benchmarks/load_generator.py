@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Load generator for the ComfyUI REST API
+
+Starts generations at a fixed rate (open loop: a slow API does not slow the
+arrivals down) and follows each one through the API the way a client does:
+
+  1. POST /api/generate
+  2. wait for the job: poll GET /api/status/<job_id> (--follow poll) or hold
+     GET /api/stream/<job_id> open until its terminal event (--follow stream)
+  3. GET every output image (--no-download skips this)
+
+and reports, as JSON:
+
+  latency     p50/p95/p99/mean/max seconds of submit, status (each poll),
+              stream_first_event, download and end_to_end (submit to last
+              image byte)
+  throughput  offered and achieved rate, completed jobs per second
+  outcomes    completed / failed / cancelled / rejected (HTTP 429/503) / errors
+  api_rss     RSS of the API process (--api-pid): start, max, end, in MB
+
+Save a run with --output and pass it back with --baseline to print the
+change of every latency percentile, throughput and peak RSS against it.
+
+Usage:
+  python3 benchmarks/load_generator.py --api-url http://localhost:5000 \\
+      --rps 2 --duration 60 --follow stream --api-pid $(pgrep -f comfyui_rest_api.py)
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import aiohttp
+
+TERMINAL_STATES = ('completed', 'failed', 'cancelled')
+
+PROMPTS = [
+    'a serene mountain landscape with golden hour lighting',
+    'a red fox in fresh snow, telephoto photograph',
+    'isometric illustration of a tiny island village',
+    'a lighthouse on a cliff during a thunderstorm',
+    'macro photograph of dew drops on a spider web',
+]
+
+
+# ============================================================================
+# Measurements
+# ============================================================================
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def summarize(values: List[float]) -> Dict:
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 50), 4),
+        'p95': round(percentile(values, 95), 4),
+        'p99': round(percentile(values, 99), 4),
+        'mean': round(sum(values) / len(values), 4),
+        'max': round(values[-1], 4),
+    }
+
+
+def read_rss(pid: int) -> Optional[int]:
+    """Resident set size of a process in bytes (Linux /proc)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class RssSampler:
+    def __init__(self, pid: Optional[int], interval: float):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[int] = []
+
+    async def run(self):
+        while self.pid:
+            rss = read_rss(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            await asyncio.sleep(self.interval)
+
+    def report(self) -> Optional[Dict]:
+        if not self.samples:
+            return None
+        mb = lambda value: round(value / 1024 ** 2, 1)
+        return {'pid': self.pid, 'start_mb': mb(self.samples[0]), 'max_mb': mb(max(self.samples)),
+                'end_mb': mb(self.samples[-1]), 'samples': len(self.samples)}
+
+
+# ============================================================================
+# Load
+# ============================================================================
+
+class LoadGenerator:
+    def __init__(self, args):
+        self.args = args
+        self.api_url = args.api_url.rstrip('/')
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.images = 0
+        self.image_bytes = 0
+        self.completed_at: List[float] = []
+        self.rng = random.Random(args.seed)
+
+    def payload(self, index: int) -> Dict:
+        payload = {
+            'prompt': self.rng.choice(PROMPTS),
+            'steps': self.args.steps,
+            'width': self.args.size,
+            'height': self.args.size,
+            'cache': self.args.cache,
+        }
+        if self.args.workflow:
+            payload['workflow'] = self.args.workflow
+        if self.args.cache:
+            # Repeat a small set of seeds so the result cache gets hits
+            payload['seed'] = index % self.args.distinct_seeds
+        return payload
+
+    def error(self, kind: str):
+        self.errors[kind] += 1
+        self.outcomes['error'] += 1
+
+    async def job(self, session: aiohttp.ClientSession, index: int):
+        started = time.perf_counter()
+        try:
+            async with session.post(f'{self.api_url}/api/generate', json=self.payload(index)) as response:
+                body = await response.json(content_type=None)
+                self.latency['submit'].append(time.perf_counter() - started)
+                if response.status in (429, 503):
+                    self.outcomes['rejected'] += 1
+                    return
+                if response.status not in (200, 202):
+                    return self.error(f'generate HTTP {response.status}')
+
+            job_id = body['job_id']
+            if body.get('status') in TERMINAL_STATES:
+                status = body
+            elif self.args.follow == 'stream':
+                status = await self.follow_stream(session, job_id)
+            else:
+                status = await self.follow_poll(session, job_id)
+            if status is None:
+                return
+
+            state = status.get('status')
+            self.outcomes[state or 'unknown'] += 1
+            if state == 'completed' and self.args.download:
+                for image in status.get('outputs') or []:
+                    await self.download(session, image)
+            if state == 'completed':
+                self.latency['end_to_end'].append(time.perf_counter() - started)
+                self.completed_at.append(time.perf_counter())
+        except asyncio.TimeoutError:
+            self.error('timeout')
+        except (aiohttp.ClientError, ValueError, KeyError) as e:
+            self.error(type(e).__name__)
+
+    async def get_status(self, session: aiohttp.ClientSession, job_id: str) -> Optional[Dict]:
+        started = time.perf_counter()
+        async with session.get(f'{self.api_url}/api/status/{job_id}') as response:
+            body = await response.json(content_type=None)
+            self.latency['status'].append(time.perf_counter() - started)
+            if response.status != 200:
+                self.error(f'status HTTP {response.status}')
+                return None
+            return body
+
+    async def follow_poll(self, session: aiohttp.ClientSession, job_id: str) -> Optional[Dict]:
+        deadline = time.perf_counter() + self.args.job_timeout
+        while time.perf_counter() < deadline:
+            status = await self.get_status(session, job_id)
+            if status is None or status.get('status') in TERMINAL_STATES:
+                return status
+            await asyncio.sleep(self.args.poll_interval)
+        self.error('timeout')
+        return None
+
+    async def follow_stream(self, session: aiohttp.ClientSession, job_id: str) -> Optional[Dict]:
+        started = time.perf_counter()
+        url = f'{self.api_url}/api/stream/{job_id}'
+        timeout = aiohttp.ClientTimeout(total=self.args.job_timeout)
+        first = True
+        async with session.get(url, params={'previews': '0'}, timeout=timeout) as response:
+            if response.status != 200:
+                self.error(f'stream HTTP {response.status}')
+                return None
+            event = None
+            async for raw in response.content:
+                line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+                if line.startswith('event:'):
+                    event = line[6:].strip()
+                    if first:
+                        self.latency['stream_first_event'].append(time.perf_counter() - started)
+                        first = False
+                elif line.startswith('data:') and event in TERMINAL_STATES:
+                    break
+        # The terminal event carries the outputs; the status has them all in one place
+        return await self.get_status(session, job_id)
+
+    async def download(self, session: aiohttp.ClientSession, image: Dict):
+        url = image.get('url') or f"/api/image/{image['filename']}"
+        started = time.perf_counter()
+        async with session.get(f'{self.api_url}{url}') as response:
+            if response.status != 200:
+                return self.error(f'image HTTP {response.status}')
+            size = 0
+            async for chunk in response.content.iter_chunked(256 * 1024):
+                size += len(chunk)
+        self.latency['download'].append(time.perf_counter() - started)
+        self.images += 1
+        self.image_bytes += size
+
+    async def run(self) -> Dict:
+        args = self.args
+        total = args.requests or max(1, int(args.rps * args.duration))
+        rss = RssSampler(args.api_pid, args.rss_interval)
+        connector = aiohttp.TCPConnector(limit=args.connections)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=args.job_timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            sampler = asyncio.create_task(rss.run())
+            started = time.perf_counter()
+            tasks = []
+            for index in range(total):
+                delay = started + index / args.rps - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self.job(session, index)))
+            offered_seconds = time.perf_counter() - started
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+            sampler.cancel()
+        # One last sample after the load: memory the API kept
+        if args.api_pid and read_rss(args.api_pid):
+            rss.samples.append(read_rss(args.api_pid))
+
+        completed = len(self.completed_at)
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'label': args.label,
+            'config': {
+                'api_url': self.api_url, 'requests': total, 'rps': args.rps, 'follow': args.follow,
+                'download': args.download, 'workflow': args.workflow, 'steps': args.steps,
+                'size': args.size, 'cache': args.cache, 'python': platform.python_version(),
+            },
+            'latency': {name: summarize(values) for name, values in sorted(self.latency.items())},
+            'throughput': {
+                'offered_rps': round(args.rps, 3),
+                'achieved_rps': round((total - 1) / offered_seconds, 3) if total > 1 and offered_seconds else None,
+                'completed_per_second': round(completed / elapsed, 3) if elapsed else None,
+                'elapsed_seconds': round(elapsed, 2),
+                'images': self.images,
+                'image_mb_per_second': round(self.image_bytes / 1024 ** 2 / elapsed, 2) if elapsed else None,
+            },
+            'outcomes': dict(self.outcomes),
+            'errors': dict(self.errors),
+            'api_rss': rss.report(),
+        }
+
+
+# ============================================================================
+# Baselines
+# ============================================================================
+
+def compare(result: Dict, baseline: Dict) -> List[str]:
+    """One line per metric: baseline -> current (change)"""
+    def line(name, old, new, lower_is_better=True):
+        if old is None or new is None:
+            return None
+        change = (new - old) / old * 100 if old else 0.0
+        better = (change < 0) == lower_is_better
+        mark = '' if abs(change) < 5 else (' better' if better else ' WORSE')
+        return f'{name:<32} {old:>10.4f} -> {new:>10.4f} ({change:+.1f}%){mark}'
+
+    lines = []
+    for stage, stats in result['latency'].items():
+        old_stats = baseline.get('latency', {}).get(stage, {})
+        for q in ('p50', 'p95', 'p99'):
+            lines.append(line(f'latency.{stage}.{q}', old_stats.get(q), stats.get(q)))
+    lines.append(line('throughput.completed_per_second',
+                      baseline.get('throughput', {}).get('completed_per_second'),
+                      result['throughput'].get('completed_per_second'), lower_is_better=False))
+    lines.append(line('api_rss.max_mb', (baseline.get('api_rss') or {}).get('max_mb'),
+                      (result.get('api_rss') or {}).get('max_mb')))
+    return [entry for entry in lines if entry]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Load generator for the ComfyUI REST API')
+    parser.add_argument('--api-url', default=os.environ.get('API_URL', 'http://localhost:5000'))
+    parser.add_argument('--rps', type=float, default=1.0, help='Generations started per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of arrivals')
+    parser.add_argument('--requests', type=int, default=0, help='Total generations (overrides --duration)')
+    parser.add_argument('--follow', choices=('poll', 'stream'), default='poll')
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--no-download', dest='download', action='store_false', help='Skip image downloads')
+    parser.add_argument('--workflow', default=None, help='Workflow name (default: the API default)')
+    parser.add_argument('--steps', type=int, default=8)
+    parser.add_argument('--size', type=int, default=1024, help='Width and height')
+    parser.add_argument('--cache', action='store_true', help='Allow result cache hits (repeats seeds)')
+    parser.add_argument('--distinct-seeds', type=int, default=10, help='Seeds cycled with --cache')
+    parser.add_argument('--connections', type=int, default=256, help='Client connection pool size')
+    parser.add_argument('--job-timeout', type=float, default=600.0)
+    parser.add_argument('--api-pid', type=int, default=None, help='Sample the RSS of this process')
+    parser.add_argument('--rss-interval', type=float, default=0.5)
+    parser.add_argument('--label', default='', help='Free text stored in the report (version, branch)')
+    parser.add_argument('--output', help='Write the JSON report here as well')
+    parser.add_argument('--baseline', help='Earlier report to compare against')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for prompt selection')
+    args = parser.parse_args(argv)
+    if args.rps <= 0:
+        parser.error('--rps must be positive')
+
+    result = asyncio.run(LoadGenerator(args).run())
+    report = json.dumps(result, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nAgainst {args.baseline} ({baseline.get('label') or baseline.get('timestamp')}):", file=sys.stderr)
+        for entry in compare(result, baseline):
+            print(f'  {entry}', file=sys.stderr)
+
+    return 0 if not result['errors'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
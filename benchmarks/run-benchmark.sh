@@ -0,0 +1,99 @@
+#!/bin/bash
+################################################################################
+# REST API Benchmark
+################################################################################
+# Starts the fake ComfyUI server and the REST API against it in a throwaway
+# workspace, runs the load generator, and leaves the JSON report in
+# benchmarks/results/. No GPU or models needed.
+#
+# Usage:
+#   ./benchmarks/run-benchmark.sh [--async] [--baseline FILE] [-- LOAD_GENERATOR_ARGS...]
+#
+# Examples:
+#   ./benchmarks/run-benchmark.sh -- --rps 2 --duration 60 --follow stream
+#   ./benchmarks/run-benchmark.sh --async --baseline benchmarks/results/main.json
+#
+# Environment:
+#   FAKE_COMFYUI_ARGS  extra fake_comfyui.py arguments (default: "--step-delay 0.05")
+#   BENCH_API_PORT     API port (default: 5055)
+#   BENCH_COMFYUI_PORT fake ComfyUI port (default: 8199)
+################################################################################
+
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+REPO_DIR="$(dirname "$SCRIPT_DIR")"
+RESULTS_DIR="${SCRIPT_DIR}/results"
+API_PORT="${BENCH_API_PORT:-5055}"
+COMFYUI_PORT="${BENCH_COMFYUI_PORT:-8199}"
+FAKE_COMFYUI_ARGS="${FAKE_COMFYUI_ARGS:---step-delay 0.05}"
+API_SERVER=flask
+BASELINE=""
+LOAD_ARGS=()
+
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --async) API_SERVER=async; shift ;;
+        --baseline) BASELINE="$2"; shift 2 ;;
+        --) shift; LOAD_ARGS=("$@"); break ;;
+        *) echo "Unknown option: $1" >&2; exit 1 ;;
+    esac
+done
+
+WORKSPACE="$(mktemp -d -t comfyapi-bench-XXXXXX)"
+mkdir -p "${WORKSPACE}/ComfyUI/output" "$RESULTS_DIR"
+REPORT="${RESULTS_DIR}/$(date +%Y%m%d_%H%M%S)-${API_SERVER}.json"
+COMFYUI_PID=""
+API_PID=""
+
+cleanup() {
+    [ -n "$API_PID" ] && kill "$API_PID" 2>/dev/null || true
+    [ -n "$COMFYUI_PID" ] && kill "$COMFYUI_PID" 2>/dev/null || true
+    wait 2>/dev/null || true
+    rm -rf "$WORKSPACE"
+}
+trap cleanup EXIT
+
+wait_for() {
+    local name=$1 url=$2
+    for _ in $(seq 1 60); do
+        if curl -s -o /dev/null "$url"; then
+            echo "✅ ${name} is up"
+            return 0
+        fi
+        sleep 0.5
+    done
+    echo "❌ ${name} did not start (see ${WORKSPACE}/*.log)" >&2
+    tail -n 20 "${WORKSPACE}"/*.log >&2 || true
+    return 1
+}
+
+echo "🧪 Fake ComfyUI on :${COMFYUI_PORT} (${FAKE_COMFYUI_ARGS})"
+# shellcheck disable=SC2086
+python3 "${SCRIPT_DIR}/fake_comfyui.py" --port "$COMFYUI_PORT" \
+    --output-dir "${WORKSPACE}/ComfyUI/output" --temp-dir "${WORKSPACE}/ComfyUI/temp" \
+    $FAKE_COMFYUI_ARGS > "${WORKSPACE}/fake_comfyui.log" 2>&1 &
+COMFYUI_PID=$!
+wait_for "Fake ComfyUI" "http://127.0.0.1:${COMFYUI_PORT}/system_stats"
+
+# Admission limits off: the load generator is a single client
+API_SCRIPT=comfyui_rest_api.py
+[ "$API_SERVER" = "async" ] && API_SCRIPT=async_server.py
+echo "🚀 REST API (${API_SERVER}) on :${API_PORT}"
+(
+    cd "${REPO_DIR}/api"
+    exec env WORKSPACE_PATH="$WORKSPACE" COMFYUI_HOST=127.0.0.1 COMFYUI_PORT="$COMFYUI_PORT" \
+        API_HOST=127.0.0.1 API_PORT="$API_PORT" ADMISSION_RATE=0 ADMISSION_MAX_QUEUE=0 \
+        python3 "$API_SCRIPT"
+) > "${WORKSPACE}/api.log" 2>&1 &
+API_PID=$!
+wait_for "REST API" "http://127.0.0.1:${API_PORT}/api/health"
+
+echo "📈 Load: ${LOAD_ARGS[*]:-defaults}"
+STATUS=0
+python3 "${SCRIPT_DIR}/load_generator.py" --api-url "http://127.0.0.1:${API_PORT}" \
+    --api-pid "$API_PID" --label "$(git -C "$REPO_DIR" describe --always --dirty 2>/dev/null || echo unknown)-${API_SERVER}" \
+    --output "$REPORT" ${BASELINE:+--baseline "$BASELINE"} "${LOAD_ARGS[@]}" || STATUS=$?
+
+echo "📄 Report: ${REPORT}"
+exit $STATUS
@@ -0,0 +1,12 @@
+"""
+ComfyUI-Batch-Items
+
+Per-item prompts and seeds within one latent batch: BatchCLIPTextEncode,
+BatchKSampler and BatchRandomNoise. Shipped in the image and copied to
+ComfyUI/custom_nodes by start.sh; the REST API's micro-batcher merges
+requests with different prompts and seeds once ComfyUI reports the nodes.
+"""
+
+from .nodes import NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS
+
+__all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS']
@@ -0,0 +1,302 @@
+"""
+Per-item prompts and seeds in one latent batch
+
+ComfyUI's stock nodes share one conditioning and one noise seed across a
+latent batch. The REST API's micro-batcher merges requests that differ in
+prompt and seed into one prompt by rendering these drop-in replacements,
+each taking the stock node's inputs plus a JSON list with one value per
+batch item:
+
+    BatchCLIPTextEncode   CLIPTextEncode + texts   one conditioning per item
+                          (+ cache: encode through ComfyUI-Conditioning-Cache)
+    BatchKSampler         KSampler + seeds         item i gets the noise of seeds[i]
+    BatchRandomNoise      RandomNoise + seeds      same, for SamplerCustomAdvanced
+
+Item i's initial noise is exactly what a single generation with seeds[i]
+uses. Two more things would make an item differ from its single-generation
+result, and BatchKSampler avoids both by sampling the batch in groups:
+texts that encode to different lengths are zero-padded into one
+conditioning, so each group shares one text length and is sampled with the
+padding cut off; samplers that draw noise while sampling (ancestral, SDE)
+draw it for the whole batch, so with those every item is its own group.
+BatchRandomNoise cannot split the batch: behind SamplerCustomAdvanced its
+items only reproduce with equal texts and a sampler that draws no noise,
+which is all the REST API merges there. An empty list falls back to the
+stock behaviour.
+"""
+
+import json
+import sys
+from collections import OrderedDict
+
+import torch
+
+import comfy.sample
+import comfy.samplers
+import comfy.utils
+import latent_preview
+
+
+def _json_list(text: str, kind, name: str) -> list:
+    if not text or not text.strip():
+        return []
+    values = json.loads(text)
+    if not isinstance(values, list) or not all(isinstance(v, kind) for v in values):
+        raise ValueError(f'{name} must be a JSON list of {kind.__name__} values')
+    return values
+
+
+def _per_item(values: list, default, size: int, name: str) -> list:
+    """One value per batch item; an empty list repeats default"""
+    if not values:
+        return [default] * size
+    if len(values) != size:
+        raise ValueError(f'{name} has {len(values)} values for a batch of {size}')
+    return values
+
+
+def batch_noise(latent: torch.Tensor, seeds: list) -> torch.Tensor:
+    """Initial noise whose item i is that of a batch of one seeded with seeds[i]"""
+    return torch.cat([
+        comfy.sample.prepare_noise(latent[index:index + 1], seed)
+        for index, seed in enumerate(seeds)
+    ])
+
+
+# Conditioning option listing each item's text length, set when they differ
+ITEM_LENGTHS = 'batch_item_lengths'
+
+# Samplers that draw fresh noise while sampling (keep in step with the REST
+# API's workflow_templates.stochastic_sampler)
+STOCHASTIC_SAMPLERS = frozenset({'ddpm', 'lcm', 'restart', 'seeds_2', 'seeds_3', 'sa_solver', 'sa_solver_pece'})
+
+
+def stochastic_sampler(name: str) -> bool:
+    return 'ancestral' in name or 'sde' in name or name in STOCHASTIC_SAMPLERS
+
+
+# sys.modules name of ComfyUI-Conditioning-Cache's nodes module (MODULE_ALIAS there)
+CONDITIONING_CACHE_MODULE = 'comfyui_conditioning_cache'
+
+
+def encode_text(clip, text: str, cache: bool):
+    """A text's conditioning, through the conditioning cache when asked for
+    and installed"""
+    conditioning_cache = sys.modules.get(CONDITIONING_CACHE_MODULE) if cache else None
+    if conditioning_cache is not None:
+        return conditioning_cache.encode_text(clip, text)
+    return clip.encode_from_tokens_scheduled(clip.tokenize(text))
+
+
+def _pad_tokens(tensor: torch.Tensor, length: int) -> torch.Tensor:
+    if tensor.ndim < 2 or tensor.shape[1] == length:
+        return tensor
+    padding = torch.zeros((tensor.shape[0], length - tensor.shape[1]) + tuple(tensor.shape[2:]),
+                          dtype=tensor.dtype, device=tensor.device)
+    return torch.cat((tensor, padding), dim=1)
+
+
+def batch_conditioning(items: list) -> list:
+    """Stack single-entry conditionings along the batch dimension"""
+    if any(len(conditioning) != 1 for conditioning in items):
+        raise ValueError('BatchCLIPTextEncode needs one conditioning entry per text (no prompt scheduling)')
+    conds = [conditioning[0][0] for conditioning in items]
+    lengths = [cond.shape[1] for cond in conds]
+    length = max(lengths)
+    cond = torch.cat([_pad_tokens(c, length) for c in conds])
+
+    extras = dict(items[0][0][1])
+    for name, value in extras.items():
+        if isinstance(value, torch.Tensor):
+            values = [conditioning[0][1][name] for conditioning in items]
+            if name == 'attention_mask':
+                values = [_pad_tokens(v, length) for v in values]
+            extras[name] = torch.cat(values)
+    if len(set(lengths)) > 1:
+        extras[ITEM_LENGTHS] = lengths
+    return [[cond, extras]]
+
+
+def select_items(conditioning: list, indices: list, size: int) -> list:
+    """The given batch items of a conditioning, cut to their text length;
+    entries not batched over size items are shared and kept whole"""
+    selected = []
+    for cond, extras in conditioning:
+        extras = dict(extras)
+        lengths = extras.pop(ITEM_LENGTHS, None)
+        if size > 1 and cond.shape[0] == size:
+            length = lengths[indices[0]] if lengths else cond.shape[1]
+            cond = cond[indices, :length]
+            for name, value in extras.items():
+                if isinstance(value, torch.Tensor) and value.ndim and value.shape[0] == size:
+                    value = value[indices]
+                    extras[name] = value[:, :length] if name == 'attention_mask' else value
+        selected.append([cond, extras])
+    return selected
+
+
+def sample_groups(positive: list, negative: list, seeds: list, sampler_name: str) -> list:
+    """Item indices to sample together: equal text lengths, and alone with a
+    sampler that draws noise while sampling"""
+    def lengths(conditioning):
+        found = [extras.get(ITEM_LENGTHS) for _, extras in conditioning]
+        return [tuple(entry[index] if entry else None for entry in found) for index in range(len(seeds))]
+
+    if stochastic_sampler(sampler_name) and len(set(seeds)) > 1:
+        return [[index] for index in range(len(seeds))]
+    groups = OrderedDict()
+    for index, key in enumerate(zip(lengths(positive), lengths(negative))):
+        groups.setdefault(key, []).append(index)
+    return list(groups.values())
+
+
+class BatchCLIPTextEncode:
+    """CLIPTextEncode with one text per batch item"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "text": ("STRING", {"multiline": True, "dynamicPrompts": True,
+                                    "tooltip": "Text for every item when texts is empty."}),
+                "clip": ("CLIP",),
+                "texts": ("STRING", {"multiline": True, "default": "",
+                                     "tooltip": "JSON list with one text per batch item."}),
+            },
+            "optional": {
+                "cache": ("BOOLEAN", {"default": False,
+                                      "tooltip": "Reuse conditioning cached by CLIP Text Encode (Cached)."}),
+            }
+        }
+
+    RETURN_TYPES = ("CONDITIONING",)
+    FUNCTION = "encode"
+    CATEGORY = "conditioning"
+    DESCRIPTION = "Encodes one prompt per latent batch item into a batched conditioning."
+
+    def encode(self, clip, text, texts, cache=False):
+        if clip is None:
+            raise RuntimeError("ERROR: clip input is invalid: None")
+        items = _json_list(texts, str, 'texts') or [text]
+        encoded = {}
+        for item in items:
+            if item not in encoded:
+                encoded[item] = encode_text(clip, item, cache)
+        if len(encoded) == 1:
+            return (encoded[items[0]],)
+        return (batch_conditioning([encoded[item] for item in items]),)
+
+
+class BatchKSampler:
+    """KSampler with one seed per batch item"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "model": ("MODEL",),
+                "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff, "control_after_generate": True}),
+                "steps": ("INT", {"default": 20, "min": 1, "max": 10000}),
+                "cfg": ("FLOAT", {"default": 8.0, "min": 0.0, "max": 100.0, "step": 0.1, "round": 0.01}),
+                "sampler_name": (comfy.samplers.KSampler.SAMPLERS,),
+                "scheduler": (comfy.samplers.KSampler.SCHEDULERS,),
+                "positive": ("CONDITIONING",),
+                "negative": ("CONDITIONING",),
+                "latent_image": ("LATENT",),
+                "denoise": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01}),
+                "seeds": ("STRING", {"default": "", "tooltip": "JSON list with one seed per batch item."}),
+            }
+        }
+
+    RETURN_TYPES = ("LATENT",)
+    FUNCTION = "sample"
+    CATEGORY = "sampling"
+    DESCRIPTION = "KSampler whose batch items each start from the noise of their own seed."
+
+    def sample(self, model, seed, steps, cfg, sampler_name, scheduler, positive, negative,
+               latent_image, denoise=1.0, seeds=""):
+        latent = latent_image["samples"]
+        if hasattr(comfy.sample, 'fix_empty_latent_channels'):
+            latent = comfy.sample.fix_empty_latent_channels(model, latent)
+
+        size = latent.shape[0]
+        noise_mask = latent_image.get("noise_mask")
+
+        def run(noise, latent, positive, negative, noise_mask, seed):
+            callback = latent_preview.prepare_callback(model, steps)
+            return comfy.sample.sample(
+                model, noise, steps, cfg, sampler_name, scheduler, positive, negative, latent,
+                denoise=denoise, noise_mask=noise_mask, callback=callback,
+                disable_pbar=not comfy.utils.PROGRESS_BAR_ENABLED, seed=seed
+            )
+
+        out = latent_image.copy()
+        if "batch_index" in latent_image:
+            # Items picked from a larger batch keep the stock noise layout
+            noise = comfy.sample.prepare_noise(latent, seed, latent_image["batch_index"])
+            out["samples"] = run(noise, latent, select_items(positive, list(range(size)), 1),
+                                 select_items(negative, list(range(size)), 1), noise_mask, seed)
+            return (out,)
+
+        item_seeds = _per_item(_json_list(seeds, int, 'seeds'), seed, size, 'seeds')
+        samples = [None] * size
+        for indices in sample_groups(positive, negative, item_seeds, sampler_name):
+            mask = noise_mask
+            if isinstance(mask, torch.Tensor) and size > 1 and mask.shape[0] == size:
+                mask = mask[indices]
+            result = run(
+                batch_noise(latent[indices], [item_seeds[index] for index in indices]), latent[indices],
+                select_items(positive, indices, size), select_items(negative, indices, size),
+                mask, item_seeds[indices[0]]
+            )
+            for offset, index in enumerate(indices):
+                samples[index] = result[offset:offset + 1]
+        out["samples"] = torch.cat(samples)
+        return (out,)
+
+
+class _BatchNoise:
+    """NOISE for SamplerCustomAdvanced with one seed per batch item"""
+
+    def __init__(self, seed: int, seeds: list):
+        self.seed = seed
+        self.seeds = seeds
+
+    def generate_noise(self, input_latent):
+        latent = input_latent["samples"]
+        if "batch_index" in input_latent or not self.seeds:
+            return comfy.sample.prepare_noise(latent, self.seed, input_latent.get("batch_index"))
+        return batch_noise(latent, _per_item(self.seeds, self.seed, latent.shape[0], 'seeds'))
+
+
+class BatchRandomNoise:
+    """RandomNoise with one seed per batch item"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "noise_seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff, "control_after_generate": True}),
+                "seeds": ("STRING", {"default": "", "tooltip": "JSON list with one seed per batch item."}),
+            }
+        }
+
+    RETURN_TYPES = ("NOISE",)
+    FUNCTION = "get_noise"
+    CATEGORY = "sampling/custom_sampling/noise"
+
+    def get_noise(self, noise_seed, seeds):
+        return (_BatchNoise(noise_seed, _json_list(seeds, int, 'seeds')),)
+
+
+NODE_CLASS_MAPPINGS = {
+    "BatchCLIPTextEncode": BatchCLIPTextEncode,
+    "BatchKSampler": BatchKSampler,
+    "BatchRandomNoise": BatchRandomNoise,
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "BatchCLIPTextEncode": "CLIP Text Encode (Batch Items)",
+    "BatchKSampler": "KSampler (Batch Seeds)",
+    "BatchRandomNoise": "Random Noise (Batch Seeds)",
+}
@@ -0,0 +1,32 @@
+"""
+ComfyUI-Conditioning-Cache
+
+CLIP Text Encode (Cached): persistent text-encoder conditioning cache.
+Shipped in the image and copied to ComfyUI/custom_nodes by start.sh; the
+REST API swaps CLIPTextEncode for it once ComfyUI reports the node.
+
+    GET /conditioning_cache/stats   entries, RAM/disk use, hits and misses
+"""
+
+import sys
+
+from . import nodes
+from .nodes import MODULE_ALIAS, NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS, STORE, install_loader_hooks
+
+# Before any workflow runs, so every CLIP loaded from here on knows its files
+install_loader_hooks()
+
+# BatchCLIPTextEncode encodes through the same cache
+sys.modules.setdefault(MODULE_ALIAS, nodes)
+
+try:
+    from aiohttp import web
+    from server import PromptServer
+
+    @PromptServer.instance.routes.get('/conditioning_cache/stats')
+    async def conditioning_cache_stats(request):
+        return web.json_response(STORE.stats())
+except (ImportError, AttributeError):
+    pass
+
+__all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS']
@@ -0,0 +1,307 @@
+"""
+CachedCLIPTextEncode: CLIPTextEncode with a persistent conditioning cache
+
+Encoding a prompt with the FLUX.2 (Mistral) or Qwen text encoders costs
+seconds per prompt. ComfyUI only skips the encoder while the text stays
+the same from one prompt to the next; this node remembers every
+conditioning it produced, across prompts and restarts.
+
+The cache key is a SHA-256 of
+    - the text encoder: the weights files it was loaded from (their
+      safetensors header, size and mtime, hashed once per file) plus the
+      names, shapes and dtypes of its tensors
+    - the patches applied to it (LoRA clip strengths and a sample of the
+      LoRA weights they scale)
+    - the CLIP layer and tokenizer options (CLIPSetLastLayer and the like)
+    - the prompt text
+Both fingerprints are computed once per loaded encoder / LoRA stack.
+
+A CLIP object does not know its files, so comfy.sd.load_clip and
+load_checkpoint_guess_config (used by CLIPLoader, DualCLIPLoader and the
+checkpoint loaders) are wrapped to record them. An encoder loaded any other
+way is identified by a sample of 96 values per tensor instead: two
+fine-tunes of one encoder that agree on every sampled value would share
+entries. Clear the cache directory after swapping such encoders.
+
+Environment:
+    CONDITIONING_CACHE_DIR      safetensors store (default: /workspace/cache/conditioning,
+                                empty keeps the cache in RAM only)
+    CONDITIONING_CACHE_RAM_MB   in-RAM LRU budget (default: 2048)
+    CONDITIONING_CACHE_DISK_MB  on-disk budget (default: 20480)
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+
+import torch
+
+from .store import ConditioningStore
+
+KEY_VERSION = 2
+
+# Values sampled from each weight tensor at its start, middle and end
+SAMPLE = 32
+
+# Largest safetensors header hashed; other files hash their first bytes
+MAX_HEADER_BYTES = 100 * 1024 ** 2
+HEAD_BYTES = 1024 ** 2
+
+CACHE_DIR = os.environ.get('CONDITIONING_CACHE_DIR', '/workspace/cache/conditioning')
+RAM_MB = float(os.environ.get('CONDITIONING_CACHE_RAM_MB', 2048))
+DISK_MB = float(os.environ.get('CONDITIONING_CACHE_DISK_MB', 20480))
+
+STORE = ConditioningStore(CACHE_DIR or None, int(RAM_MB * 1024 ** 2), int(DISK_MB * 1024 ** 2))
+
+# Name other node packages import this module by (ComfyUI loads custom nodes
+# under their directory path, which is not a stable module name)
+MODULE_ALIAS = 'comfyui_conditioning_cache'
+
+
+# ============================================================================
+# Fingerprints
+# ============================================================================
+
+def _sample(tensor: torch.Tensor) -> bytes:
+    """A few values of a tensor as float32 bytes"""
+    try:
+        flat = tensor.detach().reshape(-1)
+        n = flat.numel()
+        if n > 3 * SAMPLE:
+            middle = n // 2
+            flat = torch.cat((flat[:SAMPLE], flat[middle:middle + SAMPLE], flat[-SAMPLE:]))
+        return flat.to('cpu', torch.float32).numpy().tobytes()
+    except Exception:
+        # Quantized and other wrapper tensors: shape and dtype only
+        return b''
+
+
+def _update(digest, value, depth: int = 0):
+    """Feed patch contents (tensors, tuples, weight adapters) into a hash"""
+    if depth > 8:
+        return
+    if isinstance(value, torch.Tensor):
+        digest.update(f'{tuple(value.shape)}:{value.dtype}'.encode())
+        digest.update(_sample(value))
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'[{len(value)}'.encode())
+        for item in value:
+            _update(digest, item, depth + 1)
+    elif isinstance(value, (type(None), bool, int, float, str)):
+        digest.update(repr(value).encode())
+    elif hasattr(value, 'weights'):
+        # comfy.weight_adapter (LoRAAdapter, LoHaAdapter, ...)
+        digest.update(type(value).__name__.encode())
+        _update(digest, value.weights, depth + 1)
+    elif callable(value):
+        digest.update(getattr(value, '__qualname__', type(value).__name__).encode())
+    else:
+        digest.update(type(value).__name__.encode())
+
+
+_file_fingerprints = {}
+_file_lock = threading.Lock()
+
+
+def file_fingerprint(path: str) -> str:
+    """Hash of a weights file's safetensors header, size and mtime, cached per
+    path until the file changes"""
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    with _file_lock:
+        fingerprint = _file_fingerprints.get(key)
+    if fingerprint is not None:
+        return fingerprint
+
+    digest = hashlib.sha256(f'{st.st_size}:{st.st_mtime_ns}'.encode())
+    with open(path, 'rb') as f:
+        head = f.read(8)
+        length = struct.unpack('<Q', head)[0] if len(head) == 8 else 0
+        if path.endswith('.safetensors') and 0 < length <= MAX_HEADER_BYTES:
+            digest.update(f.read(length))
+        else:
+            digest.update(head + f.read(HEAD_BYTES))
+    fingerprint = digest.hexdigest()
+    with _file_lock:
+        _file_fingerprints[key] = fingerprint
+    return fingerprint
+
+
+def _record_files(clip, paths):
+    """Remember the files a CLIP was loaded from on its (shared) encoder model"""
+    model = getattr(clip, 'cond_stage_model', None)
+    if model is None or not paths:
+        return
+    try:
+        model._conditioning_cache_files = [file_fingerprint(str(path)) for path in paths]
+    except OSError as e:
+        logging.warning(f'[Conditioning Cache] Cannot fingerprint {paths}: {e}')
+
+
+def install_loader_hooks():
+    """Wrap comfy.sd's CLIP loaders to record the files they read (idempotent)"""
+    import comfy.sd
+
+    if getattr(comfy.sd, '_conditioning_cache_hooked', False):
+        return
+
+    load_clip = comfy.sd.load_clip
+
+    @functools.wraps(load_clip)
+    def hooked_load_clip(*args, **kwargs):
+        clip = load_clip(*args, **kwargs)
+        _record_files(clip, kwargs.get('ckpt_paths', args[0] if args else None))
+        return clip
+
+    load_checkpoint = comfy.sd.load_checkpoint_guess_config
+
+    @functools.wraps(load_checkpoint)
+    def hooked_load_checkpoint(*args, **kwargs):
+        out = load_checkpoint(*args, **kwargs)
+        path = kwargs.get('ckpt_path', args[0] if args else None)
+        if path is not None and len(out) > 1:
+            _record_files(out[1], [path])
+        return out
+
+    comfy.sd.load_clip = hooked_load_clip
+    comfy.sd.load_checkpoint_guess_config = hooked_load_checkpoint
+    comfy.sd._conditioning_cache_hooked = True
+
+
+def encoder_fingerprint(clip) -> str:
+    """Hash of the text encoder, cached on the model object
+
+    Keyed by the recorded weights files when the encoder came through a
+    hooked loader, else by sampled weight values (see the module docstring).
+    """
+    model = clip.cond_stage_model
+    fingerprint = getattr(model, '_conditioning_cache_fingerprint', None)
+    if fingerprint is None:
+        files = getattr(model, '_conditioning_cache_files', None)
+        digest = hashlib.sha256(type(model).__name__.encode())
+        digest.update(json.dumps(files).encode())
+        for name, tensor in model.state_dict().items():
+            digest.update(name.encode())
+            if files:
+                digest.update(f'{tuple(tensor.shape)}:{tensor.dtype}'.encode())
+            else:
+                _update(digest, tensor)
+        fingerprint = digest.hexdigest()
+        model._conditioning_cache_fingerprint = fingerprint
+    return fingerprint
+
+
+def patches_fingerprint(clip) -> str:
+    """Hash of the patches (LoRAs and their clip strengths) on the encoder,
+    cached on the patcher until its patches change"""
+    patcher = clip.patcher
+    patches = getattr(patcher, 'patches', None) or {}
+    if not patches:
+        return 'none'
+    version = getattr(patcher, 'patches_uuid', None)
+    cached = getattr(patcher, '_conditioning_cache_patches', None)
+    if cached is not None and version is not None and cached[0] == version:
+        return cached[1]
+    digest = hashlib.sha256()
+    for key in sorted(patches, key=str):
+        digest.update(str(key).encode())
+        # (strength_patch, patch, strength_model, offset, function)
+        for patch in patches[key]:
+            _update(digest, tuple(patch))
+    fingerprint = digest.hexdigest()
+    patcher._conditioning_cache_patches = (version, fingerprint)
+    return fingerprint
+
+
+def cache_key(clip, text: str):
+    """Key of a prompt's conditioning, None when it must not be cached"""
+    # Hooks and prompt scheduling make the conditioning depend on more than the text
+    if getattr(clip, 'apply_hooks_to_conds', None) or getattr(clip, 'use_clip_schedule', False):
+        return None
+    options = json.dumps({
+        'layer_idx': getattr(clip, 'layer_idx', None),
+        'tokenizer_options': getattr(clip, 'tokenizer_options', None) or {},
+    }, sort_keys=True, default=repr)
+    digest = hashlib.sha256()
+    for part in (str(KEY_VERSION), encoder_fingerprint(clip), patches_fingerprint(clip), options, text):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _to_device(conditioning, device):
+    return [
+        [cond.to(device), {k: v.to(device) if isinstance(v, torch.Tensor) else v for k, v in extras.items()}]
+        for cond, extras in conditioning
+    ]
+
+
+# ============================================================================
+# Node
+# ============================================================================
+
+class CachedCLIPTextEncode:
+    """Drop-in replacement for CLIPTextEncode (same inputs and output)"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "text": ("STRING", {"multiline": True, "dynamicPrompts": True,
+                                    "tooltip": "The text to be encoded."}),
+                "clip": ("CLIP", {"tooltip": "The CLIP model used for encoding the text."}),
+            }
+        }
+
+    RETURN_TYPES = ("CONDITIONING",)
+    OUTPUT_TOOLTIPS = ("A conditioning containing the embedded text used to guide the diffusion model.",)
+    FUNCTION = "encode"
+    CATEGORY = "conditioning"
+    DESCRIPTION = ("Encodes a text prompt like CLIP Text Encode, reusing conditioning cached in RAM "
+                   "and on disk for the same encoder, LoRA clip strength and text.")
+
+    def encode(self, clip, text):
+        if clip is None:
+            raise RuntimeError(
+                "ERROR: clip input is invalid: None\n\nIf the clip is from a checkpoint loader node "
+                "your checkpoint does not contain a valid clip or text encoder model."
+            )
+        return (encode_text(clip, text),)
+
+
+def encode_text(clip, text: str):
+    """A prompt's conditioning, from the cache when it has been encoded before
+
+    Also used by BatchCLIPTextEncode (custom_nodes/ComfyUI-Batch-Items),
+    which finds this module as sys.modules[MODULE_ALIAS].
+    """
+    try:
+        key = cache_key(clip, text)
+    except Exception as e:
+        logging.warning(f'[Conditioning Cache] No cache key, encoding uncached: {e}')
+        key = None
+
+    if key is not None:
+        conditioning = STORE.get(key)
+        if conditioning is not None:
+            import comfy.model_management
+            return _to_device(conditioning, comfy.model_management.intermediate_device())
+
+    tokens = clip.tokenize(text)
+    conditioning = clip.encode_from_tokens_scheduled(tokens)
+    if key is not None:
+        STORE.put(key, conditioning)
+    return conditioning
+
+
+NODE_CLASS_MAPPINGS = {
+    "CachedCLIPTextEncode": CachedCLIPTextEncode,
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "CachedCLIPTextEncode": "CLIP Text Encode (Cached)",
+}
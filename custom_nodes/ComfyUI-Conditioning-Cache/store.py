@@ -0,0 +1,253 @@
+"""
+Conditioning store: an in-RAM LRU over safetensors files
+
+An entry is the CONDITIONING a text encoder returns, a list of
+[tensor, extras] pairs, under a hex key. On disk each entry is one
+safetensors file; the tensors (cond and the tensor-valued extras such as
+pooled_output) are its tensors and the rest of the layout is JSON in its
+metadata:
+
+    <directory>/<key[:2]>/<key>.safetensors
+
+Disk hits are read through safe_open, which memory-maps the file, and then
+held in the RAM LRU. Files are written to a temporary name and renamed into
+place, so several ComfyUI processes (one per GPU) can share a directory.
+Above max_disk_bytes the files used longest ago (mtime, touched on every
+hit) are removed.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import torch
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+FORMAT = 'conditioning-cache/1'
+
+# Extras that are not tensors must survive a JSON round trip
+JSON_TYPES = (type(None), bool, int, float, str)
+
+
+class Uncacheable(Exception):
+    """Conditioning with extras that cannot be stored"""
+
+
+def _json_value(value):
+    if isinstance(value, JSON_TYPES):
+        return value
+    if isinstance(value, (list, tuple)) and all(isinstance(v, JSON_TYPES) for v in value):
+        return list(value)
+    raise Uncacheable(type(value).__name__)
+
+
+def split(conditioning: List) -> tuple:
+    """(tensors, layout) of a conditioning list; raises Uncacheable"""
+    tensors = {}
+    layout = []
+    for index, (cond, extras) in enumerate(conditioning):
+        tensors[f'{index}.cond'] = cond
+        entry = {'tensors': [], 'values': {}}
+        for name, value in extras.items():
+            if isinstance(value, torch.Tensor):
+                tensors[f'{index}.{name}'] = value
+                entry['tensors'].append(name)
+            else:
+                entry['values'][name] = _json_value(value)
+        layout.append(entry)
+    return tensors, layout
+
+
+def join(tensors: dict, layout: List) -> List:
+    """Fresh conditioning list from stored tensors (tensors are shared)"""
+    conditioning = []
+    for index, entry in enumerate(layout):
+        extras = dict(entry['values'])
+        extras.update((name, tensors[f'{index}.{name}']) for name in entry['tensors'])
+        conditioning.append([tensors[f'{index}.cond'], extras])
+    return conditioning
+
+
+class _Entry:
+    __slots__ = ('tensors', 'layout', 'size')
+
+    def __init__(self, tensors: dict, layout: List):
+        self.tensors = tensors
+        self.layout = layout
+        self.size = sum(t.numel() * t.element_size() for t in tensors.values())
+
+
+class ConditioningStore:
+    """RAM LRU of conditioning, backed by a directory of safetensors files"""
+
+    def __init__(self, directory: Optional[str], max_ram_bytes: int, max_disk_bytes: int):
+        self.directory = directory
+        self.max_ram_bytes = max_ram_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ram_bytes = 0
+        self.disk_bytes: Optional[int] = None    # scanned on the first write
+        self.hits = {'ram': 0, 'disk': 0}
+        self.misses = 0
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}.safetensors')
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[List]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits['ram'] += 1
+                return join(entry.tensors, entry.layout)
+
+        entry = self._read(key) if self.directory else None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits['disk'] += 1
+        self._remember(key, entry)
+        return join(entry.tensors, entry.layout)
+
+    def _read(self, key: str) -> Optional[_Entry]:
+        path = self.path(key)
+        try:
+            with safe_open(path, framework='pt', device='cpu') as f:
+                metadata = f.metadata() or {}
+                if metadata.get('format') != FORMAT:
+                    return None
+                tensors = {name: f.get_tensor(name) for name in f.keys()}
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f'[Conditioning Cache] Unreadable entry {path}: {e}')
+            return None
+        return _Entry(tensors, json.loads(metadata['layout']))
+
+    # ------------------------------------------------------------------
+    # Insertion
+    # ------------------------------------------------------------------
+
+    def put(self, key: str, conditioning: List) -> bool:
+        """Store a conditioning list; False when it cannot be cached"""
+        try:
+            tensors, layout = split(conditioning)
+        except (Uncacheable, TypeError, ValueError) as e:
+            logging.debug(f'[Conditioning Cache] Not caching conditioning: {e}')
+            return False
+        entry = _Entry({name: t.detach().to('cpu').contiguous() for name, t in tensors.items()}, layout)
+        self._remember(key, entry)
+        if self.directory:
+            self._write(key, entry)
+        return True
+
+    def _remember(self, key: str, entry: _Entry):
+        if entry.size > self.max_ram_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.ram_bytes -= previous.size
+            self._entries[key] = entry
+            self.ram_bytes += entry.size
+            while self.ram_bytes > self.max_ram_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.ram_bytes -= evicted.size
+
+    def _write(self, key: str, entry: _Entry):
+        path = self.path(key)
+        partial = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Own storage per tensor: safetensors refuses tensors sharing memory
+            save_file({name: t.clone() for name, t in entry.tensors.items()}, partial,
+                      metadata={'format': FORMAT, 'layout': json.dumps(entry.layout)})
+            size = os.path.getsize(partial)
+            os.replace(partial, path)
+        except Exception as e:
+            logging.warning(f'[Conditioning Cache] Could not write {path}: {e}')
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = self._scan()
+            else:
+                self.disk_bytes += size
+            over = self.disk_bytes > self.max_disk_bytes
+        if over:
+            self._prune()
+
+    # ------------------------------------------------------------------
+    # Disk budget
+    # ------------------------------------------------------------------
+
+    def _files(self) -> List[os.DirEntry]:
+        files = []
+        try:
+            shards = [d for d in os.scandir(self.directory) if d.is_dir()]
+        except FileNotFoundError:
+            return files
+        for shard in shards:
+            try:
+                files.extend(f for f in os.scandir(shard.path) if f.name.endswith('.safetensors'))
+            except FileNotFoundError:
+                continue
+        return files
+
+    def _scan(self) -> int:
+        total = 0
+        for f in self._files():
+            try:
+                total += f.stat().st_size
+            except FileNotFoundError:
+                continue
+        return total
+
+    def _prune(self):
+        """Remove the least recently used files down to 90% of the budget"""
+        files = []
+        for f in self._files():
+            try:
+                stat = f.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, f.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * 0.9
+        removed = 0
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self.disk_bytes = total
+        logging.info(f'[Conditioning Cache] Pruned {removed} entries, {total / 1024 ** 2:.0f} MB on disk')
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'ram_mb': round(self.ram_bytes / 1024 ** 2, 1),
+                'disk_mb': None if self.disk_bytes is None else round(self.disk_bytes / 1024 ** 2, 1),
+                'hits': dict(self.hits),
+                'misses': self.misses,
+            }
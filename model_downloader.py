@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+"""
+Parallel, resumable, verified FLUX.2 model downloads from Hugging Face.
+
+Shared by the image build (download-models-build.py) and pod startup
+(start.sh). Every file is split into ranges fetched over several
+connections at once, and files download concurrently, smallest first, so
+small models are usable early:
+
+    - Data is written straight into MODEL.part next to its final location
+      (no temp directory, no move across filesystems) and renamed when done.
+    - Finished ranges are recorded in MODEL.part.json, so an interrupted
+      download resumes where it stopped.
+    - Size and SHA256 are checked against the Hugging Face metadata before
+      the rename.
+    - --max-bandwidth caps the total rate over all connections.
+    - A JSON manifest records every file (size, sha256, commit, status) and
+      is rewritten while downloads run, so the REST API can tell which
+      workflows already have their models (see api/model_readiness.py).
+
+Usage:
+    python3 model_downloader.py --models-dir /workspace/ComfyUI/models --select dev
+    python3 model_downloader.py --select all --connections 16 --max-bandwidth 200M
+
+Environment: HF_TOKEN (gated/private repos), HF_ENDPOINT (default
+https://huggingface.co), MODEL_DOWNLOAD_CONNECTIONS, MODEL_DOWNLOAD_BANDWIDTH.
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import quote, urljoin
+
+HF_ENDPOINT = os.environ.get('HF_ENDPOINT', 'https://huggingface.co').rstrip('/')
+
+# Bytes per range request (also the resume granularity)
+CHUNK_SIZE = 64 * 1024 * 1024
+
+# Parallel range requests over all files
+DEFAULT_CONNECTIONS = 8
+
+# Attempts per range (the range resumes from the last byte written)
+ATTEMPTS = 5
+
+# Bytes per read from a response
+READ_SIZE = 1024 * 1024
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 15
+
+# (group, repo_id, filename in repo, models subdirectory), smallest first
+CATALOG = [
+    ('common', 'Comfy-Org/flux2-dev', 'split_files/vae/flux2-vae.safetensors', 'vae'),
+    ('klein', 'Comfy-Org/flux2-klein', 'split_files/text_encoders/qwen_3_4b.safetensors', 'text_encoders'),
+    ('klein', 'Comfy-Org/flux2-klein', 'split_files/diffusion_models/flux-2-klein-base-4b.safetensors', 'diffusion_models'),
+    ('klein', 'Comfy-Org/flux2-klein', 'split_files/diffusion_models/flux-2-klein-4b.safetensors', 'diffusion_models'),
+    ('dev', 'ByteZSzn/Flux.2-Turbo-ComfyUI', 'Flux2TurboComfyv2.safetensors', 'loras'),
+    ('dev', 'Comfy-Org/flux2-dev', 'split_files/text_encoders/mistral_3_small_flux2_fp8.safetensors', 'text_encoders'),
+    ('dev', 'Comfy-Org/flux2-dev', 'split_files/diffusion_models/flux2_dev_fp8mixed.safetensors', 'diffusion_models'),
+]
+
+# FLUX_MODEL value -> catalog groups
+SELECTIONS = {
+    'common': ('common',),
+    'klein': ('common', 'klein'),
+    'dev': ('common', 'dev'),
+    'all': ('common', 'klein', 'dev'),
+}
+
+
+class DownloadError(Exception):
+    pass
+
+
+class RangeInterrupted(DownloadError):
+    """A range response broke off; position is the next byte to fetch"""
+
+    def __init__(self, message: str, position: int):
+        super().__init__(message)
+        self.position = position
+
+
+@dataclass
+class ModelFile:
+    """One file to download and, after download_all(), its outcome"""
+    repo_id: str
+    filename: str
+    dest: str
+    revision: str = 'main'
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+    commit: Optional[str] = None
+    url: Optional[str] = None
+    status: str = 'pending'         # downloading, present, downloaded, failed
+    verified: bool = False
+    seconds: float = 0.0
+    error: Optional[str] = None
+    # Download state
+    done: set = field(default_factory=set)
+    chunks: int = 0
+    remaining: int = 0
+    started: float = 0.0
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.dest)
+
+    @property
+    def part(self) -> str:
+        return f'{self.dest}.part'
+
+    def manifest_entry(self) -> Dict:
+        return {
+            'repo_id': self.repo_id, 'filename': self.filename, 'revision': self.revision,
+            'commit': self.commit, 'path': self.dest, 'size': self.size, 'sha256': self.sha256,
+            'verified': self.verified, 'status': self.status, 'progress': self.progress,
+            'seconds': round(self.seconds, 1), 'error': self.error,
+        }
+
+    @property
+    def progress(self) -> float:
+        """Fraction of ranges written (1.0 once the file is in place)"""
+        if self.status in ('present', 'downloaded'):
+            return 1.0
+        return round(len(self.done) / self.chunks, 3) if self.chunks else 0.0
+
+
+def select_models(selection: str, models_dir: str) -> List[ModelFile]:
+    groups = SELECTIONS[selection]
+    return [
+        ModelFile(repo_id, filename, os.path.join(models_dir, subdir, os.path.basename(filename)))
+        for group, repo_id, filename, subdir in CATALOG if group in groups
+    ]
+
+
+def parse_size(text: str) -> int:
+    """'200M' -> bytes (K, M, G are powers of 1024; 0 means unlimited)"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?', text.strip(), re.IGNORECASE)
+    if not match:
+        raise ValueError(f'invalid size: {text}')
+    return int(float(match.group(1)) * 1024 ** ' KMG'.index(match.group(2).upper() or ' '))
+
+
+def human(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f}{unit}' if unit in ('B', 'KB') else f'{size:.1f}{unit}'
+        size /= 1024
+
+
+# ============================================================================
+# Hugging Face metadata
+# ============================================================================
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def _auth_headers(token: Optional[str]) -> Dict[str, str]:
+    headers = {'User-Agent': 'flux2-model-downloader'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    return headers
+
+
+def resolve(model: ModelFile, token: Optional[str]):
+    """Fill in size, sha256, commit and the (CDN) download URL of a model
+
+    HEAD on /resolve/ answers with a redirect whose X-Linked-Size and
+    X-Linked-Etag headers are the LFS file's size and SHA256.
+    """
+    url = f'{HF_ENDPOINT}/{model.repo_id}/resolve/{quote(model.revision, safe="")}/{quote(model.filename)}'
+    request = urllib.request.Request(url, method='HEAD', headers=_auth_headers(token))
+    opener = urllib.request.build_opener(_NoRedirect)
+    try:
+        response = opener.open(request, timeout=30)
+        headers, location = response.headers, url
+    except urllib.error.HTTPError as e:
+        if e.code not in (301, 302, 303, 307, 308):
+            raise DownloadError(f'HTTP {e.code} resolving {model.repo_id}/{model.filename}')
+        headers, location = e.headers, urljoin(url, e.headers.get('Location', url))
+        if not headers.get('X-Linked-Size'):
+            # Small (non-LFS) file behind a redirect: size and ETag are on the target
+            target = urllib.request.Request(location, method='HEAD', headers=_auth_headers(
+                token if location.startswith(HF_ENDPOINT) else None))
+            with urllib.request.urlopen(target, timeout=30) as response:
+                commit = headers.get('X-Repo-Commit')
+                headers = response.headers
+                if commit and not headers.get('X-Repo-Commit'):
+                    headers['X-Repo-Commit'] = commit
+
+    size = headers.get('X-Linked-Size') or headers.get('Content-Length')
+    etag = (headers.get('X-Linked-Etag') or headers.get('ETag') or '').strip('"').removeprefix('W/').strip('"')
+    model.size = int(size) if size and size.isdigit() else None
+    model.sha256 = etag if re.fullmatch(r'[0-9a-f]{64}', etag) else None
+    model.commit = headers.get('X-Repo-Commit')
+    model.url = location
+
+
+# ============================================================================
+# Download
+# ============================================================================
+
+class RateLimiter:
+    """Token bucket shared by all connections (0 = unlimited)"""
+
+    def __init__(self, bytes_per_second: int):
+        self.rate = bytes_per_second
+        self._allowance = float(bytes_per_second)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, amount: int):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            self._allowance -= amount
+            delay = -self._allowance / self.rate if self._allowance < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+
+def sha256sum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE * 8), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelDownloader:
+    """Downloads ModelFiles with `connections` parallel range requests"""
+
+    def __init__(self, connections: int = DEFAULT_CONNECTIONS, max_bandwidth: int = 0,
+                 chunk_size: int = CHUNK_SIZE, token: Optional[str] = None, verify_existing: bool = False,
+                 manifest: Optional[str] = None):
+        self.connections = max(1, connections)
+        self.limiter = RateLimiter(max_bandwidth)
+        self.chunk_size = chunk_size
+        self.token = token
+        self.verify_existing = verify_existing
+        self.manifest = manifest
+        self._models: List[ModelFile] = []
+        self._lock = threading.Lock()
+        self._manifest_lock = threading.Lock()
+        self._fds: Dict[str, int] = {}
+        self._received = 0
+        self._total = 0
+
+    def download_all(self, models: List[ModelFile]) -> List[ModelFile]:
+        self._models = models
+        with ThreadPoolExecutor(max_workers=self.connections) as metadata:
+            list(metadata.map(self._resolve, models))
+
+        pending = []
+        for model in models:
+            if model.status == 'pending' and self._is_present(model):
+                model.status = 'present'
+                print(f'✅ [SKIP] {model.name} already present', flush=True)
+            elif model.status == 'pending':
+                pending.append(model)
+
+        self.publish()
+        if not pending:
+            return models
+        # Hashing runs on its own pool so it does not hold up connections
+        with ThreadPoolExecutor(max_workers=2) as self._finisher:
+            tasks = []
+            for model in sorted(pending, key=lambda m: m.size or 0):
+                try:
+                    tasks.extend(self._prepare(model))
+                except (OSError, DownloadError) as e:
+                    self._fail(model, str(e))
+            if tasks:
+                self._total = sum(
+                    min(self.chunk_size, model.size - index * self.chunk_size) for model, index in tasks
+                )
+                print(f'📥 Downloading {len(pending)} file(s), {human(self._total)} '
+                      f'over {self.connections} connections', flush=True)
+                self.publish()
+                stop = threading.Event()
+                threading.Thread(target=self._report, args=(stop,), daemon=True).start()
+                with ThreadPoolExecutor(max_workers=self.connections) as pool:
+                    list(pool.map(lambda task: self._fetch_range(*task), tasks))
+                stop.set()
+        # Files that failed keep their .part and state for the next run
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+        self.publish()
+        return models
+
+    def publish(self):
+        """Rewrite the manifest with the current state of every file"""
+        if not self.manifest:
+            return
+        with self._manifest_lock:
+            try:
+                write_manifest(self.manifest, self._models)
+            except OSError as e:
+                print(f'⚠️ Manifest not written: {e}', file=sys.stderr, flush=True)
+
+    # ------------------------------------------------------------------
+    # Preparation
+    # ------------------------------------------------------------------
+
+    def _resolve(self, model: ModelFile):
+        try:
+            resolve(model, self.token)
+        except (OSError, DownloadError) as e:
+            if os.path.exists(model.dest):
+                # Offline: trust the file that is there
+                model.status, model.error = 'present', f'not verified ({e})'
+            else:
+                self._fail(model, str(e))
+
+    def _is_present(self, model: ModelFile) -> bool:
+        if not os.path.exists(model.dest):
+            return False
+        if model.size is not None and os.path.getsize(model.dest) != model.size:
+            print(f'⚠️ {model.name}: {os.path.getsize(model.dest)} bytes on disk, '
+                  f'{model.size} expected - downloading again', flush=True)
+            return False
+        if self.verify_existing and model.sha256:
+            if sha256sum(model.dest) != model.sha256:
+                print(f'⚠️ {model.name}: SHA256 mismatch - downloading again', flush=True)
+                return False
+            model.verified = True
+        return True
+
+    def _state_path(self, model: ModelFile) -> str:
+        return f'{model.part}.json'
+
+    def _prepare(self, model: ModelFile) -> List[tuple]:
+        """Open (or reopen) the .part file; returns the ranges still to fetch"""
+        if model.size is None:
+            raise DownloadError('size unknown (Hugging Face did not report X-Linked-Size)')
+        os.makedirs(os.path.dirname(model.dest), exist_ok=True)
+        if model.size == 0:
+            open(model.dest, 'wb').close()
+            model.status = 'downloaded'
+            return []
+        chunks = model.chunks = (model.size + self.chunk_size - 1) // self.chunk_size
+
+        state = {}
+        if os.path.exists(model.part) and os.path.exists(self._state_path(model)):
+            try:
+                with open(self._state_path(model), encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+        if (state.get('size'), state.get('sha256'), state.get('chunk_size')) == (model.size, model.sha256, self.chunk_size):
+            model.done = set(state.get('done', [])) & set(range(chunks))
+            if model.done:
+                print(f'↻ {model.name}: resuming, {len(model.done)}/{chunks} ranges already done', flush=True)
+        else:
+            model.done = set()
+
+        fd = os.open(model.part, os.O_RDWR | os.O_CREAT, 0o644)
+        if not model.done:
+            os.ftruncate(fd, 0)
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(fd, 0, model.size)
+            except OSError:
+                os.ftruncate(fd, model.size)
+        else:
+            os.ftruncate(fd, model.size)
+        self._fds[model.dest] = fd
+        self._save_state(model)
+
+        model.remaining = chunks - len(model.done)
+        model.started = time.monotonic()
+        model.status = 'downloading'
+        if model.remaining == 0:
+            self._finisher_submit(model)
+            return []
+        return [(model, index) for index in range(chunks) if index not in model.done]
+
+    def _save_state(self, model: ModelFile):
+        state = {'size': model.size, 'sha256': model.sha256, 'chunk_size': self.chunk_size,
+                 'done': sorted(model.done)}
+        tmp = f'{self._state_path(model)}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, self._state_path(model))
+
+    # ------------------------------------------------------------------
+    # Ranges
+    # ------------------------------------------------------------------
+
+    def _fetch_range(self, model: ModelFile, index: int):
+        if model.status == 'failed':
+            return
+        start = index * self.chunk_size
+        end = min(start + self.chunk_size, model.size) - 1
+        position = start
+        error = None
+        for attempt in range(1, ATTEMPTS + 1):
+            if attempt > 1:
+                time.sleep(min(2 ** (attempt - 1), 30))
+            try:
+                position = self._get(model, position, end)
+                error = None
+                break
+            except RangeInterrupted as e:
+                # Keep what arrived: the next attempt asks for the rest only
+                error, position = str(e), e.position
+            except urllib.error.HTTPError as e:
+                error = f'HTTP {e.code}'
+                if e.code in (401, 403, 410):
+                    # Signed CDN URLs expire: resolve a fresh one
+                    try:
+                        resolve(model, self.token)
+                    except (OSError, DownloadError) as resolve_error:
+                        error = str(resolve_error)
+            except (OSError, http.client.HTTPException, DownloadError) as e:
+                error = str(e) or type(e).__name__
+        if error:
+            self._fail(model, f'range {index} failed after {ATTEMPTS} attempts: {error}')
+            return
+
+        with self._lock:
+            model.done.add(index)
+            model.remaining -= 1
+            self._save_state(model)
+            finished = model.remaining == 0
+        if finished:
+            self._finisher_submit(model)
+
+    def _get(self, model: ModelFile, position: int, end: int) -> int:
+        """Fetch bytes position..end into the .part file; returns the next position"""
+        headers = {'Range': f'bytes={position}-{end}', 'User-Agent': 'flux2-model-downloader'}
+        if model.url.startswith(HF_ENDPOINT) and self.token:
+            # The token goes to huggingface.co only, never to the CDN
+            headers['Authorization'] = f'Bearer {self.token}'
+        request = urllib.request.Request(model.url, headers=headers)
+        fd = self._fds[model.dest]
+        with urllib.request.urlopen(request, timeout=60) as response:
+            if response.status != 206 and not (response.status == 200 and position == 0 and end + 1 == model.size):
+                raise DownloadError(f'server ignored the range request (HTTP {response.status})')
+            while position <= end:
+                try:
+                    block = response.read(min(READ_SIZE, end + 1 - position))
+                except (OSError, http.client.HTTPException) as e:
+                    raise RangeInterrupted(f'{e or type(e).__name__} at byte {position}', position)
+                if not block:
+                    raise RangeInterrupted(f'connection closed at byte {position}', position)
+                self.limiter.take(len(block))
+                os.pwrite(fd, block, position)
+                position += len(block)
+                with self._lock:
+                    self._received += len(block)
+        return position
+
+    # ------------------------------------------------------------------
+    # Completion
+    # ------------------------------------------------------------------
+
+    def _finisher_submit(self, model: ModelFile):
+        self._finisher.submit(self._finish, model)
+
+    def _finish(self, model: ModelFile):
+        """Verify size and SHA256, then rename .part to its final name"""
+        fd = self._fds.pop(model.dest)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        size = os.path.getsize(model.part)
+        if size != model.size:
+            self._fail(model, f'size mismatch: {size} bytes, {model.size} expected')
+            return
+        if model.sha256:
+            digest = sha256sum(model.part)
+            if digest != model.sha256:
+                os.remove(model.part)
+                os.remove(self._state_path(model))
+                self._fail(model, f'SHA256 mismatch: {digest}, {model.sha256} expected (partial file removed)')
+                return
+            model.verified = True
+        os.replace(model.part, model.dest)
+        os.remove(self._state_path(model))
+        model.status = 'downloaded'
+        model.seconds = time.monotonic() - model.started
+        check = 'SHA256 verified' if model.verified else 'size verified'
+        print(f'✅ {model.name} ({human(model.size)}, {model.seconds:.0f}s, {check})', flush=True)
+        self.publish()
+
+    def _fail(self, model: ModelFile, error: str):
+        with self._lock:
+            if model.status == 'failed':
+                return
+            model.status, model.error = 'failed', error
+        print(f'❌ {model.name}: {error}', file=sys.stderr, flush=True)
+        self.publish()
+
+    def _report(self, stop: threading.Event):
+        started, last = time.monotonic(), 0
+        while not stop.wait(PROGRESS_INTERVAL):
+            with self._lock:
+                received = self._received
+            elapsed = time.monotonic() - started
+            rate = (received - last) / PROGRESS_INTERVAL
+            last = received
+            percent = f' ({100 * received / self._total:.0f}%)' if self._total else ''
+            print(f'📊 {human(received)}/{human(self._total)}{percent}, {human(rate)}/s, '
+                  f'{elapsed:.0f}s elapsed', flush=True)
+            self.publish()
+
+
+# ============================================================================
+# Manifest
+# ============================================================================
+
+def write_manifest(path: str, models: List[ModelFile]):
+    """Merge this run's files into the manifest at path (keyed by file path)"""
+    entries = {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = {entry['path']: entry for entry in json.load(f).get('files', [])}
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    for model in models:
+        entry = model.manifest_entry()
+        previous = entries.get(model.dest) or {}
+        if model.status == 'present' and previous.get('verified') and model.sha256 is not None and (
+                previous.get('sha256'), previous.get('size')) == (model.sha256, model.size):
+            # Checked by an earlier run and unchanged since
+            entry['verified'] = True
+        entries[model.dest] = entry
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({
+            'updated': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'files': sorted(entries.values(), key=lambda entry: entry['path']),
+        }, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ============================================================================
+# Command line
+# ============================================================================
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Download FLUX.2 models in parallel with resume and verification')
+    parser.add_argument('--models-dir', default='/workspace/ComfyUI/models', help='ComfyUI models directory')
+    parser.add_argument('--select', choices=sorted(SELECTIONS), default='all',
+                        help='models to download, as FLUX_MODEL (default: all)')
+    parser.add_argument('--connections', type=int,
+                        default=int(os.environ.get('MODEL_DOWNLOAD_CONNECTIONS', DEFAULT_CONNECTIONS)),
+                        help=f'parallel range requests (default: {DEFAULT_CONNECTIONS})')
+    parser.add_argument('--max-bandwidth', type=parse_size, default=os.environ.get('MODEL_DOWNLOAD_BANDWIDTH', '0'),
+                        help='total rate cap such as 100M (bytes/s, default: unlimited)')
+    parser.add_argument('--chunk-size', type=parse_size, default=CHUNK_SIZE, help='bytes per range (default: 64M)')
+    parser.add_argument('--manifest', help='JSON manifest (default: MODELS_DIR/models-manifest.json)')
+    parser.add_argument('--verify-existing', action='store_true',
+                        help='check the SHA256 of files already present (default: size only)')
+    args = parser.parse_args(argv)
+
+    models = select_models(args.select, args.models_dir)
+    manifest = args.manifest or os.path.join(args.models_dir, 'models-manifest.json')
+    downloader = ModelDownloader(args.connections, args.max_bandwidth, args.chunk_size,
+                                 os.environ.get('HF_TOKEN') or None, args.verify_existing, manifest)
+    started = time.monotonic()
+    downloader.download_all(models)
+    failed = [model for model in models if model.status == 'failed']
+    print(f'📄 Manifest: {manifest}', flush=True)
+    if failed:
+        print(f'❌ {len(failed)} of {len(models)} model(s) failed: {", ".join(m.name for m in failed)}',
+              file=sys.stderr, flush=True)
+        return 1
+    print(f'✅ {len(models)} model(s) ready in {time.monotonic() - started:.0f}s', flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Provisioning planner for the custom models requested through pod variables.
+
+start.sh used to loop over HF_MODEL_<CATEGORY><N>, HF_MODEL<N>,
+HF_FULL_MODEL<N> and CIVITAI_MODEL_<CATEGORY><N> (up to 50 slots per
+category), walking the target folder with find and starting a Python
+process for every variable. This script does it in one process:
+
+    1. index    one walk of the ComfyUI models folder (and of any other
+                HF_MODEL_DIR target), file name -> directories
+    2. plan     every set variable resolved to destination files,
+                deduplicated by destination path
+    3. execute  only the files missing from the index, concurrently:
+                Hugging Face files through model_downloader (ranged,
+                resumable, SHA256 verified), CivitAI URLs through the
+                civitai CLI
+
+A file counts as present when a file of the same name is in the target
+folder or below it (the same folder layout the old find check accepted),
+not merely when the folder holds some other .safetensors file. Full
+repositories (HF_FULL_MODEL<N>) are listed through the Hub API and each
+file is checked at its path in the target folder.
+
+Usage:
+    python3 provision_models.py [--comfyui-dir /workspace/ComfyUI] [--dry-run]
+
+Environment: the HF_MODEL_* / HF_FULL_MODEL* / CIVITAI_MODEL_* variables,
+HF_TOKEN, CIVITAI_TOKEN, MODEL_DOWNLOAD_CONNECTIONS, MODEL_DOWNLOAD_BANDWIDTH.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Set
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+from model_downloader import (
+    DEFAULT_CONNECTIONS, HF_ENDPOINT, ModelDownloader, ModelFile, parse_size,
+)
+
+# HF_MODEL_<NAME><N> + HF_MODEL_<FILE_SUFFIX><N> -> models/<folder>
+CATEGORIES_HF = [
+    ('VAE', 'VAE_FILENAME', 'vae'),
+    ('UPSCALER', 'UPSCALER_PTH', 'upscale_models'),
+    ('LORA', 'LORA_FILENAME', 'loras'),
+    ('TEXT_ENCODERS', 'TEXT_ENCODERS_FILENAME', 'text_encoders'),
+    ('CLIP_VISION', 'CLIP_VISION_FILENAME', 'clip_vision'),
+    ('PATCHES', 'PATCHES_FILENAME', 'model_patches'),
+    ('AUDIO_ENCODERS', 'AUDIO_ENCODERS_FILENAME', 'audio_encoders'),
+    ('DIFFUSION_MODELS', 'DIFFUSION_MODELS_FILENAME', 'diffusion_models'),
+    ('CHECKPOINTS', 'CHECKPOINTS_FILENAME', 'checkpoints'),
+    ('VL', 'VL_FILENAME', 'VLM'),
+    ('SAMS', 'SAMS_FILENAME', 'sams'),
+    ('LATENT_UPSCALE', 'LATENT_UPSCALE_FILENAME', 'latent_upscale_models'),
+]
+
+# CIVITAI_MODEL_<NAME><N> -> models/<folder>
+CATEGORIES_CIVITAI = [
+    ('LORA_URL', 'loras'),
+    ('UNET_URL', 'diffusion_models'),
+]
+
+# Numbered slots per variable family
+HF_SLOTS = 20
+CIVITAI_SLOTS = 50
+
+# Parallel civitai CLI downloads (they run alongside the Hugging Face ones)
+CIVITAI_WORKERS = 2
+
+# Repository files a full download leaves out
+SKIP_REPO_FILES = ('.gitattributes',)
+
+# Weights extensions (only for the offline fallback of full repositories)
+WEIGHT_EXTENSIONS = ('.safetensors', '.pth', '.bin', '.ckpt', '.gguf', '.pt')
+
+
+# ============================================================================
+# Index
+# ============================================================================
+
+class ModelIndex:
+    """File name -> directories holding it, built with one walk per root"""
+
+    def __init__(self):
+        self.names: Dict[str, Set[str]] = {}
+        self.roots: List[str] = []
+        self.files = 0
+
+    def add_root(self, root: str):
+        root = os.path.abspath(root)
+        if any(root == seen or root.startswith(seen + os.sep) for seen in self.roots):
+            return
+        # A new root containing earlier ones replaces them
+        self.roots = [seen for seen in self.roots if not seen.startswith(root + os.sep)]
+        self.roots.append(root)
+        for directory, _, files in os.walk(root):
+            for name in files:
+                if name.endswith(('.part', '.part.json', '.tmp')):
+                    continue
+                self.names.setdefault(name, set()).add(directory)
+                self.files += 1
+
+    def contains(self, target: str, name: str) -> bool:
+        """A file called name in target or below it"""
+        target = os.path.abspath(target)
+        return any(
+            directory == target or directory.startswith(target + os.sep)
+            for directory in self.names.get(name, ())
+        )
+
+    def exists(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        return os.path.dirname(path) in self.names.get(os.path.basename(path), ())
+
+    def has_weights(self, target: str) -> bool:
+        target = os.path.abspath(target)
+        return any(
+            name.endswith(WEIGHT_EXTENSIONS) and self.contains(target, name)
+            for name in self.names
+        )
+
+
+# ============================================================================
+# Plan
+# ============================================================================
+
+@dataclass
+class PlanItem:
+    """One file (or CivitAI URL) a variable asks for"""
+    source: str                     # hf or civitai
+    variable: str
+    target: str                     # destination folder
+    repo_id: str = ''
+    filename: str = ''              # file in the repository / resolved CivitAI name
+    dest: str = ''                  # destination file ('' while a CivitAI name is unknown)
+    url: str = ''
+    match: str = 'name'             # name: anywhere below target, path: exactly dest
+    action: str = 'download'        # download, skip, error
+    reason: str = ''
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def _request(url: str, token: Optional[str], method: str = 'GET') -> urllib.request.Request:
+    headers = {'User-Agent': 'flux2-provisioning'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    return urllib.request.Request(url, method=method, headers=headers)
+
+
+def list_repo_files(repo_id: str, token: Optional[str]) -> List[str]:
+    """Paths of every file in a Hugging Face model repository"""
+    url = f'{HF_ENDPOINT}/api/models/{quote(repo_id, safe="/")}'
+    with urllib.request.urlopen(_request(url, token), timeout=30) as response:
+        siblings = json.load(response).get('siblings') or []
+    return [entry['rfilename'] for entry in siblings
+            if entry.get('rfilename') and os.path.basename(entry['rfilename']) not in SKIP_REPO_FILES]
+
+
+def civitai_filename(url: str, token: Optional[str]) -> Optional[str]:
+    """File name of a CivitAI download: from the URL, else from the redirect"""
+    name = os.path.basename(urlparse(url).path)
+    if '.' in name:
+        return unquote(name)
+
+    try:
+        response = urllib.request.build_opener(_NoRedirect).open(_request(url, token, 'HEAD'), timeout=30)
+        disposition = response.headers.get('Content-Disposition', '')
+    except urllib.error.HTTPError as e:
+        location = e.headers.get('Location', '')
+        disposition = e.headers.get('Content-Disposition') or ''.join(
+            parse_qs(urlparse(location).query).get('response-content-disposition', [])
+        )
+    except OSError:
+        return None
+    match = re.search(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', disposition)
+    return os.path.basename(unquote(match.group(1))) if match else None
+
+
+def build_plan(env: Mapping[str, str], comfyui_dir: str, index: ModelIndex) -> List[PlanItem]:
+    """Resolve every set provisioning variable into plan items, one per destination"""
+    models_dir = os.path.join(comfyui_dir, 'models')
+    hf_token = env.get('HF_TOKEN') or None
+    civitai_token = env.get('CIVITAI_TOKEN') or None
+    items: List[PlanItem] = []
+
+    for name, suffix, folder in CATEGORIES_HF:
+        for slot in range(1, HF_SLOTS + 1):
+            repo_id, filename = env.get(f'HF_MODEL_{name}{slot}'), env.get(f'HF_MODEL_{suffix}{slot}')
+            if repo_id and filename:
+                target = os.path.join(models_dir, folder)
+                items.append(PlanItem('hf', f'HF_MODEL_{name}{slot}', target, repo_id, filename,
+                                      os.path.join(target, os.path.basename(filename))))
+
+    for slot in range(1, HF_SLOTS + 1):
+        target = os.path.join(comfyui_dir, env.get(f'HF_MODEL_DIR{slot}', ''))
+        repo_id, filename = env.get(f'HF_MODEL{slot}'), env.get(f'HF_MODEL_FILENAME{slot}')
+        if repo_id and filename:
+            items.append(PlanItem('hf', f'HF_MODEL{slot}', target, repo_id, filename,
+                                  os.path.join(target, os.path.basename(filename))))
+        elif repo_id:
+            print(f'⚠️ HF_MODEL{slot}={repo_id} has no HF_MODEL_FILENAME{slot} - ignored', flush=True)
+
+        repo_id = env.get(f'HF_FULL_MODEL{slot}')
+        if repo_id:
+            index.add_root(target)
+            try:
+                files = list_repo_files(repo_id, hf_token)
+            except (OSError, ValueError) as e:
+                # Offline: keep the old rule, a folder with weights is provisioned
+                action = 'skip' if index.has_weights(target) else 'error'
+                items.append(PlanItem('hf', f'HF_FULL_MODEL{slot}', target, repo_id, action=action,
+                                      reason=f'repository not listed ({e})'))
+                continue
+            for filename in files:
+                items.append(PlanItem('hf', f'HF_FULL_MODEL{slot}', target, repo_id, filename,
+                                      os.path.join(target, filename), match='path'))
+
+    civitai = []
+    for name, folder in CATEGORIES_CIVITAI:
+        for slot in range(1, CIVITAI_SLOTS + 1):
+            variable = f'CIVITAI_MODEL_{name}{slot}'
+            url = env.get(variable)
+            if not url:
+                continue
+            item = PlanItem('civitai', variable, os.path.join(models_dir, folder), url=url)
+            if not civitai_token:
+                item.action, item.reason = 'error', 'CIVITAI_TOKEN is not set'
+            else:
+                civitai.append(item)
+            items.append(item)
+    # One HEAD request per URL whose name is not in the URL itself
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for item, filename in zip(civitai, pool.map(lambda i: civitai_filename(i.url, civitai_token), civitai)):
+            if filename:
+                item.filename, item.dest = filename, os.path.join(item.target, filename)
+
+    # Deduplicate by destination, then mark what is already there
+    plan, seen = [], set()
+    for item in items:
+        key = item.dest or item.url or f'{item.repo_id}:{item.target}'
+        if key in seen:
+            continue
+        seen.add(key)
+        if item.action == 'download' and item.dest:
+            index.add_root(item.target)
+            name = os.path.basename(item.dest)
+            present = index.exists(item.dest) if item.match == 'path' else index.contains(item.target, name)
+            if present:
+                item.action, item.reason = 'skip', 'already present'
+        plan.append(item)
+    return plan
+
+
+# ============================================================================
+# Execution
+# ============================================================================
+
+def run_civitai(item: PlanItem) -> bool:
+    os.makedirs(item.target, exist_ok=True)
+    print(f'ℹ️ [DOWNLOAD] {item.variable}: {item.url} → {item.target}', flush=True)
+    try:
+        result = subprocess.run(['civitai', '--quit', item.url, item.target])
+    except OSError as e:
+        print(f'❌ {item.variable}: civitai CLI not available ({e})', file=sys.stderr, flush=True)
+        return False
+    if result.returncode:
+        print(f'❌ {item.variable}: civitai exited with {result.returncode}', file=sys.stderr, flush=True)
+        return False
+    return True
+
+
+def execute(plan: List[PlanItem], downloader: ModelDownloader) -> int:
+    """Download the missing items; returns the number of failures"""
+    hf = [ModelFile(item.repo_id, item.filename, item.dest)
+          for item in plan if item.action == 'download' and item.source == 'hf']
+    civitai = [item for item in plan if item.action == 'download' and item.source == 'civitai']
+    failures = 0
+
+    with ThreadPoolExecutor(max_workers=CIVITAI_WORKERS) as pool:
+        futures = [pool.submit(run_civitai, item) for item in civitai]
+        if hf:
+            downloader.download_all(hf)
+            failures += sum(model.status == 'failed' for model in hf)
+        failures += sum(not future.result() for future in futures)
+    return failures
+
+
+# ============================================================================
+# Command line
+# ============================================================================
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Download the models requested by HF_MODEL_* / CIVITAI_* variables')
+    parser.add_argument('--comfyui-dir', default='/workspace/ComfyUI', help='ComfyUI directory')
+    parser.add_argument('--connections', type=int,
+                        default=int(os.environ.get('MODEL_DOWNLOAD_CONNECTIONS', DEFAULT_CONNECTIONS)),
+                        help=f'parallel range requests (default: {DEFAULT_CONNECTIONS})')
+    parser.add_argument('--max-bandwidth', type=parse_size, default=os.environ.get('MODEL_DOWNLOAD_BANDWIDTH', '0'),
+                        help='total rate cap such as 100M (bytes/s, default: unlimited)')
+    parser.add_argument('--manifest', help='JSON manifest (default: COMFYUI_DIR/models/models-manifest.json)')
+    parser.add_argument('--dry-run', action='store_true', help='print the plan without downloading')
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    index = ModelIndex()
+    index.add_root(os.path.join(args.comfyui_dir, 'models'))
+    plan = build_plan(os.environ, args.comfyui_dir, index)
+    if not plan:
+        print('ℹ️ No custom models requested', flush=True)
+        return 0
+
+    print(f'🗂️ Indexed {index.files} file(s) in {time.monotonic() - started:.1f}s', flush=True)
+    for item in plan:
+        what = f'{item.repo_id}/{item.filename}' if item.source == 'hf' else (item.filename or item.url)
+        if item.action == 'skip':
+            print(f'✅ [SKIP] {what} ({item.reason})', flush=True)
+        elif item.action == 'error':
+            print(f'⚠️ {item.variable}: {item.reason} - not downloaded', flush=True)
+        else:
+            print(f'📋 [PLAN] {what} → {item.target}', flush=True)
+
+    todo = [item for item in plan if item.action == 'download']
+    errors = sum(item.action == 'error' for item in plan)
+    print(f'📋 {len(todo)} to download, {len(plan) - len(todo) - errors} present, {errors} not resolvable', flush=True)
+    if args.dry_run or not todo:
+        return 1 if errors else 0
+
+    manifest = args.manifest or os.path.join(args.comfyui_dir, 'models', 'models-manifest.json')
+    downloader = ModelDownloader(args.connections, args.max_bandwidth, token=os.environ.get('HF_TOKEN') or None,
+                                 manifest=manifest)
+    failures = execute(plan, downloader)
+    elapsed = time.monotonic() - started
+    if failures or errors:
+        print(f'❌ {failures + errors} of {len(plan)} item(s) not provisioned ({elapsed:.0f}s)',
+              file=sys.stderr, flush=True)
+        return 1
+    print(f'✅ Custom models provisioned in {elapsed:.0f}s', flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
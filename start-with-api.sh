@@ -7,11 +7,12 @@
 # Includes health checks, logging, and graceful shutdown handling
 #
 # Usage:
-#   ./start-with-api.sh [--api-only] [--no-api]
+#   ./start-with-api.sh [--api-only] [--no-api] [--async]
 #
 # Options:
 #   --api-only     Start only REST API (ComfyUI must be running separately)
 #   --no-api       Start only ComfyUI (no REST API)
+#   --async        Serve the REST API on asyncio (aiohttp) instead of Flask
 #   --debug        Enable debug logging
 ################################################################################
 
@@ -24,6 +25,7 @@ API_HOST="${API_HOST:-0.0.0.0}"
 API_PORT="${API_PORT:-5000}"
 WORKSPACE_PATH="${WORKSPACE_PATH:-/workspace}"
 DEBUG="${DEBUG:-false}"
+API_SERVER="${API_SERVER:-flask}"   # flask | async
 
 # Script directories
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
@@ -117,6 +119,10 @@ for arg in "$@"; do
             START_API=false
             log_info "Starting ComfyUI only (no REST API)"
             ;;
+        --async)
+            API_SERVER=async
+            log_info "Async REST API server selected"
+            ;;
         --debug)
             DEBUG=true
             log_info "Debug mode enabled"
@@ -136,6 +142,7 @@ log_info "=========================================="
 log_info "ComfyUI: ${COMFYUI_HOST}:${COMFYUI_PORT}"
 log_info "REST API: ${API_HOST}:${API_PORT}"
 log_info "Workspace: ${WORKSPACE_PATH}"
+log_info "API server: ${API_SERVER}"
 log_info "Debug: ${DEBUG}"
 log_info "=========================================="
 
@@ -172,8 +179,16 @@ fi
 if [ "$START_API" = true ]; then
     log_info "Starting REST API..."
 
+    if [ "$API_SERVER" = async ]; then
+        API_SCRIPT="${API_DIR}/async_server.py"
+        API_IMPORTS="flask, requests, aiohttp"
+    else
+        API_SCRIPT="${API_DIR}/comfyui_rest_api.py"
+        API_IMPORTS="flask, requests"
+    fi
+
     # Check Python dependencies
-    if ! python -c "import flask, requests" 2>/dev/null; then
+    if ! python -c "import ${API_IMPORTS}" 2>/dev/null; then
         log_warning "Missing Python dependencies, installing..."
         pip install -q -r "${API_DIR}/requirements.txt"
     fi
@@ -188,9 +203,9 @@ if [ "$START_API" = true ]; then
 
     # Start the API
     if [ "$DEBUG" = true ]; then
-        python "${API_DIR}/comfyui_rest_api.py" &
+        python "$API_SCRIPT" &
     else
-        python "${API_DIR}/comfyui_rest_api.py" > /tmp/comfyui_api.log 2>&1 &
+        python "$API_SCRIPT" > /tmp/comfyui_api.log 2>&1 &
     fi
 
     API_PID=$!
@@ -124,6 +124,8 @@ fi
 # Export generation configuration before starting ComfyUI
 export OUTPUT_FOLDER="/workspace/output/"
 export GENERATION_LOG_DIR="/workspace/logs/generations/"
+export GENERATION_JOURNAL_DIR="/workspace/logs/journal/"
+export CONDITIONING_CACHE_DIR="/workspace/cache/conditioning/"
 export PROMPT_DEFAULT_TEXT="kong fu panda, dancing and playing concert flute, in circus arean, crowd cheering, music notes emrge from the flute"
 export IMAGE_DEFAULT_ID="UNDEFINED_ID_"
 
@@ -131,6 +133,8 @@ export IMAGE_DEFAULT_ID="UNDEFINED_ID_"
 cat >> /etc/rp_environment << 'EOF'
 export OUTPUT_FOLDER="/workspace/output/"
 export GENERATION_LOG_DIR="/workspace/logs/generations/"
+export GENERATION_JOURNAL_DIR="/workspace/logs/journal/"
+export CONDITIONING_CACHE_DIR="/workspace/cache/conditioning/"
 export PROMPT_DEFAULT_TEXT="kong fu panda, dancing and playing concert flute, in circus arean, crowd cheering, music notes emrge from the flute"
 export IMAGE_DEFAULT_ID="UNDEFINED_ID_"
 EOF
@@ -166,6 +170,12 @@ if [[ "$HAS_CUDA" -eq 1 ]]; then
         echo "🔒 Authentication enabled"
     fi
 
+    # Bundled custom nodes (conditioning cache, batch items), refreshed from the image on every boot
+    if [[ -d /root/custom-nodes-backup/ ]]; then
+        cp -r /root/custom-nodes-backup/. /workspace/ComfyUI/custom_nodes/ 2>/dev/null || true
+        echo "✅ Bundled custom nodes installed: $(ls /root/custom-nodes-backup/ | tr '\n' ' ')"
+    fi
+
 	echo "▶️ ComfyUI service starting (CUDA available)"
 
     python3 /workspace/ComfyUI/main.py ${COMFYUI_EXTRA_ARGUMENTS:---listen --enable-manager --preview-method auto} &
@@ -196,201 +206,6 @@ else
     echo "❌ ERROR: PyTorch CUDA driver mismatch or unavailable, ComfyUI not started"
 fi
 
-# Function to download models if variables are set
-download_model_HF() {
-    local model_var="$1"
-    local file_var="$2"
-    local dest_dir="$3"
-
-    if [[ -n "${!model_var}" && -n "${!file_var}" ]]; then
-        local target="/workspace/ComfyUI/models/$dest_dir"
-        mkdir -p "$target"
-
-        # Check if file already exists (including in subdirectories)
-        local filename=$(basename "${!file_var}")
-        if find "$target" -name "$filename" -o -name "*.safetensors" -o -name "*.pth" 2>/dev/null | grep -q .; then
-            echo "✅ [SKIP] ${filename} already exists in $target"
-            return 0
-        fi
-
-        echo "ℹ️ [DOWNLOAD] Fetching ${!model_var}/${!file_var} → $target"
-        python3 - <<PYTHON_HF 2>/dev/null
-import os
-import shutil
-import glob
-from huggingface_hub import hf_hub_download
-
-try:
-    token = os.environ.get('HF_TOKEN')
-    temp_dir = "/workspace/temp"
-
-    local_file = hf_hub_download(
-        repo_id="${!model_var}",
-        filename="${!file_var}",
-        local_dir=temp_dir,
-        repo_type="model",
-        token=token,
-        cache_dir=os.environ.get('HF_HUB_CACHE', '/workspace/.cache/huggingface')
-    )
-
-    # Move to final destination, flattening path (remove any nested directories)
-    final_filename = os.path.basename("${!file_var}")
-    final_path = os.path.join("$target", final_filename)
-    os.makedirs(os.path.dirname(final_path), exist_ok=True)
-
-    if os.path.exists(local_file) and local_file != final_path:
-        shutil.move(local_file, final_path)
-
-    # Also search for the file in nested directories if not found yet
-    if not os.path.exists(final_path):
-        found_files = glob.glob(os.path.join(temp_dir, '**', final_filename), recursive=True)
-        if found_files:
-            shutil.move(found_files[0], final_path)
-
-except Exception as e:
-    print(f"⚠️ Failed to download ${!model_var}/${!file_var}: {e}")
-PYTHON_HF
-        sleep 1
-    fi
-
-    return 0
-}
-
-download_generic_HF() {
-    local model_var="$1"
-    local file_var="$2"
-    local dest_dir="$3"
-
-    local model="${!model_var}"
-    [[ -z "$model" ]] && return 0
-
-    local file=""
-    if [[ -n "$file_var" ]]; then
-        file="${!file_var}"
-    fi
-
-    local target="/workspace/ComfyUI/$dest_dir"
-    mkdir -p "$target"
-
-    # Check if files already exist in target directory
-    if [[ -n "$(find "$target" -type f \( -name "*.safetensors" -o -name "*.pth" -o -name "*.bin" \) 2>/dev/null | head -1)" ]]; then
-        echo "✅ [SKIP] Models already exist in $target"
-        return 0
-    fi
-
-    if [[ -n "$file" ]]; then
-        echo "ℹ️ [DOWNLOAD] Fetching $model/$file → $target"
-        python3 - <<PYTHON_HF 2>/dev/null
-import os
-import shutil
-import glob
-from huggingface_hub import hf_hub_download
-
-try:
-    token = os.environ.get('HF_TOKEN')
-    temp_dir = "/workspace/temp"
-
-    local_file = hf_hub_download(
-        repo_id="$model",
-        filename="$file",
-        local_dir=temp_dir,
-        repo_type="model",
-        token=token,
-        cache_dir=os.environ.get('HF_HUB_CACHE', '/workspace/.cache/huggingface')
-    )
-
-    # Move to final destination, flattening path (remove any nested directories)
-    final_filename = os.path.basename("$file")
-    final_path = os.path.join("$target", final_filename)
-    os.makedirs(os.path.dirname(final_path), exist_ok=True)
-
-    if os.path.exists(local_file) and local_file != final_path:
-        shutil.move(local_file, final_path)
-
-    # Also search for the file in nested directories if not found yet
-    if not os.path.exists(final_path):
-        found_files = glob.glob(os.path.join(temp_dir, '**', final_filename), recursive=True)
-        if found_files:
-            shutil.move(found_files[0], final_path)
-
-except Exception as e:
-    print(f"⚠️ Failed to download $model/$file: {e}")
-PYTHON_HF
-    else
-        echo "ℹ️ [DOWNLOAD] Fetching $model → $target"
-        python3 - <<PYTHON_HF 2>/dev/null
-import os
-from huggingface_hub import snapshot_download
-
-try:
-    token = os.environ.get('HF_TOKEN')
-    snapshot_download(
-        repo_id="$model",
-        repo_type="model",
-        local_dir="$target",
-        token=token,
-        cache_dir=os.environ.get('HF_HUB_CACHE', '/workspace/.cache/huggingface')
-    )
-except Exception as e:
-    print(f"⚠️ Failed to download $model: {e}")
-PYTHON_HF
-    fi
-
-    sleep 1
-    return 0
-}
-
-download_model_CIVITAI() {
-    local url_var="$1"
-    local dest_dir="$2"
-
-    # Check if URL variable is set
-    if [[ -z "${!url_var}" ]]; then
-        return 0
-    fi
-
-    # Token check
-    if [[ -z "$CIVITAI_TOKEN" ]]; then
-        echo "⚠️ ERROR: CIVITAI_TOKEN is not set as an environment variable – '${!url_var}' not downloaded"
-        return 1
-    fi
-
-    local target="/workspace/ComfyUI/models/$dest_dir"
-    mkdir -p "$target"
-
-    local url="${!url_var}"
-
-    # Try to determine filename
-    local filename
-    filename="$(basename "$(printf '%s\n' "$url" | sed 's/[?#].*$//')")"
-
-    # Fallback: unknown name (for API downloads)
-    if [[ "$filename" == "download" || "$filename" == "models" || -z "$filename" ]]; then
-        filename=""
-    fi
-
-    # Check if file already exists
-    if [[ -n "$filename" ]] && compgen -G "$target/$filename*" > /dev/null; then
-        echo "✅ [SKIP] $filename already exists in $target"
-        return 0
-    fi
-
-    # Check if directory already has models
-    if [[ -n "$(find "$target" -type f \( -name "*.safetensors" -o -name "*.pth" \) 2>/dev/null | head -1)" ]]; then
-        echo "✅ [SKIP] Models already exist in $target - skipping CivitAI download"
-        return 0
-    fi
-
-    echo "ℹ️ [DOWNLOAD] Fetching $url → $target ..."
-    civitai --quit "$url" "$target" || {
-        echo "⚠️ Failed to download $url"
-        return 1
-    }
-
-    sleep 1
-    return 0
-}
-
 download_workflow() {
     local url_var="$1"
 
@@ -496,80 +311,10 @@ if [[ "$HAS_COMFYUI" -eq 1 ]]; then
     export HF_HUB_CACHE="/workspace/.cache/huggingface"
     mkdir -p "$HF_HUB_CACHE"
 
-    # Parallel model downloads with progress tracking
+    # Parallel, resumable model downloads (shared with the image build)
     MODELS_LOG="/tmp/model_downloads.log"
-    TEMP_DOWNLOAD_DIR="/workspace/temp"
-    mkdir -p "$TEMP_DOWNLOAD_DIR"
-    > "$MODELS_LOG"
-
-    # Function to download model directly to final location (serial execution)
-    download_model_bg() {
-        local model_name="$1"
-        local repo_id="$2"
-        local filename="$3"
-        local dest_dir="$4"
-        local dest_file="$5"
-
-        if [[ -f "$dest_file" ]]; then
-            echo "  ✅ Already exists, skipping download"
-            return 0
-        fi
-
-        mkdir -p "$dest_dir"
-
-        # Download directly to final destination using huggingface_hub
-        python3 - <<PYTHON_DOWNLOAD 2>&1 | tee /tmp/${model_name// /_}.log
-import sys
-import os
-import shutil
-from pathlib import Path
-from huggingface_hub import hf_hub_download
-
-try:
-    # Set up token if provided
-    token = os.environ.get('HF_TOKEN')
-    dest_dir = "$dest_dir"
-    final_dest = "$dest_file"
-    temp_dir = "/workspace/temp"
-
-    print(f"  📥 Downloading to {dest_dir}...", flush=True)
-
-    # Download to temp directory first (hf_hub creates nested structure)
-    local_file = hf_hub_download(
-        repo_id="$repo_id",
-        filename="$filename",
-        local_dir=temp_dir,
-        repo_type="model",
-        token=token
-    )
-
-    # Ensure destination directory exists
-    os.makedirs(os.path.dirname(final_dest), exist_ok=True)
-
-    # Move file from temp to final destination (flattening path)
-    if os.path.exists(local_file):
-        shutil.move(local_file, final_dest)
-        size_mb = os.path.getsize(final_dest) / (1024 * 1024)
-        print(f"  ✅ Downloaded successfully ({size_mb:.0f}MB): {final_dest}", flush=True)
-        sys.exit(0)
-    else:
-        print(f"  ⚠️ Downloaded file not found at: {local_file}", file=sys.stderr, flush=True)
-        sys.exit(1)
-
-except Exception as e:
-    print(f"  ❌ Download failed: {e}", file=sys.stderr, flush=True)
-    import traceback
-    traceback.print_exc(file=sys.stderr)
-    sys.exit(1)
-PYTHON_DOWNLOAD
-
-        if [[ $? -eq 0 ]]; then
-            return 0
-        else
-            echo "  ❌ Download failed - see log: /tmp/${model_name// /_}.log"
-            return 1
-        fi
-    }
+    MODEL_DOWNLOADER="${MODEL_DOWNLOADER:-/model_downloader.py}"
+    MODELS_MANIFEST="/workspace/ComfyUI/models/models-manifest.json"
 
     # Validate HF_TOKEN is available for private/gated models
     if [[ -z "$HF_TOKEN" ]]; then
@@ -610,72 +355,47 @@ PYTHON_DOWNLOAD
             ;;
     esac
 
-    echo "📥 Starting SERIAL model downloads (smallest first for faster availability)..."
-    echo "ℹ️  Models become usable immediately after download completes"
-
-    # Download order by size (smallest to largest):
-    # Common: 1. VAE (321MB)
-    # Dev: 2. Turbo LoRA (2.6GB), 3. Text Encoder Dev FP8 (17GB), 4. Diffusion Dev FP8 (34GB)
-    # Klein: 2. Text Encoder Klein (7GB), 3. Diffusion Klein Base (8.5GB), 4. Diffusion Klein Distilled (8.5GB)
-
-    # Common models (VAE only - shared by both Klein and Dev)
-    if [[ $LOAD_COMMON -eq 1 ]]; then
-        # 1. VAE (321MB)
-        echo "📥 [Common 1/1] Downloading VAE (321MB)..."
-        download_model_bg "VAE (FLUX.2)" "Comfy-Org/flux2-dev" "split_files/vae/flux2-vae.safetensors" "/workspace/ComfyUI/models/vae" "/workspace/ComfyUI/models/vae/flux2-vae.safetensors"
-        echo "✅ [Common 1/1] VAE ready!"
-        echo ""
+    if [[ $LOAD_KLEIN -eq 1 && $LOAD_DEV -eq 1 ]]; then
+        MODEL_SELECTION="all"
+    elif [[ $LOAD_KLEIN -eq 1 ]]; then
+        MODEL_SELECTION="klein"
+    elif [[ $LOAD_DEV -eq 1 ]]; then
+        MODEL_SELECTION="dev"
+    else
+        MODEL_SELECTION="common"
     fi
 
-    # Klein models
-    if [[ $LOAD_KLEIN -eq 1 ]]; then
-        # 3. Text Encoder Klein (7GB)
-        echo "📥 [Klein 1/3] Downloading Text Encoder Klein (7GB)..."
-        download_model_bg "Text Encoder (FLUX.2 Klein)" "Comfy-Org/flux2-klein" "split_files/text_encoders/qwen_3_4b.safetensors" "/workspace/ComfyUI/models/text_encoders" "/workspace/ComfyUI/models/text_encoders/qwen_3_4b.safetensors"
-        echo "✅ [Klein 1/3] Text Encoder Klein ready!"
-        echo ""
-
-        # 4. Diffusion Klein Base (8.5GB)
-        echo "📥 [Klein 2/3] Downloading Diffusion Model Klein Base (8.5GB)..."
-        download_model_bg "Diffusion Model Base (FLUX.2 Klein)" "Comfy-Org/flux2-klein" "split_files/diffusion_models/flux-2-klein-base-4b.safetensors" "/workspace/ComfyUI/models/diffusion_models" "/workspace/ComfyUI/models/diffusion_models/flux-2-klein-base-4b.safetensors"
-        echo "✅ [Klein 2/3] Diffusion Klein Base ready!"
-        echo ""
-
-        # 5. Diffusion Klein Distilled (8.5GB)
-        echo "📥 [Klein 3/3] Downloading Diffusion Model Klein Distilled (8.5GB)..."
-        download_model_bg "Diffusion Model Distilled (FLUX.2 Klein)" "Comfy-Org/flux2-klein" "split_files/diffusion_models/flux-2-klein-4b.safetensors" "/workspace/ComfyUI/models/diffusion_models" "/workspace/ComfyUI/models/diffusion_models/flux-2-klein-4b.safetensors"
-        echo "✅ [Klein 3/3] Diffusion Klein Distilled ready!"
-        echo ""
-    fi
+    # Files download concurrently in 64MB ranges over MODEL_DOWNLOAD_CONNECTIONS
+    # connections (default 8), smallest first so models become usable early.
+    # Each file is written in place as <name>.part, resumed after a restart,
+    # checked against the Hugging Face size and SHA256, then renamed.
+    # MODEL_DOWNLOAD_BANDWIDTH (e.g. 100M) caps the total rate.
+    echo "📥 Starting parallel model downloads (resumable, SHA256 verified, smallest first)..."
+    echo "ℹ️  Models become usable immediately after download completes"
 
-    # Dev models (includes Dev-specific Turbo LoRA)
-    if [[ $LOAD_DEV -eq 1 ]]; then
-        # 2. Turbo LoRA (2.6GB) - Dev-specific
-        echo "📥 [Dev 1/3] Downloading Turbo LoRA (2.6GB)..."
-        download_model_bg "Turbo LoRA (FLUX.2 Dev)" "ByteZSzn/Flux.2-Turbo-ComfyUI" "Flux2TurboComfyv2.safetensors" "/workspace/ComfyUI/models/loras" "/workspace/ComfyUI/models/loras/Flux2TurboComfyv2.safetensors"
-        echo "✅ [Dev 1/3] Turbo LoRA ready!"
-        echo ""
-
-        # 3. Text Encoder Dev FP8 (17GB)
-        echo "📥 [Dev 2/3] Downloading Text Encoder Dev FP8 (17GB)..."
-        download_model_bg "Text Encoder (FLUX.2 Dev FP8)" "Comfy-Org/flux2-dev" "split_files/text_encoders/mistral_3_small_flux2_fp8.safetensors" "/workspace/ComfyUI/models/text_encoders" "/workspace/ComfyUI/models/text_encoders/mistral_3_small_flux2_fp8.safetensors"
-        echo "✅ [Dev 2/3] Text Encoder Dev FP8 ready!"
-        echo ""
-
-        # 4. Diffusion Dev FP8 (34GB)
-        echo "📥 [Dev 3/3] Downloading Diffusion Model Dev FP8 (34GB)..."
-        download_model_bg "Diffusion Model (FLUX.2 Dev FP8)" "Comfy-Org/flux2-dev" "split_files/diffusion_models/flux2_dev_fp8mixed.safetensors" "/workspace/ComfyUI/models/diffusion_models" "/workspace/ComfyUI/models/diffusion_models/flux2_dev_fp8mixed.safetensors"
-        echo "✅ [Dev 3/3] Diffusion Dev FP8 ready!"
-        echo ""
+    MODELS_OK=1
+    python3 "$MODEL_DOWNLOADER" \
+        --models-dir /workspace/ComfyUI/models \
+        --select "$MODEL_SELECTION" \
+        --manifest "$MODELS_MANIFEST" 2>&1 | tee "$MODELS_LOG"
+    if [[ ${PIPESTATUS[0]} -ne 0 ]]; then
+        MODELS_OK=0
+        echo "❌ Some model downloads failed - see $MODELS_LOG (restart the pod to resume)"
     fi
+    echo ""
 
     # Show completion status
     MODELS_LOADED=$((LOAD_COMMON * 1 + LOAD_KLEIN * 3 + LOAD_DEV * 3))
     echo ""
-    echo "✅ FLUX.2 models provisioning complete!"
-    echo "📊 Downloaded: $MODELS_LOADED models (FLUX_MODEL=$FLUX_MODEL)"
+    if [[ $MODELS_OK -eq 1 ]]; then
+        echo "✅ FLUX.2 models provisioning complete!"
+    else
+        echo "⚠️ FLUX.2 models provisioning incomplete"
+    fi
+    echo "📊 Selected: $MODELS_LOADED models (FLUX_MODEL=$FLUX_MODEL)"
     echo "📂 Location: /workspace/ComfyUI/models/"
-    echo "🚀 All models ready for use!"
+    echo "📄 Manifest: $MODELS_MANIFEST"
+    [[ $MODELS_OK -eq 1 ]] && echo "🚀 All models ready for use!"
 
     # provisioning workflows
     echo "📥 Provisioning workflows"
@@ -742,67 +462,14 @@ PYTHON
     fi
 
     # provisioning Models and loras (custom models via env vars)
+    # HF_MODEL_<CATEGORY><N>, HF_MODEL<N>, HF_FULL_MODEL<N> (HF_MODEL_DIR<N>) and
+    # CIVITAI_MODEL_<CATEGORY><N> are resolved into one deduplicated plan against a
+    # single index of the models folder; only missing files are downloaded, concurrently
     echo "📥 Provisioning custom models via environment variables"
-	
-    # categorie:  NAME:SUFFIX:MAP
-    CATEGORIES_HF=(
-      "VAE:VAE_FILENAME:vae"
-      "UPSCALER:UPSCALER_PTH:upscale_models"
-      "LORA:LORA_FILENAME:loras"
-      "TEXT_ENCODERS:TEXT_ENCODERS_FILENAME:text_encoders"
-      "CLIP_VISION:CLIP_VISION_FILENAME:clip_vision"
-      "PATCHES:PATCHES_FILENAME:model_patches"
-      "AUDIO_ENCODERS:AUDIO_ENCODERS_FILENAME:audio_encoders"
-      "DIFFUSION_MODELS:DIFFUSION_MODELS_FILENAME:diffusion_models"
-      "CHECKPOINTS:CHECKPOINTS_FILENAME:checkpoints"
-      "VL:VL_FILENAME:VLM"
-      "SAMS:SAMS_FILENAME:sams"
-      "LATENT_UPSCALE:LATENT_UPSCALE_FILENAME:latent_upscale_models"
-    )
-	
-    for cat in "${CATEGORIES_HF[@]}"; do
-      IFS=":" read -r NAME SUFFIX DIR <<< "$cat"
-	
-      for i in $(seq 1 20); do
-        VAR1="HF_MODEL_${NAME}${i}"
-        VAR2="HF_MODEL_${SUFFIX}${i}"
-        download_model_HF "$VAR1" "$VAR2" "$DIR"
-      done
-    done
-	
-    # Huggingface download file to specified directory
-    for i in $(seq 1 20); do
-        VAR1="HF_MODEL${i}"
-        VAR2="HF_MODEL_FILENAME${i}"
-        DIR_VAR="HF_MODEL_DIR${i}"
-        download_generic_HF "${VAR1}" "${VAR2}" "${!DIR_VAR}"
-    done
-	
-    # Huggingface download full model to specified directory
-    for i in $(seq 1 20); do
-        VAR1="HF_FULL_MODEL${i}"
-        DIR_VAR="HF_MODEL_DIR${i}"
-        download_generic_HF "${VAR1}" "" "${!DIR_VAR}"
-    done  
-	 
-    # provisioning Models and loras CIVITAI
-    echo "📥 Provisioning models CIVITAI"
-	
-    # categorie: NAME:MAP	
-    CATEGORIES_CIVITAI=(
-       "LORA_URL:loras"
-	   "UNET_URL:diffusion_models"
-    )
-
-    for cat in "${CATEGORIES_CIVITAI[@]}"; do
-      IFS=":" read -r NAME DIR <<< "$cat"
-	
-      for i in $(seq 1 50); do
-        VAR1="CIVITAI_MODEL_${NAME}${i}"
-        download_model_CIVITAI "$VAR1" "$DIR"
-      done
-    done
-	
+
+    python3 "${PROVISION_MODELS:-/provision_models.py}" --comfyui-dir /workspace/ComfyUI \
+        || echo "⚠️ Some custom models were not provisioned (see messages above)"
+
     HAS_PROVISIONING=1
 else
     HAS_PROVISIONING=0   
@@ -0,0 +1,53 @@
+"""
+pytest setup for the REST API and comfy_runner unit tests
+
+Puts api/, workflows/ and the repository root (model_downloader.py) on
+sys.path (the modules import each other as siblings) and points
+WORKSPACE_PATH at a temporary directory before comfyui_rest_api is
+imported, so its job store and caches stay out of /workspace. Nothing here
+talks to ComfyUI.
+
+The other test_*.py files are GPU checks run as plain scripts inside the
+pod (see README, Test/Debug); pytest leaves them alone.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+API_DIR = ROOT / 'api'
+WORKFLOWS_DIR = ROOT / 'workflows'
+
+collect_ignore = [
+    'test_environment.py',
+    'test_environment_runpod.py',
+    'test_flash.py',
+    'test_llama_cpp.py',
+    'test_pytorch_cuda.py',
+    'test_sage.py',
+    'test_torch_generic_nms.py',
+]
+
+for path in (API_DIR, WORKFLOWS_DIR, ROOT):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+os.environ['WORKSPACE_PATH'] = tempfile.mkdtemp(prefix='rest-api-tests-')
+os.environ.setdefault('COMFYUI_HOST', '127.0.0.1')
+os.environ.setdefault('COMFYUI_PORT', '9')
+
+
+@pytest.fixture(scope='session')
+def api():
+    """The Flask API module (services not started)"""
+    import comfyui_rest_api
+    return comfyui_rest_api
+
+
+@pytest.fixture(scope='session')
+def workflows_dir() -> Path:
+    return WORKFLOWS_DIR
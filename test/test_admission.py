@@ -0,0 +1,120 @@
+"""Admission control: token bucket refill and the priority-aware queue bound"""
+
+import pytest
+
+import admission as admission_module
+from admission import AdmissionController, TokenBucket, priority_rank
+
+
+def test_bucket_starts_full_and_refills_at_rate():
+    bucket = TokenBucket(rate=2.0, burst=4, now=100.0)
+    assert bucket.tokens == 4
+
+    bucket.tokens = 0
+    bucket.refill(100.5)
+    assert bucket.tokens == pytest.approx(1.0)
+    bucket.refill(110.0)
+    assert bucket.tokens == 4           # capped at burst
+
+
+def test_bucket_ignores_clock_going_backwards():
+    bucket = TokenBucket(rate=1.0, burst=1, now=50.0)
+    bucket.refill(49.0)
+    assert bucket.tokens == 1
+    assert bucket.updated == 50.0
+
+
+def test_bucket_wait_seconds():
+    bucket = TokenBucket(rate=0.5, burst=1, now=0.0)
+    assert bucket.wait_seconds() == 0.0
+    bucket.tokens = 0.5
+    assert bucket.wait_seconds() == pytest.approx(1.0)
+    assert TokenBucket(rate=0.0, burst=0, now=0.0).wait_seconds() == float('inf')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic for the admission module"""
+    now = [1000.0]
+    monkeypatch.setattr(admission_module.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_rate_limit_per_client(clock):
+    controller = AdmissionController(depth=lambda rank: 0, rate=1.0, burst=2, max_queue=0)
+    assert controller.admit('a').admitted
+    assert controller.admit('a').admitted
+    refused = controller.admit('a')
+    assert not refused.admitted
+    assert refused.retry_after == 1
+    assert refused.reason == 'Rate limit exceeded'
+
+    # Another client has its own bucket
+    assert controller.admit('b').admitted
+
+    clock[0] += 1.0
+    assert controller.admit('a').admitted
+    assert controller.rejected_rate == 1
+
+
+def test_buckets_off_by_default(clock):
+    controller = AdmissionController(depth=lambda rank: 0, max_queue=0)
+    assert not controller.enabled
+    assert all(controller.admit('proxy').admitted for _ in range(100))
+
+
+def test_quota_overrides_default_rate(clock):
+    controller = AdmissionController(
+        depth=lambda rank: 0, rate=0.0, max_queue=0,
+        quotas={'key:partner': {'rate': 1.0, 'burst': 1}}
+    )
+    assert controller.admit('key:partner').admitted
+    assert not controller.admit('key:partner').admitted
+    assert controller.admit('anonymous').admitted
+
+
+def test_queue_bound_counts_own_class_and_more_urgent():
+    waiting = {priority_rank('interactive'): 1, priority_rank('batch'): 10}
+    controller = AdmissionController(depth=lambda rank: waiting[rank], max_queue=5)
+
+    refused = controller.admit('client', 'batch')
+    assert not refused.admitted
+    assert refused.reason == 'Queue full (10 jobs waiting)'
+    # A batch backlog does not lock interactive requests out
+    assert controller.admit('client', 'interactive').admitted
+    assert controller.rejected_queue == 1
+    assert controller.admitted == {'interactive': 1, 'batch': 0}
+
+
+def test_queue_full_retry_after_uses_job_duration():
+    controller = AdmissionController(depth=lambda rank: 8, slots=lambda: 2, max_queue=4, job_seconds=10.0)
+    decision = controller.admit('client')
+    # 5 jobs over the bound drained by 2 slots at 10 s each
+    assert decision.retry_after == 25
+
+    controller.observe(20.0, alpha=1.0)
+    assert controller.job_seconds == 20.0
+
+
+def test_unknown_api_keys_are_limited_by_address(api, clock, monkeypatch):
+    monkeypatch.setattr(api, 'ADMISSION_QUOTAS', {'partner': {'rate': 1.0, 'burst': 1}})
+    controller = AdmissionController(
+        depth=lambda rank: 0, rate=1.0, burst=2, max_queue=0,
+        quotas={'key:partner': {'rate': 1.0, 'burst': 1}}
+    )
+
+    def admit(api_key: str, address: str = '10.0.0.7'):
+        headers = {'X-API-Key': api_key} if api_key else {}
+        with api.app.test_request_context(headers=headers, environ_base={'REMOTE_ADDR': address}):
+            return controller.admit(api._client_key())
+
+    # A fresh made-up key per request still draws from the address's bucket
+    assert admit('random-1').admitted
+    assert admit('random-2').admitted
+    assert not admit('random-3').admitted
+    assert not admit(None).admitted
+    assert admit('random-4', address='10.0.0.8').admitted
+
+    # A configured key has its own bucket
+    assert admit('partner').admitted
+    assert not admit('partner').admitted
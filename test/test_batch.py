@@ -0,0 +1,159 @@
+"""Bulk batches: the start window, streamed JSONL results and archives"""
+
+import io
+import json
+import tarfile
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from batch_runner import BatchRunner, stream_tar, stream_zip
+from job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    created = JobStore(tmp_path / 'jobs.sqlite3')
+    yield created
+    created.close()
+
+
+def finish(store: JobStore, job_id: str, status: str = 'completed', **extra):
+    store.save({'job_id': job_id, 'status': status, 'prompt': 'a fox',
+                'created_at': datetime.now().isoformat(), **extra})
+
+
+def test_runner_keeps_the_window_across_batches(store):
+    started = []
+
+    def start_item(request, priority):
+        job_id = f"job-{request['prompt']}"
+        finish(store, job_id, 'queued')
+        started.append((request['prompt'], priority))
+        return job_id
+
+    store.create_batch('first', [{'prompt': f'a{index}'} for index in range(3)], 'batch')
+    store.create_batch('second', [{'prompt': f'b{index}'} for index in range(2)], 'interactive')
+    runner = BatchRunner(store, start_item, window=4)
+
+    runner.advance()
+    assert started == [('a0', 'batch'), ('a1', 'batch'), ('a2', 'batch'), ('b0', 'interactive')]
+    runner.advance()
+    assert len(started) == 4                    # window full, nothing settled
+
+    finish(store, 'job-a0')
+    finish(store, 'job-a1', 'failed', error='boom')
+    runner.advance()
+    assert started[4:] == [('b1', 'interactive')]
+
+    for job_id in ('job-a2', 'job-b0', 'job-b1'):
+        finish(store, job_id)
+    runner.advance()
+    assert [store.get_batch(batch_id)['status'] for batch_id in ('first', 'second')] == ['completed'] * 2
+    assert runner.stats()['items_started'] == 5
+
+
+def entries():
+    yield 'a.png', 5, [b'ab', b'cde']
+    yield 'b.png', 0, []
+    yield 'manifest.jsonl', 3, [b'{}\n']
+
+
+def test_stream_zip_round_trips():
+    data = b''.join(stream_zip(entries()))
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.namelist() == ['a.png', 'b.png', 'manifest.jsonl']
+        assert archive.read('a.png') == b'abcde'
+        assert archive.testzip() is None
+
+
+def test_stream_tar_round_trips():
+    data = b''.join(stream_tar(entries()))
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        assert archive.getnames() == ['a.png', 'b.png', 'manifest.jsonl']
+        assert archive.extractfile('a.png').read() == b'abcde'
+
+
+def test_stream_tar_refuses_a_short_member():
+    with pytest.raises(IOError, match='expected 5 bytes, got 2'):
+        b''.join(stream_tar([('a.png', 5, [b'ab'])]))
+
+
+# ----------------------------------------------------------------------
+# Routes
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def client(api, store, monkeypatch):
+    monkeypatch.setattr(api, 'job_store', store)
+    monkeypatch.setattr(api.backend_pool, 'healthy_backends', lambda: ['backend'])
+    monkeypatch.setattr(api, 'BATCH_POLL_SECONDS', 0.01)
+    return api.app.test_client()
+
+
+def jsonl(*lines) -> str:
+    return ''.join(json.dumps(line) + '\n' for line in lines)
+
+
+def test_invalid_lines_reject_the_whole_batch(client, store):
+    response = client.post('/api/batch', data=jsonl({'prompt': 'ok'}, {'steps': 4}, {'prompt': 'x', 'steps': 'many'}))
+    assert response.status_code == 400
+    assert [error['line'] for error in response.get_json()['errors']] == [2, 3]
+    assert store.running_batches() == []
+
+    assert client.post('/api/batch', data='\n\n').status_code == 400
+    assert client.post('/api/batch?priority=urgent', data=jsonl({'prompt': 'ok'})).status_code == 400
+
+
+def test_batch_is_stored_in_order(client, store):
+    response = client.post('/api/batch', data=jsonl({'prompt': 'a cat'}, {'prompt': 'a dog', 'seed': 7}))
+    assert response.status_code == 202
+    batch_id = response.get_json()['batch_id']
+    assert store.unstarted_items(batch_id, 10) == [(0, {'prompt': 'a cat'}), (1, {'prompt': 'a dog', 'seed': 7})]
+    assert client.get(f'/api/batch/{batch_id}').get_json()['total'] == 2
+
+
+def test_results_stream_in_item_order_and_resume(client, store):
+    store.create_batch('b', [{'prompt': str(index)} for index in range(3)], 'batch')
+    for index in range(3):
+        store.set_item_job('b', index, f'job-{index}')
+    finish(store, 'job-0', seed=1, outputs=[{'filename': 'x_00001_.png'}])
+    finish(store, 'job-1', 'failed', error='out of memory')
+    finish(store, 'job-2', 'processing')
+
+    # Item 2 is still running: the stream stops at the deadline with the resume index
+    lines = [json.loads(line) for line in client.get('/api/batch/b/results?timeout=1').get_data(as_text=True).splitlines()]
+    assert [line.get('index') for line in lines[:2]] == [0, 1]
+    assert lines[0]['outputs'] == [{'filename': 'x_00001_.png'}]
+    assert lines[1]['error'] == 'out of memory'
+    assert lines[-1] == {'timeout': True, 'next': 2}
+
+    finish(store, 'job-2')
+    resumed = client.get('/api/batch/b/results?from=2').get_data(as_text=True).splitlines()
+    assert [json.loads(line)['index'] for line in resumed] == [2]
+
+
+def test_results_stream_validates_its_parameters(client, store):
+    store.create_batch('b', [{'prompt': 'a'}], 'batch')
+    assert client.get('/api/batch/b/results?from=-1').status_code == 400
+    assert client.get('/api/batch/b/results?timeout=0').status_code == 400
+    assert client.get('/api/batch/missing/results').status_code == 404
+
+
+def test_archive_bundles_finished_images(api, client, store):
+    api.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    (api.OUTPUT_DIR / 'batch_00001_.png').write_bytes(b'png bytes')
+    store.create_batch('b', [{'prompt': 'a'}, {'prompt': 'b'}], 'batch')
+    store.set_item_job('b', 0, 'job-0')
+    store.set_item_job('b', 1, 'job-1')
+    finish(store, 'job-0', seed=3, outputs=[{'filename': 'batch_00001_.png', 'type': 'output'}])
+    finish(store, 'job-1', 'failed')
+
+    response = client.get('/api/batch/b/archive')
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert archive.namelist() == ['000000_batch_00001_.png', 'manifest.jsonl']
+        assert archive.read('000000_batch_00001_.png') == b'png bytes'
+        manifest = json.loads(archive.read('manifest.jsonl'))
+    assert (manifest['index'], manifest['job_id'], manifest['seed']) == (0, 'job-0', 3)
+    assert client.get('/api/batch/b/archive?format=rar').status_code == 400
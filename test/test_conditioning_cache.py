@@ -0,0 +1,171 @@
+"""Conditioning cache: node probing in the backend pool, cache keys and the store
+
+The node package needs torch and safetensors (it runs inside ComfyUI); its
+tests are skipped where they are not installed.
+"""
+
+import importlib
+import importlib.util
+import os
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+from backend_pool import BackendPool
+
+NODE_DIR = Path(__file__).resolve().parent.parent / 'custom_nodes' / 'ComfyUI-Conditioning-Cache'
+
+
+class ProbedClient:
+    """ComfyUI client stub answering health checks and /object_info probes"""
+
+    def __init__(self, installed=True):
+        self.installed = installed
+        self.down = False
+        self.probes = 0
+
+    def get_system_stats(self):
+        if self.down:
+            raise ConnectionError('connection refused')
+        return {'devices': []}
+
+    def get_queue(self):
+        return {'queue_running': [], 'queue_pending': []}
+
+    def has_node(self, class_type):
+        self.probes += 1
+        return self.installed
+
+
+def test_pool_supports_a_node_once_every_healthy_backend_has_it():
+    clients = {'http://a:8188': ProbedClient(), 'http://b:8188': ProbedClient(installed=False)}
+    pool = BackendPool(list(clients), client_factory=clients.get, handler=lambda *a: None,
+                       max_failures=1, probe_nodes=['CachedCLIPTextEncode'])
+    a, b = pool.backends.values()
+
+    pool.check_all()
+    pool.check_all()
+    assert clients['http://a:8188'].probes == 1      # asked once, not on every check
+    assert not pool.supports('CachedCLIPTextEncode')
+    assert a.to_dict()['node_classes'] == {'CachedCLIPTextEncode': True}
+
+    # An ejected backend does not count; once re-admitted it is asked again
+    clients['http://b:8188'].down = True
+    pool.check(b)
+    assert pool.supports('CachedCLIPTextEncode')
+    assert not pool.supports('SomethingElse')
+    clients['http://b:8188'].down = False
+    clients['http://b:8188'].installed = True
+    pool.check(b)
+    assert clients['http://b:8188'].probes == 2
+    assert pool.supports('CachedCLIPTextEncode')
+
+
+@pytest.fixture(scope='module')
+def nodes():
+    pytest.importorskip('torch')
+    pytest.importorskip('safetensors')
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('CONDITIONING_CACHE_DIR', '')
+        # Imported as a plain package: its __init__ hooks comfy.sd, which only exists in ComfyUI
+        spec = importlib.util.spec_from_file_location(
+            'conditioning_cache', NODE_DIR / '__init__.py', submodule_search_locations=[str(NODE_DIR)])
+        mp.setitem(sys.modules, 'conditioning_cache', importlib.util.module_from_spec(spec))
+        yield importlib.import_module('conditioning_cache.nodes')
+        for name in ('conditioning_cache.nodes', 'conditioning_cache.store'):
+            sys.modules.pop(name, None)
+
+
+def weights_file(path, seed: int, mtime: int) -> str:
+    import torch
+    from safetensors.torch import save_file
+
+    torch.manual_seed(seed)
+    save_file({'weight': torch.randn(4, 4), 'bias': torch.randn(4)}, str(path))
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def clip(patches=None, **options):
+    import torch
+
+    torch.manual_seed(0)
+    return types.SimpleNamespace(
+        cond_stage_model=torch.nn.Linear(4, 4),
+        patcher=types.SimpleNamespace(patches=patches or {}, patches_uuid=object()),
+        **options,
+    )
+
+
+def test_file_fingerprint_hashes_header_size_and_mtime(nodes, tmp_path):
+    first = weights_file(tmp_path / 'a.safetensors', seed=1, mtime=1_000_000)
+    copy = weights_file(tmp_path / 'b.safetensors', seed=1, mtime=1_000_000)
+    assert nodes.file_fingerprint(first) == nodes.file_fingerprint(copy)
+
+    # Same architecture, other weights: only the file's identity tells them apart
+    tuned = weights_file(tmp_path / 'c.safetensors', seed=2, mtime=2_000_000)
+    assert nodes.file_fingerprint(tuned) != nodes.file_fingerprint(first)
+    os.utime(first, (3_000_000, 3_000_000))
+    assert nodes.file_fingerprint(first) != nodes.file_fingerprint(copy)
+
+
+def test_encoders_from_other_files_get_other_keys(nodes, tmp_path):
+    base = weights_file(tmp_path / 'base.safetensors', seed=1, mtime=1_000_000)
+    tuned = weights_file(tmp_path / 'tuned.safetensors', seed=2, mtime=2_000_000)
+    loaded = [clip(), clip()]
+    nodes._record_files(loaded[0], [base])
+    nodes._record_files(loaded[1], [tuned])
+    unrecorded = clip()
+
+    # Equal weights in memory, so only the recorded files separate the first two
+    keys = [nodes.cache_key(c, 'a red fox') for c in loaded + [unrecorded]]
+    assert len(set(keys)) == 3
+    assert nodes.cache_key(loaded[0], 'a red fox') == keys[0]
+    assert loaded[0].cond_stage_model._conditioning_cache_fingerprint
+
+
+def test_cache_key_covers_text_options_and_patches(nodes):
+    import torch
+
+    plain = clip()
+    key = nodes.cache_key(plain, 'a red fox')
+    assert nodes.cache_key(plain, 'a blue fox') != key
+    assert nodes.cache_key(clip(layer_idx=-2), 'a red fox') != key
+    lora = {'layer.weight': [(0.8, torch.ones(4, 4), 1.0, None, None)]}
+    stronger = {'layer.weight': [(1.0, torch.ones(4, 4), 1.0, None, None)]}
+    assert len({key, nodes.cache_key(clip(lora), 'a red fox'), nodes.cache_key(clip(stronger), 'a red fox')}) == 3
+    assert nodes.cache_key(clip(use_clip_schedule=True), 'a red fox') is None
+
+
+def test_store_round_trips_through_ram_and_disk(nodes, tmp_path):
+    import torch
+
+    store_module = sys.modules['conditioning_cache.store']
+    conditioning = [[torch.randn(1, 8, 16), {'pooled_output': torch.randn(1, 16), 'guidance': 3.5}]]
+    store = store_module.ConditioningStore(str(tmp_path), max_ram_bytes=1024 ** 2, max_disk_bytes=1024 ** 2)
+    assert store.put('ab' * 32, conditioning)
+    assert not store.put('cd' * 32, [[torch.randn(1, 8, 16), {'hook': object()}]])
+
+    reopened = store_module.ConditioningStore(str(tmp_path), max_ram_bytes=1024 ** 2, max_disk_bytes=1024 ** 2)
+    [[cond, extras]] = reopened.get('ab' * 32)
+    assert torch.equal(cond, conditioning[0][0])
+    assert torch.equal(extras['pooled_output'], conditioning[0][1]['pooled_output'])
+    assert extras['guidance'] == 3.5
+    reopened.get('ab' * 32)
+    assert reopened.get('ef' * 32) is None
+    assert reopened.stats()['hits'] == {'ram': 1, 'disk': 1} and reopened.stats()['misses'] == 1
+
+
+def test_store_prunes_the_oldest_files_over_budget(nodes, tmp_path):
+    import torch
+
+    store_module = sys.modules['conditioning_cache.store']
+    store = store_module.ConditioningStore(str(tmp_path), max_ram_bytes=0, max_disk_bytes=10 * 1024)
+    keys = [f'{i:02x}' * 32 for i in range(4)]
+    for key in keys:
+        store.put(key, [[torch.zeros(1, 1024), {}]])     # ~4 KB per file
+    on_disk = [key for key in keys if os.path.exists(store.path(key))]
+    assert on_disk and on_disk == keys[-len(on_disk):] and len(on_disk) < len(keys)
+    assert store.stats()['disk_mb'] <= 10 / 1024
@@ -0,0 +1,178 @@
+"""/api/image: ETags, ranges, variants and Accept negotiation in both servers"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from image_variants import ImageVariants, accept_quality, file_etag, parse_accept
+
+PIL = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def variants(tmp_path):
+    created = ImageVariants(tmp_path / 'variants', sizes=(128, 256), workers=1)
+    yield created
+    created._executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'Flux2_00001_.png'
+    PIL.new('RGB', (640, 480), (200, 40, 40)).save(path)
+    return path
+
+
+def test_parse_accept_reads_q_values():
+    ranges = parse_accept('image/webp;q=0.5, image/*; q=0.8, */*;q=0, text/html;q=bad')
+    assert ranges == {'image/webp': 0.5, 'image/*': 0.8, '*/*': 0.0, 'text/html': 0.0}
+    assert accept_quality('jpeg', ranges) == 0.8
+    assert accept_quality('webp', ranges) == 0.5
+    # Wildcards never vouch for AVIF or WebP
+    assert accept_quality('avif', {'*/*': 1.0}) == 0.0
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('', 'jpeg'),
+    ('*/*', 'jpeg'),
+    ('image/png', 'png'),
+    ('image/png, image/jpeg;q=0', 'png'),
+    ('image/jpeg;q=0, */*', 'png'),
+    ('text/html', 'png'),
+    ('image/webp;q=0.5, image/jpeg', 'jpeg'),
+    ('image/webp, */*;q=0.8', 'webp'),
+])
+def test_negotiate(variants, accept, expected):
+    if expected == 'webp' and 'webp' not in variants.formats:
+        pytest.skip('Pillow without WebP')
+    assert variants.negotiate(accept) == expected
+
+
+def test_size_only_request_with_png_accept_stays_png(variants):
+    assert variants.resolve(None, '100', 'image/png') == ('png', 128, True)
+    assert variants.resolve(None, None, 'image/png') is None
+    with pytest.raises(ValueError):
+        variants.resolve(None, '0', '')
+
+
+def test_variant_is_rendered_once(variants, source):
+    path = variants.get(source, 'jpeg', 128)
+    with PIL.open(path) as image:
+        assert image.format == 'JPEG'
+        assert max(image.size) == 128
+    etag = file_etag(path)
+    assert variants.get(source, 'jpeg', 128) == path
+    assert (variants.rendered, variants.hits) == (1, 1)
+    # A hit records its use without changing the variant's ETag
+    assert file_etag(path) == etag
+
+
+def test_replaced_source_gets_a_new_variant(variants, source):
+    first = variants.get(source, 'jpeg', 128)
+    PIL.new('RGB', (320, 320), (0, 0, 255)).save(source)
+    os.utime(source, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert variants.get(source, 'jpeg', 128) != first
+
+
+def test_cache_evicts_least_recently_served(variants, source, tmp_path):
+    sources = []
+    for index in range(3):
+        path = tmp_path / f'img_{index}.png'
+        PIL.new('RGB', (512, 512), (index * 80, 0, 0)).save(path)
+        sources.append(path)
+    paths = [variants.get(path, 'png', 256) for path in sources]
+    for age, path in zip((300, 200, 100), paths):
+        os.utime(path, (time.time() - age, path.stat().st_mtime))
+    variants.get(sources[0], 'png', 256)        # served again: now the most recent
+
+    variants.max_bytes = sum(path.stat().st_size for path in paths) - 1
+    variants.prune()
+    assert [path.exists() for path in paths] == [True, False, True]
+    assert variants.evictions == 1
+
+
+def test_cache_drops_variants_past_max_age(variants, source):
+    path = variants.get(source, 'jpeg', 128)
+    os.utime(path, (time.time() - 7200, path.stat().st_mtime))
+    variants.max_age = 3600
+    variants.prune()
+    assert not path.exists()
+    assert variants.stats()['disk_mb'] == 0.0
+
+
+# ----------------------------------------------------------------------
+# Both servers
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def output_image(api, variants, monkeypatch):
+    monkeypatch.setattr(api, 'image_variants', variants)
+    api.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    path = api.OUTPUT_DIR / 'Flux2_Turbo_00001_.png'
+    PIL.new('RGB', (640, 480), (10, 120, 10)).save(path)
+    yield path
+    path.unlink()
+
+
+def test_flask_serves_etag_304_and_ranges(api, output_image):
+    client = api.app.test_client()
+    response = client.get(f'/api/image/{output_image.name}')
+    assert response.status_code == 200
+    assert response.data == output_image.read_bytes()
+    assert response.headers['Content-Disposition'].startswith('attachment')
+    etag = response.headers['ETag']
+
+    assert client.get(f'/api/image/{output_image.name}', headers={'If-None-Match': etag}).status_code == 304
+    partial = client.get(f'/api/image/{output_image.name}', headers={'Range': 'bytes=0-99'})
+    assert partial.status_code == 206
+    assert partial.data == output_image.read_bytes()[:100]
+
+
+def test_flask_negotiates_variants(api, output_image):
+    client = api.app.test_client()
+    png = client.get(f'/api/image/{output_image.name}?size=128', headers={'Accept': 'image/png'})
+    assert png.status_code == 200
+    assert png.headers['Content-Type'] == 'image/png'
+    assert png.headers['Vary'] == 'Accept'
+    assert png.headers['Content-Disposition'].startswith('inline')
+
+    jpeg = client.get(f'/api/image/{output_image.name}?size=128', headers={'Accept': '*/*'})
+    assert jpeg.headers['Content-Type'] == 'image/jpeg'
+    assert client.get(f'/api/image/{output_image.name}?format=tiff').status_code == 400
+
+
+def test_flask_answers_202_while_a_variant_renders(api, output_image, monkeypatch):
+    monkeypatch.setattr(api.image_variants, 'wait_seconds', 0.0)
+    monkeypatch.setattr(api.image_variants, '_render', lambda *args: time.sleep(0.5))
+    response = api.app.test_client().get(f'/api/image/{output_image.name}?size=256&format=jpeg')
+    assert response.status_code == 202
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_async_server_sends_the_same_headers(api, output_image):
+    aiohttp = pytest.importorskip('aiohttp')
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+    import async_server
+
+    flask_client = api.app.test_client()
+    expected = flask_client.get(f'/api/image/{output_image.name}?size=128&format=jpeg').headers
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/api/image/{filename}', async_server.download_image)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get(f'/api/image/{output_image.name}?size=128&format=jpeg')
+            assert response.status == 200
+            for name in ('ETag', 'Content-Type', 'Content-Disposition', 'Cache-Control'):
+                assert response.headers[name] == expected[name]
+            cached = await client.get(f'/api/image/{output_image.name}?size=128&format=jpeg',
+                                      headers={'If-None-Match': response.headers['ETag']})
+            assert cached.status == 304
+            partial = await client.get(f'/api/image/{output_image.name}', headers={'Range': 'bytes=10-19'})
+            assert partial.status == 206
+            assert await partial.read() == output_image.read_bytes()[10:20]
+
+    asyncio.run(run())
@@ -0,0 +1,144 @@
+"""AffinityScheduler: dispatch order, fairness window and cancellation"""
+
+import threading
+import time
+
+import pytest
+
+from backend_pool import BackendPool
+from job_scheduler import AffinityScheduler, PendingJob
+
+FLUX = ('flux2_dev.safetensors',)
+KLEIN = ('flux2_klein.safetensors',)
+
+
+class Recorder:
+    """submit callback: records job ids and frees the backend slot again"""
+
+    def __init__(self, pool: BackendPool, expected: int):
+        self.pool = pool
+        self.expected = expected
+        self.order = []
+        self.done = threading.Event()
+
+    def __call__(self, job: PendingJob, backend) -> bool:
+        self.order.append(job.job_id)
+        self.pool.release(backend)
+        if len(self.order) >= self.expected:
+            self.done.set()
+        return True
+
+
+def make_scheduler(expected: int, loaded=(), fairness_seconds=30.0):
+    pool = BackendPool(['http://127.0.0.1:9'], client_factory=lambda url: None, handler=lambda *a: None)
+    backend = pool.primary()
+    backend.loaded_models = tuple(loaded)
+    recorder = Recorder(pool, expected)
+    scheduler = AffinityScheduler(pool, submit=recorder, fairness_seconds=fairness_seconds, max_inflight=1)
+    return scheduler, recorder
+
+
+def run(scheduler, recorder, jobs):
+    for job in jobs:
+        scheduler.enqueue(job)
+    scheduler.start()
+    try:
+        assert recorder.done.wait(5), f'only dispatched {recorder.order}'
+    finally:
+        scheduler.stop()
+    return recorder.order
+
+
+def test_interactive_jobs_dispatch_before_batch_jobs():
+    scheduler, recorder = make_scheduler(3)
+    order = run(scheduler, recorder, [
+        PendingJob('batch-1', {}, FLUX, priority=1),
+        PendingJob('batch-2', {}, FLUX, priority=1),
+        PendingJob('interactive', {}, FLUX, priority=0),
+    ])
+    assert order == ['interactive', 'batch-1', 'batch-2']
+
+
+def test_jobs_for_the_loaded_models_go_first():
+    scheduler, recorder = make_scheduler(3, loaded=FLUX)
+    order = run(scheduler, recorder, [
+        PendingJob('klein', {}, KLEIN),
+        PendingJob('flux-1', {}, FLUX),
+        PendingJob('flux-2', {}, FLUX),
+    ])
+    assert order == ['flux-1', 'flux-2', 'klein']
+    assert scheduler.swaps == 1
+
+
+def test_fairness_window_overrides_affinity():
+    scheduler, recorder = make_scheduler(2, loaded=FLUX, fairness_seconds=30.0)
+    stale = PendingJob('klein', {}, KLEIN, enqueued_at=time.monotonic() - 60)
+    order = run(scheduler, recorder, [stale, PendingJob('flux', {}, FLUX)])
+    assert order == ['klein', 'flux']
+    assert scheduler.fairness_overrides == 1
+
+
+def test_priority_classes_are_not_reordered_across():
+    # A batch job for the loaded models never jumps an interactive one
+    scheduler, recorder = make_scheduler(2, loaded=FLUX)
+    order = run(scheduler, recorder, [
+        PendingJob('batch-flux', {}, FLUX, priority=1),
+        PendingJob('interactive-klein', {}, KLEIN, priority=0),
+    ])
+    assert order == ['interactive-klein', 'batch-flux']
+
+
+def test_unready_jobs_do_not_block_others():
+    pool = BackendPool(['http://127.0.0.1:9'], client_factory=lambda url: None, handler=lambda *a: None)
+    recorder = Recorder(pool, 1)
+    scheduler = AffinityScheduler(pool, submit=recorder, ready=lambda job: job.job_id != 'downloading')
+    order = run(scheduler, recorder, [PendingJob('downloading', {}, KLEIN), PendingJob('ready', {}, FLUX)])
+    assert order == ['ready']
+    assert [job['job_id'] for job in scheduler.pending()] == ['downloading']
+
+
+def test_remove_single_job():
+    scheduler, _ = make_scheduler(0)
+    scheduler.enqueue(PendingJob('a', {}))
+    scheduler.enqueue(PendingJob('b', {}))
+    assert scheduler.remove('a')
+    assert not scheduler.remove('a')
+    assert [job['job_id'] for job in scheduler.pending()] == ['b']
+
+
+def test_remove_batch_member_keeps_the_others():
+    scheduler, _ = make_scheduler(0)
+    scheduler.enqueue(PendingJob('a', {}, members=['a', 'b', 'c']))
+    assert scheduler.depth() == 3
+
+    assert scheduler.remove('a')
+    pending = scheduler.pending()
+    assert pending[0]['job_id'] == 'b'
+    assert pending[0]['jobs'] == ['b', 'c']
+    assert scheduler.depth() == 2
+
+    assert scheduler.remove('c')
+    assert scheduler.remove('b')
+    assert scheduler.pending() == []
+
+
+def test_depth_counts_by_priority():
+    scheduler, _ = make_scheduler(0)
+    scheduler.enqueue(PendingJob('i', {}, priority=0))
+    scheduler.enqueue(PendingJob('b', {}, members=['b', 'c'], priority=1))
+    assert scheduler.depth(0) == 1
+    assert scheduler.depth(1) == 3
+    assert scheduler.depth() == 3
+
+
+@pytest.mark.parametrize('queue_remaining, pending, idle', [
+    (0, False, True),
+    (1, False, False),
+    (0, True, False),
+])
+def test_idle(queue_remaining, pending, idle):
+    scheduler, _ = make_scheduler(0)
+    scheduler.pool.primary().queue_remaining = queue_remaining
+    if pending:
+        scheduler.enqueue(PendingJob('a', {}))
+    assert scheduler.idle() is idle
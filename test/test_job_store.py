@@ -0,0 +1,104 @@
+"""JobStore: jobs and batches survive closing and reopening the database"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from job_store import JobStore
+
+
+def job(job_id: str, status: str, minutes_ago: int, **extra) -> dict:
+    created = (datetime.now() - timedelta(minutes=minutes_ago)).isoformat()
+    return {'job_id': job_id, 'status': status, 'prompt': 'a fox', 'created_at': created, **extra}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / 'jobs.sqlite3'
+
+
+def reopen(store: JobStore, db_path) -> JobStore:
+    store.close()
+    return JobStore(db_path)
+
+
+def test_unfinished_jobs_are_recovered_in_creation_order(db_path):
+    store = JobStore(db_path)
+    store.save_many([
+        job('processing', 'processing', 3, prompt_id='p-1', backend='127.0.0.1:8188'),
+        job('queued', 'queued', 1),
+        job('done', 'completed', 5, completed_at=datetime.now().isoformat(),
+            outputs=[{'filename': 'Flux2_00001_.png'}]),
+        job('cancelled', 'cancelled', 2),
+    ])
+
+    store = reopen(store, db_path)
+    assert [data['job_id'] for data in store.unfinished()] == ['processing', 'queued']
+    recovered = store.unfinished()[0]
+    assert recovered['prompt_id'] == 'p-1'
+    assert recovered['backend'] == '127.0.0.1:8188'
+
+
+def test_finished_jobs_are_found_after_restart(db_path):
+    store = JobStore(db_path)
+    store.save(job('a', 'queued', 1))
+    store.save(job('a', 'completed', 1, prompt_id='p-2', outputs=[{'filename': 'x_00001_.png'}]))
+
+    store = reopen(store, db_path)
+    assert store.get('a')['status'] == 'completed'
+    assert [data['job_id'] for data in store.find_by_prompt('p-2')] == ['a']
+    assert store.find_output('x_00001_.png')['job_id'] == 'a'
+    assert store.unfinished() == []
+    assert store.count(['completed']) == 1
+
+
+def test_batch_resumes_with_unstarted_items(db_path):
+    store = JobStore(db_path)
+    items = [{'prompt': f'item {index}'} for index in range(4)]
+    store.create_batch('batch-1', items, 'batch', client='key:test')
+    store.save(job('job-0', 'completed', 1))
+    store.set_item_job('batch-1', 0, 'job-0')
+    store.save(job('job-1', 'processing', 1))
+    store.set_item_job('batch-1', 1, 'job-1')
+
+    store = reopen(store, db_path)
+    assert [batch['batch_id'] for batch in store.running_batches()] == ['batch-1']
+    assert store.unstarted_items('batch-1', 10) == [(2, items[2]), (3, items[3])]
+    assert store.batch_counts('batch-1') == {'completed': 1, 'processing': 1, 'pending': 2}
+    listed = store.batch_items('batch-1', start=1)
+    assert [item['index'] for item in listed] == [1, 2, 3]
+    assert listed[0]['job']['status'] == 'processing'
+    assert listed[1]['job'] is None
+
+
+def test_finished_batches_are_not_resumed(db_path):
+    store = JobStore(db_path)
+    store.create_batch('batch-1', [{'prompt': 'a'}], 'batch')
+    store.set_batch_status('batch-1', 'cancelled')
+
+    store = reopen(store, db_path)
+    assert store.running_batches() == []
+    assert store.get_batch('batch-1')['completed_at'] is not None
+
+
+def test_api_reattaches_submitted_jobs_after_restart(api, db_path, monkeypatch):
+    store = JobStore(db_path)
+    store.save_many([
+        job('member-1', 'processing', 2, prompt_id='p-9', batch_index=1, batch_size=2),
+        job('member-0', 'queued', 2, prompt_id='p-9', batch_index=0, batch_size=2),
+        job('unsubmitted', 'queued', 1),
+    ])
+    store = reopen(store, db_path)
+
+    monkeypatch.setattr(api, 'job_store', store)
+    monkeypatch.setattr(api, '_reconcile_recovered', lambda statuses: None)
+    monkeypatch.setattr(api, 'jobs', {})
+    monkeypatch.setattr(api, 'prompt_jobs', {})
+    api.recover_jobs()
+
+    assert set(api.jobs) == {'member-0', 'member-1'}
+    # Batch members are re-linked to their prompt in batch-index order
+    assert api.prompt_jobs == {'p-9': ['member-0', 'member-1']}
+    lost = store.get('unsubmitted')
+    assert lost['status'] == 'failed'
+    assert 'restarted' in lost['error']
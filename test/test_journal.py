@@ -0,0 +1,168 @@
+"""Generation journal: rotated segments, reading them back and journal_stats"""
+
+import argparse
+import gzip
+import json
+import os
+import time
+
+import pytest
+
+from comfy_runner.journal import (
+    ACTIVE_NAME, GenerationJournal, make_record, read_records, segments, workflow_models,
+)
+from comfy_runner.journal_stats import Quantiles, aggregate, format_table, main, parse_time, parse_where
+
+
+def record(status='completed', ts='2026-01-17T10:00:00.000Z', total=1.0, **fields):
+    return {'ts': ts, 'source': 'comfy-run', 'status': status, 'timings': {'total': total}, **fields}
+
+
+def test_make_record_and_workflow_models(monkeypatch):
+    monkeypatch.setenv('RUNPOD_POD_ID', 'pod-7')
+    made = make_record('comfy-run', 'completed', id='img-1', seed=None, steps=4)
+    assert made['pod'] == 'pod-7'
+    assert made['ts'].endswith('Z')
+    assert 'seed' not in made and made['steps'] == 4
+
+    assert workflow_models({
+        '1': {'class_type': 'UNETLoader', 'inputs': {'unet_name': 'flux2_dev.safetensors'}},
+        '2': {'class_type': 'LoraLoader', 'inputs': {'lora_name': 'style.safetensors', 'clip': ['1', 0]}},
+        '3': {'class_type': 'VAELoader', 'inputs': {'vae_name': 'flux2-vae.safetensors'}},
+        '4': {'class_type': 'KSampler', 'inputs': {'seed': 1}},
+        '5': {'class_type': 'Note'},
+    }) == ['flux2-vae.safetensors', 'flux2_dev.safetensors', 'style.safetensors']
+
+
+def test_from_env(tmp_path):
+    assert GenerationJournal.from_env(str(tmp_path), {'GENERATION_JOURNAL': 'false'}) is None
+    journal = GenerationJournal.from_env(str(tmp_path / 'journal'), {
+        'GENERATION_JOURNAL_SEGMENT_MB': '0.5', 'GENERATION_JOURNAL_KEEP': '3'})
+    assert (journal.max_bytes, journal.keep) == (512 * 1024, 3)
+    assert os.path.isdir(journal.directory)
+
+
+def test_segments_rotate_compress_and_prune(tmp_path):
+    journal = GenerationJournal(str(tmp_path), max_bytes=200, keep=2)
+    for i in range(13):
+        journal.append(record(id=f'img-{i}', prompt='x' * 60))
+
+    paths = segments(str(tmp_path))
+    closed = [os.path.basename(path) for path in paths[:-1]]
+    assert len(closed) == 2 and all(name.endswith('.jsonl.gz') for name in closed)
+    assert paths[-1] == str(tmp_path / ACTIVE_NAME)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+    # Segments stay in order; the oldest records went with the pruned segments
+    ids = [int(r['id'].split('-')[1]) for r in read_records(paths)]
+    assert ids == sorted(ids) and ids[-1] == 12 and ids[0] > 0
+    with gzip.open(paths[0], 'rt') as f:
+        assert json.loads(f.readline())['id'] == f'img-{ids[0]}'
+
+
+def test_segment_being_compressed_is_read_once(tmp_path):
+    closed = tmp_path / 'journal-20260117T100000000000-1.jsonl'
+    closed.write_text(json.dumps(record(id='a')) + '\n')
+    with gzip.open(f'{closed}.gz', 'wt') as f:
+        f.write(json.dumps(record(id='a')) + '\n')
+    assert segments(str(tmp_path)) == [f'{closed}.gz']
+
+
+def test_read_records_skips_torn_lines_and_old_segments(tmp_path):
+    old = tmp_path / 'journal-20260101T000000000000-1.jsonl'
+    old.write_text(json.dumps(record(id='old')) + '\n')
+    os.utime(old, (1000, 1000))
+    active = tmp_path / ACTIVE_NAME
+    active.write_text(json.dumps(record(id='new')) + '\n[1]\n{"id": "to')
+
+    paths = segments(str(tmp_path))
+    assert [r['id'] for r in read_records(paths)] == ['old', 'new']
+    assert [r['id'] for r in read_records(paths, since=time.time() - 60)] == ['new']
+    assert list(read_records([str(tmp_path / 'missing.jsonl')])) == []
+
+
+def test_quantiles_stay_within_one_percent():
+    quantiles = Quantiles()
+    for value in range(1, 101):
+        quantiles.add(float(value))
+    assert quantiles.quantile(0.5) == pytest.approx(50, rel=0.01)
+    assert quantiles.quantile(0.95) == pytest.approx(95, rel=0.01)
+    assert quantiles.quantile(0.99) == pytest.approx(99, rel=0.01)
+    assert (quantiles.mean, quantiles.max) == (50.5, 100.0)
+    assert Quantiles().quantile(0.5) is None
+
+
+def test_aggregate_groups_failures_and_throughput():
+    records = [
+        record(ts='2026-01-17T10:00:00Z', total=2.0, workflow='klein', width=1024, height=1024, outputs=['a', 'b']),
+        record(ts='2026-01-17T11:00:00Z', total=4.0, workflow='klein', width=1024, height=1024, outputs=['c']),
+        record('failed', ts='2026-01-17T10:30:00Z', workflow='klein', width=1024, height=1024),
+        record('cancelled', ts='2026-01-17T10:40:00Z', workflow='klein', width=1024, height=1024),
+        record(ts='2026-01-17T12:00:00Z', total=9.0, workflow='dev', source='rest-api'),
+    ]
+    groups, overall = aggregate(records, ['workflow', 'resolution'])
+
+    klein = groups[('klein', '1024x1024')].summary()
+    assert klein['records'] == 4
+    assert klein['outcomes'] == {'completed': 2, 'failed': 1, 'cancelled': 1}
+    assert klein['failure_rate'] == pytest.approx(1 / 3, abs=1e-4)
+    assert klein['latency']['count'] == 2 and klein['latency']['max'] == 4.0
+    assert klein['throughput'] == {'completed_per_hour': 2.0, 'images_per_hour': 3.0}
+    assert (klein['first'], klein['last']) == ('2026-01-17T10:00:00Z', '2026-01-17T11:00:00Z')
+    assert ('dev', '-') in groups and overall.records == 5
+
+    groups, overall = aggregate(records, ['day'], where=[('source', 'rest-api')])
+    assert list(groups) == [('2026-01-17',)] and overall.records == 1
+    _, overall = aggregate(records, [], since=parse_time('2026-01-17T10:35:00Z'), until=parse_time('2026-01-17T12:00:00Z'))
+    assert overall.records == 2
+
+    lines = format_table(*aggregate(records, ['workflow']), ['workflow'], 'total')
+    assert lines[0].split()[:3] == ['workflow', 'n', 'ok']
+    assert lines[-1].split()[:3] == ['all', '5', '3']
+
+
+def test_parse_time_and_where():
+    assert parse_time('2026-01-17') == parse_time('2026-01-17T00:00:00Z')
+    assert time.time() - parse_time('12h') == pytest.approx(12 * 3600, abs=5)
+    assert parse_where('source=rest-api') == ('source', 'rest-api')
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_time('yesterday')
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_where('source')
+
+
+def test_main_prints_json_and_table(tmp_path, capsys):
+    journal = GenerationJournal(str(tmp_path))
+    journal.append(record(total=3.0, workflow='klein', steps=4))
+    journal.append(record('failed', workflow='klein', steps=4))
+
+    assert main([str(tmp_path), '--group-by', 'workflow', '--json']) == 0
+    report = json.loads(capsys.readouterr().out)
+    [group] = report['groups']
+    assert (group['workflow'], group['records'], group['failure_rate']) == ('klein', 2, 0.5)
+    assert report['overall']['latency']['p50'] == pytest.approx(3.0, rel=0.01)
+
+    assert main([str(tmp_path), '--group-by', 'steps']) == 0
+    assert capsys.readouterr().out.splitlines()[2].split()[:3] == ['4', '2', '1']
+    assert main([str(tmp_path), '--where', 'workflow=dev']) == 1
+    assert main([str(tmp_path / 'empty')]) == 1
+
+
+def test_api_journals_finished_jobs(api, tmp_path, monkeypatch):
+    journal = GenerationJournal(str(tmp_path))
+    monkeypatch.setattr(api, 'journal', journal)
+    status = api.GenerationStatus(
+        job_id='job-1', status='completed', prompt='a fox', workflow=api.DEFAULT_WORKFLOW, seed=7,
+        width=1024, height=768, total_steps=4, outputs=[{'filename': 'out_00001_.png'}],
+        created_at='2026-01-17T10:00:00', started_at='2026-01-17T10:00:02', completed_at='2026-01-17T10:00:07',
+    )
+    api._journal(api.asdict(status))
+    api._drain_journal()
+
+    [written] = read_records(segments(str(tmp_path)))
+    assert (written['source'], written['status'], written['id']) == ('rest-api', 'completed', 'job-1')
+    assert written['timings'] == {'queue': 2.0, 'execution': 5.0, 'total': 7.0}
+    assert written['outputs'] == ['out_00001_.png']
+    assert (written['steps'], written['seed']) == (4, 7)
+    assert written['models'] == list(api.workflow_templates.get(api.DEFAULT_WORKFLOW).models)
+    assert 'error' not in written and 'cache_hit' not in written
@@ -0,0 +1,126 @@
+"""Prometheus exposition, stage timings from ComfyUI events and GET /metrics"""
+
+import types
+
+import pytest
+
+import metrics as metrics_module
+from metrics import CONTENT_TYPE, ExecutionTimeline, Registry
+
+
+def sample(text: str, line_start: str) -> float:
+    """Value of the first exposition line starting with line_start"""
+    for line in text.splitlines():
+        if line.startswith(line_start + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    raise AssertionError(f'{line_start} not in output')
+
+
+def test_counters_gauges_and_escaping():
+    registry = Registry()
+    requests = registry.counter('api_requests_total', 'Requests', ('route', 'status'))
+    vram = registry.gauge('vram_bytes', 'VRAM in use', ('gpu',))
+    requests.inc(route='/api/image/<filename>', status=200)
+    requests.inc(2, route='/api/image/<filename>', status=200)
+    requests.inc(route='say "hi"\n', status=500)
+    vram.set(1.5e9, gpu='0')
+    vram.set(2e9, gpu='0')
+
+    text = registry.render()
+    assert '# TYPE api_requests_total counter' in text
+    assert sample(text, 'api_requests_total{route="/api/image/<filename>",status="200"}') == 3
+    assert 'route="say \\"hi\\"\\n"' in text
+    assert sample(text, 'vram_bytes{gpu="0"}') == 2e9
+    assert text.endswith('\n')
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, route='/a')
+
+    text = registry.render()
+    assert sample(text, 'latency_seconds_bucket{route="/a",le="0.1"}') == 2
+    assert sample(text, 'latency_seconds_bucket{route="/a",le="1"}') == 3
+    assert sample(text, 'latency_seconds_bucket{route="/a",le="+Inf"}') == 4
+    assert sample(text, 'latency_seconds_sum{route="/a"}') == pytest.approx(3.65)
+    assert sample(text, 'latency_seconds_count{route="/a"}') == 4
+
+
+def test_failing_collector_does_not_break_the_scrape():
+    registry = Registry()
+    gauge = registry.gauge('jobs', 'Jobs')
+
+    def broken():
+        raise RuntimeError('backend gone')
+
+    registry.add_collector(broken)
+    registry.add_collector(lambda: gauge.set(3))
+    assert sample(registry.render(), 'jobs') == 3
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(metrics_module, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+WORKFLOW = {
+    '1': {'class_type': 'UNETLoader'},
+    '2': {'class_type': 'KSampler'},
+    '3': {'class_type': 'VAEDecode'},
+}
+
+
+def test_timeline_turns_events_into_stage_and_node_timings(clock):
+    registry = Registry()
+    timeline = ExecutionTimeline(registry)
+
+    timeline.submitted('p1', created_age=2.0, workflow=WORKFLOW)
+    for advance, event, data in [
+        (0.5, 'execution_start', {}),
+        (0.0, 'execution_cached', {'nodes': ['1']}),
+        (0.25, 'executing', {'node': '2'}),
+        (4.0, 'executing', {'node': '3'}),
+        (1.0, 'executing', {'node': None}),
+    ]:
+        clock[0] += advance
+        timeline.event(event, {'prompt_id': 'p1', **data})
+    timeline.event('execution_start', {'prompt_id': 'unknown'})
+
+    text = registry.render()
+    stages = {stage: sample(text, f'comfyapi_job_stage_seconds_sum{{stage="{stage}"}}')
+              for stage in ('api_queue', 'comfyui_queue', 'first_node', 'execution', 'total')}
+    assert stages == {'api_queue': 2.0, 'comfyui_queue': 0.5, 'first_node': 0.25, 'execution': 5.25, 'total': 7.75}
+    assert sample(text, 'comfyapi_node_execution_seconds_sum{class_type="KSampler"}') == 4.0
+    assert sample(text, 'comfyapi_node_execution_seconds_sum{class_type="VAEDecode"}') == 1.0
+    assert sample(text, 'comfyapi_node_cached_total{class_type="UNETLoader"}') == 1
+    assert sample(text, 'comfyapi_prompts_finished_total{outcome="completed"}') == 1
+
+
+def test_failed_prompts_count_without_execution_timings(clock):
+    registry = Registry()
+    timeline = ExecutionTimeline(registry, retain=1)
+    timeline.submitted('dropped', 0.0, WORKFLOW)
+    timeline.submitted('p2', 0.0, WORKFLOW)
+    timeline.event('execution_start', {'prompt_id': 'p2'})
+    timeline.event('execution_error', {'prompt_id': 'p2'})
+    timeline.event('execution_success', {'prompt_id': 'dropped'})     # beyond retain: forgotten
+
+    text = registry.render()
+    assert sample(text, 'comfyapi_prompts_finished_total{outcome="failed"}') == 1
+    assert 'outcome="completed"' not in text
+    assert 'stage="execution"' not in text
+
+
+def test_metrics_endpoint_counts_requests_by_route(api):
+    client = api.app.test_client()
+    client.get('/api/workflows')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    assert sample(text, 'comfyapi_http_requests_total{method="GET",route="/api/workflows",status="200"}') >= 1
+    assert 'comfyapi_http_request_duration_seconds_bucket{method="GET",route="/api/workflows",le="+Inf"}' in text
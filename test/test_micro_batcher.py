@@ -0,0 +1,199 @@
+"""Micro-batching: grouping by key, flush timing and per-item seeds"""
+
+import json
+import threading
+import time
+from dataclasses import replace
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+ITEMS = ('prompt', 'seed')
+
+
+class Flushes:
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.batches = []
+        self.done = threading.Event()
+
+    def __call__(self, key, items):
+        self.batches.append((key, [item for item in items]))
+        if len(self.batches) >= self.expected:
+            self.done.set()
+
+
+@pytest.fixture
+def batcher():
+    created = []
+
+    def make(expected: int, max_wait: float = 0.05, max_size: int = 4):
+        flushes = Flushes(expected)
+        micro_batcher = MicroBatcher(flush=flushes, max_wait=max_wait, max_size=max_size)
+        created.append(micro_batcher)
+        return micro_batcher, flushes
+
+    yield make
+    for micro_batcher in created:
+        micro_batcher.stop()
+
+
+def test_items_are_grouped_by_key(batcher):
+    micro_batcher, flushes = batcher(2)
+    for item, key in (('a1', 'a'), ('b1', 'b'), ('a2', 'a')):
+        micro_batcher.add(key, item)
+    micro_batcher.start()
+    assert flushes.done.wait(2)
+    assert sorted(flushes.batches) == [('a', ['a1', 'a2']), ('b', ['b1'])]
+    assert micro_batcher.stats()['mean_batch_size'] == 1.5
+
+
+def test_full_group_flushes_before_the_deadline(batcher):
+    micro_batcher, flushes = batcher(1, max_wait=30.0, max_size=3)
+    micro_batcher.start()
+    started = time.monotonic()
+    for index in range(3):
+        micro_batcher.add('key', index)
+    assert flushes.done.wait(2)
+    assert time.monotonic() - started < 5
+    assert flushes.batches == [('key', [0, 1, 2])]
+
+
+def test_full_group_is_closed_to_new_items(batcher):
+    micro_batcher, flushes = batcher(3, max_wait=0.05, max_size=2)
+    # Added before the flush thread runs: the fifth item must not join a full group
+    for index in range(5):
+        micro_batcher.add('key', index)
+    assert micro_batcher.pending() == 5
+    micro_batcher.start()
+    assert flushes.done.wait(2)
+    assert flushes.batches == [('key', [0, 1]), ('key', [2, 3]), ('key', [4])]
+
+
+def test_no_wait_flushes_at_once(batcher):
+    micro_batcher, flushes = batcher(1, max_wait=30.0)
+    micro_batcher.start()
+    micro_batcher.add('key', 'alone', wait=False)
+    assert flushes.done.wait(2)
+    assert flushes.batches == [('key', ['alone'])]
+
+
+def test_no_wait_still_joins_a_waiting_group(batcher):
+    micro_batcher, flushes = batcher(1, max_wait=0.2)
+    micro_batcher.add('key', 'first')
+    micro_batcher.add('key', 'second', wait=False)
+    micro_batcher.start()
+    assert flushes.done.wait(2)
+    assert flushes.batches == [('key', ['first', 'second'])]
+
+
+def test_removed_items_are_not_flushed(batcher):
+    micro_batcher, flushes = batcher(1)
+    micro_batcher.add('key', 'keep')
+    micro_batcher.add('key', 'drop')
+    micro_batcher.add('other', 'drop-too')
+    assert micro_batcher.remove(lambda item: item.startswith('drop'))
+    assert micro_batcher.pending() == 1
+    micro_batcher.start()
+    assert flushes.done.wait(2)
+    time.sleep(0.1)
+    assert flushes.batches == [('key', ['keep'])]
+
+
+# ----------------------------------------------------------------------
+# API: batch keys and the seeds each job reports
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def flush(api, monkeypatch):
+    """Run flush_micro_batch on fresh job maps; returns the enqueued PendingJobs"""
+    monkeypatch.setattr(api, 'jobs', {})
+    monkeypatch.setattr(api, '_persist', lambda snapshots: None)
+    enqueued = []
+    monkeypatch.setattr(api.scheduler, 'enqueue', enqueued.append)
+
+    def run(gen_requests, key, supported: bool):
+        monkeypatch.setattr(api.backend_pool, 'supports', lambda class_type: supported)
+        items = []
+        for index, gen_request in enumerate(gen_requests):
+            job_id = f'job-{index}'
+            api.jobs[job_id] = api.GenerationStatus(job_id=job_id, status='queued', prompt=gen_request.prompt)
+            items.append((job_id, gen_request))
+        api.flush_micro_batch(key, items)
+        return enqueued
+
+    return run
+
+
+def requests_for(api, prompts, seed=1000):
+    return [api.GenerationRequest(prompt=prompt, seed=seed + index, width=512, height=512)
+            for index, prompt in enumerate(prompts)]
+
+
+def nodes_by_class(workflow: dict) -> dict:
+    return {node['class_type']: node for node in workflow.values()}
+
+
+def test_batch_key_ignores_prompt_only_with_batch_nodes(api):
+    cat, dog = requests_for(api, ['a cat', 'a dog'])
+    assert api._batch_key(cat, per_item=ITEMS) == api._batch_key(dog, per_item=ITEMS)
+    assert api._batch_key(cat, per_item=('seed',)) != api._batch_key(dog, per_item=('seed',))
+    assert api._batch_key(cat, per_item=()) != api._batch_key(dog, per_item=())
+    assert api._batch_key(cat, per_item=()) == api._batch_key(replace(cat, seed=7), per_item=())
+    # Anything else that changes the graph keeps requests apart
+    assert api._batch_key(cat, per_item=ITEMS) != api._batch_key(replace(dog, steps=8), per_item=ITEMS)
+    assert api._batch_key(cat, per_item=ITEMS) != api._batch_key(replace(dog, width=1024), per_item=ITEMS)
+    assert api._batch_key(cat, per_item=ITEMS) != api._batch_key(cat, per_item=())
+
+
+@pytest.mark.parametrize('workflow, sampler, supported, expected', [
+    ('flux2_turbo_parametric_api', None, True, ('prompt', 'seed')),
+    ('flux2_turbo_parametric_api', 'dpmpp_2m', True, ('prompt', 'seed')),
+    # Noise drawn while sampling covers the whole batch
+    ('flux2_turbo_parametric_api', 'euler_ancestral', True, ()),
+    ('flux2_turbo_parametric_api', 'dpmpp_2m_sde', True, ()),
+    # SamplerCustomAdvanced cannot sample text lengths apart
+    ('flux2_klein_simple_parametric_api', None, True, ('seed',)),
+    ('flux2_turbo_parametric_api', None, False, ()),
+])
+def test_batch_item_parameters(api, monkeypatch, workflow, sampler, supported, expected):
+    monkeypatch.setattr(api.backend_pool, 'supports', lambda class_type: supported)
+    gen_request = api.GenerationRequest(prompt='a cat', sampler=sampler, workflow=workflow)
+    assert api.batch_item_parameters(api.workflow_templates.get(workflow), gen_request) == expected
+
+
+def test_per_item_batch_gives_every_job_its_own_seed(api, flush):
+    gen_requests = requests_for(api, ['a cat', 'a dog', 'a cat'])
+    gen_requests[2].seed = gen_requests[0].seed     # server-chosen seeds can collide
+    [job] = flush(gen_requests, api._batch_key(gen_requests[0], per_item=ITEMS), supported=True)
+
+    assert job.job_ids == ['job-0', 'job-1', 'job-2']
+    seeds = [api.jobs[job_id].seed for job_id in job.job_ids]
+    assert seeds[:2] == [1000, 1001]
+    assert len(set(seeds)) == 3
+    assert [api.jobs[job_id].batch_index for job_id in job.job_ids] == [0, 1, 2]
+
+    nodes = nodes_by_class(job.workflow)
+    assert json.loads(nodes['BatchKSampler']['inputs']['seeds']) == seeds
+    assert json.loads(nodes['BatchCLIPTextEncode']['inputs']['texts']) == ['a cat', 'a dog', 'a cat']
+
+
+def test_shared_seed_batch_reports_a_seed_for_index_zero_only(api, flush):
+    gen_requests = [replace(request, sampler='euler_ancestral') for request in requests_for(api, ['a cat', 'a cat'])]
+    [job] = flush(gen_requests, api._batch_key(gen_requests[0], per_item=()), supported=True)
+
+    assert [api.jobs[job_id].seed for job_id in job.job_ids] == [1000, None]
+    assert [api.jobs[job_id].batch_index for job_id in job.job_ids] == [0, 1]
+    nodes = nodes_by_class(job.workflow)
+    assert 'BatchKSampler' not in nodes
+    assert nodes['KSampler']['inputs']['seed'] == 1000
+
+
+def test_per_item_group_is_split_when_batch_nodes_disappear(api, flush):
+    gen_requests = requests_for(api, ['a cat', 'a dog'])
+    enqueued = flush(gen_requests, api._batch_key(gen_requests[0], per_item=ITEMS), supported=False)
+
+    assert [job.job_ids for job in enqueued] == [['job-0'], ['job-1']]
+    assert [api.jobs[job_id].seed for job_id in ('job-0', 'job-1')] == [1000, 1001]
+    assert [api.jobs[job_id].batch_index for job_id in ('job-0', 'job-1')] == [None, None]
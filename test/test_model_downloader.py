@@ -0,0 +1,191 @@
+"""Model downloads: parallel ranges, resume state, verification and the manifest"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import model_downloader
+from model_downloader import ModelDownloader, ModelFile, parse_size, select_models, write_manifest
+
+CHUNK = 1000
+
+
+class HubServer(ThreadingHTTPServer):
+    """Hugging Face /resolve/ (HEAD: redirect with LFS headers) and a ranged CDN"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), HubHandler)
+        self.files = {}         # name -> bytes
+        self.sha256 = {}        # name -> announced digest (defaults to the real one)
+        self.cuts = {}          # name -> ranged responses to break off halfway
+        self.ranges = []        # (name, Range header)
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class HubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        name = self.path.rsplit('/', 1)[1]
+        data = self.server.files[name]
+        self.send_response(302)
+        self.send_header('Location', f'/cdn/{name}')
+        self.send_header('X-Linked-Size', str(len(data)))
+        self.send_header('X-Linked-Etag', '"%s"' % self.server.sha256.get(name, hashlib.sha256(data).hexdigest()))
+        self.send_header('X-Repo-Commit', 'abc123')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        server = self.server
+        name = self.path.rsplit('/', 1)[1]
+        data = server.files[name]
+        requested = self.headers['Range']
+        with server.lock:
+            server.ranges.append((name, requested))
+            cut = server.cuts.get(name, 0)
+            if cut:
+                server.cuts[name] = cut - 1
+        start, end = (int(value) for value in requested.split('=')[1].split('-'))
+        body = data[start:end + 1]
+        self.send_response(206)
+        self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if cut:
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    created = HubServer()
+    threading.Thread(target=created.serve_forever, daemon=True).start()
+    monkeypatch.setattr(model_downloader, 'HF_ENDPOINT', created.url)
+    monkeypatch.setattr(model_downloader, 'time', types.SimpleNamespace(
+        sleep=lambda seconds: None, monotonic=time.monotonic))
+    yield created
+    created.shutdown()
+    created.server_close()
+
+
+def model(tmp_path, name: str) -> ModelFile:
+    return ModelFile('org/repo', f'split_files/vae/{name}', str(tmp_path / 'models' / 'vae' / name))
+
+
+def download(tmp_path, *models, connections: int = 4):
+    downloader = ModelDownloader(connections, chunk_size=CHUNK, manifest=str(tmp_path / 'manifest.json'))
+    return downloader.download_all(list(models))
+
+
+def manifest(tmp_path) -> dict:
+    with open(tmp_path / 'manifest.json') as f:
+        return {os.path.basename(entry['path']): entry for entry in json.load(f)['files']}
+
+
+def test_parse_size():
+    assert parse_size('0') == 0
+    assert parse_size('512K') == 512 * 1024
+    assert parse_size('1.5GB') == int(1.5 * 1024 ** 3)
+    with pytest.raises(ValueError):
+        parse_size('fast')
+
+
+def test_selection_shares_the_common_files(tmp_path):
+    names = {selection: [m.name for m in select_models(selection, str(tmp_path))] for selection in ('klein', 'dev')}
+    assert names['klein'][0] == names['dev'][0] == 'flux2-vae.safetensors'
+    assert not set(names['klein'][1:]) & set(names['dev'][1:])
+
+
+def test_files_download_in_ranges_and_verify(hub, tmp_path):
+    hub.files = {'small.safetensors': os.urandom(1500), 'large.safetensors': os.urandom(4200)}
+    small, large = model(tmp_path, 'small.safetensors'), model(tmp_path, 'large.safetensors')
+    download(tmp_path, large, small)
+
+    for item in (small, large):
+        assert (item.status, item.verified, item.commit) == ('downloaded', True, 'abc123')
+        assert open(item.dest, 'rb').read() == hub.files[item.name]
+        assert not os.path.exists(item.part) and not os.path.exists(f'{item.part}.json')
+    assert sorted(requested for name, requested in hub.ranges if name == 'large.safetensors') == [
+        'bytes=0-999', 'bytes=1000-1999', 'bytes=2000-2999', 'bytes=3000-3999', 'bytes=4000-4199']
+    entries = manifest(tmp_path)
+    assert entries['large.safetensors']['status'] == 'downloaded'
+    assert entries['large.safetensors']['progress'] == 1.0
+
+
+def test_broken_range_continues_from_the_last_byte(hub, tmp_path):
+    hub.files = {'a.safetensors': os.urandom(2000)}
+    hub.cuts = {'a.safetensors': 1}
+    item = model(tmp_path, 'a.safetensors')
+    download(tmp_path, item, connections=1)
+
+    assert item.status == 'downloaded'
+    assert hub.ranges[:2] == [('a.safetensors', 'bytes=0-999'), ('a.safetensors', 'bytes=500-999')]
+
+
+def test_interrupted_download_resumes_from_its_state_file(hub, tmp_path):
+    data = os.urandom(3500)
+    hub.files = {'b.safetensors': data}
+    item = model(tmp_path, 'b.safetensors')
+    os.makedirs(os.path.dirname(item.dest))
+    with open(item.part, 'wb') as f:
+        f.write(data[:2000] + bytes(1500))
+    with open(f'{item.part}.json', 'w') as f:
+        json.dump({'size': 3500, 'sha256': hashlib.sha256(data).hexdigest(), 'chunk_size': CHUNK, 'done': [0, 1]}, f)
+
+    download(tmp_path, item)
+    assert item.status == 'downloaded'
+    assert sorted(requested for _, requested in hub.ranges) == ['bytes=2000-2999', 'bytes=3000-3499']
+    assert open(item.dest, 'rb').read() == data
+
+
+def test_sha256_mismatch_is_not_installed(hub, tmp_path):
+    hub.files = {'c.safetensors': os.urandom(1200)}
+    hub.sha256 = {'c.safetensors': '0' * 64}
+    item = model(tmp_path, 'c.safetensors')
+    download(tmp_path, item)
+
+    assert item.status == 'failed' and 'SHA256 mismatch' in item.error
+    assert not os.path.exists(item.dest) and not os.path.exists(item.part)
+    assert manifest(tmp_path)['c.safetensors']['status'] == 'failed'
+
+
+def test_present_files_are_checked_by_size(hub, tmp_path):
+    hub.files = {'d.safetensors': os.urandom(1200), 'e.safetensors': os.urandom(1200)}
+    complete, short = model(tmp_path, 'd.safetensors'), model(tmp_path, 'e.safetensors')
+    os.makedirs(os.path.dirname(complete.dest))
+    with open(complete.dest, 'wb') as f:
+        f.write(hub.files['d.safetensors'])
+    with open(short.dest, 'wb') as f:
+        f.write(hub.files['e.safetensors'][:100])
+
+    download(tmp_path, complete, short)
+    assert (complete.status, short.status) == ('present', 'downloaded')
+    assert {name for name, _ in hub.ranges} == {'e.safetensors'}
+
+
+def test_manifest_keeps_entries_of_other_runs(tmp_path):
+    path = str(tmp_path / 'manifest.json')
+    first, second = model(tmp_path, 'f.safetensors'), model(tmp_path, 'g.safetensors')
+    first.status, second.status = 'downloaded', 'failed'
+    write_manifest(path, [first])
+    write_manifest(path, [second])
+    assert {name: entry['status'] for name, entry in manifest(tmp_path).items()} == {
+        'f.safetensors': 'downloaded', 'g.safetensors': 'failed'}
@@ -0,0 +1,139 @@
+"""Model readiness: file states, workflow gating in the scheduler and /api/ready"""
+
+import json
+import threading
+
+import pytest
+
+from backend_pool import BackendPool
+from job_scheduler import AffinityScheduler, PendingJob
+from model_readiness import ModelReadiness, model_files
+from workflow_templates import WorkflowTemplateRegistry
+
+GRAPH = {
+    '1': {'class_type': 'UNETLoader', 'inputs': {'unet_name': 'flux2_dev.safetensors'}},
+    '2': {'class_type': 'CLIPLoader', 'inputs': {'clip_name': 'mistral.safetensors'}},
+    '3': {'class_type': 'VAELoader', 'inputs': {'vae_name': 'flux2-vae.safetensors'}},
+    '4': {'class_type': 'KSampler', 'inputs': {'seed': '${SEED}', 'model': ['1', 0]}},
+}
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    path = tmp_path / 'models'
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def readiness(tmp_path, models_dir):
+    workflows = tmp_path / 'workflows'
+    workflows.mkdir()
+    (workflows / 'dev.json').write_text(json.dumps(GRAPH))
+    return ModelReadiness(models_dir, models_dir / 'models-manifest.json', WorkflowTemplateRegistry(workflows), ttl=0)
+
+
+def place(models_dir, folder: str, name: str, size: int = 10):
+    (models_dir / folder).mkdir(exist_ok=True)
+    (models_dir / folder / name).write_bytes(bytes(size))
+
+
+def write_manifest(models_dir, *entries):
+    (models_dir / 'models-manifest.json').write_text(json.dumps({'files': [
+        {'path': str(models_dir / folder / name), **entry} for folder, name, entry in entries
+    ]}))
+
+
+def states(readiness) -> dict:
+    return {state['name']: state['state'] for state in readiness.workflow('dev')['files']}
+
+
+def test_model_files_lists_loader_inputs():
+    assert model_files(GRAPH) == [
+        ('vae_name', 'flux2-vae.safetensors'), ('unet_name', 'flux2_dev.safetensors'),
+        ('clip_name', 'mistral.safetensors'),
+    ]
+
+
+def test_file_states_follow_the_downloader(readiness, models_dir):
+    assert set(states(readiness).values()) == {'missing'}
+
+    place(models_dir, 'vae', 'flux2-vae.safetensors')
+    place(models_dir, 'unet', 'flux2_dev.safetensors', size=4)          # ComfyUI's second folder
+    (models_dir / 'text_encoders').mkdir()
+    (models_dir / 'text_encoders' / 'mistral.safetensors.part').write_bytes(b'')
+    assert states(readiness) == {
+        'flux2-vae.safetensors': 'ready', 'flux2_dev.safetensors': 'ready', 'mistral.safetensors': 'downloading'}
+
+    write_manifest(
+        models_dir,
+        ('diffusion_models', 'flux2_dev.safetensors', {'size': 10, 'status': 'downloading', 'progress': 0.4}),
+        ('text_encoders', 'mistral.safetensors', {'size': 8, 'status': 'failed', 'error': 'HTTP 403'}),
+    )
+    report = readiness.workflow('dev')
+    # Four bytes on disk but ten expected: a leftover, not the finished file
+    assert states(readiness)['flux2_dev.safetensors'] == 'downloading'
+    assert report['files'][1]['progress'] == 0.4
+    assert report['files'][2]['error'] == 'HTTP 403'
+    assert (report['ready'], report['missing']) == (False, ['flux2_dev.safetensors', 'mistral.safetensors'])
+
+    place(models_dir, 'diffusion_models', 'flux2_dev.safetensors', size=10)
+    place(models_dir, 'text_encoders', 'mistral.safetensors', size=8)
+    assert readiness.workflow('dev')['ready']
+    assert readiness.ready(GRAPH)
+
+
+def test_inactive_without_a_local_models_folder(readiness, tmp_path):
+    readiness.models_dir = tmp_path / 'remote-only'
+    assert readiness.workflow('dev') == {'workflow': 'dev', 'ready': True, 'missing': [], 'files': []}
+    readiness.models_dir = tmp_path / 'models'
+    readiness.enabled = False
+    assert readiness.missing(GRAPH) == []
+
+
+def test_scheduler_holds_jobs_until_their_models_land():
+    pool = BackendPool(['http://127.0.0.1:9'], client_factory=lambda url: None, handler=lambda *a: None)
+    landed = {'klein'}
+    order, dispatched = [], threading.Event()
+
+    def submit(job, backend):
+        order.append(job.job_id)
+        pool.release(backend)
+        if len(order) == 2:
+            dispatched.set()
+        return True
+
+    scheduler = AffinityScheduler(pool, submit=submit, max_inflight=1,
+                                  ready=lambda job: job.workflow['needs'] in landed)
+    scheduler.enqueue(PendingJob('dev-job', {'needs': 'dev'}))
+    scheduler.enqueue(PendingJob('klein-job', {'needs': 'klein'}))
+    scheduler.start()
+    try:
+        assert not dispatched.wait(0.3)
+        assert order == ['klein-job']
+        assert scheduler.stats()['pending'] == 1
+        landed.add('dev')
+        assert dispatched.wait(5)
+    finally:
+        scheduler.stop()
+    assert order == ['klein-job', 'dev-job']
+
+
+def test_ready_routes(api, tmp_path, monkeypatch):
+    models_dir = tmp_path / 'api-models'
+    models_dir.mkdir()
+    readiness = ModelReadiness(models_dir, models_dir / 'models-manifest.json', api.workflow_templates, ttl=0)
+    monkeypatch.setattr(api, 'model_readiness', readiness)
+    client = api.app.test_client()
+
+    response = client.get('/api/ready')
+    assert response.status_code == 503
+    missing = response.get_json()['workflows'][api.DEFAULT_WORKFLOW]['missing']
+    assert missing
+
+    template = api.workflow_templates.get(api.DEFAULT_WORKFLOW)
+    for input_name, name in model_files(template.nodes):
+        place(models_dir, readiness._check(input_name, name).folder, name)
+    assert client.get('/api/ready').status_code == 200
+    assert client.get(f'/api/ready/{api.DEFAULT_WORKFLOW}').get_json()['ready'] is True
+    assert client.get('/api/ready/no_such_workflow').status_code == 404
@@ -0,0 +1,112 @@
+"""Output index: metadata, keyset cursors and the maintained file count"""
+
+import json
+
+import pytest
+
+from output_index import OutputIndex, decode_cursor, encode_cursor
+
+PIL = pytest.importorskip('PIL')
+from PIL import Image, PngImagePlugin  # noqa: E402
+
+
+def write_png(path, seed, prompt, size=(64, 48)):
+    info = PngImagePlugin.PngInfo()
+    info.add_text('prompt', json.dumps({
+        '3': {'class_type': 'KSampler', 'inputs': {'seed': seed, 'positive': ['6', 0]}},
+        '6': {'class_type': 'CLIPTextEncode', 'inputs': {'text': prompt}},
+    }))
+    Image.new('RGB', size).save(path, pnginfo=info)
+
+
+@pytest.fixture
+def index(tmp_path):
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    for number in range(5):
+        write_png(output_dir / f'Flux2_{number:05d}_.png', seed=number, prompt=f'mountain {number}')
+    (output_dir / 'notes.txt').write_text('not an image')
+    created = OutputIndex(output_dir, tmp_path / 'jobs.db')
+    created.open()
+    created.reconcile()
+    return created
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(1767225600.5, 'Flux2_00001_.png')) == (1767225600.5, 'Flux2_00001_.png')
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor('not-a-cursor')
+
+
+def test_reconcile_reads_png_metadata(index):
+    items, _ = index.query(seed=3)
+    assert len(items) == 1
+    assert items[0]['filename'] == 'Flux2_00003_.png'
+    assert (items[0]['width'], items[0]['height'], items[0]['prompt']) == (64, 48, 'mountain 3')
+
+
+@pytest.mark.parametrize('sort', ['filename', 'mtime', 'size'])
+@pytest.mark.parametrize('descending', [True, False])
+def test_cursor_pages_cover_every_file_once(index, sort, descending):
+    seen, cursor = [], None
+    while True:
+        items, cursor = index.query(sort=sort, descending=descending, limit=2, cursor=cursor)
+        seen.extend(item['filename'] for item in items)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(f'Flux2_{number:05d}_.png' for number in range(5))
+    assert len(seen) == len(set(seen))
+
+
+def test_prefix_filter_escapes_like_wildcards(index):
+    assert index.query(prefix='Flux2_0000')[0]
+    assert index.query(prefix='Flux2%')[0] == []
+
+
+def rows(index) -> int:
+    return index._conn.execute('SELECT COUNT(*) FROM outputs').fetchone()[0]
+
+
+def test_file_count_follows_writes(index):
+    assert index.files == rows(index) == 5
+    index.add('Flux2_00001_.png')                 # rewritten, not new
+    assert index.files == 5
+
+    write_png(index.output_dir / 'Flux2_00005_.png', seed=5, prompt='lake')
+    index.add('Flux2_00005_.png')
+    (index.output_dir / 'Flux2_00000_.png').unlink()
+    index.remove('Flux2_00000_.png')
+    index.remove('missing.png')
+    assert index.files == rows(index) == 5
+
+    (index.output_dir / 'Flux2_00001_.png').unlink()
+    index.reconcile()
+    assert index.files == rows(index) == 4
+    assert index.count() == index.stats()['files'] == 4
+
+    reopened = OutputIndex(index.output_dir, index.db_path)
+    reopened.open()
+    assert reopened.files == 4
+
+
+def test_count_applies_filters(index):
+    assert index.count(q='mountain') == 5
+    assert index.count(seed=2) == 1
+    assert index.count(job_id='unknown') == 0
+
+
+def test_route_counts_filtered_listings_only_on_request(api, index, monkeypatch):
+    monkeypatch.setattr(api, 'output_index', index)
+    client = api.app.test_client()
+
+    page = client.get('/api/outputs?limit=2&sort=mtime').get_json()
+    assert page['total'] == 5
+    assert len(page['images']) == 2 and page['next_cursor']
+
+    filtered = client.get('/api/outputs?q=mountain&limit=2').get_json()
+    assert filtered['total'] is None
+    assert client.get('/api/outputs?q=mountain&limit=2&count=true').get_json()['total'] == 5
+
+    rest = client.get(f"/api/outputs?q=mountain&limit=10&cursor={filtered['next_cursor']}").get_json()
+    assert len(rest['images']) == 3 and rest['next_cursor'] is None
+    assert client.get('/api/outputs?sort=prompt').status_code == 400
@@ -0,0 +1,53 @@
+"""Result cache keys: stable across renders, dict order and drop-in node classes"""
+
+import copy
+
+from result_cache import cache_key
+
+GRAPH = {
+    '1': {'class_type': 'KSampler', 'inputs': {'seed': 42, 'steps': 4, 'model': ['2', 0]}},
+    '2': {'class_type': 'UNETLoader', 'inputs': {'unet_name': 'flux2_dev.safetensors'}},
+}
+
+
+def test_key_is_pinned():
+    # Changing the canonical form orphans every cached result; bump
+    # INDEX_VERSION instead of editing this value
+    assert cache_key(GRAPH) == '7af53e9aae9691be3b37464850952d2c85f151b32f0510697122b18a128b82c9'
+
+
+def test_key_ignores_dict_order():
+    reordered = {
+        '2': GRAPH['2'],
+        '1': {'inputs': {'model': ['2', 0], 'steps': 4, 'seed': 42}, 'class_type': 'KSampler'},
+    }
+    assert cache_key(reordered) == cache_key(GRAPH)
+
+
+def test_key_changes_with_any_input():
+    changed = copy.deepcopy(GRAPH)
+    changed['1']['inputs']['seed'] = 43
+    assert cache_key(changed) != cache_key(GRAPH)
+
+
+def test_equivalent_classes_share_a_key():
+    cached = copy.deepcopy(GRAPH)
+    cached['1']['class_type'] = 'CachedKSampler'
+    assert cache_key(cached) != cache_key(GRAPH)
+    assert cache_key(cached, {'CachedKSampler': 'KSampler'}) == cache_key(GRAPH)
+    assert cached['1']['class_type'] == 'CachedKSampler'     # input left untouched
+
+
+def test_request_key_is_the_same_with_or_without_the_conditioning_cache(api, monkeypatch):
+    gen_request = api.GenerationRequest(prompt='a red fox', seed=1234, steps=8, width=768, height=768)
+
+    monkeypatch.setattr(api.backend_pool, 'supports', lambda class_type: False)
+    plain = api.prepare_request_workflow(gen_request)
+    monkeypatch.setattr(api.backend_pool, 'supports', lambda class_type: True)
+    substituted = api.prepare_request_workflow(gen_request)
+
+    assert 'CachedCLIPTextEncode' in {node['class_type'] for node in substituted.values()}
+    assert cache_key(substituted, api.CACHE_EQUIVALENT_CLASSES) == cache_key(plain, api.CACHE_EQUIVALENT_CLASSES)
+    # Rendering again from the shared template gives the same key
+    assert cache_key(api.prepare_request_workflow(gen_request), api.CACHE_EQUIVALENT_CLASSES) == \
+        cache_key(substituted, api.CACHE_EQUIVALENT_CLASSES)
@@ -0,0 +1,178 @@
+"""Trace spans: context propagation, exporters, job lifecycles and the waterfall"""
+
+import json
+
+import pytest
+
+from comfy_runner.tracing import (
+    JsonlExporter, OtlpExporter, SpanContext, Tracer, configure, parse_traceparent,
+)
+from comfy_runner.trace_summary import waterfall
+from job_tracing import JobTraces
+
+PARENT = '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'
+
+
+class Collected:
+    """Exporter keeping spans in memory"""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+
+@pytest.fixture
+def collected():
+    return Collected()
+
+
+@pytest.fixture
+def tracer(collected):
+    return Tracer('test', [collected])
+
+
+def by_name(collected) -> dict:
+    return {span.name: span for span in collected.spans}
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(PARENT) == SpanContext('4bf92f3577b34da6a3ce929d0e0e4736', '00f067aa0ba902b7')
+    assert parse_traceparent(PARENT.upper()).trace_id == '4bf92f3577b34da6a3ce929d0e0e4736'
+    assert parse_traceparent(f'00-{"0" * 32}-00f067aa0ba902b7-01') is None
+    assert parse_traceparent('garbage') is None
+    assert parse_traceparent(None) is None
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+    with tracer.span('generate', job_id='a') as span:
+        child = tracer.start_span('child')
+    assert not tracer.enabled
+    assert not span.recording and not child.recording
+    assert span.traceparent is None
+
+
+def test_spans_nest_and_join_the_callers_trace(tracer, collected):
+    with tracer.span('generate', parent=PARENT, steps=4, skipped=None) as root:
+        with tracer.span('submit'):
+            pass
+        with pytest.raises(RuntimeError):
+            with tracer.span('download'):
+                raise RuntimeError('disk full')
+    tracer.flush()
+
+    spans = by_name(collected)
+    assert root.trace_id == '4bf92f3577b34da6a3ce929d0e0e4736'
+    assert spans['generate'].parent_id == '00f067aa0ba902b7'
+    assert spans['generate'].attributes == {'steps': 4}
+    assert spans['submit'].parent_id == spans['download'].parent_id == root.context.span_id
+    assert {span.trace_id for span in collected.spans} == {root.trace_id}
+    assert spans['download'].to_dict()['status'] == 'error'
+    assert spans['download'].error == 'RuntimeError: disk full'
+    assert spans['submit'].to_dict()['status'] == 'ok'
+
+
+def test_configure_reads_the_environment(tmp_path):
+    otlp = configure('api', {'OTEL_EXPORTER_OTLP_ENDPOINT': 'http://collector:4318/', 'OTEL_SERVICE_NAME': 'renamed'})
+    assert [(type(exporter), exporter.endpoint) for exporter in otlp.exporters] == [
+        (OtlpExporter, 'http://collector:4318/v1/traces')]
+    assert otlp.service == 'renamed'
+
+    path = tmp_path / 'logs' / 'traces.jsonl'
+    tracer = configure('api', {'TRACE_FILE': str(path)})
+    assert [type(exporter) for exporter in tracer.exporters] == [JsonlExporter]
+    with tracer.span('generate'):
+        pass
+    tracer.flush()
+    [line] = path.read_text().splitlines()
+    assert json.loads(line)['name'] == 'generate'
+
+
+def test_otlp_payload(tracer):
+    span = tracer.start_span('KSampler', node='3', images=2, denoise=0.5, cached=False)
+    span.end(error='out of memory')
+    [resource] = OtlpExporter('http://unused').payload([span])['resourceSpans']
+    assert resource['resource']['attributes'][0]['value'] == {'stringValue': 'test'}
+    [otlp] = resource['scopeSpans'][0]['spans']
+    assert (otlp['traceId'], otlp['spanId'], otlp['parentSpanId']) == (span.trace_id, span.context.span_id, '')
+    assert {a['key']: a['value'] for a in otlp['attributes']} == {
+        'node': {'stringValue': '3'}, 'images': {'intValue': '2'},
+        'denoise': {'doubleValue': 0.5}, 'cached': {'boolValue': False},
+    }
+    assert otlp['status'] == {'code': 2, 'message': 'out of memory'}
+
+
+def run_prompt(traces: JobTraces, prompt_id: str, job_ids, final: str = 'execution_success'):
+    workflow = {'3': {'class_type': 'KSampler'}, '9': {'class_type': 'SaveImage'}}
+    traces.dispatched(job_ids, backend='pod-1')
+    traces.submitted(prompt_id, job_ids, workflow, backend='pod-1')
+    for event, data in [
+        ('execution_start', {}),
+        ('executing', {'node': '3'}),
+        ('executing', {'node': '9'}),
+        ('executed', {'node': '9', 'output': {'images': [{}, {}]}}),
+        (final, {'exception_message': 'CUDA out of memory'} if final == 'execution_error' else {}),
+    ]:
+        traces.event(event, {'prompt_id': prompt_id, **data})
+
+
+def test_job_spans_follow_the_lifecycle(tracer, collected):
+    traces = JobTraces(tracer)
+    with tracer.span('POST /api/generate') as request:
+        job = traces.begin('job-1', workflow='flux2_turbo')
+    run_prompt(traces, 'p-1', ['job-1'])
+    traces.finish('job-1', 'completed', images=2)
+    tracer.flush()
+
+    spans = by_name(collected)
+    assert set(spans) == {'POST /api/generate', 'job', 'scheduler_queue', 'comfyui_execution',
+                          'comfyui_queue', 'KSampler', 'SaveImage'}
+    parent = {name: span.parent_id for name, span in spans.items()}
+    assert parent['job'] == request.context.span_id
+    assert parent['scheduler_queue'] == parent['comfyui_execution'] == job.context.span_id
+    assert parent['KSampler'] == parent['SaveImage'] == spans['comfyui_execution'].context.span_id
+    assert spans['SaveImage'].attributes['images'] == 2
+    assert spans['job'].attributes['prompt_id'] == 'p-1'
+    assert spans['job'].attributes['status'] == 'completed'
+    assert all(span.error is None for span in collected.spans)
+
+
+def test_micro_batched_jobs_get_their_own_execution_spans(tracer, collected):
+    traces = JobTraces(tracer)
+    jobs = [traces.begin(job_id) for job_id in ('a', 'b')]
+    run_prompt(traces, 'p-2', ['a', 'b'], final='execution_error')
+    for job_id in ('a', 'b'):
+        traces.finish(job_id, 'failed', error='CUDA out of memory')
+    tracer.flush()
+
+    for job in jobs:
+        trace = [span for span in collected.spans if span.trace_id == job.trace_id]
+        names = sorted(span.name for span in trace)
+        assert names == ['KSampler', 'SaveImage', 'comfyui_execution', 'comfyui_queue', 'job', 'scheduler_queue']
+        errors = {span.name: span.error for span in trace}
+        assert errors['SaveImage'] == errors['comfyui_execution'] == errors['job'] == 'CUDA out of memory'
+        assert errors['KSampler'] is None
+
+
+def test_waterfall_indents_children(tracer, collected):
+    with tracer.span('generate'):
+        with tracer.span('submit'):
+            pass
+    tracer.flush()
+    lines = waterfall([span.to_dict() for span in collected.spans])
+    assert lines[1].endswith('  generate')
+    assert lines[2].endswith('    submit')
+
+
+def test_api_joins_the_callers_trace(api, tracer, collected, monkeypatch):
+    monkeypatch.setattr(api, 'tracer', tracer)
+    response = api.app.test_client().delete('/api/queue/no-such-job', headers={'traceparent': PARENT})
+    tracer.flush()
+
+    assert response.headers['X-Trace-Id'] == '4bf92f3577b34da6a3ce929d0e0e4736'
+    [span] = collected.spans
+    assert span.name == 'DELETE /api/queue/<job_id>'
+    assert span.parent_id == '00f067aa0ba902b7'
+    assert span.attributes['http.status_code'] == response.status_code
@@ -0,0 +1,185 @@
+"""Remote output downloads: parallel fetches, Range resume and verification"""
+
+import hashlib
+import io
+import os
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from comfy_runner import transfer
+from comfy_runner.client import unique_path
+from comfy_runner.transfer import Downloader, verify, verify_png
+
+PIL = pytest.importorskip('PIL.Image')
+
+
+def png_bytes(fill: int = None) -> bytes:
+    """64x64 PNG of one grey level, or of noise (which does not compress)"""
+    pixels = os.urandom(64 * 64 * 3) if fill is None else bytes([fill]) * 64 * 64 * 3
+    buffer = io.BytesIO()
+    PIL.frombytes('RGB', (64, 64), pixels).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class ViewServer(ThreadingHTTPServer):
+    """ComfyUI's /view: Range, If-Range and scripted broken responses"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ViewHandler)
+        self.files = {}
+        self.cuts = {}          # filename -> responses to break off halfway
+        self.ranges = []        # (filename, Range header or None)
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def etag(self, filename: str) -> str:
+        return '"' + hashlib.sha256(self.files[filename]).hexdigest()[:16] + '"'
+
+
+class ViewHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        filename = parse_qs(urlsplit(self.path).query).get('filename', [''])[0]
+        data = server.files.get(filename)
+        if data is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        requested = self.headers.get('Range')
+        with server.lock:
+            server.ranges.append((filename, requested))
+            cut = server.cuts.get(filename, 0)
+            if cut:
+                server.cuts[filename] = cut - 1
+
+        start = 0
+        if requested and self.headers.get('If-Range', server.etag(filename)) == server.etag(filename):
+            start = int(requested.split('=')[1].split('-')[0])
+        body = data[start:]
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', server.etag(filename))
+        self.end_headers()
+        if cut:
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    created = ViewServer()
+    thread = threading.Thread(target=created.serve_forever, daemon=True)
+    thread.start()
+    yield created
+    created.shutdown()
+    created.server_close()
+
+
+@pytest.fixture
+def downloader(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, 'time', types.SimpleNamespace(sleep=lambda seconds: None))
+    created = Downloader(server.url, str(tmp_path / 'out'), workers=3, timeout=10)
+    yield created
+    created.close()
+
+
+def image(filename: str) -> dict:
+    return {'filename': filename, 'subfolder': '', 'type': 'output'}
+
+
+def test_verify_png_finds_truncation_and_corruption(tmp_path):
+    data = png_bytes(1)
+    path = tmp_path / 'a.png'
+    path.write_bytes(data)
+    assert verify_png(str(path)) is None
+    assert verify(str(path), len(data) + 1) == f'{len(data)} of {len(data) + 1} bytes'
+
+    path.write_bytes(data[:-20])
+    assert verify_png(str(path)).startswith('truncated')
+    corrupt = bytearray(data)
+    corrupt[40] ^= 0xff
+    path.write_bytes(bytes(corrupt))
+    assert 'CRC mismatch' in verify_png(str(path))
+
+
+def test_images_download_in_parallel(server, downloader, tmp_path):
+    server.files = {f'Flux2_{index:05d}_.png': png_bytes(index) for index in range(6)}
+    transfers = downloader.fetch_all([image(name) for name in server.files])
+
+    assert [t.error for t in transfers] == [None] * 6
+    for t in transfers:
+        data = server.files[t.image['filename']]
+        assert open(t.path, 'rb').read() == data
+        assert t.sha256 == hashlib.sha256(data).hexdigest()
+    assert os.listdir(tmp_path / 'out' / transfer.PARTIAL_DIR) == []
+
+
+def test_broken_download_resumes_with_a_range(server, downloader):
+    data = png_bytes()
+    server.files = {'big.png': data}
+    server.cuts = {'big.png': 1}
+    [result] = downloader.fetch_all([image('big.png')])
+
+    assert result.error is None
+    assert open(result.path, 'rb').read() == data
+    assert server.ranges == [('big.png', None), ('big.png', f'bytes={len(data) // 2}-')]
+    assert any(note.startswith('Resuming big.png') for note in result.notes)
+
+
+def test_changed_image_is_downloaded_again_in_full(server, downloader, monkeypatch):
+    server.files = {'img.png': png_bytes(3)}
+    server.cuts = {'img.png': 1}
+    original = ViewHandler.do_GET
+
+    def replace_after_first_request(handler):
+        original(handler)
+        server.files['img.png'] = png_bytes(4)     # the stored ETag no longer matches
+
+    monkeypatch.setattr(ViewHandler, 'do_GET', replace_after_first_request)
+    [result] = downloader.fetch_all([image('img.png')])
+
+    assert result.error is None
+    assert open(result.path, 'rb').read() == png_bytes(4)
+    # If-Range failed, so the second response was the whole new file
+    assert [requested is not None for _, requested in server.ranges] == [False, True]
+
+
+def test_corrupt_image_is_never_committed(server, downloader, tmp_path):
+    corrupt = bytearray(png_bytes(5))
+    corrupt[40] ^= 0xff
+    server.files = {'bad.png': bytes(corrupt)}
+    [result] = downloader.fetch_all([image('bad.png')])
+
+    assert result.path is None
+    assert 'CRC mismatch' in result.error
+    assert len(server.ranges) == transfer.DOWNLOAD_ATTEMPTS
+    assert sorted(os.listdir(tmp_path / 'out')) == [transfer.PARTIAL_DIR]
+
+
+def test_existing_files_are_not_overwritten(server, downloader, tmp_path):
+    server.files = {'same.png': png_bytes(6)}
+    (tmp_path / 'out').mkdir()
+    (tmp_path / 'out' / 'same.png').write_bytes(b'keep me')
+    [result] = downloader.fetch_all([image('same.png')])
+    assert result.path == str(tmp_path / 'out' / 'same_1.png')
+    assert (tmp_path / 'out' / 'same.png').read_bytes() == b'keep me'
+    assert unique_path(str(tmp_path / 'out' / 'same.png')) == str(tmp_path / 'out' / 'same_2.png')
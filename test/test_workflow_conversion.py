@@ -0,0 +1,61 @@
+"""UI-format workflows converted with the bundled object_info snapshot"""
+
+import json
+
+import pytest
+
+from comfy_runner.schema import load_snapshot
+from comfy_runner.workflow import VARIABLE, WorkflowError, convert_ui_to_api, required_classes
+
+
+@pytest.fixture(scope='module')
+def snapshot():
+    definitions = load_snapshot()
+    assert definitions, 'object_info_snapshot.json is missing or unreadable'
+    return definitions
+
+
+def load(workflows_dir, name: str) -> dict:
+    with open(workflows_dir / name, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_snapshot_covers_the_default_gui_workflow(workflows_dir, snapshot):
+    assert required_classes(load(workflows_dir, 'flux2_turbo_default_gui.json')) <= set(snapshot)
+
+
+def test_default_gui_workflow_matches_the_parametric_template(workflows_dir, snapshot):
+    converted = convert_ui_to_api(load(workflows_dir, 'flux2_turbo_default_gui.json'), snapshot)
+    template = load(workflows_dir, 'flux2_turbo_parametric_api.json')['prompt']
+
+    assert sorted(converted) == sorted(template)
+    for node_id, node in template.items():
+        result = converted[node_id]
+        assert result['class_type'] == node['class_type'], node_id
+        for input_name, value in node['inputs'].items():
+            assert input_name in result['inputs'], f'{node_id}.{input_name}'
+            if isinstance(value, str) and VARIABLE.search(value):
+                continue    # the template's ${PLACEHOLDER}; the GUI holds a concrete value
+            assert result['inputs'][input_name] == value, f'{node_id}.{input_name}'
+
+        # Extra inputs may only be optional widgets the template leaves at their default
+        optional = snapshot[node['class_type']]['input'].get('optional', {})
+        assert set(result['inputs']) - set(node['inputs']) <= set(optional), node_id
+
+
+def test_converted_links_point_at_existing_nodes(workflows_dir, snapshot):
+    converted = convert_ui_to_api(load(workflows_dir, 'flux2_turbo_default_gui.json'), snapshot)
+    for node in converted.values():
+        for value in node['inputs'].values():
+            if isinstance(value, list) and len(value) == 2 and isinstance(value[1], int):
+                assert value[0] in converted
+
+
+@pytest.mark.parametrize('name', ['flux2_klein_simple.json', 'flux2_turbo_kombitz_6ref.json'])
+def test_unknown_node_classes_are_reported(workflows_dir, snapshot, name):
+    workflow = load(workflows_dir, name)
+    missing = required_classes(workflow) - set(snapshot)
+    assert missing
+    with pytest.raises(WorkflowError, match='No node definitions for') as error:
+        convert_ui_to_api(workflow, snapshot)
+    assert all(class_type in str(error.value) for class_type in missing)
@@ -0,0 +1,137 @@
+"""Parametric workflows render with every ${PLACEHOLDER} resolved"""
+
+import json
+import re
+
+import pytest
+
+from comfy_runner.workflow import VARIABLE, WorkflowTemplate as RunnerTemplate
+from workflow_templates import (
+    BATCH_ITEM_CLASSES, PLACEHOLDER_PARAMS, PLACEHOLDER_RE, WorkflowTemplateRegistry,
+)
+
+API_TEMPLATES = [
+    'flux2_klein_simple_parametric_api',
+    'flux2_simple',
+    'flux2_simple_parametric_api',
+    'flux2_turbo_parametric_api',
+]
+
+PARAMS = {
+    'prompt': 'a lighthouse at dusk, "quoted" text',
+    'negative_prompt': 'blurry',
+    'seed': 123456789,
+    'steps': 6,
+    'cfg': 2.5,
+    'width': 768,
+    'height': 512,
+    'batch_size': 1,
+    'sampler': 'euler',
+    'scheduler': 'simple',
+    'lora_strength': 0.8,
+    'filename_prefix': 'pytest',
+}
+
+
+@pytest.fixture(scope='module')
+def registry(workflows_dir):
+    return WorkflowTemplateRegistry(workflows_dir)
+
+
+def unresolved(workflow: dict) -> list:
+    return PLACEHOLDER_RE.findall(json.dumps(workflow))
+
+
+def test_every_api_workflow_is_listed(registry):
+    parsed = sorted(name for name, template, _ in registry.available() if template is not None)
+    assert parsed == API_TEMPLATES
+
+
+@pytest.mark.parametrize('name', API_TEMPLATES)
+def test_render_resolves_every_placeholder(registry, name):
+    template = registry.get(name)
+    workflow = template.render(PARAMS)
+    assert unresolved(workflow) == []
+
+    inputs = [node['inputs'] for node in workflow.values()]
+    assert any(node.get('width') == 768 and node.get('height') == 512 for node in inputs)
+    assert any(node.get('text') == PARAMS['prompt'] for node in inputs)
+    # Rendering copies patched nodes, so the shared template is reusable
+    assert template.render({**PARAMS, 'prompt': 'something else'}) != workflow
+    assert template.render(PARAMS) == workflow
+
+
+@pytest.mark.parametrize('name', API_TEMPLATES)
+def test_render_batch_resolves_every_placeholder(registry, name):
+    template = registry.get(name)
+    items = [{**PARAMS, 'prompt': 'a cat', 'seed': 1}, {**PARAMS, 'prompt': 'a dog', 'seed': 2}]
+    workflow = template.render_batch(items)
+    assert unresolved(workflow) == []
+
+    classes = {node['class_type']: node for node in workflow.values()}
+    assert set(template.batch_classes) <= set(classes)
+    assert json.loads(classes['BatchCLIPTextEncode']['inputs']['texts']) == ['a cat', 'a dog']
+    seed_lists = [
+        json.loads(node['inputs'][list_input])
+        for replacement, _, list_input in BATCH_ITEM_CLASSES.values() if list_input == 'seeds'
+        for node in workflow.values() if node['class_type'] == replacement
+    ]
+    assert seed_lists == [[1, 2]]
+    assert any(node['inputs'].get('batch_size') == 2 for node in workflow.values())
+
+
+def test_render_batch_refuses_to_vary_a_value_without_per_item_node(tmp_path):
+    # The seed also lands in the filename, which SaveImage cannot take per item
+    (tmp_path / 'seeded_names.json').write_text(json.dumps({
+        '1': {'class_type': 'KSampler', 'inputs': {'seed': '${SEED}', 'steps': 4}},
+        '2': {'class_type': 'SaveImage', 'inputs': {'filename_prefix': 'flux_${SEED}', 'images': ['1', 0]}},
+    }))
+    template = WorkflowTemplateRegistry(tmp_path).get('seeded_names')
+    assert template.render_batch([{'seed': 7}, {'seed': 7}])['2']['inputs']['filename_prefix'] == 'flux_7'
+    with pytest.raises(ValueError, match='cannot vary seed'):
+        template.render_batch([{'seed': 7}, {'seed': 8}])
+
+
+@pytest.mark.parametrize('name', [name for name in API_TEMPLATES if name.endswith('_parametric_api')])
+def test_comfy_run_placeholders_are_all_known(workflows_dir, name):
+    # comfy-run.sh fills in the PLACEHOLDER_PARAMS names; anything else would
+    # silently fall back to the environment or to ''
+    text = (workflows_dir / f'{name}.json').read_text()
+    names = {match[0] or match[1] for match in VARIABLE.findall(text)}
+    assert names and names <= set(PLACEHOLDER_PARAMS)
+
+
+@pytest.mark.parametrize('name', [name for name in API_TEMPLATES if name.endswith('_parametric_api')])
+def test_comfy_run_render_resolves_every_placeholder(workflows_dir, name):
+    template = RunnerTemplate(str(workflows_dir / f'{name}.json'), node_definitions=lambda classes: {})
+    values = {placeholder: str(PARAMS[param]) for placeholder, param in PLACEHOLDER_PARAMS.items()}
+    workflow = template.render(values)
+
+    assert not re.search(r'\$\{?\w', json.dumps(workflow))
+    seeds = [node['inputs'].get('seed', node['inputs'].get('noise_seed')) for node in workflow.values()
+             if node['class_type'] in ('KSampler', 'RandomNoise')]
+    assert seeds and all(int(seed) == PARAMS['seed'] for seed in seeds)
+
+
+def test_composite_placeholders_keep_falsy_values(tmp_path):
+    (tmp_path / 'named.json').write_text(json.dumps({
+        '1': {'class_type': 'KSampler', 'inputs': {'seed': '${SEED}', 'steps': 4}},
+        '2': {'class_type': 'SaveImage', 'inputs': {'filename_prefix': 'flux_${SEED}_${STEPS}'}},
+    }))
+    template = WorkflowTemplateRegistry(tmp_path).get('named')
+    assert template.render({'seed': 0, 'steps': 4})['2']['inputs']['filename_prefix'] == 'flux_0_4'
+    assert template.render({'seed': 5})['2']['inputs']['filename_prefix'] == 'flux_5_'
+
+
+def test_render_batch_keeps_the_conditioning_cache(registry):
+    template = registry.get('flux2_turbo_parametric_api')
+    items = [{**PARAMS, 'prompt': 'a cat'}, {**PARAMS, 'prompt': 'a dog'}]
+
+    cached = template.render_batch(items, substitutions={'CLIPTextEncode': 'CachedCLIPTextEncode'})
+    encoders = [node for node in cached.values() if node['class_type'] == 'BatchCLIPTextEncode']
+    assert [node['inputs'].get('cache') for node in encoders] == [True]
+    # The shared negative prompt keeps the cached single-text encoder
+    assert 'CachedCLIPTextEncode' in {node['class_type'] for node in cached.values()}
+
+    plain = template.render_batch(items)
+    assert all('cache' not in node['inputs'] for node in plain.values() if node['class_type'] == 'BatchCLIPTextEncode')
@@ -4,9 +4,14 @@
 ################################################################################
 #
 # DESCRIPTION:
-#   Self-contained script for executing ComfyUI workflows with dynamic parameter
-#   injection, comprehensive logging, and error handling. Supports both UI and API
-#   format workflows with automatic conversion and seed/prompt substitution.
+#   Executes ComfyUI workflows on this machine with dynamic parameter
+#   injection, comprehensive logging, and error handling. Supports both UI and
+#   API format workflows with automatic conversion and seed/prompt substitution.
+#
+#   Thin wrapper around the comfy_runner Python package (next to this script),
+#   which runs the whole pipeline in one process: one keep-alive connection to
+#   ComfyUI, completion pushed over the ComfyUI websocket, and the same
+#   generation logs and output naming as before.
 #
 # LOCATION:
 #   ./rundpod-flux2-dev-turbo/workflows/comfy-run.sh
@@ -14,1046 +19,60 @@
 # FEATURES:
 #   ✓ Parameter substitution (${PROMPT}, ${SEED}, ${IMAGE_ID}, ${OUTPUT_FOLDER}, ${STEPS}, ${WIDTH}, ${HEIGHT}, ${BATCH_SIZE})
 #   ✓ UI to API workflow format auto-conversion
-#   ✓ ComfyUI REST API integration with polling
+#   ✓ Websocket completion (falls back to /history polling)
+#   ✓ Push-based completion via the REST API event stream (--stream-url)
+#   ✓ Sweep mode (--prompts-file, --seed-range, --grid): one parse, one connection,
+#     bounded in-flight prompts
 #   ✓ Comprehensive generation logging and tracking
 #   ✓ Output filename normalization (5-digit to 2-digit suffix)
-#   ✓ Auto-dependency installation (envsubst)
 #   ✓ Seed generation with collision prevention
 #   ✓ Configurable dimensions, steps, and batch size
-#   ✓ Progress monitoring with timeout handling
 #
 # REQUIREMENTS:
 #   - ComfyUI running on localhost:8188 (configurable via env vars)
-#   - curl, jq, python3 (pre-installed in standard pods)
-#   - gettext-base (auto-installed if missing, provides envsubst)
+#   - python3 (pre-installed in standard pods)
+#   - Optional: websocket-client (push completion; polling without it)
 #
-# DEPENDENCIES:
-#   - Standard: bash, curl, jq, python3, date, mktemp
-#   - Optional: gettext-base (auto-installed)
+# USAGE:
+#   ./comfy-run.sh --prompt "Your prompt" [OPTIONS]
+#   ./comfy-run.sh --help
 #
 # ENVIRONMENT VARIABLES:
 #   COMFYUI_HOST (default: localhost)
 #   COMFYUI_PORT (default: 8188)
 #   GENERATION_LOG_DIR (default: /workspace/logs/generations/)
+#   GENERATION_TEXT_LOGS (default: true; false skips the per-generation .log files)
+#   GENERATION_JOURNAL_DIR (default: /workspace/logs/journal/; one JSON record per generation,
+#     stats: python3 -m comfy_runner.journal_stats DIR; GENERATION_JOURNAL=false disables)
+#   COMFY_STREAM_URL (optional, REST API base URL for --stream-url)
+#   TRACE_FILE (optional, JSONL trace spans; python3 -m comfy_runner.trace_summary FILE)
+#   OTEL_EXPORTER_OTLP_ENDPOINT (optional, OpenTelemetry collector for spans)
 #
 # RETURN CODES:
 #   0 - Success: Workflow completed successfully
 #   1 - Failure: Validation error, missing dependency, or execution failure
-#   2 - Timeout: Workflow exceeded MAX_POLLS waiting period
+#   2 - Timeout: Workflow exceeded the --timeout waiting period
 #
 # AUTHOR:
 #   ComfyUI Community <noreply@comfyui.org>
 #   Enhanced with modular functions and comprehensive logging
 #
-# VERSION: 2.1.0
-# LAST UPDATED: 2026-01-31
+# VERSION: 3.0.0
+# LAST UPDATED: 2026-10-17
 #
 ################################################################################
 
 set -euo pipefail
 
-################################################################################
-# HELP & USAGE
-################################################################################
-
-show_help() {
-    cat << 'EOF'
-╔════════════════════════════════════════════════════════════════════════════╗
-║                  ComfyUI Workflow Runner - Help & Usage                    ║
-╚════════════════════════════════════════════════════════════════════════════╝
-
-USAGE:
-    ./comfy-run.sh --prompt "Your prompt" [OPTIONS]
-
-REQUIRED ARGUMENTS:
-    --prompt TEXT           The prompt text to pass to the workflow
-                           Example: --prompt "A beautiful sunset over mountains"
-
-OPTIONS:
-    --workflow FILE         Workflow JSON file (default: flux2_turbo_512x512_parametric_api.json)
-                           Supports both ComfyUI UI format and API format
-                           Example: --workflow flux2_turbo_512x512_api.json
-
-    --image-id ID          Unique identifier for this generation (prevents cache)
-                           Example: --image-id "batch_001_001"
-                           (Appended to prompt automatically)
-
-    --output-folder PATH   Directory for output images (default: /workspace/output/)
-                           Example: --output-folder "/workspace/custom_output/"
-                           (Will be created if it doesn't exist)
-
-    --seed SEED            Seed value for reproducibility (default: auto-generated)
-                           Example: --seed 12345
-                           (Auto-generation: random int + epoch time for uniqueness)
-
-    --steps NUM            Number of inference steps (default: 15)
-                           Example: --steps 20
-                           (Typical range: 4-30, higher = more detail but slower)
-
-    --width NUM            Image width in pixels (default: 512)
-                           Example: --width 768
-                           (Must be multiple of 16)
-
-    --height NUM           Image height in pixels (default: 512)
-                           Example: --height 768
-                           (Must be multiple of 16)
-
-    --batch-size NUM       Number of images per batch (default: 1)
-                           Example: --batch-size 4
-                           (Higher values use more VRAM)
-
-    --help, -h             Display this help message and exit
-
-EXAMPLES:
-    # Basic usage with auto-generated seed
-    ./comfy-run.sh --prompt "A red car"
-
-    # Full specification with custom dimensions
-    ./comfy-run.sh --prompt "A red car" \
-                   --image-id "test_001" \
-                   --workflow flux2_turbo_512x512_parametric_api.json \
-                   --output-folder /workspace/outputs/ \
-                   --seed 42 \
-                   --steps 4 \
-                   --width 512 \
-                   --height 512 \
-                   --batch-size 1
-
-    # Using environment defaults (high-res turbo)
-    ./comfy-run.sh --prompt "A red car" --image-id "batch_2024_001"
-
-    # Custom resolution with batch
-    ./comfy-run.sh --prompt "A red car" \
-                   --width 768 \
-                   --height 768 \
-                   --batch-size 4
-
-WORKFLOW REGISTRY:
-    Available workflows are registered in: workflows.conf
-
-    turbo-512        Fast Flux.2 Turbo at 512x512 (6-8 seconds)
-    turbo-1024       Quality Flux.2 Turbo at 1024x1024 (10-12 seconds)
-    turbo-advanced   Variable step count (6-30 seconds)
-    turbo-reference  6-image reference conditioning (variable time)
-
-ENVIRONMENT CONFIGURATION:
-    COMFYUI_HOST         ComfyUI server hostname (default: localhost)
-    COMFYUI_PORT         ComfyUI server port (default: 8188)
-    GENERATION_LOG_DIR   Logging directory (default: /workspace/logs/generations/)
-
-    Example:
-    export COMFYUI_HOST="192.168.1.100"
-    export COMFYUI_PORT="9000"
-    ./comfy-run.sh --prompt "Test"
-
-OUTPUT FILES:
-    • Generated images:  {OUTPUT_FOLDER}/{IMAGE_ID}_{HH}{MM}{SS}_*.png
-    • Generation log:    {LOG_DIR}/generation_{TIMESTAMP}.log
-    • Debug payload:     /tmp/comfyui-payload-{TIMESTAMP}.json
-
-LOGGING:
-    All generations are logged to:
-    {GENERATION_LOG_DIR}/generation_{TIMESTAMP}.log
-
-    Log includes:
-    - Input parameters (prompt, seed, image-id, workflow, etc.)
-    - ComfyUI server accessibility checks
-    - Workflow validation results
-    - API submission and polling details
-    - Final output status and file locations
-    - Execution timeline and errors
-
-RETURN VALUES:
-    0  = Success: Workflow completed successfully
-    1  = Error: Validation failure, missing dependency, or API error
-    2  = Timeout: Workflow exceeded 1-hour execution limit
-
-COMMON ISSUES:
-
-    1. "ComfyUI server not accessible"
-       → Check ComfyUI is running: curl localhost:8188/system_stats
-       → Verify COMFYUI_HOST and COMFYUI_PORT environment variables
-       → Default URL: http://localhost:8188
-
-    2. "Workflow file not found"
-       → Ensure workflow file exists in current directory or provide full path
-       → Check file permissions (must be readable)
-       → List available workflows: ls -la *.json
-
-    3. "Failed to install envsubst"
-       → Root/sudo access required for apt-get
-       → Install manually: apt-get install -y gettext-base
-       → Or ensure /usr/bin/envsubst exists
-
-    4. "Failed to get prompt_id from response"
-       → Workflow may have validation errors
-       → Check payload file: cat /tmp/comfyui-payload-*.json
-       → Review ComfyUI logs for detailed error info
-
-ADVANCED USAGE:
-
-    Batch processing:
-    ─────────────────
-    for i in {1..10}; do
-        ./comfy-run.sh --prompt "Image $i" --image-id "batch_001_$(printf '%03d' $i)"
-    done
-
-    Custom resolution (if workflow supports):
-    ──────────────────────────────────────────
-    export WIDTH=768 HEIGHT=768
-    ./comfy-run.sh --prompt "Test" --image-id "custom_res"
-
-    Parallel execution:
-    ───────────────────
-    ./comfy-run.sh --prompt "Job 1" --image-id "job_001" &
-    ./comfy-run.sh --prompt "Job 2" --image-id "job_002" &
-    ./comfy-run.sh --prompt "Job 3" --image-id "job_003" &
-    wait
-
-PERFORMANCE NOTES:
-    - Seed substitution overhead: <1ms per workflow
-    - Workflow validation overhead: <50ms (depends on size)
-    - API submission: ~100-200ms
-    - Polling: 2-second intervals up to 1 hour timeout
-    - Model loading: 5-20s (first time), <100ms (cached)
-
-SUPPORT:
-    For issues, consult:
-    - ComfyUI Docs: https://docs.comfy.org
-    - GitHub Issues: https://github.com/Comfy-Org/ComfyUI/issues
-    - Generation logs: {GENERATION_LOG_DIR}
-
-EOF
-}
-
-################################################################################
-# UTILITY & LOGGING FUNCTIONS
-################################################################################
-
-# Print info message to stdout
-log_info() {
-    echo "[INFO] $*"
-}
-
-# Print success message to stdout
-log_success() {
-    echo "[✓] $*"
-}
-
-# Print error message to stderr
-log_error() {
-    echo "[✗] $*" >&2
-}
-
-# Print debug message to stderr (only if DEBUG=1)
-log_debug() {
-    if [[ "${DEBUG:-0}" == "1" ]]; then
-        echo "[DEBUG] $*" >&2
-    fi
-}
-
-################################################################################
-# GENERATION LOGGING FUNCTIONS
-# Comprehensive logging for audit trail and debugging
-################################################################################
-
-# Initialize generation log file with header and parameters
-# Creates log directory if needed and writes parameter summary
-# Variables used: GENERATION_LOG_DIR, START_TIMESTAMP, START_TIME, PROMPT,
-#                 IMAGE_ID, OUTPUT_FOLDER, WORKFLOW_FILE, CLIENT_ID
-init_generation_log() {
-    mkdir -p "$GENERATION_LOG_DIR" || return 1
-
-    LOG_FILE="${GENERATION_LOG_DIR}generation_${START_TIMESTAMP}.log"
-
-    cat > "$LOG_FILE" << EOF
-████████████████████████████████████████████████████████████████████████████████
- GENERATION LOG - ${START_TIME}
-████████████████████████████████████████████████████████████████████████████████
-
-GENERATION METADATA:
-  Timestamp:        ${START_TIME}
-  Client ID:        ${CLIENT_ID}
-  Log File:         ${LOG_FILE}
-
-INPUT PARAMETERS:
-  Prompt:           ${PROMPT}
-  Image ID:         ${IMAGE_ID}
-  Seed:             ${SEED}
-  Steps:            ${STEPS}
-  Width:            ${WIDTH}
-  Height:           ${HEIGHT}
-  Batch Size:       ${BATCH_SIZE}
-  Workflow:         ${WORKFLOW_FILE}
-  Output Folder:    ${OUTPUT_FOLDER}
-  Filename Prefix:  ${FILENAME_PREFIX}
-
-EXECUTION LOG:
-─────────────────────────────────────────────────────────────────────────────
-EOF
-}
-
-# Log message to file with timestamp
-# Usage: log_to_file "Message text"
-# Output format: [HH:MM:SS] Message text
-log_to_file() {
-    if [[ -n "${LOG_FILE:-}" ]]; then
-        echo "[$(date '+%H:%M:%S')] $*" >> "$LOG_FILE"
-    fi
-}
-
-# Finalize generation log with results and completion status
-# Arguments:
-#   $1 = Completion status (Success, Failed, Timeout)
-#   $2 = Output details (JSON or text)
-finalize_generation_log() {
-    if [[ -n "${LOG_FILE:-}" ]]; then
-        local END_TIME=$(date '+%Y-%m-%d %H:%M:%S')
-        local STATUS="$1"
-        local OUTPUT_DETAILS="${2:-  (No output captured)}"
-
-        cat >> "$LOG_FILE" << EOF
-─────────────────────────────────────────────────────────────────────────────
-
-COMPLETION STATUS:
-  Status:           ${STATUS}
-  Prompt ID:        ${PROMPT_ID}
-  Start Time:       ${START_TIME}
-  End Time:         ${END_TIME}
-  Output Location:  ${OUTPUT_FOLDER}
-
-GENERATED OUTPUTS:
-${OUTPUT_DETAILS}
-
-████████████████████████████████████████████████████████████████████████████████
-EOF
-        log_info "Generation log: $LOG_FILE"
-    fi
-}
-
-################################################################################
-# CONFIGURATION & INITIALIZATION
-################################################################################
-
-# Setup ComfyUI connection parameters
-# Can be overridden via environment variables
-COMFYUI_HOST="${COMFYUI_HOST:-localhost}"
-COMFYUI_PORT="${COMFYUI_PORT:-8188}"
-COMFYUI_URL="http://${COMFYUI_HOST}:${COMFYUI_PORT}"
-
-# Get script directory (where workflow files are located)
+# The comfy_runner package lives next to this script
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
-# Default configuration values
-WORKFLOW_FILE="${SCRIPT_DIR}/flux2_turbo_512x512_parametric_api.json"
-PROMPT=""
-IMAGE_ID="UNDEFINED_ID_"
-OUTPUT_FOLDER="/workspace/output/"
-SEED=""
-STEPS=15
-WIDTH=512
-HEIGHT=512
-BATCH_SIZE=1
-GENERATION_LOG_DIR="${GENERATION_LOG_DIR:-/workspace/logs/generations/}"
-PROMPT_ID=""
-
-# Timestamp and identification
-START_TIME=$(date '+%Y-%m-%d %H:%M:%S')
-START_TIMESTAMP=$(date '+%Y%m%d_%H%M%S')
-CLIENT_ID="claude-code-${START_TIMESTAMP}-$(date +%N)"
-
-################################################################################
-# ARGUMENT PARSING & VALIDATION
-################################################################################
-
-# Parse command-line arguments
-# Supports: --prompt, --workflow, --image-id, --output-folder, --seed, --steps, --width, --height, --batch-size, --help
-parse_arguments() {
-    while [[ $# -gt 0 ]]; do
-        case "$1" in
-            --workflow)
-                WORKFLOW_FILE="$2"
-                shift 2
-                ;;
-            --prompt)
-                PROMPT="$2"
-                shift 2
-                ;;
-            --image-id)
-                IMAGE_ID="$2"
-                shift 2
-                ;;
-            --output-folder)
-                OUTPUT_FOLDER="$2"
-                shift 2
-                ;;
-            --seed)
-                SEED="$2"
-                shift 2
-                ;;
-            --steps)
-                STEPS="$2"
-                shift 2
-                ;;
-            --width)
-                WIDTH="$2"
-                shift 2
-                ;;
-            --height)
-                HEIGHT="$2"
-                shift 2
-                ;;
-            --batch-size)
-                BATCH_SIZE="$2"
-                shift 2
-                ;;
-            --help|-h)
-                show_help
-                exit 0
-                ;;
-            *)
-                log_error "Unknown option: $1"
-                echo ""
-                echo "Use --help for usage information"
-                exit 1
-                ;;
-        esac
-    done
-}
-
-# Validate required arguments and parameters
-# Checks prompt is provided and workflow file exists
-validate_arguments() {
-    # Prompt is required
-    if [[ -z "$PROMPT" ]]; then
-        log_error "Prompt is required (--prompt)"
-        echo ""
-        echo "Use --help for usage information"
-        exit 1
-    fi
-
-    # Workflow file must exist
-    if [[ ! -f "$WORKFLOW_FILE" ]]; then
-        log_error "Workflow file not found: $WORKFLOW_FILE"
-        exit 1
-    fi
-}
-
-# Generate or use provided seed
-# Auto-generation: random integer + epoch time for uniqueness
-generate_seed() {
-    if [[ -z "$SEED" ]]; then
-        local EPOCH_TIME=$(date +%s)
-        local RANDOM_INT=$((RANDOM * 32768 + RANDOM))
-        SEED=$((RANDOM_INT + EPOCH_TIME))
-        log_debug "Auto-generated seed: $SEED"
-    fi
-}
-
-# Compute derived values from parameters
-# Sets: FILENAME_PREFIX, and appends IMAGE_ID to PROMPT for cache busting
-compute_derived_values() {
-    # Append IMAGE_ID to prompt to prevent caching
-    if [[ -n "$IMAGE_ID" && "$IMAGE_ID" != "UNDEFINED_ID_" ]]; then
-        PROMPT="${PROMPT} (id: ${IMAGE_ID})"
-    fi
-
-    # Compute filename prefix from IMAGE_ID + HH:MM:SS
-    local HOUR=$(date '+%H')
-    local MINUTE=$(date '+%M')
-    local SECOND=$(date '+%S')
-    FILENAME_PREFIX="${IMAGE_ID}_${HOUR}${MINUTE}${SECOND}"
-}
-
-# Export variables for use in envsubst and subprocesses
-export_variables() {
-    export PROMPT
-    export IMAGE_ID
-    export OUTPUT_FOLDER
-    export SEED
-    export STEPS
-    export WIDTH
-    export HEIGHT
-    export BATCH_SIZE
-    export FILENAME_PREFIX
-    export COMFYUI_URL
-}
-
-# Print startup information
-print_startup_info() {
-    echo ""
-    log_info "═══════════════════════════════════════════════════════════════"
-    log_info "ComfyUI Workflow Execution"
-    log_info "═══════════════════════════════════════════════════════════════"
-    log_info "Timestamp:        ${START_TIME}"
-    log_info "ComfyUI Server:   ${COMFYUI_URL}"
-    log_info "Client ID:        ${CLIENT_ID}"
-    log_info ""
-    log_info "Configuration:"
-    log_info "  Workflow:       $(basename "$WORKFLOW_FILE")"
-    log_info "  Prompt:         ${PROMPT:0:60}$( (( ${#PROMPT} > 60 )) && echo "..." || echo "" )"
-    log_info "  Image ID:       ${IMAGE_ID}"
-    log_info "  Seed:           ${SEED}"
-    log_info "  Steps:          ${STEPS}"
-    log_info "  Size:           ${WIDTH}x${HEIGHT}"
-    log_info "  Batch Size:     ${BATCH_SIZE}"
-    log_info "  Output:         ${OUTPUT_FOLDER}"
-    log_info ""
-}
-
-################################################################################
-# MAIN INITIALIZATION SEQUENCE
-################################################################################
-
-# Parse arguments
-parse_arguments "$@"
-
-# Validate arguments
-validate_arguments
-
-# Generate/validate seed
-generate_seed
-
-# Compute derived values
-compute_derived_values
-
-# Export variables
-export_variables
-
-# Initialize logging
-init_generation_log
-log_to_file "Generation started with parameters"
-
-# Print startup info
-print_startup_info
-
-################################################################################
-# DEPENDENCY CHECKS & VALIDATION
-################################################################################
-
-# Check for required command in PATH
-# Arguments: $1 = command name
-# Returns: 0 if found, 1 if not found
-check_command() {
-    if ! command -v "$1" &> /dev/null; then
-        return 1
-    fi
-    return 0
-}
-
-# Verify all required dependencies are available
-# Installs envsubst/gettext-base if missing
-# Exits if curl or jq not found
-verify_dependencies() {
-    log_info "Verifying dependencies..."
-
-    # curl is required
-    if ! check_command curl; then
-        log_error "curl not found - cannot proceed"
-        log_to_file "ERROR: curl command not found"
-        exit 1
-    fi
-    log_debug "✓ curl found"
-
-    # jq is required
-    if ! check_command jq; then
-        log_error "jq not found - cannot proceed"
-        log_to_file "ERROR: jq command not found"
-        exit 1
-    fi
-    log_debug "✓ jq found"
-
-    # python3 is required
-    if ! check_command python3; then
-        log_error "python3 not found - cannot proceed"
-        log_to_file "ERROR: python3 command not found"
-        exit 1
-    fi
-    log_debug "✓ python3 found"
-
-    # envsubst - auto-install if missing
-    if ! check_command envsubst; then
-        log_info "envsubst not found, installing gettext-base..."
-        log_to_file "Installing missing dependency: gettext-base"
-        if apt-get update > /dev/null 2>&1 && apt-get install -y gettext-base > /dev/null 2>&1; then
-            log_success "envsubst installed successfully"
-            log_to_file "Successfully installed gettext-base"
-        else
-            log_error "Failed to install envsubst (gettext-base package)"
-            log_to_file "ERROR: Failed to install gettext-base (may require root)"
-            exit 1
-        fi
-    fi
-    log_debug "✓ envsubst found"
-
-    log_success "All dependencies verified"
-    log_to_file "All dependencies verified successfully"
-}
-
-# Check ComfyUI server accessibility
-# Verifies server is reachable via HTTP and responding to /system_stats
-check_comfyui_accessibility() {
-    log_info "Checking ComfyUI server accessibility..."
-    log_to_file "Checking ComfyUI server at ${COMFYUI_URL}"
-
-    local HTTP_CODE=$(curl -s -o /dev/null -w "%{http_code}" "${COMFYUI_URL}/system_stats" 2>/dev/null || echo "000")
-
-    if [[ "$HTTP_CODE" != "200" ]]; then
-        log_error "ComfyUI server not accessible at ${COMFYUI_URL} (HTTP $HTTP_CODE)"
-        log_to_file "ERROR: ComfyUI server not accessible (HTTP $HTTP_CODE)"
-        finalize_generation_log "Failed" ""
-        exit 1
-    fi
-
-    log_success "ComfyUI server is accessible"
-    log_to_file "ComfyUI server is accessible (HTTP 200)"
-}
-
-# Validate workflow file exists and is readable
-# Note: Full validation happens during execution by ComfyUI API
-# Arguments: $1 = workflow file path
-validate_workflow_structure() {
-    local workflow_file="$1"
-
-    log_info "Validating workflow file..."
-    log_to_file "Validating workflow file at $workflow_file"
-
-    # Check file exists and is readable
-    if [[ ! -r "$workflow_file" ]]; then
-        log_error "Workflow file not readable: $workflow_file"
-        log_to_file "ERROR: Workflow file not readable"
-        finalize_generation_log "Failed" "Workflow file not accessible"
-        exit 1
-    fi
-
-    log_success "Workflow file is readable"
-    log_to_file "Workflow file validated successfully"
-}
-
-################################################################################
-# WORKFLOW PROCESSING
-################################################################################
-
-# Convert ComfyUI UI format to API format
-# The UI format (used in web interface) has a different structure than the
-# API format (required for REST API calls). This function:
-#   - Converts node array to node dictionary keyed by node ID
-#   - Resolves node connection links to direct references
-#   - Filters out UI-only nodes (Note, Reroute, PrimitiveNode)
-#   - Maps widget values to proper input names using node definitions
-#
-# Arguments: $1 = workflow file path (UI format)
-# Output: JSON string in API format
-convert_ui_to_api_format() {
-    local ui_workflow_file=$1
-    local comfyui_url="${COMFYUI_URL:-http://localhost:8188}"
-
-    # Use Python to convert UI format to API format
-    python3 << PYTHON_EOF
-import json
-import urllib.request
-import urllib.error
-
-# Read the UI format workflow
-with open("$ui_workflow_file", 'r') as f:
-    ui_workflow = json.load(f)
-
-# Try to fetch node definitions from ComfyUI API for proper input name mapping
-node_definitions = {}
-try:
-    req = urllib.request.Request("$comfyui_url/object_info")
-    with urllib.request.urlopen(req, timeout=5) as response:
-        node_definitions = json.loads(response.read().decode())
-except Exception as e:
-    pass  # Continue without node definitions if API is unavailable
-
-# Check if it's already in API format (has nodes as top-level keys)
-if 'nodes' in ui_workflow and isinstance(ui_workflow['nodes'], list):
-    # Build link mapping: link_id -> (source_node_id, output_slot)
-    link_map = {}
-    if 'links' in ui_workflow and ui_workflow['links']:
-        for link in ui_workflow['links']:
-            link_id, source_node, source_slot, target_node, target_slot, link_type = link[:6]
-            link_map[link_id] = [str(source_node), source_slot]
-
-    # Convert from UI format to API format
-    api_workflow = {}
-
-    # UI-only node types that should be filtered out
-    ui_only_nodes = {'Note', 'Reroute', 'PrimitiveNode'}
-
-    for node in ui_workflow['nodes']:
-        node_id = str(node['id'])
-        node_type = node.get('type')
-
-        # Skip UI-only nodes
-        if node_type in ui_only_nodes:
-            continue
-
-        api_node = {
-            'class_type': node_type,
-            'inputs': {}
-        }
-
-        # Process inputs (connections to other nodes)
-        if 'inputs' in node and isinstance(node['inputs'], list):
-            for input_item in node['inputs']:
-                input_name = input_item.get('name', '')
-                if 'link' in input_item and input_item['link'] is not None:
-                    # This input is connected to another node
-                    if input_item['link'] in link_map:
-                        # Use the resolved link reference
-                        api_node['inputs'][input_name] = link_map[input_item['link']]
-
-        # Process widget values (parameters)
-        if 'widgets_values' in node:
-            widget_values = list(node['widgets_values'])  # Make a copy
-            node_type = node.get('type', '')
-
-            # Filter out UI-only widget values (e.g., "randomize" controls)
-            # These shouldn't be sent to the API
-            filtered_widget_values = []
-            for val in widget_values:
-                # Skip "randomize" control values
-                if isinstance(val, str) and val == 'randomize':
-                    continue
-                filtered_widget_values.append(val)
-
-            # Get input names from node definition if available
-            input_names = []
-            if node_type in node_definitions:
-                node_def = node_definitions[node_type]
-                if 'input' in node_def:
-                    # Get required inputs in order
-                    required = node_def.get('input', {}).get('required', {})
-                    input_names = list(required.keys())
-
-            # Map filtered widget values to input names
-            if input_names:
-                # Build list of unset input names (those that need widget values)
-                unset_inputs = [name for name in input_names if name not in api_node['inputs']]
-
-                # Assign widget values to unset inputs in order
-                for idx, input_name in enumerate(unset_inputs):
-                    if idx < len(filtered_widget_values):
-                        api_node['inputs'][input_name] = filtered_widget_values[idx]
-            else:
-                # Fallback: no node definition, just map widget values generically
-                for idx, widget_value in enumerate(filtered_widget_values):
-                    api_node['inputs'][f'widget_{idx}'] = widget_value
-
-        api_workflow[node_id] = api_node
-
-    print(json.dumps(api_workflow))
-else:
-    # Already in API format, just return as is
-    print(json.dumps(ui_workflow))
-PYTHON_EOF
-}
-
-################################################################################
-# WORKFLOW EXECUTION PIPELINE
-################################################################################
-
-# Process workflow template with parameter substitution
-# Substitutes ${PROMPT}, ${SEED}, ${IMAGE_ID}, ${OUTPUT_FOLDER}, etc.
-# Arguments: $1 = input workflow file, $2 = output workflow file
-process_workflow_template() {
-    local input_file="$1"
-    local output_file="$2"
-
-    log_info "Processing workflow template..."
-    log_to_file "Substituting environment variables into workflow"
-
-    if ! envsubst < "$input_file" > "$output_file"; then
-        log_error "Failed to process workflow template"
-        log_to_file "ERROR: envsubst failed to process workflow"
-        finalize_generation_log "Failed" "Template processing error"
-        exit 1
-    fi
-
-    log_success "Workflow template processed"
-    log_to_file "Workflow template processed successfully"
-}
-
-# Substitute seed values in KSampler nodes
-# Modifies the seed input for all KSampler nodes to use the specified seed
-# Arguments: $1 = workflow API file (modified in-place)
-substitute_seed() {
-    local workflow_api="$1"
-    local seed_value="$SEED"
-
-    log_info "Substituting seed in KSampler nodes..."
-    log_to_file "Substituting seed value: $seed_value"
-
-    python3 << PYTHON_EOF
-import json
-import sys
-
-try:
-    with open("$workflow_api", 'r') as f:
-        api_workflow = json.load(f)
-
-    seed_count = 0
-    for node_id, node in api_workflow.items():
-        if isinstance(node, dict) and node.get('class_type') == 'KSampler':
-            if 'inputs' in node and 'seed' in node['inputs']:
-                old_seed = node['inputs']['seed']
-                node['inputs']['seed'] = int($seed_value)
-                seed_count += 1
-                print(f"  Node {node_id}: {old_seed} → $seed_value", file=sys.stderr)
-
-    with open("$workflow_api", 'w') as f:
-        json.dump(api_workflow, f)
-
-    print(f"Substituted seed in {seed_count} sampler nodes", file=sys.stderr)
-except Exception as e:
-    print(f"ERROR: Failed to substitute seed: {e}", file=sys.stderr)
-    sys.exit(1)
-PYTHON_EOF
-
-    log_success "Seed substituted in KSampler nodes"
-    log_to_file "Successfully substituted seed in all KSampler nodes"
-}
-
-# Submit workflow to ComfyUI via REST API
-# Sends the prepared workflow payload and retrieves the prompt_id
-# Handles both formats: {"prompt": {...}} and direct {...}
-# Arguments: $1 = workflow API file
-# Sets: PROMPT_ID (global), PAYLOAD_FILE (global)
-submit_workflow() {
-    local workflow_api="$1"
-
-    log_info "Submitting workflow to ComfyUI..."
-    log_to_file "Submitting workflow to ${COMFYUI_URL}/prompt"
-
-    # Extract the prompt object from the workflow
-    # If the workflow has a "prompt" wrapper, extract it
-    # Otherwise use the workflow as-is
-    local prompt_obj
-    if jq -e '.prompt' "$workflow_api" > /dev/null 2>&1; then
-        # Workflow already has "prompt" wrapper, extract it
-        prompt_obj=$(jq '.prompt' "$workflow_api")
-    else
-        # Workflow is direct API format, use as-is
-        prompt_obj=$(cat "$workflow_api")
-    fi
-
-    # Build JSON payload with client_id
-    PAYLOAD=$(jq -n --argjson prompt "$prompt_obj" --arg client_id "$CLIENT_ID" '{prompt: $prompt, client_id: $client_id}')
-
-    # Save payload for debugging
-    PAYLOAD_FILE="/tmp/comfyui-payload-${START_TIMESTAMP}.json"
-    echo "$PAYLOAD" > "$PAYLOAD_FILE"
-    log_info "Debug payload saved to: $PAYLOAD_FILE"
-
-    # Submit to ComfyUI
-    local HTTP_RESPONSE=$(curl -s -w "\n%{http_code}" -X POST \
-        -H "Content-Type: application/json" \
-        -d "$PAYLOAD" \
-        "${COMFYUI_URL}/prompt")
-
-    # Extract response body and status code
-    local RESPONSE=$(echo "$HTTP_RESPONSE" | head -n -1)
-    local STATUS_CODE=$(echo "$HTTP_RESPONSE" | tail -n 1)
-
-    if [[ "$STATUS_CODE" != "200" ]]; then
-        log_error "Failed to submit workflow (HTTP $STATUS_CODE)"
-        log_to_file "ERROR: HTTP $STATUS_CODE response: $RESPONSE"
-        finalize_generation_log "Failed" "API submission failed"
-        exit 1
-    fi
-
-    # Extract prompt_id from response
-    PROMPT_ID=$(echo "$RESPONSE" | jq -r '.prompt_id' 2>/dev/null || echo "")
-
-    if [[ -z "$PROMPT_ID" || "$PROMPT_ID" == "null" ]]; then
-        log_error "Failed to extract prompt_id from response"
-        log_to_file "ERROR: No prompt_id in response: $RESPONSE"
-        finalize_generation_log "Failed" "Invalid API response"
-        exit 1
-    fi
-
-    log_success "Workflow submitted (prompt_id: $PROMPT_ID)"
-    log_to_file "Successfully submitted workflow with prompt_id: $PROMPT_ID"
-}
-
-# Poll ComfyUI for workflow completion
-# Checks /history endpoint until workflow is complete or timeout
-# Sets: OUTPUTS (global) on success
-poll_for_completion() {
-    local POLL_INTERVAL=2
-    local POLL_COUNT=0
-    local MAX_POLLS=1800  # 1 hour at 2-second intervals
-    local MAX_TIME=$((MAX_POLLS * POLL_INTERVAL))
-
-    log_info "Polling for completion (timeout: ${MAX_TIME}s)..."
-    log_to_file "Starting completion polling with ${MAX_POLLS} max polls"
-
-    while [[ $POLL_COUNT -lt $MAX_POLLS ]]; do
-        # Fetch execution history
-        local HTTP_RESPONSE=$(curl -s -w "\n%{http_code}" \
-            "${COMFYUI_URL}/history/${PROMPT_ID}")
-        local HISTORY=$(echo "$HTTP_RESPONSE" | head -n -1)
-        local STATUS_CODE=$(echo "$HTTP_RESPONSE" | tail -n 1)
-
-        if [[ "$STATUS_CODE" != "200" ]]; then
-            log_error "Failed to fetch workflow status (HTTP $STATUS_CODE)"
-            log_to_file "ERROR: Failed to fetch history (HTTP $STATUS_CODE)"
-            finalize_generation_log "Failed" "Status check failed"
-            exit 1
-        fi
-
-        # Check if workflow is complete
-        if echo "$HISTORY" | jq -e ".\"$PROMPT_ID\"" > /dev/null 2>&1; then
-            handle_completion_response "$HISTORY"
-            return $?
-        fi
-
-        # Show progress every 10 polls (20 seconds)
-        if (( POLL_COUNT % 10 == 0 )); then
-            local ELAPSED=$((POLL_COUNT * POLL_INTERVAL))
-            log_info "Still processing... (${ELAPSED}s elapsed)"
-            log_to_file "Progress: ${ELAPSED}s elapsed"
-        fi
-
-        sleep $POLL_INTERVAL
-        ((POLL_COUNT++))
-    done
-
-    # Timeout reached
-    log_error "Workflow exceeded timeout (${MAX_TIME}s)"
-    log_to_file "ERROR: Workflow timeout after ${MAX_TIME}s"
-    finalize_generation_log "Timeout" ""
-    exit 2
-}
-
-# Handle workflow completion response
-# Processes outputs on success or extracts error message on failure
-# Arguments: $1 = history JSON response
-handle_completion_response() {
-    local HISTORY="$1"
-
-    # Check if execution was successful
-    if echo "$HISTORY" | jq -e ".\"$PROMPT_ID\".outputs" > /dev/null 2>&1; then
-        OUTPUTS=$(echo "$HISTORY" | jq ".\"$PROMPT_ID\".outputs" 2>/dev/null)
-
-        log_success "Workflow completed successfully"
-        log_to_file "Workflow execution completed successfully"
-        log_to_file "Outputs: $OUTPUTS"
-
-        return 0
-    else
-        # Extraction error message
-        local ERROR_MSG=$(echo "$HISTORY" | jq -r ".\"$PROMPT_ID\".status.messages // \"Unknown error\"" 2>/dev/null)
-        log_error "Workflow execution failed: $ERROR_MSG"
-        log_to_file "ERROR: Workflow execution failed: $ERROR_MSG"
-        finalize_generation_log "Failed" "$ERROR_MSG"
-        exit 1
-    fi
-}
-
-# Rename output files from 5-digit to 2-digit suffix format
-# Standardizes filenames for consistent naming
-# Example: image_005_ becomes image_5_
-normalize_output_filenames() {
-    if [[ -z "$FILENAME_PREFIX" ]]; then
-        log_debug "FILENAME_PREFIX empty, skipping filename normalization"
-        return 0
-    fi
-
-    log_info "Normalizing output filenames..."
-    log_to_file "Normalizing filenames with prefix: $FILENAME_PREFIX"
-
-    python3 << PYTHON_EOF
-import os
-import re
-import glob
-import sys
-
-output_folder = "$OUTPUT_FOLDER"
-prefix = "$FILENAME_PREFIX"
-renamed_count = 0
-
-# Find all files matching the pattern: PREFIX_XXXXX_*
-pattern = os.path.join(output_folder, f"{prefix}_*.png")
-for filepath in glob.glob(pattern):
-    basename = os.path.basename(filepath)
-    # Match: PREFIX_XXXXX_*.png and extract the number
-    match = re.match(r'^(.+?)_(\d{5})_(.*)$', basename)
-    if match:
-        prefix_part = match.group(1)
-        old_num = match.group(2)
-        suffix = match.group(3)
-        # Convert 5-digit to 2-digit (padding with zeros)
-        new_num = str(int(old_num)).zfill(2)
-        new_basename = f"{prefix_part}_{new_num}_{suffix}"
-        new_filepath = os.path.join(output_folder, new_basename)
-
-        # Rename only if new file doesn't exist
-        if not os.path.exists(new_filepath):
-            try:
-                os.rename(filepath, new_filepath)
-                print(f"  {basename} → {new_basename}", file=sys.stderr)
-                renamed_count += 1
-            except Exception as e:
-                print(f"  ERROR renaming {basename}: {e}", file=sys.stderr)
-
-if renamed_count > 0:
-    print(f"Renamed {renamed_count} file(s)", file=sys.stderr)
-else:
-    print("No files to rename", file=sys.stderr)
-PYTHON_EOF
-
-    log_success "Output filenames normalized"
-    log_to_file "Successfully normalized output filenames"
-}
-
-################################################################################
-# MAIN EXECUTION
-################################################################################
-
-# Verify dependencies first
-verify_dependencies
-
-# Check ComfyUI is accessible
-check_comfyui_accessibility
-
-# Validate workflow structure
-validate_workflow_structure "$WORKFLOW_FILE"
-
-# Process workflow template
-TEMP_WORKFLOW=$(mktemp /tmp/comfyui-workflow-XXXXXX.json)
-trap "rm -f $TEMP_WORKFLOW" EXIT
-process_workflow_template "$WORKFLOW_FILE" "$TEMP_WORKFLOW"
-
-# Convert to API format
-TEMP_WORKFLOW_API=$(mktemp /tmp/comfyui-workflow-api-XXXXXX.json)
-trap "rm -f $TEMP_WORKFLOW_API" EXIT
-convert_ui_to_api_format "$TEMP_WORKFLOW" > "$TEMP_WORKFLOW_API"
-log_success "Workflow converted to API format"
-log_to_file "Workflow converted to API format"
-
-# Substitute seed
-substitute_seed "$TEMP_WORKFLOW_API"
-
-# Submit workflow
-submit_workflow "$TEMP_WORKFLOW_API"
-
-# Poll for completion and handle output
-poll_for_completion
-if [[ $? -eq 0 ]]; then
-    echo ""
-    echo "═══════════════════════════════════════════════════════════════"
-    echo "Generated Outputs:"
-    echo "═══════════════════════════════════════════════════════════════"
-    echo "$OUTPUTS"
-    echo ""
+if ! command -v python3 &> /dev/null; then
+    echo "[✗] python3 not found - cannot proceed" >&2
+    exit 1
+fi
 
-    # Normalize filenames
-    normalize_output_filenames
+export PYTHONPATH="${SCRIPT_DIR}${PYTHONPATH:+:${PYTHONPATH}}"
+export COMFY_RUNNER_PROG="$(basename "$0")"
 
-    # Finalize log
-    finalize_generation_log "Success" "$OUTPUTS"
-    exit 0
-fi
+exec python3 -m comfy_runner --mode local "$@"
@@ -0,0 +1,32 @@
+"""
+comfy_runner - run ComfyUI workflows from Python or the command line
+
+The pipeline behind comfy-run.sh and comfy-run-remote.sh: template
+substitution, UI→API conversion, submission over one keep-alive connection,
+websocket completion, error reporting, output renaming (local mode) or
+download (remote mode), and generation logs.
+
+    from comfy_runner import RunConfig, run
+    exit_code = run(RunConfig(workflow='flux2_turbo_parametric_api.json', prompt='A red car'))
+
+Command line: python3 -m comfy_runner --help
+"""
+
+from .client import ComfyClient, ComfyError, create_watcher
+from .runner import RunConfig, Runner, build_variants, run
+from .schema import SchemaStore
+from .transfer import Downloader
+from .workflow import (
+    WorkflowError, WorkflowTemplate, convert_ui_to_api, is_ui_format,
+    set_seed, substitute,
+)
+
+__version__ = '3.0.0'
+
+__all__ = [
+    'ComfyClient', 'ComfyError', 'create_watcher',
+    'RunConfig', 'Runner', 'build_variants', 'run',
+    'SchemaStore', 'Downloader',
+    'WorkflowError', 'WorkflowTemplate', 'convert_ui_to_api', 'is_ui_format',
+    'set_seed', 'substitute',
+]
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Command line interface: python3 -m comfy_runner [--mode local|remote] ...
+
+Accepts the options of comfy-run.sh and comfy-run-remote.sh (both are thin
+wrappers around it). Exit codes are theirs: 0 success, 1 failure, 2 timeout.
+"""
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from . import tracing
+from .logs import log_debug, log_error
+from .runner import GRID_NAMES, MODES, UNDEFINED_ID, RunConfig, run
+from .transfer import DEFAULT_WORKERS
+
+# Workflows live next to the package (workflows/ in the repo, on the pod
+# and in the image)
+WORKFLOWS_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_WORKFLOW = WORKFLOWS_DIR / 'flux2_turbo_512x512_parametric_api.json'
+
+# mode -> default generation log directory (GENERATION_LOG_DIR overrides)
+DEFAULT_LOG_DIRS = {
+    'local': '/workspace/logs/generations/',
+    'remote': './logs/generations/',
+}
+
+# mode -> default generation journal directory (GENERATION_JOURNAL_DIR overrides)
+DEFAULT_JOURNAL_DIRS = {
+    'local': '/workspace/logs/journal/',
+    'remote': './logs/journal/',
+}
+
+DESCRIPTION = """\
+Run a ComfyUI workflow with parameter substitution and generation logging.
+
+local mode talks to ComfyUI on this machine (COMFYUI_HOST:COMFYUI_PORT) and
+normalizes output filenames in place; remote mode talks to a RunPod pod
+through its proxy URL and downloads the images to --local-output."""
+
+EPILOG = """\
+sweep mode:
+  --prompts-file, --seed-range and --grid run every combination of prompts x
+  seeds x grid values in one process, with at most --concurrency prompts
+  queued at a time. Each variant gets its own generation log and output
+  prefix, with a 4-digit variant number appended to the image ID.
+
+completion:
+  Completion is pushed over ComfyUI's websocket when websocket-client is
+  installed, or over the REST API event stream with --stream-url; otherwise
+  /history is polled every second.
+
+remote downloads:
+  Images are fetched --download-workers at a time into LOCAL_OUTPUT/.partial/,
+  resumed with HTTP Range requests after a dropped connection, verified (PNG
+  chunk CRCs, announced size) and renamed into LOCAL_OUTPUT atomically.
+
+UI format workflows:
+  Converted with the node definitions of the classes they use, cached per
+  ComfyUI version and custom node set; missing classes are fetched from
+  /object_info/<class>, and a bundled snapshot covers an unreachable server.
+
+environment:
+  COMFYUI_HOST, COMFYUI_PORT   local ComfyUI server (default: localhost:8188)
+  RUNPOD_POD_URL               remote pod URL (else auto-detected with runpodctl)
+  GENERATION_LOG_DIR           log directory (local: /workspace/logs/generations/,
+                               remote: ./logs/generations/)
+  GENERATION_TEXT_LOGS         false: no per-generation .log files (default: true)
+  GENERATION_JOURNAL_DIR       structured journal, one JSON record per generation
+                               (local: /workspace/logs/journal/, remote:
+                               ./logs/journal/); GENERATION_JOURNAL=false turns
+                               it off; stats: python3 -m comfy_runner.journal_stats
+  GENERATION_JOURNAL_SEGMENT_MB,
+  GENERATION_JOURNAL_KEEP      segment size before rotation (16) and compressed
+                               segments kept (100)
+  RECOVERY_DIR                 remote timeout recovery files (default: ./logs/recovery/)
+  COMFY_STREAM_URL             same as --stream-url
+  COMFY_SCHEMA_CACHE           same as --schema-cache
+  RUNPOD_PUBLIC_IP,            remote mode: pull images with rsync over SSH
+  RUNPOD_TCP_PORT_22           (root@IP, port), falling back to HTTP per image
+  POD_OUTPUT_DIR               ComfyUI output directory on the pod for rsync
+                               (default: /workspace/ComfyUI/output)
+  TRACE_FILE                   append trace spans (template, conversion, submit,
+                               wait, download) to this JSONL file; summary:
+                               python3 -m comfy_runner.trace_summary TRACE_FILE
+  OTEL_EXPORTER_OTLP_ENDPOINT  export spans to an OpenTelemetry collector
+  TRACEPARENT                  W3C trace context to join (set by a caller)
+
+output files:
+  {OUTPUT_FOLDER or LOCAL_OUTPUT}/{IMAGE_ID}_{HHMMSS}_*.png
+  {LOG_DIR}/generation_{TIMESTAMP}.log  ({TIMESTAMP}_{NNNN} for sweep variants)
+  /tmp/comfyui-payload-{TIMESTAMP}.json  (prompt payload of the first variant)
+
+exit codes:
+  0 success, 1 validation/connection/execution failure, 2 timeout"""
+
+
+class ArgumentParser(argparse.ArgumentParser):
+    """Usage errors exit 1 (2 means timeout for the runners)"""
+
+    def error(self, message):
+        log_error(message)
+        print('\nUse --help for usage information', file=sys.stderr)
+        sys.exit(1)
+
+
+def build_parser(prog: str = None) -> ArgumentParser:
+    parser = ArgumentParser(
+        prog=prog or os.environ.get('COMFY_RUNNER_PROG') or 'python3 -m comfy_runner',
+        description=DESCRIPTION,
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--mode', choices=MODES, default='local',
+                        help='local ComfyUI server or remote RunPod pod (default: local)')
+    parser.add_argument('--prompt', default='', help='prompt text')
+    parser.add_argument('--workflow', default=str(DEFAULT_WORKFLOW),
+                        help=f'workflow JSON, UI or API format (default: {DEFAULT_WORKFLOW.name})')
+    parser.add_argument('--image-id', default=UNDEFINED_ID,
+                        help='identifier appended to the prompt and used as output prefix')
+    parser.add_argument('--output-folder', default='/workspace/output/',
+                        help='output folder on the ComfyUI machine (default: /workspace/output/)')
+    parser.add_argument('--seed', type=int, help='seed (default: random per image)')
+    parser.add_argument('--steps', type=int, default=15, help='inference steps (default: 15)')
+    parser.add_argument('--width', type=int, default=512, help='image width (default: 512)')
+    parser.add_argument('--height', type=int, default=512, help='image height (default: 512)')
+    parser.add_argument('--batch-size', type=int, default=1, help='images per prompt (default: 1)')
+    parser.add_argument('--timeout', type=float, default=3600,
+                        help='seconds to wait for each prompt (default: 3600)')
+
+    server = parser.add_argument_group('server')
+    server.add_argument('--url', '--pod-url', dest='url',
+                        help='ComfyUI base URL (local default: http://$COMFYUI_HOST:$COMFYUI_PORT; '
+                             'remote: https://{POD_ID}-8188.proxy.runpod.net, $RUNPOD_POD_URL or runpodctl)')
+    server.add_argument('--stream-url', default=os.environ.get('COMFY_STREAM_URL') or None,
+                        help='REST API base URL: wait on /api/stream/<prompt_id> instead of the websocket')
+    server.add_argument('--poll', action='store_true', help='poll /history instead of waiting for events')
+    server.add_argument('--schema-cache', metavar='DIR',
+                        help='node definition cache for UI format workflows '
+                             '(default: $COMFY_SCHEMA_CACHE or ~/.cache/comfy_runner/schema)')
+    server.add_argument('--refresh-schema', action='store_true',
+                        help='refetch the node definitions a UI format workflow uses')
+
+    remote = parser.add_argument_group('remote mode')
+    remote.add_argument('--local-output', default='./output/',
+                        help='local folder for downloaded images (default: ./output/)')
+    remote.add_argument('--download', dest='download', action='store_true', default=True,
+                        help='download images (default)')
+    remote.add_argument('--no-download', dest='download', action='store_false',
+                        help='leave images on the pod')
+    remote.add_argument('--download-workers', type=int, default=DEFAULT_WORKERS, metavar='N',
+                        help=f'parallel image downloads (default: {DEFAULT_WORKERS})')
+    remote.add_argument('--no-rsync', dest='rsync', action='store_false',
+                        help='download over HTTP even when RUNPOD_PUBLIC_IP and RUNPOD_TCP_PORT_22 are set')
+
+    sweep = parser.add_argument_group('sweep mode')
+    sweep.add_argument('--prompts-file', help='one prompt per line (blank lines and # comments skipped)')
+    sweep.add_argument('--seed-range', metavar='A:B', help='every seed from A to B (inclusive)')
+    sweep.add_argument('--grid', metavar='PARAM=V1,V2', action='append', default=[],
+                       help='values to sweep for steps, width, height or batch-size (repeatable)')
+    sweep.add_argument('--concurrency', type=int, default=2,
+                       help='prompts queued in ComfyUI at once (default: 2)')
+    return parser
+
+
+def normalize_url(url: str) -> str:
+    """Add https:// to a bare host and strip the trailing slash"""
+    url = url.strip().rstrip('/')
+    if not re.match(r'^https?://', url):
+        url = f'https://{url}'
+    return url
+
+
+def detect_pod_url() -> Optional[str]:
+    """Proxy URL of the first RUNNING pod listed by runpodctl"""
+    if not shutil.which('runpodctl'):
+        return None
+    try:
+        listing = subprocess.run(
+            ['runpodctl', 'get', 'pod'], capture_output=True, text=True, timeout=30
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    for line in listing.splitlines():
+        if 'RUNNING' in line and line.split():
+            return f'https://{line.split()[0]}-8188.proxy.runpod.net'
+    return None
+
+
+def resolve_url(args) -> Optional[str]:
+    if args.url:
+        return normalize_url(args.url) if args.mode == 'remote' else args.url.rstrip('/')
+    if args.mode == 'local':
+        host = os.environ.get('COMFYUI_HOST', 'localhost')
+        port = os.environ.get('COMFYUI_PORT', '8188')
+        return f'http://{host}:{port}'
+    url = os.environ.get('RUNPOD_POD_URL') or detect_pod_url()
+    if url:
+        log_debug(f'Pod URL: {url}')
+    return normalize_url(url) if url else None
+
+
+def parse_grid(parser: ArgumentParser, specs: List[str]):
+    grid = {}
+    for spec in specs:
+        match = re.match(r'^([a-z_-]+)=(\d+(?:,\d+)*)$', spec)
+        if not match or match.group(1) not in GRID_NAMES:
+            parser.error(f'Invalid --grid: {spec} (expected steps|width|height|batch-size=V1,V2,...)')
+        grid[GRID_NAMES[match.group(1)]] = match.group(2).split(',')
+    return grid
+
+
+def config_from_args(parser: ArgumentParser, argv: List[str] = None) -> RunConfig:
+    """Parse and validate arguments (usage errors exit 1)"""
+    args = parser.parse_args(argv)
+
+    if not args.prompt and not args.prompts_file:
+        parser.error('Prompt is required (--prompt or --prompts-file)')
+    if not os.path.isfile(args.workflow):
+        parser.error(f'Workflow file not found: {args.workflow}')
+    if args.prompts_file and not os.access(args.prompts_file, os.R_OK):
+        parser.error(f'Prompts file not readable: {args.prompts_file}')
+
+    seed_range = None
+    if args.seed_range:
+        match = re.match(r'^(\d+):(\d+)$', args.seed_range)
+        if not match or int(match.group(1)) > int(match.group(2)):
+            parser.error(f'Invalid --seed-range: {args.seed_range} (expected START:END, START <= END)')
+        if args.seed is not None:
+            parser.error('--seed and --seed-range cannot be combined')
+        seed_range = (int(match.group(1)), int(match.group(2)))
+
+    if args.concurrency < 1:
+        parser.error(f'Invalid --concurrency: {args.concurrency} (expected a positive integer)')
+    if args.download_workers < 1:
+        parser.error(f'Invalid --download-workers: {args.download_workers} (expected a positive integer)')
+    if args.timeout <= 0:
+        parser.error(f'Invalid --timeout: {args.timeout:g}')
+
+    url = resolve_url(args)
+    if not url:
+        parser.error('Pod URL not found: use --pod-url, set RUNPOD_POD_URL, or start a pod (runpodctl)')
+
+    return RunConfig(
+        workflow=args.workflow,
+        mode=args.mode,
+        url=url,
+        prompt=args.prompt,
+        prompts_file=args.prompts_file,
+        image_id=args.image_id,
+        output_folder=args.output_folder,
+        seed=args.seed,
+        seed_range=seed_range,
+        grid=parse_grid(parser, args.grid),
+        steps=args.steps,
+        width=args.width,
+        height=args.height,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+        log_dir=os.environ.get('GENERATION_LOG_DIR') or DEFAULT_LOG_DIRS[args.mode],
+        text_logs=os.environ.get('GENERATION_TEXT_LOGS', 'true').lower() == 'true',
+        journal_dir=os.environ.get('GENERATION_JOURNAL_DIR') or DEFAULT_JOURNAL_DIRS[args.mode],
+        recovery_dir=os.environ.get('RECOVERY_DIR') or './logs/recovery/',
+        local_output=args.local_output,
+        download=args.download,
+        download_workers=args.download_workers,
+        rsync=args.rsync,
+        stream_url=normalize_url(args.stream_url) if args.stream_url else None,
+        poll=args.poll,
+        schema_cache=args.schema_cache,
+        refresh_schema=args.refresh_schema,
+    )
+
+
+def main(argv: List[str] = None) -> int:
+    config = config_from_args(build_parser(), argv)
+    tracing.configure('comfy_runner')
+    try:
+        return run(config)
+    except KeyboardInterrupt:
+        log_error('Interrupted')
+        return 1
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+ComfyUI HTTP client and completion watchers
+
+ComfyClient keeps one keep-alive connection (HTTP or HTTPS, so a RunPod
+proxy URL works as well as localhost) for every submit, /history check and
+/view download of a run, reopening it when the server drops it.
+
+Completion is pushed by a watcher instead of found by polling /history:
+WebSocketWatcher listens on ComfyUI's own /ws (needs websocket-client),
+EventStreamWatcher follows the REST API's /api/stream/<prompt_id> (--stream-url).
+The runner only fetches /history for prompts a watcher reports finished, and
+falls back to polling when no watcher is available or its channel drops.
+"""
+
+import http.client
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import quote, urlencode, urlsplit
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+USER_AGENT = 'comfy-runner'
+
+# Connection-level errors after which a keep-alive connection is reopened
+STALE_ERRORS = (
+    http.client.RemoteDisconnected, http.client.CannotSendRequest,
+    ConnectionResetError, BrokenPipeError,
+)
+
+
+class ComfyError(Exception):
+    """ComfyUI rejected a request or returned something unusable"""
+
+
+def _connection(url: str, timeout: float) -> Tuple[http.client.HTTPConnection, str]:
+    """(connection, path prefix) for a base URL"""
+    parts = urlsplit(url)
+    cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    return cls(parts.hostname, parts.port, timeout=timeout), parts.path.rstrip('/')
+
+
+class ComfyClient:
+    """One keep-alive connection to a ComfyUI server"""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._conn = None
+        self._prefix = ''
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # ------------------------------------------------------------------
+    # Transport
+    # ------------------------------------------------------------------
+
+    def _send(self, method: str, path: str, body: Optional[Dict],
+              extra_headers: Optional[Dict[str, str]] = None) -> http.client.HTTPResponse:
+        payload = json.dumps(body) if body is not None else None
+        headers = {'User-Agent': USER_AGENT, **(extra_headers or {})}
+        if payload is not None:
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            if self._conn is None:
+                self._conn, self._prefix = _connection(self.base_url, self.timeout)
+            try:
+                self._conn.request(method, self._prefix + path, body=payload, headers=headers)
+                return self._conn.getresponse()
+            except STALE_ERRORS:
+                self.close()
+                if attempt == 2:
+                    raise
+            except OSError:
+                self.close()
+                raise
+
+    def request(self, method: str, path: str, body: Optional[Dict] = None) -> Tuple[int, bytes]:
+        response = self._send(method, path, body)
+        try:
+            return response.status, response.read()
+        except OSError:
+            self.close()
+            raise
+
+    def get_json(self, path: str) -> Tuple[int, Optional[Dict]]:
+        status, data = self.request('GET', path)
+        if status != 200:
+            return status, None
+        try:
+            return status, json.loads(data)
+        except ValueError:
+            raise ComfyError(f'GET {path}: response is not JSON')
+
+    # ------------------------------------------------------------------
+    # ComfyUI endpoints
+    # ------------------------------------------------------------------
+
+    def ping(self) -> int:
+        """HTTP status of /system_stats (0: unreachable)"""
+        try:
+            return self.request('GET', '/system_stats')[0]
+        except (OSError, http.client.HTTPException):
+            return 0
+
+    def system_stats(self) -> Optional[Dict]:
+        """/system_stats (None: unreachable or not JSON)"""
+        try:
+            return self.get_json('/system_stats')[1]
+        except (OSError, http.client.HTTPException, ComfyError):
+            return None
+
+    def extensions(self) -> List[str]:
+        """Frontend extension scripts (/extensions/<pack>/...), one set per custom node pack"""
+        try:
+            listing = self.get_json('/extensions')[1]
+        except (OSError, http.client.HTTPException, ComfyError):
+            return []
+        return [path for path in listing or [] if isinstance(path, str)]
+
+    def object_info(self, class_type: str = None) -> Optional[Dict]:
+        """Node definitions: every node, or one node class (/object_info/<class_type>)
+
+        None when the request fails or the server has no per-class route.
+        """
+        path = '/object_info' + (f'/{quote(class_type, safe="")}' if class_type else '')
+        try:
+            return self.get_json(path)[1]
+        except (OSError, http.client.HTTPException, ComfyError):
+            return None
+
+    def submit(self, workflow: Dict, client_id: str, extra_data: Optional[Dict] = None) -> str:
+        """Queue an API prompt graph; returns its prompt_id
+
+        extra_data is stored with the prompt in ComfyUI's queue and history.
+        """
+        body = {'prompt': workflow, 'client_id': client_id}
+        if extra_data:
+            body['extra_data'] = extra_data
+        status, data = self.request('POST', '/prompt', body)
+        try:
+            result = json.loads(data)
+        except ValueError:
+            result = {}
+        if status != 200:
+            detail = result.get('error') or result.get('errors') or data.decode(errors='replace')
+            if isinstance(detail, dict):
+                detail = detail.get('message') or json.dumps(detail)
+            node_errors = result.get('node_errors')
+            if node_errors:
+                detail = f'{detail} (node errors: {json.dumps(node_errors)})'
+            raise ComfyError(f'HTTP {status}: {detail}')
+        prompt_id = result.get('prompt_id') or result.get('number')
+        if prompt_id is None:
+            raise ComfyError(f'No prompt_id in response: {data.decode(errors="replace")}')
+        return str(prompt_id)
+
+    def history(self, prompt_id: str) -> Optional[Dict]:
+        """History entry of a prompt (None while it is queued or running)"""
+        status, history = self.get_json(f'/history/{prompt_id}')
+        if status != 200:
+            raise ComfyError(f'Failed to fetch history (HTTP {status})')
+        return (history or {}).get(prompt_id)
+
+    def download(self, image: Dict, dest: str, offset: int = 0,
+                 validator: Optional[str] = None) -> Tuple[int, Optional[int], Optional[str]]:
+        """Stream an output image from /view to dest, resuming after offset bytes
+
+        validator (the ETag of the partial download) makes the server send
+        the whole file again if the image changed. Returns (bytes in dest,
+        full size announced by the server or None, ETag).
+        """
+        query = {'filename': image['filename'], 'type': image.get('type') or 'output'}
+        if image.get('subfolder'):
+            query['subfolder'] = image['subfolder']
+        headers = {}
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+            if validator:
+                headers['If-Range'] = validator
+        response = self._send('GET', f'/view?{urlencode(query)}', None, headers)
+        written = 0
+        try:
+            if response.status == 206:
+                # Content-Range: bytes <start>-<end>/<total>
+                match = re.match(r'bytes (\d+)-\d+/(\d+|\*)', response.getheader('Content-Range') or '')
+                if not match or int(match.group(1)) != offset:
+                    response.read()
+                    raise ComfyError(f'HTTP 206 with unexpected Content-Range for offset {offset}')
+                total = int(match.group(2)) if match.group(2) != '*' else None
+                mode = 'ab'
+            elif response.status == 200:
+                length = response.getheader('Content-Length')
+                total = int(length) if length and length.isdigit() else None
+                offset, mode = 0, 'wb'
+            else:
+                response.read()
+                raise ComfyError(f'HTTP {response.status}')
+            with open(dest, mode) as f:
+                while True:
+                    chunk = response.read(65536)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    written += len(chunk)
+        except OSError:
+            self.close()
+            raise
+        return offset + written, total, response.getheader('ETag')
+
+
+def unique_path(path: str) -> str:
+    """path, or path with _1, _2, ... before the extension if it exists"""
+    if not os.path.exists(path):
+        return path
+    name, ext = os.path.splitext(path)
+    counter = 1
+    while os.path.exists(f'{name}_{counter}{ext}'):
+        counter += 1
+    return f'{name}_{counter}{ext}'
+
+
+# ============================================================================
+# Completion watchers
+# ============================================================================
+
+class CompletionWatcher:
+    """Prompt ids reported finished by a push channel"""
+
+    # Shown in startup output and logs
+    name = 'polling'
+
+    def __init__(self, on_progress: Callable[[str, int, int], None] = None):
+        self.on_progress = on_progress    # (prompt_id, value, max)
+        self.alive = False
+        self._finished: Set[str] = set()
+        self._cond = threading.Condition()
+
+    def start(self) -> bool:
+        return False
+
+    def watch(self, prompt_id: str):
+        """Called right after a prompt is submitted"""
+
+    def close(self):
+        self._set_dead()
+
+    def wait(self, timeout: float) -> Set[str]:
+        """Prompt ids finished since the last call (waits up to timeout for one)"""
+        with self._cond:
+            if not self._finished and self.alive:
+                self._cond.wait(timeout)
+            finished, self._finished = self._finished, set()
+        return finished
+
+    def _finish(self, prompt_id: str):
+        with self._cond:
+            self._finished.add(prompt_id)
+            self._cond.notify_all()
+
+    def _set_dead(self):
+        with self._cond:
+            self.alive = False
+            self._cond.notify_all()
+
+
+class WebSocketWatcher(CompletionWatcher):
+    """ComfyUI's /ws event socket for the run's client_id"""
+
+    name = 'websocket'
+
+    def __init__(self, base_url: str, client_id: str, on_progress=None):
+        super().__init__(on_progress)
+        parts = urlsplit(base_url.rstrip('/'))
+        scheme = 'wss' if parts.scheme == 'https' else 'ws'
+        self.url = f'{scheme}://{parts.netloc}{parts.path}/ws?clientId={client_id}'
+        self._ws = None
+
+    def start(self) -> bool:
+        if websocket is None:
+            return False
+        try:
+            self._ws = websocket.create_connection(self.url, timeout=10, header=[f'User-Agent: {USER_AGENT}'])
+        except Exception:
+            return False
+        self._ws.settimeout(None)
+        self.alive = True
+        threading.Thread(target=self._run, name='comfy-ws', daemon=True).start()
+        return True
+
+    def close(self):
+        super().close()
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+
+    def _run(self):
+        try:
+            while self.alive:
+                message = self._ws.recv()
+                if isinstance(message, (bytes, bytearray)) or not message:
+                    continue     # binary frames are previews
+                try:
+                    event = json.loads(message)
+                except ValueError:
+                    continue
+                self._handle(event.get('type'), event.get('data') or {})
+        except Exception:
+            pass
+        self._set_dead()
+
+    def _handle(self, event_type: str, data: Dict):
+        prompt_id = data.get('prompt_id')
+        if not prompt_id:
+            return
+        if event_type == 'executing' and data.get('node') is None:
+            self._finish(prompt_id)
+        elif event_type in ('execution_success', 'execution_error', 'execution_interrupted'):
+            self._finish(prompt_id)
+        elif event_type == 'progress' and self.on_progress:
+            self.on_progress(prompt_id, data.get('value', 0), data.get('max', 0))
+
+
+class EventStreamWatcher(CompletionWatcher):
+    """The REST API's Server-Sent Events stream (/api/stream/<prompt_id>)
+
+    Prompts must be submitted with the REST API listener's client_id (set by
+    start()), which makes ComfyUI route their events to the REST API.
+    """
+
+    name = 'event stream'
+
+    # Terminal events of /api/stream
+    TERMINAL_EVENTS = ('completed', 'failed', 'cancelled', 'timeout')
+
+    def __init__(self, stream_url: str, timeout: float, on_progress=None):
+        super().__init__(on_progress)
+        self.stream_url = stream_url.rstrip('/')
+        self.timeout = timeout
+        self.client_id = None
+
+    def start(self) -> bool:
+        try:
+            status, info = ComfyClient(self.stream_url, timeout=10).get_json('/api/stream')
+        except (OSError, http.client.HTTPException, ComfyError):
+            return False
+        self.client_id = (info or {}).get('client_id')
+        self.alive = bool(self.client_id)
+        return self.alive
+
+    def watch(self, prompt_id: str):
+        threading.Thread(
+            target=self._follow, args=(prompt_id,), name=f'comfy-sse-{prompt_id[:8]}', daemon=True
+        ).start()
+
+    def _follow(self, prompt_id: str):
+        terminal = None
+        try:
+            conn, prefix = _connection(self.stream_url, self.timeout)
+            conn.request('GET', f'{prefix}/api/stream/{prompt_id}?previews=0', headers={'User-Agent': USER_AGENT})
+            response = conn.getresponse()
+            event = data = ''
+            deadline = time.monotonic() + self.timeout
+            while response.status == 200 and time.monotonic() < deadline:
+                line = response.readline()
+                if not line:
+                    break
+                line = line.decode('utf-8', errors='replace').rstrip('\r\n')
+                if line.startswith('event:'):
+                    event = line[6:].strip()
+                elif line.startswith('data:'):
+                    data = line[5:].strip()
+                elif not line:
+                    if event == 'progress' and self.on_progress:
+                        try:
+                            progress = json.loads(data)
+                            self.on_progress(prompt_id, progress.get('value', 0), progress.get('max', 0))
+                        except ValueError:
+                            pass
+                    elif event in self.TERMINAL_EVENTS:
+                        terminal = event
+                        break
+                    event = data = ''
+            conn.close()
+        except (OSError, http.client.HTTPException):
+            pass
+        if terminal:
+            self._finish(prompt_id)
+        else:
+            # The stream ended without a result: poll from now on
+            self._set_dead()
+
+
+def create_watcher(
+    base_url: str,
+    client_id: str,
+    stream_url: str = None,
+    timeout: float = 3600,
+    poll: bool = False,
+    on_progress=None
+) -> CompletionWatcher:
+    """The best available watcher, already started (a polling one if none is)"""
+    if not poll:
+        if stream_url:
+            watcher = EventStreamWatcher(stream_url, timeout, on_progress)
+        else:
+            watcher = WebSocketWatcher(base_url, client_id, on_progress)
+        if watcher.start():
+            return watcher
+    return CompletionWatcher()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Generation journal: one JSON record per generation
+
+The runners and the REST API append a record for every finished generation
+(parameters, timings, outputs, status, pod, model set) to a shared
+directory of JSONL segments:
+
+    journal.jsonl                                  active segment
+    journal-20260117T103000123456-4242.jsonl.gz    closed segments, oldest first
+
+The active segment is closed once it passes max_bytes, compressed and the
+oldest closed segments beyond `keep` removed. Appends and rotation hold an
+flock on journal.lock, so several runners and the API can share one
+directory. journal_stats.py aggregates the records.
+
+Record fields (None values are left out):
+
+    ts          end of the generation, UTC ISO 8601
+    source      comfy-run, comfy-run-remote or rest-api
+    status      completed, failed, cancelled or timeout
+    id          image ID (runners) or job ID (API)
+    prompt_id, workflow, prompt, seed, steps, width, height, batch_size
+    timings     seconds by stage; always has "total"
+    outputs     image filenames
+    error, pod, backend, models, cache_hit, trace_id
+"""
+
+import fcntl
+import glob
+import gzip
+import json
+import os
+import shutil
+import socket
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+ACTIVE_NAME = 'journal.jsonl'
+LOCK_NAME = 'journal.lock'
+SEGMENT_GLOB = 'journal-*.jsonl*'
+
+DEFAULT_MAX_BYTES = 16 * 1024 ** 2
+DEFAULT_KEEP = 100
+
+# Loader inputs that name a weights file (as in the API's workflow_templates)
+MODEL_INPUTS = (
+    'ckpt_name', 'unet_name', 'clip_name', 'clip_name1', 'clip_name2',
+    'vae_name', 'lora_name',
+)
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def pod_name() -> str:
+    """RunPod pod ID, else the host name"""
+    return os.environ.get('RUNPOD_POD_ID') or socket.gethostname()
+
+
+def workflow_models(workflow: Dict[str, Dict]) -> List[str]:
+    """Weights files an API-format workflow loads"""
+    names = set()
+    for node in workflow.values():
+        inputs = node.get('inputs') or {}
+        for input_name in MODEL_INPUTS:
+            value = inputs.get(input_name)
+            if isinstance(value, str) and value:
+                names.add(value)
+    return sorted(names)
+
+
+def make_record(source: str, status: str, **fields) -> Dict:
+    """A journal record stamped with the time and pod"""
+    record = {'ts': utc_now(), 'source': source, 'status': status, 'pod': pod_name()}
+    record.update((key, value) for key, value in fields.items() if value is not None)
+    return record
+
+
+class GenerationJournal:
+    """Appends records to the size-rotated segments of one directory"""
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, keep: int = DEFAULT_KEEP):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.active = os.path.join(directory, ACTIVE_NAME)
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, directory: str, environ=None) -> Optional['GenerationJournal']:
+        """Journal in directory with the GENERATION_JOURNAL_SEGMENT_MB / _KEEP
+        limits; None when GENERATION_JOURNAL=false"""
+        environ = os.environ if environ is None else environ
+        if environ.get('GENERATION_JOURNAL', 'true').lower() != 'true':
+            return None
+        return cls(
+            directory,
+            max_bytes=int(float(environ.get('GENERATION_JOURNAL_SEGMENT_MB', 16)) * 1024 ** 2),
+            keep=int(environ.get('GENERATION_JOURNAL_KEEP', DEFAULT_KEEP)),
+        )
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.directory, LOCK_NAME), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def append(self, record: Dict):
+        line = (json.dumps(record, separators=(',', ':'), ensure_ascii=False, default=str) + '\n').encode()
+        closed = None
+        with self._locked():
+            with open(self.active, 'ab') as f:
+                f.write(line)
+                size = f.tell()
+            if size >= self.max_bytes:
+                stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+                closed = os.path.join(self.directory, f'journal-{stamp}-{os.getpid()}.jsonl')
+                os.replace(self.active, closed)
+        # Compressed outside the lock; readers take the .jsonl until the .gz exists
+        if closed:
+            self._compress(closed)
+            self._prune()
+
+    def _compress(self, path: str):
+        partial = f'{path}.gz.{os.getpid()}.tmp'
+        with open(path, 'rb') as src, gzip.open(partial, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(partial, f'{path}.gz')
+        os.remove(path)
+
+    def _prune(self):
+        closed = sorted(glob.glob(os.path.join(glob.escape(self.directory), 'journal-*.jsonl.gz')))
+        for path in closed[:max(0, len(closed) - self.keep)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def segments(directory: str) -> List[str]:
+    """Segment files of a journal directory, oldest first (active last)"""
+    paths = sorted(glob.glob(os.path.join(glob.escape(directory), SEGMENT_GLOB)))
+    names = set(paths)
+    # A .jsonl next to its .gz is being compressed; count it once
+    closed = [p for p in paths if p.endswith('.jsonl.gz') or (p.endswith('.jsonl') and f'{p}.gz' not in names)]
+    active = os.path.join(directory, ACTIVE_NAME)
+    return closed + ([active] if os.path.exists(active) else [])
+
+
+def read_records(paths: Iterable[str], since: Optional[float] = None) -> Iterator[Dict]:
+    """Every record of the segments, one line in memory at a time; since
+    (epoch seconds) skips segments last written before it"""
+    for path in paths:
+        try:
+            if since is not None and os.path.getmtime(path) < since:
+                continue
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn line of a crashed writer
+                    if isinstance(record, dict):
+                        yield record
+        except (OSError, EOFError):
+            continue
+
+
+def parse_ts(value: str) -> Optional[float]:
+    """Epoch seconds of a record's ts"""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+def seconds_between(start: Optional[float], end: Optional[float]) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return round(max(0.0, end - start), 3)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Aggregate statistics of the generation journal
+
+    python3 -m comfy_runner.journal_stats [DIR_OR_SEGMENT ...] [--since 7d]
+        [--group-by workflow,resolution,steps] [--where source=rest-api]
+        [--timing total] [--json]
+
+Streams the segments (see journal.py) one record at a time. Latency
+percentiles come from log-spaced buckets within 1% of the exact value, so
+memory grows with the number of groups, not of records. Per group: records,
+outcomes, failure rate (failed and timed out, of those not cancelled),
+p50/p95/p99/mean/max of a timing over completed generations, and
+throughput in completed generations and images per hour between the
+group's first and last record.
+
+Group and --where keys are record fields, plus resolution (WIDTHxHEIGHT),
+day (YYYY-MM-DD, UTC) and hour.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .journal import parse_ts, read_records, segments
+
+DEFAULT_DIR = '/workspace/logs/journal/'
+DEFAULT_GROUP_BY = 'workflow,resolution,steps'
+QUANTILES = (0.5, 0.95, 0.99)
+
+DURATION_RE = re.compile(r'^(\d+(?:\.\d+)?)([smhdw])$')
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+class Quantiles:
+    """Streaming quantiles within a relative error (log-spaced buckets)"""
+
+    def __init__(self, relative_error: float = 0.01):
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        if value <= 1e-6:
+            self.zeros += 1
+        else:
+            self.buckets[math.ceil(math.log(value) / self.log_gamma)] += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return min(2 * self.gamma ** index / (self.gamma + 1), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+
+class GroupStats:
+    """Running totals of one group"""
+
+    def __init__(self):
+        self.records = 0
+        self.outcomes: Dict[str, int] = defaultdict(int)
+        self.latency = Quantiles()
+        self.images = 0
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+
+    def add(self, record: Dict, timing: str):
+        self.records += 1
+        status = record.get('status', 'unknown')
+        self.outcomes[status] += 1
+        ts = parse_ts(record.get('ts'))
+        if ts is not None:
+            self.first = ts if self.first is None else min(self.first, ts)
+            self.last = ts if self.last is None else max(self.last, ts)
+        if status != 'completed':
+            return
+        self.images += len(record.get('outputs') or ()) or int(record.get('batch_size') or 1)
+        value = (record.get('timings') or {}).get(timing)
+        if isinstance(value, (int, float)):
+            self.latency.add(float(value))
+
+    def summary(self) -> Dict:
+        attempted = self.records - self.outcomes.get('cancelled', 0)
+        failed = self.outcomes.get('failed', 0) + self.outcomes.get('timeout', 0)
+        hours = (self.last - self.first) / 3600 if self.first is not None and self.last > self.first else None
+        completed = self.outcomes.get('completed', 0)
+        return {
+            'records': self.records,
+            'outcomes': dict(self.outcomes),
+            'failure_rate': round(failed / attempted, 4) if attempted else None,
+            'latency': {
+                'count': self.latency.count,
+                **{f'p{round(q * 100)}': _round(self.latency.quantile(q)) for q in QUANTILES},
+                'mean': _round(self.latency.mean),
+                'max': _round(self.latency.max if self.latency.count else None),
+            },
+            'throughput': {
+                'completed_per_hour': round(completed / hours, 2) if hours else None,
+                'images_per_hour': round(self.images / hours, 2) if hours else None,
+            },
+            'first': _iso(self.first),
+            'last': _iso(self.last),
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+def _iso(epoch: Optional[float]) -> Optional[str]:
+    return None if epoch is None else time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(epoch))
+
+
+def field_value(record: Dict, key: str) -> str:
+    """A record field as a group label, derived fields included"""
+    if key == 'resolution':
+        if record.get('width') and record.get('height'):
+            return f"{record['width']}x{record['height']}"
+        return '-'
+    if key in ('day', 'hour'):
+        ts = record.get('ts') or ''
+        return ts[:10] if key == 'day' else ts[:13].replace('T', ' ') + 'h'
+    value = record.get(key)
+    if isinstance(value, list):
+        return ','.join(map(str, value))
+    return '-' if value is None else str(value)
+
+
+def parse_time(value: str) -> float:
+    """Epoch seconds of '7d'/'12h'/'30m' ago or of an ISO date/time"""
+    match = DURATION_RE.match(value.strip())
+    if match:
+        return time.time() - float(match.group(1)) * DURATION_UNITS[match.group(2)]
+    epoch = parse_ts(value if 'T' in value or ' ' in value else f'{value}T00:00:00Z')
+    if epoch is None:
+        raise argparse.ArgumentTypeError(f'not a duration (7d, 12h) or ISO time: {value}')
+    return epoch
+
+
+def parse_where(value: str) -> Tuple[str, str]:
+    key, sep, expected = value.partition('=')
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f'expected KEY=VALUE: {value}')
+    return key, expected
+
+
+def aggregate(records: Iterable[Dict], group_by: List[str], timing: str = 'total',
+              since: Optional[float] = None, until: Optional[float] = None,
+              where: Iterable[Tuple[str, str]] = ()) -> Tuple[Dict[Tuple, GroupStats], GroupStats]:
+    """Per-group and overall stats of the matching records"""
+    groups: Dict[Tuple, GroupStats] = defaultdict(GroupStats)
+    overall = GroupStats()
+    where = list(where)
+    for record in records:
+        if since is not None or until is not None:
+            ts = parse_ts(record.get('ts'))
+            if ts is None or (since is not None and ts < since) or (until is not None and ts >= until):
+                continue
+        if any(field_value(record, key) != expected for key, expected in where):
+            continue
+        groups[tuple(field_value(record, key) for key in group_by)].add(record, timing)
+        overall.add(record, timing)
+    return groups, overall
+
+
+def _fmt(value, suffix: str = '') -> str:
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f'{value:.2f}{suffix}'
+    return f'{value}{suffix}'
+
+
+def format_table(groups: Dict[Tuple, GroupStats], overall: GroupStats, group_by: List[str], timing: str) -> List[str]:
+    headers = group_by + ['n', 'ok', 'fail%', f'p50 {timing}', 'p95', 'p99', 'mean', 'max', 'gen/h', 'img/h']
+    rows = []
+    labelled = sorted(groups.items()) if group_by else []
+    for key, stats in labelled + [(('all',) + ('',) * (len(group_by) - 1) if group_by else (), overall)]:
+        summary = stats.summary()
+        latency = summary['latency']
+        failure = summary['failure_rate']
+        rows.append(list(key) + [
+            str(summary['records']),
+            str(summary['outcomes'].get('completed', 0)),
+            _fmt(None if failure is None else failure * 100),
+            _fmt(latency['p50'], 's'), _fmt(latency['p95'], 's'), _fmt(latency['p99'], 's'),
+            _fmt(latency['mean'], 's'), _fmt(latency['max'], 's'),
+            _fmt(summary['throughput']['completed_per_hour']),
+            _fmt(summary['throughput']['images_per_hour']),
+        ])
+    widths = [max(len(row[i]) for row in rows + [headers]) for i in range(len(headers))]
+    numeric = len(group_by)
+
+    def line(cells: List[str]) -> str:
+        return '  '.join(cell.ljust(w) if i < numeric else cell.rjust(w) for i, (cell, w) in enumerate(zip(cells, widths)))
+
+    rule = line(['-' * w for w in widths])
+    body = [line(row) for row in rows[:-1]] + ([rule] if labelled else [])
+    return [line(headers), rule] + body + [line(rows[-1])]
+
+
+def journal_paths(locations: List[str]) -> List[str]:
+    paths = []
+    for location in locations:
+        paths.extend(segments(location) if os.path.isdir(location) else [location])
+    return paths
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python3 -m comfy_runner.journal_stats',
+        description='Latency percentiles, throughput and failure rates from the generation journal.'
+    )
+    parser.add_argument('locations', nargs='*', metavar='DIR_OR_SEGMENT',
+                        help='journal directories or segment files (default: GENERATION_JOURNAL_DIR, '
+                             f'else {DEFAULT_DIR})')
+    parser.add_argument('--since', type=parse_time, help='only records from then on: 7d, 12h, 30m or an ISO time')
+    parser.add_argument('--until', type=parse_time, help='only records before then')
+    parser.add_argument('--group-by', default=DEFAULT_GROUP_BY,
+                        help=f'comma-separated keys, empty for one group (default: {DEFAULT_GROUP_BY})')
+    parser.add_argument('--where', type=parse_where, action='append', default=[], metavar='KEY=VALUE',
+                        help='only matching records (repeatable), e.g. source=rest-api')
+    parser.add_argument('--timing', default='total',
+                        help='timing to report: total, queue, execution (API), submit, comfyui, outputs (runners)')
+    parser.add_argument('--json', action='store_true', help='print JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    locations = args.locations or [os.environ.get('GENERATION_JOURNAL_DIR') or DEFAULT_DIR]
+    paths = journal_paths(locations)
+    if not paths:
+        print(f"No journal segments in {', '.join(locations)}", file=sys.stderr)
+        return 1
+
+    group_by = [key.strip() for key in args.group_by.split(',') if key.strip()]
+    groups, overall = aggregate(
+        read_records(paths, since=args.since), group_by, args.timing,
+        since=args.since, until=args.until, where=args.where
+    )
+    if not overall.records:
+        print('No matching records', file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps({
+            'group_by': group_by,
+            'timing': args.timing,
+            'groups': [{**dict(zip(group_by, key)), **stats.summary()} for key, stats in sorted(groups.items())],
+            'overall': overall.summary(),
+        }, indent=2))
+    else:
+        for line in format_table(groups, overall, group_by, args.timing):
+            print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
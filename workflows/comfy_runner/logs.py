@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Console output, generation logs and recovery files
+
+The formats are the ones comfy-run.sh and comfy-run-remote.sh have always
+written, so existing log readers and tests keep working: one generation log
+per image request (REMOTE GENERATION LOG in remote mode) and, in remote mode,
+a recovery file for prompts still running on the pod at timeout.
+GENERATION_TEXT_LOGS=false turns the generation logs off; the structured
+record of each generation goes to the journal (journal.py) either way.
+"""
+
+import glob
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+RULE = '─' * 77
+BLOCK = '█' * 80
+BAR = '━' * 53
+
+
+def log_info(message: str = ''):
+    print(f'[INFO] {message}', flush=True)
+
+
+def log_success(message: str):
+    print(f'[✓] {message}', flush=True)
+
+
+def log_warn(message: str):
+    print(f'[⚠] {message}', flush=True)
+
+
+def log_error(message: str = ''):
+    print(f'[✗] {message}', file=sys.stderr, flush=True)
+
+
+def log_debug(message: str):
+    if os.environ.get('DEBUG', '0') == '1':
+        print(f'[DEBUG] {message}', file=sys.stderr, flush=True)
+
+
+def now(fmt: str = '%Y-%m-%d %H:%M:%S') -> str:
+    return datetime.now().strftime(fmt)
+
+
+def _fields(rows: List[Tuple[str, object]]) -> str:
+    return '\n'.join(f'  {label + ":":<18}{value}' for label, value in rows)
+
+
+class GenerationLog:
+    """Audit log of one generation: parameters, execution steps, outcome
+    (path None: text logs are off and nothing is written)"""
+
+    def __init__(self, path: Optional[str], remote: bool, metadata: List[Tuple[str, object]],
+                 connection: List[Tuple[str, object]], parameters: List[Tuple[str, object]],
+                 output_location: str):
+        self.path = path
+        self.remote = remote
+        self.output_location = output_location
+        self.start_time = now()
+        if path is None:
+            return
+        title = 'REMOTE GENERATION LOG' if remote else 'GENERATION LOG'
+        sections = [
+            ('GENERATION METADATA', [('Timestamp', self.start_time)] + metadata + [('Log File', path)]
+             + ([('Execution Mode', 'REMOTE (via RunPod proxy)')] if remote else [])),
+        ]
+        if connection:
+            sections.append(('POD CONNECTION', connection))
+        sections.append(('INPUT PARAMETERS', parameters))
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f'{BLOCK}\n {title} - {self.start_time}\n{BLOCK}\n\n')
+            for heading, rows in sections:
+                f.write(f'{heading}:\n{_fields(rows)}\n\n')
+            f.write(f'EXECUTION LOG:\n{RULE}\n')
+
+    def write(self, message: str):
+        if self.path is None:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(f'[{now("%H:%M:%S")}] {message}\n')
+
+    def finalize(self, status: str, prompt_id: Optional[str], details: str = ''):
+        if self.path is None:
+            return
+        location = 'Local Output' if self.remote else 'Output Location'
+        heading = 'DOWNLOADED OUTPUTS' if self.remote else 'GENERATED OUTPUTS'
+        rows = [
+            ('Status', status),
+            ('Prompt ID', prompt_id or ''),
+            ('Start Time', self.start_time),
+            ('End Time', now()),
+            (location, self.output_location),
+        ]
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(
+                f'{RULE}\n\nCOMPLETION STATUS:\n{_fields(rows)}\n\n'
+                f'{heading}:\n{details or "  (No output captured)"}\n\n{BLOCK}\n'
+            )
+
+
+def write_recovery_file(recovery_dir: str, timestamp: str, fields: Dict[str, object]) -> str:
+    """Save what is needed to check on a timed-out prompt later; returns the path"""
+    os.makedirs(recovery_dir, exist_ok=True)
+    path = os.path.join(recovery_dir, f'prompt_{timestamp}.recovery')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('# Workflow Recovery File\n')
+        f.write(f'# Generated: {now()}\n')
+        f.write("# Use this file to check the status of a timed-out workflow\n\n")
+        for name, value in fields.items():
+            f.write(f'{name}={value}\n')
+        f.write(
+            '\n# To check the status of this workflow, run:\n'
+            '# curl -s "${POD_URL}/history/${PROMPT_ID}" | jq .\n\n'
+            "# To download images if they're ready, run:\n"
+            '# curl -s "${POD_URL}/history/${PROMPT_ID}" | jq ".[\\"${PROMPT_ID}\\"].outputs"\n'
+        )
+    return path
+
+
+def show_recovery_instructions(prompt_id: str, pod_url: str, recovery_file: str):
+    for line in (
+        BAR,
+        'WORKFLOW TIMEOUT - RECOVERY INFORMATION',
+        BAR,
+        '',
+        'The workflow timed out but may still be processing on the pod.',
+        '',
+        f'Prompt ID: {prompt_id}',
+        f'Pod URL: {pod_url}',
+        '',
+        'To check status, run:',
+        f"  curl -s '{pod_url}/history/{prompt_id}' | jq .",
+        '',
+        f'Recovery file: {recovery_file}',
+        '',
+        'To continue checking, you can:',
+        f"  • Wait for pod to finish: curl -s '{pod_url}/history/{prompt_id}' | jq .\"{prompt_id}\".outputs",
+        '  • Check a different timeout: ./comfy-run-remote.sh --prompt "..." --timeout 7200',
+        '',
+        BAR,
+    ):
+        log_error(line)
+
+
+def describe_execution_error(entry: Dict) -> List[str]:
+    """Readable lines for a failed /history entry (status, messages, node errors)"""
+    status = entry.get('status') or {}
+    lines = []
+    if status.get('status_str'):
+        lines.append(f"Status: {status['status_str']}")
+
+    messages = status.get('messages') or []
+    if messages:
+        # Progress events (execution_start, execution_cached, ...) are skipped
+        lines.append('Status Messages:')
+        for message in messages:
+            # [event_type, {...}]: show the error details of execution_error
+            if isinstance(message, list) and len(message) == 2 and isinstance(message[1], dict):
+                event_type, data = message
+                if event_type == 'execution_error':
+                    lines.append(
+                        f"  • {data.get('node_type', '?')} (node {data.get('node_id', '?')}): "
+                        f"{data.get('exception_type', 'Error')}: {data.get('exception_message', '').strip()}"
+                    )
+                elif event_type == 'execution_interrupted':
+                    lines.append(f"  • Interrupted at node {data.get('node_id', '?')}")
+            else:
+                lines.append(f'  • {message}')
+
+    nodes = status.get('nodes') or {}
+    if nodes:
+        lines.append('Node Errors:')
+        lines.extend(f'  • {node}: {error or "Unknown error"}' for node, error in nodes.items() if error is not None)
+
+    if not messages and not nodes:
+        lines.append('Full Status:')
+        lines.extend(f'  {line}' for line in json.dumps(status or 'Unknown error', indent=2).splitlines())
+    return lines
+
+
+def normalize_output_filenames(output_folder: str, prefix: str) -> List[Tuple[str, str]]:
+    """Rename PREFIX_00005_*.png to PREFIX_05_*.png; returns (old, new) names"""
+    renamed = []
+    for filepath in glob.glob(os.path.join(glob.escape(output_folder), f'{glob.escape(prefix)}_*.png')):
+        basename = os.path.basename(filepath)
+        match = re.match(r'^(.+?)_(\d{5})_(.*)$', basename)
+        if not match:
+            continue
+        new_basename = f'{match.group(1)}_{str(int(match.group(2))).zfill(2)}_{match.group(3)}'
+        new_path = os.path.join(output_folder, new_basename)
+        if os.path.exists(new_path):
+            continue
+        try:
+            os.rename(filepath, new_path)
+            renamed.append((basename, new_basename))
+        except OSError as e:
+            log_error(f'  ERROR renaming {basename}: {e}')
+    return renamed
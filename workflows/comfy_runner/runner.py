@@ -0,0 +1,746 @@
+#!/usr/bin/env python3
+"""
+The generation pipeline: variants → submit → wait → outputs
+
+Runner executes one or many variants of a workflow in one process. The
+workflow is parsed and converted once, every request shares one keep-alive
+connection, up to `concurrency` prompts are queued in ComfyUI at a time, and
+completion is pushed over a websocket (or the REST API event stream), with
+/history polling as the fallback.
+
+Local mode renames outputs in place (ComfyUI writes them to a folder on the
+same machine); remote mode downloads them from /view and leaves a recovery
+file for prompts still running on the pod at timeout.
+"""
+
+import http.client
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from . import tracing
+from .journal import GenerationJournal, make_record, seconds_between, workflow_models
+from .client import (
+    ComfyClient, ComfyError, CompletionWatcher, EventStreamWatcher,
+    create_watcher,
+)
+from .logs import (
+    GenerationLog, describe_execution_error, log_error, log_info, log_success,
+    log_warn, normalize_output_filenames, now, show_recovery_instructions,
+    write_recovery_file,
+)
+from .schema import SchemaStore
+from .transfer import DEFAULT_WORKERS, Downloader, RsyncSource
+from .workflow import WorkflowError, WorkflowTemplate
+
+MODES = ('local', 'remote')
+
+# Image ID meaning "none given": not appended to the prompt
+UNDEFINED_ID = 'UNDEFINED_ID_'
+
+# --grid names -> template variables
+GRID_NAMES = {
+    'steps': 'STEPS', 'width': 'WIDTH', 'height': 'HEIGHT',
+    'batch-size': 'BATCH_SIZE', 'batch_size': 'BATCH_SIZE',
+}
+
+# Seconds between /history checks without a watcher
+POLL_INTERVAL = 1.0
+
+# Seconds between /history checks of every prompt even with a watcher
+# (covers events lost while the socket reconnected)
+SAFETY_POLL_INTERVAL = 30.0
+
+# Seconds between "Still processing..." notes
+PROGRESS_NOTE_INTERVAL = 20.0
+
+# Remote mode: attempts (1s, 2s, 4s, ... apart) to reach the pod / submit
+REMOTE_ATTEMPTS = 5
+
+NETWORK_ERRORS = (OSError, http.client.HTTPException)
+
+
+@dataclass
+class RunConfig:
+    """Everything a run needs; the CLI fills it from arguments and environment"""
+    workflow: str
+    mode: str = 'local'
+    url: str = 'http://localhost:8188'
+    prompt: str = ''
+    prompts_file: Optional[str] = None
+    image_id: str = UNDEFINED_ID
+    output_folder: str = '/workspace/output/'
+    seed: Optional[int] = None
+    seed_range: Optional[Tuple[int, int]] = None
+    grid: Dict[str, List[str]] = field(default_factory=dict)    # variable -> values
+    steps: int = 15
+    width: int = 512
+    height: int = 512
+    batch_size: int = 1
+    concurrency: int = 2
+    timeout: float = 3600
+    log_dir: str = '/workspace/logs/generations/'
+    text_logs: bool = True                  # False: no per-generation .log files
+    journal_dir: Optional[str] = None       # generation journal (None: off)
+    recovery_dir: str = './logs/recovery/'
+    local_output: str = './output/'
+    download: bool = True
+    download_workers: int = DEFAULT_WORKERS
+    rsync: bool = True                      # use RUNPOD_PUBLIC_IP:RUNPOD_TCP_PORT_22 when set
+    stream_url: Optional[str] = None
+    poll: bool = False
+    client_id: Optional[str] = None
+    schema_cache: Optional[str] = None      # node definition cache (default: ~/.cache/comfy_runner/schema)
+    refresh_schema: bool = False
+
+    @property
+    def remote(self) -> bool:
+        return self.mode == 'remote'
+
+    @property
+    def sweep(self) -> bool:
+        return bool(self.prompts_file or self.seed_range or self.grid)
+
+
+@dataclass
+class Variant:
+    """One generation of a run and its outcome"""
+    index: int
+    values: Dict[str, str]
+    log: Optional[GenerationLog] = None
+    prompt_id: Optional[str] = None
+    submitted_at: float = 0.0
+    status: Optional[str] = None        # Success, Failed, Timeout
+    outputs: Optional[Dict] = None
+    files: List[str] = field(default_factory=list)
+    models: List[str] = field(default_factory=list)
+    started_at: float = 0.0             # monotonic: rendering began
+    completed_at: float = 0.0           # monotonic: history entry arrived
+    span: Optional[tracing.Span] = None         # the generation
+    wait_span: Optional[tracing.Span] = None    # submit -> history entry
+
+
+def read_prompts(config: RunConfig) -> List[str]:
+    if not config.prompts_file:
+        return [config.prompt]
+    with open(config.prompts_file, encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def random_seed() -> int:
+    """Random integer plus epoch time, as the shell runners generated seeds"""
+    return random.randrange(32768 * 32768) + int(time.time())
+
+
+def build_variants(config: RunConfig) -> List[Variant]:
+    """Every combination of prompts x seeds x grid values, numbered from 1"""
+    if config.seed_range:
+        seeds = list(range(config.seed_range[0], config.seed_range[1] + 1))
+    else:
+        seeds = [config.seed]
+    names = list(config.grid)
+
+    variants = []
+    combos = itertools.product(read_prompts(config), seeds, itertools.product(*config.grid.values()))
+    for index, (prompt, seed, combo) in enumerate(combos, start=1):
+        values = {
+            'STEPS': str(config.steps), 'WIDTH': str(config.width),
+            'HEIGHT': str(config.height), 'BATCH_SIZE': str(config.batch_size),
+        }
+        values.update(zip(names, combo))
+        values['SEED'] = str(seed if seed is not None else random_seed())
+        values['BASE_PROMPT'] = prompt
+        variants.append(Variant(index, values))
+    return variants
+
+
+class Runner:
+    """Runs the variants of a RunConfig against one ComfyUI server"""
+
+    def __init__(self, config: RunConfig, client: ComfyClient = None):
+        self.config = config
+        self.client = client or ComfyClient(config.url)
+        self.start_time = now()
+        self.timestamp = now('%Y%m%d_%H%M%S')
+        self.client_id = config.client_id or (
+            f"claude-code{'-remote' if config.remote else ''}-{self.timestamp}-{time.time_ns() % 10**9:09d}"
+        )
+        self.variants: List[Variant] = []
+        self.watcher: CompletionWatcher = CompletionWatcher()
+        self.downloader: Optional[Downloader] = None
+        self._last_step: Dict[str, int] = {}
+        self._started = time.monotonic()
+        self.span: Optional[tracing.Span] = None
+        self.journal: Optional[GenerationJournal] = None
+        if config.journal_dir:
+            try:
+                self.journal = GenerationJournal.from_env(config.journal_dir)
+            except OSError as e:
+                log_warn(f'Generation journal disabled ({config.journal_dir}: {e})')
+
+    # ------------------------------------------------------------------
+    # Run
+    # ------------------------------------------------------------------
+
+    def run(self) -> int:
+        """Exit code: 0 all succeeded, 1 any failed, 2 any timed out"""
+        config = self.config
+        try:
+            self.variants = build_variants(config)
+        except OSError as e:
+            log_error(f'Cannot read prompts: {e}')
+            return 1
+        if not self.variants:
+            log_error(f'No prompts in {config.prompts_file}')
+            return 1
+
+        if config.sweep:
+            self._print_sweep_info()
+        else:
+            # A single run logs from the start, connection checks included
+            self._assign_identity(self.variants[0])
+            self._open_log(self.variants[0])
+            self._print_startup_info(self.variants[0])
+
+        # TRACEPARENT (from a calling process) joins its trace
+        self.span = tracing.tracer.start_span(
+            'comfy_run', parent=os.environ.get(tracing.TRACEPARENT_ENV),
+            mode=config.mode, workflow=os.path.basename(config.workflow), variants=len(self.variants)
+        )
+        exit_code = 1
+        try:
+            exit_code = self._run()
+            return exit_code
+        except NETWORK_ERRORS as e:
+            log_error(f'Run aborted, ComfyUI unreachable: {e}')
+            for variant in self.variants:
+                if variant.status is None and variant.log is not None:
+                    self._finish(variant, 'Failed', f'  {e}', f'ERROR: ComfyUI unreachable: {e}')
+            return 1
+        finally:
+            self.watcher.close()
+            if self.downloader is not None:
+                self.downloader.close()
+            self.client.close()
+            self.span.set(exit_code=exit_code)
+            self.span.end()
+
+    def _run(self) -> int:
+        config = self.config
+        if not self._check_server():
+            self._fail_single('  Pod unreachable' if config.remote else '')
+            return 1
+
+        schema = SchemaStore(self.client, config.schema_cache, config.refresh_schema)
+        try:
+            with tracing.tracer.span('load_workflow', parent=self.span, workflow=os.path.basename(config.workflow)):
+                template = WorkflowTemplate(config.workflow, schema.definitions)
+        except (OSError, WorkflowError) as e:
+            log_error(f'Workflow validation failed: {e}')
+            self._fail_single('  Workflow validation error')
+            return 1
+        if template.converted:
+            log_success(f'Workflow converted to API format (node definitions: {schema.describe()})')
+
+        self._start_watcher()
+        self._execute(template)
+        return self._summarize()
+
+    def _check_server(self) -> bool:
+        config = self.config
+        log_info('Checking pod connectivity...' if config.remote else 'Checking ComfyUI server accessibility...')
+        attempts = REMOTE_ATTEMPTS if config.remote else 1
+        for attempt in range(1, attempts + 1):
+            status = self.client.ping()
+            if status == 200:
+                log_success('Pod is accessible (HTTP 200)' if config.remote else 'ComfyUI server is accessible')
+                self._log_single('ComfyUI server is accessible (HTTP 200)')
+                return True
+            reason = f'HTTP {status}' if status else 'network error'
+            if attempt < attempts:
+                delay = 2 ** (attempt - 1)
+                log_warn(f'Attempt {attempt} failed ({reason}), retrying in {delay}s...')
+                time.sleep(delay)
+        log_error(f'{"Cannot reach pod" if config.remote else "ComfyUI server not accessible"} at {config.url} ({reason})')
+        self._log_single(f'ERROR: ComfyUI server not accessible ({reason})')
+        return False
+
+    def _start_watcher(self):
+        config = self.config
+        on_progress = None if config.sweep else self._on_progress
+        self.watcher = create_watcher(
+            config.url, self.client_id, stream_url=config.stream_url,
+            timeout=config.timeout, poll=config.poll, on_progress=on_progress
+        )
+        if isinstance(self.watcher, EventStreamWatcher):
+            # ComfyUI routes the events of this client_id to the REST API
+            self.client_id = self.watcher.client_id
+            log_success(f'Event stream attached ({config.stream_url})')
+        elif self.watcher.alive:
+            log_success('Completion events: ComfyUI websocket')
+        elif config.stream_url and not config.poll:
+            log_info(f'Event stream unavailable at {config.stream_url}, using polling')
+        elif not config.poll:
+            log_info('Websocket unavailable (pip install websocket-client), polling /history')
+        self._log_single(f'Completion via {self.watcher.name}, client_id: {self.client_id}')
+
+    def _execute(self, template: WorkflowTemplate):
+        config = self.config
+        waiting = list(self.variants)
+        in_flight: Dict[str, Variant] = {}
+        concurrency = config.concurrency if config.sweep else 1
+        started = last_full_check = last_note = time.monotonic()
+        watcher_alive = self.watcher.alive
+
+        while waiting or in_flight:
+            while waiting and len(in_flight) < concurrency:
+                variant = waiting.pop(0)
+                if self._submit(template, variant):
+                    in_flight[variant.prompt_id] = variant
+                    self.watcher.watch(variant.prompt_id)
+            if not in_flight:
+                continue
+
+            if self.watcher.alive:
+                due = self.watcher.wait(POLL_INTERVAL) & in_flight.keys()
+            else:
+                if watcher_alive:
+                    log_info('Event channel closed, falling back to polling')
+                    watcher_alive = False
+                time.sleep(POLL_INTERVAL)
+                due = set(in_flight)
+            if time.monotonic() - last_full_check >= SAFETY_POLL_INTERVAL:
+                due = set(in_flight)
+                last_full_check = time.monotonic()
+
+            for prompt_id in due:
+                variant = in_flight[prompt_id]
+                entry = self.client.history(prompt_id)
+                if entry is not None:
+                    del in_flight[prompt_id]
+                    self._complete(variant, entry)
+
+            for prompt_id, variant in list(in_flight.items()):
+                if time.monotonic() - variant.submitted_at > config.timeout:
+                    del in_flight[prompt_id]
+                    self._time_out(variant)
+
+            if not config.sweep and in_flight and time.monotonic() - last_note >= PROGRESS_NOTE_INTERVAL:
+                last_note = time.monotonic()
+                elapsed = int(last_note - started)
+                log_info(f'Still processing... ({elapsed}s elapsed)')
+                self._log_single(f'Progress: {elapsed}s elapsed')
+
+    # ------------------------------------------------------------------
+    # Variant lifecycle
+    # ------------------------------------------------------------------
+
+    def _assign_identity(self, variant: Variant):
+        """IMAGE_ID, PROMPT and FILENAME_PREFIX, as the shell runners set them"""
+        config = self.config
+        image_id = config.image_id
+        if config.sweep:
+            separator = '' if image_id == UNDEFINED_ID else '_'
+            image_id = f'{image_id}{separator}{variant.index:04d}'
+        prompt = variant.values['BASE_PROMPT']
+        if config.image_id and config.image_id != UNDEFINED_ID:
+            prompt = f'{prompt} (id: {image_id})'
+        variant.values.update(
+            IMAGE_ID=image_id,
+            PROMPT=prompt,
+            OUTPUT_FOLDER=config.output_folder,
+            FILENAME_PREFIX=f"{image_id}_{now('%H%M%S')}",
+            COMFYUI_URL=config.url,
+        )
+
+    def _open_log(self, variant: Variant):
+        config = self.config
+        values = variant.values
+        suffix = f'_{variant.index:04d}' if config.sweep else ''
+        parameters = [
+            ('Prompt', values['PROMPT']),
+            ('Image ID', values['IMAGE_ID']),
+            ('Seed', values['SEED']),
+            ('Steps', values['STEPS']),
+            ('Width', values['WIDTH']),
+            ('Height', values['HEIGHT']),
+            ('Batch Size', values['BATCH_SIZE']),
+            ('Workflow', config.workflow),
+            ('Output Folder', config.output_folder),
+        ]
+        connection = []
+        if config.remote:
+            connection = [('Pod URL', config.url), ('Timeout', f'{config.timeout:g}s')]
+            parameters += [
+                ('Local Output', config.local_output),
+                ('Download Images', 'true' if config.download else 'false'),
+            ]
+        parameters.append(('Filename Prefix', values['FILENAME_PREFIX']))
+
+        variant.log = GenerationLog(
+            os.path.join(config.log_dir, f'generation_{self.timestamp}{suffix}.log') if config.text_logs else None,
+            remote=config.remote,
+            metadata=[('Client ID', self.client_id)],
+            connection=connection,
+            parameters=parameters,
+            output_location=config.local_output if config.remote else config.output_folder,
+        )
+        started = 'Remote generation started with parameters' if config.remote else 'Generation started with parameters'
+        variant.log.write(started + (' (sweep)' if config.sweep else ''))
+
+    def _submit(self, template: WorkflowTemplate, variant: Variant) -> bool:
+        config = self.config
+        if variant.log is None:
+            self._assign_identity(variant)
+            self._open_log(variant)
+        variant.span = tracing.tracer.start_span(
+            'generation', parent=self.span, variant=variant.index,
+            seed=variant.values.get('SEED'), image_id=variant.values.get('IMAGE_ID')
+        )
+        variant.started_at = time.monotonic()
+        try:
+            with tracing.tracer.span('process_workflow_template', parent=variant.span):
+                workflow = template.render(variant.values)
+        except (WorkflowError, ValueError, KeyError) as e:
+            self._finish(variant, 'Failed', '  Template processing error', f'ERROR: Template error: {e}')
+            return False
+        variant.models = workflow_models(workflow)
+
+        if variant.index == 1:
+            payload_file = os.path.join(tempfile.gettempdir(), f'comfyui-payload-{self.timestamp}.json')
+            with open(payload_file, 'w', encoding='utf-8') as f:
+                json.dump({'prompt': workflow, 'client_id': self.client_id}, f)
+            if not config.sweep:
+                log_info(f'Debug payload saved to: {payload_file}')
+
+        if not config.sweep:
+            log_info('Submitting workflow to remote pod...' if config.remote else 'Submitting workflow to ComfyUI...')
+        attempts = REMOTE_ATTEMPTS if config.remote else 1
+        # The trace context travels with the prompt into ComfyUI's history
+        extra_data = {'traceparent': variant.span.traceparent} if variant.span.recording else None
+        with tracing.tracer.span('submit_workflow', parent=variant.span) as span:
+            for attempt in range(1, attempts + 1):
+                try:
+                    variant.prompt_id = self.client.submit(workflow, self.client_id, extra_data)
+                    break
+                except ComfyError as e:
+                    span.end(error=str(e))
+                    self._finish(variant, 'Failed', '  Workflow submission error',
+                                 f'ERROR: Workflow submission failed: {e}')
+                    return False
+                except NETWORK_ERRORS as e:
+                    if attempt == attempts:
+                        variant.span.end(error=f'ComfyUI unreachable: {e}')
+                        raise
+                    delay = 2 ** (attempt - 1)
+                    log_warn(f'Submission attempt {attempt} failed ({e}), retrying in {delay}s...')
+                    time.sleep(delay)
+            span.set(prompt_id=variant.prompt_id, attempts=attempt)
+
+        variant.span.set(prompt_id=variant.prompt_id)
+        variant.wait_span = tracing.tracer.start_span(
+            'poll_for_completion', parent=variant.span, via=self.watcher.name
+        )
+        variant.submitted_at = time.monotonic()
+        variant.log.write(f'Successfully submitted workflow with prompt_id: {variant.prompt_id}')
+        if not config.sweep:
+            log_success(f'Workflow submitted (prompt_id: {variant.prompt_id})')
+            log_info(f'Waiting for completion via {self.watcher.name} (timeout: {config.timeout:g}s)...')
+        return True
+
+    def _complete(self, variant: Variant, entry: Dict):
+        status = entry.get('status') or {}
+        outputs = entry.get('outputs')
+        variant.completed_at = time.monotonic()
+        variant.wait_span.end()
+        if status.get('status_str') == 'error' or outputs is None:
+            lines = describe_execution_error(entry)
+            if not self.config.sweep:
+                log_error('WORKFLOW EXECUTION ERROR')
+                for line in lines:
+                    log_error(f'  {line}')
+            for line in lines:
+                variant.log.write(line)
+            reason = next((line.strip(' •') for line in lines if line.startswith('  •')), lines[0])
+            self._finish(variant, 'Failed', '\n'.join(f'  {line}' for line in lines),
+                         f'ERROR: Workflow execution failed: {reason}')
+            return
+
+        variant.outputs = outputs
+        variant.log.write('Workflow execution completed successfully')
+        variant.log.write(f'Outputs: {json.dumps(outputs)}')
+        images = sum(len(output.get('images', [])) for output in outputs.values())
+        if self.config.remote:
+            with tracing.tracer.span('download_remote_images', parent=variant.span, images=images) as span:
+                details = self._download_outputs(variant)
+                span.set(files=len(variant.files))
+        else:
+            with tracing.tracer.span('normalize_output_filenames', parent=variant.span, images=images):
+                details = self._normalize_outputs(variant)
+        self._finish(variant, 'Success', details,
+                     f"{variant.prompt_id} completed ({images} image(s), prefix {variant.values['FILENAME_PREFIX']})")
+
+    def _time_out(self, variant: Variant):
+        config = self.config
+        message = f'ERROR: Workflow timeout after {config.timeout:g}s'
+        variant.wait_span.end(error=f'Timeout after {config.timeout:g}s')
+        if config.remote:
+            suffix = f'_{variant.index:04d}' if config.sweep else ''
+            recovery_file = write_recovery_file(config.recovery_dir, self.timestamp + suffix, {
+                'PROMPT_ID': variant.prompt_id,
+                'POD_URL': config.url,
+                'IMAGE_ID': variant.values['IMAGE_ID'],
+                'SEED': variant.values['SEED'],
+                'LOCAL_OUTPUT_FOLDER': config.local_output,
+            })
+            variant.log.write(f'Recovery file saved: {recovery_file}')
+            if not config.sweep:
+                show_recovery_instructions(variant.prompt_id, config.url, recovery_file)
+        self._finish(variant, 'Timeout', '  Workflow timed out', message)
+
+    def _finish(self, variant: Variant, status: str, details: str, message: str):
+        variant.status = status
+        if variant.span is not None:
+            variant.span.set(status=status)
+            variant.span.end(error=None if status == 'Success' else message.replace('ERROR: ', '', 1))
+        variant.log.write(message)
+        variant.log.finalize(status, variant.prompt_id, details)
+        self._journal(variant, status, None if status == 'Success' else message.replace('ERROR: ', '', 1))
+        if self.config.sweep:
+            done = sum(1 for v in self.variants if v.status)
+            line = f'[{done}/{len(self.variants)}] #{variant.index:04d} {message}'
+            (log_success if status == 'Success' else log_error)(line)
+        elif status == 'Success':
+            log_success('Workflow completed successfully')
+        else:
+            log_error(message.replace('ERROR: ', '', 1))
+        if not self.config.sweep and variant.log.path:
+            log_info(f'Generation log: {variant.log.path}')
+
+    def _fail_single(self, details: str):
+        """Finalize the log of a single run that failed before submitting"""
+        if not self.config.sweep:
+            variant = self.variants[0]
+            variant.status = 'Failed'
+            variant.log.finalize('Failed', None, details)
+            self._journal(variant, 'Failed', details.strip() or 'ComfyUI server not accessible')
+            if variant.log.path:
+                log_info(f'Generation log: {variant.log.path}')
+
+    def _journal(self, variant: Variant, status: str, error: Optional[str]):
+        """Append the variant's record to the generation journal"""
+        if self.journal is None:
+            return
+        config = self.config
+        values = variant.values
+        started = variant.started_at or None
+        submitted = variant.submitted_at or None
+        completed = variant.completed_at or None
+        finished = time.monotonic()
+        timings = {
+            'submit': seconds_between(started, submitted),
+            'comfyui': seconds_between(submitted, completed),
+            'outputs': seconds_between(completed, finished) if status == 'Success' else None,
+            'total': seconds_between(started or self._started, finished),
+        }
+
+        def number(name: str) -> Optional[int]:
+            try:
+                return int(values[name])
+            except (KeyError, ValueError):
+                return None
+
+        record = make_record(
+            'comfy-run-remote' if config.remote else 'comfy-run',
+            {'Success': 'completed', 'Timeout': 'timeout'}.get(status, 'failed'),
+            id=values.get('IMAGE_ID'),
+            prompt_id=variant.prompt_id,
+            workflow=os.path.splitext(os.path.basename(config.workflow))[0],
+            prompt=values.get('BASE_PROMPT'),
+            seed=number('SEED'),
+            steps=number('STEPS'),
+            width=number('WIDTH'),
+            height=number('HEIGHT'),
+            batch_size=number('BATCH_SIZE'),
+            timings={name: value for name, value in timings.items() if value is not None},
+            outputs=[os.path.basename(path) for path in variant.files] or None,
+            error=error,
+            backend=config.url,
+            models=variant.models or None,
+            trace_id=variant.span.trace_id if variant.span is not None and variant.span.recording else None,
+        )
+        try:
+            self.journal.append(record)
+        except OSError as e:
+            log_warn(f'Could not write the generation journal: {e}')
+
+    def _log_single(self, message: str):
+        if not self.config.sweep and self.variants and self.variants[0].log:
+            self.variants[0].log.write(message)
+
+    def _on_progress(self, prompt_id: str, value: int, maximum: int):
+        if self._last_step.get(prompt_id) != value:
+            self._last_step[prompt_id] = value
+            log_info(f'Step {value}/{maximum}')
+
+    # ------------------------------------------------------------------
+    # Outputs
+    # ------------------------------------------------------------------
+
+    def _normalize_outputs(self, variant: Variant) -> str:
+        """Local mode: rename outputs in place; log details are the outputs JSON"""
+        renamed = normalize_output_filenames(self.config.output_folder, variant.values['FILENAME_PREFIX'])
+        for old, new in renamed:
+            variant.log.write(f'Renamed {old} → {new}')
+        variant.log.write(f'Normalized {len(renamed)} output filename(s)')
+        names = dict(renamed)
+        variant.files = [
+            os.path.join(self.config.output_folder, names.get(image['filename'], image['filename']))
+            for output in variant.outputs.values() for image in output.get('images', []) if image.get('filename')
+        ]
+        details = json.dumps(variant.outputs, indent=2)
+        if not self.config.sweep:
+            print(f'\n{"═" * 63}\nGenerated Outputs:\n{"═" * 63}\n{details}\n', flush=True)
+        return details
+
+    def _download_outputs(self, variant: Variant) -> str:
+        """Remote mode: fetch every output image from /view into local_output"""
+        config = self.config
+        if not config.download:
+            variant.log.write('Image download skipped (--no-download)')
+            return '  (Download disabled)'
+
+        images = [
+            image for output in variant.outputs.values()
+            for image in output.get('images', []) if image.get('filename')
+        ]
+        if not images:
+            log_warn('No images found in outputs')
+            variant.log.write('WARNING: No images found in outputs')
+            return '  (No images in outputs)'
+
+        if self.downloader is None:
+            rsync = RsyncSource.from_environment() if config.rsync else None
+            self.downloader = Downloader(config.url, config.local_output, config.download_workers, rsync)
+            if rsync:
+                log_info(f'Downloads via rsync from {rsync} ({rsync.output_dir}), HTTP as fallback')
+        if not config.sweep:
+            channel = 'rsync' if self.downloader.rsync else f'{min(len(images), self.downloader.workers)} parallel'
+            log_info(f'Downloading {len(images)} image(s) ({channel})...')
+        for image in images:
+            variant.log.write(f"Downloading image: {image['filename']}")
+
+        failed = 0
+        for transfer in self.downloader.fetch_all(images):
+            for note in transfer.notes:
+                variant.log.write(note)
+            filename = transfer.image['filename']
+            if transfer.path is None:
+                failed += 1
+                log_error(f'Download failed permanently: {filename} ({transfer.error})')
+                variant.log.write(f'ERROR: Failed to download {filename}: {transfer.error}')
+                continue
+            variant.files.append(transfer.path)
+            if os.path.basename(transfer.path) != filename:
+                variant.log.write(f'File conflict resolved: renamed to {os.path.basename(transfer.path)}')
+            if not config.sweep:
+                log_success(f'Downloaded: {filename}')
+            variant.log.write(f'Successfully downloaded: {filename} via {transfer.via} '
+                              f'({transfer.size} bytes, sha256 {transfer.sha256})')
+
+        if variant.files and not config.sweep:
+            log_success(f'Downloaded {len(variant.files)} image(s)')
+        if failed:
+            log_warn(f'Note: {failed} image(s) failed to download')
+            variant.log.write(f'WARNING: {failed} image(s) failed to download')
+        variant.log.write(f'Successfully downloaded {len(variant.files)} image(s)')
+        return '\n'.join(f'  {os.path.basename(path)}' for path in variant.files) or '  (No files)'
+
+    # ------------------------------------------------------------------
+    # Console
+    # ------------------------------------------------------------------
+
+    def _print_header(self, title: str):
+        config = self.config
+        print(flush=True)
+        log_info('═' * 63)
+        log_info(title)
+        log_info('═' * 63)
+        log_info(f'Timestamp:        {self.start_time}')
+        log_info(f"{'Pod URL:' if config.remote else 'ComfyUI Server:':<18}{config.url}")
+        log_info(f'Client ID:        {self.client_id}')
+        if config.remote:
+            log_info(f'Timeout:          {config.timeout:g}s')
+        log_info()
+        log_info('Configuration:')
+        log_info(f'  Workflow:       {os.path.basename(config.workflow)}')
+
+    def _print_startup_info(self, variant: Variant):
+        config = self.config
+        values = variant.values
+        prompt = values['PROMPT']
+        self._print_header('ComfyUI Remote Workflow Execution' if config.remote else 'ComfyUI Workflow Execution')
+        log_info(f"  Prompt:         {prompt[:60]}{'...' if len(prompt) > 60 else ''}")
+        log_info(f"  Image ID:       {values['IMAGE_ID']}")
+        log_info(f"  Seed:           {values['SEED']}")
+        log_info(f"  Steps:          {values['STEPS']}")
+        log_info(f"  Size:           {values['WIDTH']}x{values['HEIGHT']}")
+        log_info(f"  Batch Size:     {values['BATCH_SIZE']}")
+        self._print_outputs()
+        log_info()
+
+    def _print_sweep_info(self):
+        config = self.config
+        self._print_header('ComfyUI Remote Workflow Sweep' if config.remote else 'ComfyUI Workflow Sweep')
+        if config.prompts_file:
+            log_info(f'  Prompts:        {config.prompts_file}')
+        else:
+            log_info(f"  Prompt:         {config.prompt[:60]}{'...' if len(config.prompt) > 60 else ''}")
+        seeds = '{}:{}'.format(*config.seed_range) if config.seed_range else (config.seed or 'auto')
+        grid = ' '.join(f"{name.lower()}={','.join(values)}" for name, values in config.grid.items())
+        log_info(f'  Image ID:       {config.image_id}')
+        log_info(f'  Seeds:          {seeds}')
+        log_info(f"  Grid:           {grid or 'none'}")
+        log_info(f'  Concurrency:    {config.concurrency}')
+        log_info(f'  Variants:       {len(self.variants)}')
+        self._print_outputs()
+        log_info()
+
+    def _print_outputs(self):
+        config = self.config
+        if config.remote:
+            log_info(f'  Local Output:   {config.local_output}')
+            log_info(f"  Download:       {'true' if config.download else 'false'}")
+        else:
+            log_info(f'  Output:         {config.output_folder}')
+        if config.stream_url:
+            log_info(f'  Event Stream:   {config.stream_url}')
+
+    def _summarize(self) -> int:
+        counts = {status: sum(1 for v in self.variants if v.status == status)
+                  for status in ('Success', 'Failed', 'Timeout')}
+        if self.config.sweep:
+            log_info(
+                f"Sweep finished in {time.monotonic() - self._started:.0f}s: {counts['Success']} succeeded, "
+                f"{counts['Failed']} failed, {counts['Timeout']} timed out"
+            )
+            if self.config.text_logs:
+                log_info(f'Generation logs: {os.path.join(self.config.log_dir, f"generation_{self.timestamp}_*.log")}')
+            if self.journal is not None:
+                log_info(f'Generation journal: {self.journal.directory}')
+        elif counts['Success'] and self.config.remote:
+            log_success('Remote generation completed successfully!')
+        if counts['Failed']:
+            return 1
+        return 2 if counts['Timeout'] else 0
+
+
+def run(config: RunConfig) -> int:
+    """Run a configuration to completion; returns the exit code"""
+    return Runner(config).run()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Node definition (/object_info) store for UI→API conversion
+
+The full /object_info of a pod with custom nodes is several megabytes and
+slow to build while the pod is generating. SchemaStore keeps the definitions
+of the node classes workflows actually use in a local cache, keyed by the
+ComfyUI version and the set of custom node packs:
+
+    1. cache      ~/.cache/comfy_runner/schema/<version>-<digest>.json
+    2. server     /object_info/<class_type> for classes missing from the cache
+                  (the full /object_info only on servers without that route)
+    3. snapshot   object_info_snapshot.json bundled with the package
+
+Definitions are refetched only when the key changes (ComfyUI upgraded,
+custom nodes added or removed), a class is missing, or refresh is asked for.
+An unreachable server uses the newest cache, then the snapshot.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .client import ComfyClient
+from .logs import log_debug
+
+# Definitions of the node classes used by the bundled workflows
+SNAPSHOT = Path(__file__).resolve().parent / 'object_info_snapshot.json'
+
+# Cache directory (COMFY_SCHEMA_CACHE overrides)
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'comfy_runner', 'schema'
+)
+
+# Extension directories shipped with ComfyUI itself (not custom node packs)
+CORE_EXTENSIONS = {'core'}
+
+
+def custom_node_packs(extensions: List[str]) -> List[str]:
+    """Pack names of /extensions/<pack>/... script paths"""
+    packs = set()
+    for path in extensions:
+        parts = path.split('/')
+        if len(parts) > 3 and parts[1] == 'extensions' and parts[2] not in CORE_EXTENSIONS:
+            packs.add(parts[2])
+    return sorted(packs)
+
+
+def load_snapshot(path: Path = SNAPSHOT) -> Dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class SchemaStore:
+    """Node definitions from the cache, the server or the bundled snapshot"""
+
+    def __init__(self, client: Optional[ComfyClient], cache_dir: str = None, refresh: bool = False,
+                 snapshot: Path = SNAPSHOT):
+        self.client = client
+        self.cache_dir = cache_dir or os.environ.get('COMFY_SCHEMA_CACHE') or DEFAULT_CACHE_DIR
+        self.refresh = refresh
+        self.snapshot = snapshot
+        self.sources: Dict[str, str] = {}    # class_type -> cache, server or snapshot
+        self._key: Optional[str] = None
+        self._keyed = False
+
+    # ------------------------------------------------------------------
+    # Cache key
+    # ------------------------------------------------------------------
+
+    def key(self) -> Optional[str]:
+        """<comfyui_version>-<digest of the custom node packs> (None: server unreachable)"""
+        if not self._keyed:
+            self._keyed = True
+            stats = self.client.system_stats() if self.client else None
+            if stats is not None:
+                version = str((stats.get('system') or {}).get('comfyui_version') or 'unknown')
+                packs = custom_node_packs(self.client.extensions())
+                digest = hashlib.sha256(json.dumps([version, packs]).encode()).hexdigest()[:16]
+                self._key = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', version)}-{digest}"
+                log_debug(f'Schema key {self._key} ({len(packs)} custom node packs)')
+        return self._key
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def _load(self, path: str) -> Dict:
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f).get('nodes') or {}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _load_newest(self) -> Dict:
+        try:
+            paths = [entry.path for entry in os.scandir(self.cache_dir) if entry.name.endswith('.json')]
+        except OSError:
+            return {}
+        return self._load(max(paths, key=os.path.getmtime)) if paths else {}
+
+    def _save(self, key: str, nodes: Dict):
+        """Write the cache file atomically (a failure only costs a refetch)"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'saved': int(time.time()), 'nodes': nodes}, f)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            log_debug(f'Schema cache not saved: {e}')
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def _fetch(self, class_types: Iterable[str]) -> Dict:
+        fetched = {}
+        for class_type in sorted(class_types):
+            info = self.client.object_info(class_type)
+            if info is None:
+                # No per-class route (old ComfyUI): one full /object_info
+                info = self.client.object_info() or {}
+                return {name: info[name] for name in class_types if name in info}
+            if class_type in info:
+                fetched[class_type] = info[class_type]
+        return fetched
+
+    def definitions(self, class_types: Iterable[str]) -> Dict:
+        """{class_type: definition} for every class found (missing ones are left out)"""
+        wanted = set(class_types)
+        key = self.key()
+        if key is None:
+            cached = self._load_newest()
+        else:
+            cached = {} if self.refresh else self._load(self._path(key))
+
+        found = {}
+        for class_type in wanted & set(cached):
+            found[class_type] = cached[class_type]
+            self.sources[class_type] = 'cache'
+
+        missing = wanted - set(found)
+        if missing and key is not None:
+            fetched = self._fetch(missing)
+            if fetched:
+                found.update(fetched)
+                self.sources.update(dict.fromkeys(fetched, 'server'))
+                cached.update(fetched)
+                self._save(key, cached)
+            missing -= set(fetched)
+
+        if missing:
+            snapshot = load_snapshot(self.snapshot)
+            for class_type in missing & set(snapshot):
+                found[class_type] = snapshot[class_type]
+                self.sources[class_type] = 'snapshot'
+        return found
+
+    def describe(self) -> str:
+        """'3 cached, 1 from server' style summary of where definitions came from"""
+        labels = {'cache': 'cached', 'server': 'from server', 'snapshot': 'from bundled snapshot'}
+        counts = {}
+        for source in self.sources.values():
+            counts[source] = counts.get(source, 0) + 1
+        return ', '.join(f'{counts[source]} {label}' for source, label in labels.items() if source in counts)
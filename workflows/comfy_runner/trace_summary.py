@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Latency waterfall per trace from TRACE_FILE span logs
+
+    cd workflows
+    python3 -m comfy_runner.trace_summary /workspace/logs/traces.jsonl --last 5
+    python3 -m comfy_runner.trace_summary traces.jsonl --find <job_id or prompt_id>
+    python3 -m comfy_runner.trace_summary traces.jsonl --slowest 3
+
+Spans of the REST API and of the runners that share a trace (TRACEPARENT,
+traceparent header) are shown as one tree, indented by parent, with each
+span's offset from the start of the trace, its duration and a timeline bar.
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List
+
+
+def read_spans(paths: List[str]) -> Iterator[Dict]:
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(span, dict) and span.get('trace_id') and span.get('start_ns'):
+                    yield span
+
+
+def _matches(spans: List[Dict], needle: str) -> bool:
+    return any(
+        needle in (span['trace_id'], span['span_id'])
+        or any(str(value) == needle for value in (span.get('attributes') or {}).values())
+        for span in spans
+    )
+
+
+def _label(span: Dict) -> str:
+    attributes = span.get('attributes') or {}
+    keys = ('job_id', 'prompt_id', 'class_type', 'node', 'backend', 'images', 'variant')
+    details = ' '.join(f'{key}={attributes[key]}' for key in keys if key in attributes)
+    return f"{span['name']}" + (f'  {details}' if details else '')
+
+
+def waterfall(spans: List[Dict], width: int = 40) -> List[str]:
+    """Indented span tree of one trace with offset, duration and a timeline bar"""
+    spans = sorted(spans, key=lambda s: s['start_ns'])
+    ids = {span['span_id'] for span in spans}
+    children = defaultdict(list)
+    roots = []
+    for span in spans:
+        if span.get('parent_id') in ids:
+            children[span['parent_id']].append(span)
+        else:
+            roots.append(span)
+
+    start = spans[0]['start_ns']
+    end = max(span['end_ns'] for span in spans)
+    total = max(end - start, 1)
+    services = {span.get('service') for span in spans}
+    lines = [f"{'offset':>10} {'duration':>10}  {'':<{width}}  span"]
+
+    def visit(span: Dict, depth: int):
+        offset = span['start_ns'] - start
+        duration = span['end_ns'] - span['start_ns']
+        left = int(offset / total * width)
+        bar_length = max(1, round(duration / total * width))
+        bar = (' ' * left + '█' * bar_length)[:width]
+        mark = '  ✗ ' + span['error'] if span.get('error') else ''
+        service = f"  [{span.get('service')}]" if len(services) > 1 and depth == 0 else ''
+        lines.append(f'{offset / 1e6:>8.1f}ms {duration / 1e6:>8.1f}ms  {bar:<{width}}  '
+                     f"{'  ' * depth}{_label(span)}{service}{mark}")
+        for child in children[span['span_id']]:
+            visit(child, depth + 1)
+
+    for root in roots:
+        visit(root, 0)
+    return lines
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python3 -m comfy_runner.trace_summary',
+        description='Latency waterfall per trace from TRACE_FILE span logs'
+    )
+    parser.add_argument('files', nargs='+', help='JSONL span files (TRACE_FILE)')
+    parser.add_argument('--find', help='Only traces with this trace ID, job_id, prompt_id or other attribute value')
+    parser.add_argument('--last', type=int, default=10, help='Most recent N traces (default: 10, 0 for all)')
+    parser.add_argument('--slowest', type=int, default=0, help='The N slowest traces instead')
+    parser.add_argument('--width', type=int, default=40, help='Timeline bar width')
+    args = parser.parse_args(argv)
+
+    traces: Dict[str, List[Dict]] = defaultdict(list)
+    try:
+        for span in read_spans(args.files):
+            traces[span['trace_id']].append(span)
+    except OSError as e:
+        print(f'Cannot read spans: {e}', file=sys.stderr)
+        return 1
+
+    selected = [spans for spans in traces.values() if not args.find or _matches(spans, args.find)]
+    duration = lambda spans: max(s['end_ns'] for s in spans) - min(s['start_ns'] for s in spans)
+    if args.slowest:
+        selected = sorted(selected, key=duration, reverse=True)[:args.slowest]
+    else:
+        selected = sorted(selected, key=lambda spans: min(s['start_ns'] for s in spans))
+        if args.last:
+            selected = selected[-args.last:]
+    if not selected:
+        print('No matching traces', file=sys.stderr)
+        return 1
+
+    for spans in selected:
+        first = min(spans, key=lambda s: s['start_ns'])
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(first['start_ns'] / 1e9))
+        errors = sum(1 for span in spans if span.get('error'))
+        print(f"\nTrace {first['trace_id']}  {started}  {duration(spans) / 1e9:.3f}s  "
+              f"{len(spans)} spans{f', {errors} failed' if errors else ''}")
+        for line in waterfall(spans, args.width):
+            print(f'  {line}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
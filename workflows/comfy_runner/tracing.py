@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Trace spans for the runners and the REST API
+
+A span is one timed step of a generation (prepare the workflow, submit it,
+wait in the queue, run a node, download the images). Spans of a generation
+share a trace ID; the ID crosses process boundaries as a W3C traceparent
+(the TRACEPARENT environment variable for a runner, the traceparent header
+for /api/generate), so the API's spans and a caller's spans form one trace.
+
+Export is off until configure() finds one of:
+
+    TRACE_FILE                          append spans to a JSONL file
+    OTEL_EXPORTER_OTLP_TRACES_ENDPOINT  OTLP/HTTP JSON, e.g. http://localhost:4318/v1/traces
+    OTEL_EXPORTER_OTLP_ENDPOINT         same, /v1/traces is appended
+    OTEL_SERVICE_NAME                   overrides the service name
+
+Spans are exported in batches from a background thread; with export off a
+span costs one object and no I/O. trace_summary.py prints the spans of a
+TRACE_FILE as a waterfall per trace.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_ENV = 'TRACEPARENT'
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+# Batching of the export thread
+EXPORT_INTERVAL = 2.0
+EXPORT_BATCH = 512
+EXPORT_QUEUE = 10000
+
+# Queued by flush(): export the batch being collected without waiting out EXPORT_INTERVAL
+_FLUSH = object()
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+
+    @property
+    def traceparent(self) -> str:
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """SpanContext of a W3C traceparent value (None when absent or malformed)"""
+    match = TRACEPARENT_RE.match((value or '').strip().lower())
+    if not match or match.group(1) == '0' * 32:
+        return None
+    return SpanContext(match.group(1), match.group(2))
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('comfy_trace_span', default=None)
+
+# start_span(parent=...) default: the span active in this thread/context
+CURRENT = object()
+
+
+# ============================================================================
+# Spans
+# ============================================================================
+
+class Span:
+    """One timed operation; end() exports it, `with span:` makes it current"""
+
+    recording = True
+
+    def __init__(self, tracer: 'Tracer', name: str, context: SpanContext, parent_id: Optional[str],
+                 start_ns: int, attributes: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.start_ns = start_ns
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self._token = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.context.trace_id
+
+    @property
+    def traceparent(self) -> str:
+        return self.context.traceparent
+
+    def set(self, **attributes):
+        self.attributes.update((k, v) for k, v in attributes.items() if v is not None)
+
+    def end(self, error: Optional[str] = None, end_ns: Optional[int] = None):
+        """Finish and export the span (later calls are ignored)"""
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        if error:
+            self.error = str(error)
+        self.tracer.export(self)
+
+    def __enter__(self) -> 'Span':
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        self.end(error=f'{exc_type.__name__}: {exc}' if exc_type else None)
+        return False
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.context.trace_id,
+            'span_id': self.context.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'service': self.tracer.service,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'status': 'error' if self.error else 'ok',
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class _NoopSpan(Span):
+    """Returned while export is off: same interface, records nothing"""
+
+    recording = False
+
+    def __init__(self, tracer: 'Tracer', parent: Optional[SpanContext]):
+        super().__init__(tracer, '', parent or SpanContext('0' * 32, '0' * 16), None, 0, {})
+
+    @property
+    def traceparent(self) -> Optional[str]:
+        return None
+
+    def set(self, **attributes):
+        pass
+
+    def end(self, error: Optional[str] = None, end_ns: Optional[int] = None):
+        pass
+
+
+# ============================================================================
+# Exporters
+# ============================================================================
+
+class JsonlExporter:
+    """One JSON object per line; safe to share between processes (append mode)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans: List[Span]):
+        lines = ''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in spans)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OtlpExporter:
+    """OTLP/HTTP with the JSON encoding (any OpenTelemetry collector on :4318)"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._warned_at = 0.0
+
+    def payload(self, spans: List[Span]) -> Dict:
+        by_service = defaultdict(list)
+        for span in spans:
+            by_service[span.tracer.service].append(span)
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service}}]},
+            'scopeSpans': [{
+                'scope': {'name': 'comfy_runner.tracing'},
+                'spans': [{
+                    'traceId': span.context.trace_id,
+                    'spanId': span.context.span_id,
+                    'parentSpanId': span.parent_id or '',
+                    'name': span.name,
+                    'kind': 1,
+                    'startTimeUnixNano': str(span.start_ns),
+                    'endTimeUnixNano': str(span.end_ns),
+                    'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in span.attributes.items()],
+                    'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+                } for span in service_spans],
+            }],
+        } for service, service_spans in by_service.items()]}
+
+    def export(self, spans: List[Span]):
+        body = json.dumps(self.payload(spans), default=str).encode()
+        request = urllib.request.Request(self.endpoint, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except (OSError, urllib.error.URLError) as e:
+            # Tracing never breaks a generation: drop the batch, warn once a minute
+            if time.monotonic() - self._warned_at > 60:
+                self._warned_at = time.monotonic()
+                logger.warning(f'Trace export to {self.endpoint} failed: {e}')
+
+
+class _ExportThread:
+    """Batches ended spans and hands them to the exporters off the hot path"""
+
+    def __init__(self, exporters: List):
+        self.exporters = exporters
+        self.queue: 'queue.Queue[Span]' = queue.Queue(maxsize=EXPORT_QUEUE)
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._thread = threading.Thread(target=self._run, name='trace-export', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def put(self, span: Span):
+        with self._flushed:
+            self._pending += 1
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            with self._flushed:
+                self._pending -= 1
+
+    def _run(self):
+        while True:
+            span = self.queue.get()
+            if span is _FLUSH:
+                continue
+            batch = [span]
+            deadline = time.monotonic() + EXPORT_INTERVAL
+            while len(batch) < EXPORT_BATCH:
+                try:
+                    span = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is _FLUSH:
+                    break
+                batch.append(span)
+            self._export(batch)
+
+    def _export(self, batch: List[Span]):
+        for exporter in self.exporters:
+            try:
+                exporter.export(batch)
+            except Exception as e:
+                logger.warning(f'Trace export failed ({type(exporter).__name__}): {e}')
+        with self._flushed:
+            self._pending -= len(batch)
+            self._flushed.notify_all()
+
+    def flush(self, timeout: float = 5.0):
+        """Export everything queued so far (called at exit)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._export(batch)
+        try:
+            # The export thread may hold a partial batch: send it now
+            self.queue.put_nowait(_FLUSH)
+        except queue.Full:
+            pass
+        with self._flushed:
+            self._flushed.wait_for(lambda: self._pending <= 0, timeout)
+
+
+# ============================================================================
+# Tracer
+# ============================================================================
+
+class Tracer:
+    def __init__(self, service: str = 'comfy_runner', exporters: Iterable = ()):
+        self.service = service
+        self.exporters = list(exporters)
+        self._thread = _ExportThread(self.exporters) if self.exporters else None
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None
+
+    def start_span(self, name: str, parent=CURRENT, start_ns: Optional[int] = None, **attributes) -> Span:
+        """A running span; parent is a Span, SpanContext, traceparent string,
+        None for a new trace, or by default the current span"""
+        if parent is CURRENT:
+            parent = _current.get()
+        if isinstance(parent, Span):
+            parent = parent.context if parent.recording else None
+        elif isinstance(parent, str):
+            parent = parse_traceparent(parent)
+        if not self.enabled:
+            return _NoopSpan(self, parent)
+
+        context = SpanContext(parent.trace_id if parent else secrets.token_hex(16), secrets.token_hex(8))
+        attributes = {k: v for k, v in attributes.items() if v is not None}
+        return Span(self, name, context, parent.span_id if parent else None, start_ns or time.time_ns(), attributes)
+
+    # Same call, read as `with tracer.span(...)`
+    span = start_span
+
+    def export(self, span: Span):
+        if self._thread is not None:
+            self._thread.put(span)
+
+    def flush(self):
+        if self._thread is not None:
+            self._thread.flush()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def configure(service: str, environ=None) -> Tracer:
+    """Tracer with the exporters the environment asks for (see module docstring);
+    also installed as the module-level `tracer`"""
+    global tracer
+    environ = os.environ if environ is None else environ
+    exporters = []
+    if environ.get('TRACE_FILE'):
+        exporters.append(JsonlExporter(environ['TRACE_FILE']))
+    endpoint = environ.get('OTEL_EXPORTER_OTLP_TRACES_ENDPOINT')
+    if not endpoint and environ.get('OTEL_EXPORTER_OTLP_ENDPOINT'):
+        endpoint = environ['OTEL_EXPORTER_OTLP_ENDPOINT'].rstrip('/') + '/v1/traces'
+    if endpoint:
+        exporters.append(OtlpExporter(endpoint))
+    tracer = Tracer(environ.get('OTEL_SERVICE_NAME') or service, exporters)
+    return tracer
+
+
+# Disabled until configure()
+tracer = Tracer()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Remote mode output transfer: parallel /view downloads, resume, rsync over SSH
+
+Downloader fetches the images of a prompt with a pool of workers, each with
+its own keep-alive connection to the pod. Images are written to
+LOCAL_OUTPUT/.partial/ first: a download that breaks off resumes with an
+HTTP Range request, and only a file that passes verification (PNG chunk
+CRCs, size announced by the server) is renamed into LOCAL_OUTPUT in one
+atomic step, so the output folder never holds a truncated image.
+
+When the pod's SSH port is known (RUNPOD_PUBLIC_IP and RUNPOD_TCP_PORT_22,
+as shown in the pod's Connect menu), all images of a prompt are pulled with
+one rsync call instead; anything rsync could not deliver falls back to HTTP.
+"""
+
+import hashlib
+import http.client
+import os
+import shutil
+import subprocess
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .client import ComfyClient, ComfyError, unique_path
+
+# Attempts per image download (resuming the partial file)
+DOWNLOAD_ATTEMPTS = 3
+
+# Default number of parallel downloads
+DEFAULT_WORKERS = 4
+
+# Staging directory for partial downloads, inside the local output folder
+PARTIAL_DIR = '.partial'
+
+# ComfyUI output directory on the pod (rsync source; POD_OUTPUT_DIR overrides)
+DEFAULT_POD_OUTPUT_DIR = '/workspace/ComfyUI/output'
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+NETWORK_ERRORS = (OSError, http.client.HTTPException)
+
+
+def verify_png(path: str) -> Optional[str]:
+    """None if every chunk CRC matches and the file ends with IEND, else the problem"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(8) != PNG_SIGNATURE:
+                return 'not a PNG file'
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    return 'truncated (no IEND chunk)'
+                length = int.from_bytes(header[:4], 'big')
+                data = f.read(length)
+                crc = f.read(4)
+                if len(data) < length or len(crc) < 4:
+                    return f'truncated in {header[4:].decode("latin-1")} chunk'
+                if zlib.crc32(header[4:] + data) != int.from_bytes(crc, 'big'):
+                    return f'CRC mismatch in {header[4:].decode("latin-1")} chunk'
+                if header[4:] == b'IEND':
+                    return None
+    except OSError as e:
+        return str(e)
+
+
+def verify(path: str, expected_size: Optional[int]) -> Optional[str]:
+    """None if path is a complete download, else the problem"""
+    size = os.path.getsize(path)
+    if not size:
+        return 'empty file'
+    if expected_size is not None and size != expected_size:
+        return f'{size} of {expected_size} bytes'
+    if path.lower().endswith(('.png', '.png.part')):
+        return verify_png(path)
+    return None
+
+
+def sha256sum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class RsyncSource:
+    """A pod reachable over SSH (RunPod's public IP and mapped port 22)"""
+    host: str
+    port: int
+    user: str = 'root'
+    output_dir: str = DEFAULT_POD_OUTPUT_DIR
+
+    @classmethod
+    def from_environment(cls) -> Optional['RsyncSource']:
+        host = os.environ.get('RUNPOD_PUBLIC_IP')
+        port = os.environ.get('RUNPOD_TCP_PORT_22', '')
+        if not host or not port.isdigit() or not (shutil.which('rsync') and shutil.which('ssh')):
+            return None
+        return cls(host, int(port), output_dir=os.environ.get('POD_OUTPUT_DIR') or DEFAULT_POD_OUTPUT_DIR)
+
+    def __str__(self) -> str:
+        return f'{self.user}@{self.host}:{self.port}'
+
+
+@dataclass
+class Transfer:
+    """Outcome of one image download"""
+    image: Dict
+    path: Optional[str] = None
+    size: int = 0
+    sha256: str = ''
+    via: str = 'http'
+    error: Optional[str] = None
+    notes: List[str] = field(default_factory=list)    # generation log lines: resumes, retries
+
+
+class Downloader:
+    """Parallel, resumable, verified downloads into a local folder"""
+
+    def __init__(self, base_url: str, local_output: str, workers: int = DEFAULT_WORKERS,
+                 rsync: Optional[RsyncSource] = None, timeout: float = 60.0):
+        self.base_url = base_url
+        self.local_output = local_output
+        self.staging = os.path.join(local_output, PARTIAL_DIR)
+        self.workers = max(1, workers)
+        self.rsync = rsync
+        self.timeout = timeout
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._clients: List[ComfyClient] = []
+        self._lock = threading.Lock()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        for client in self._clients:
+            client.close()
+        self._clients.clear()
+
+    def fetch_all(self, images: List[Dict]) -> List[Transfer]:
+        """Download images (in order of the list); failures have Transfer.error set"""
+        os.makedirs(self.staging, exist_ok=True)
+        transfers = [Transfer(image) for image in images]
+        pending = transfers
+        if self.rsync:
+            pending = self._rsync(transfers)
+        if pending:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='download')
+            list(self._pool.map(self._fetch, pending))
+        return transfers
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def _client(self) -> ComfyClient:
+        """This worker thread's keep-alive connection"""
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = ComfyClient(self.base_url, self.timeout)
+            with self._lock:
+                self._clients.append(client)
+        return client
+
+    def _partial_path(self, image: Dict) -> str:
+        name = '__'.join(part for part in (image.get('subfolder', '').replace('/', '__'), image['filename']) if part)
+        return os.path.join(self.staging, f'{name}.part')
+
+    def _fetch(self, transfer: Transfer):
+        image = transfer.image
+        part = self._partial_path(image)
+        etag_file = f'{part}.etag'
+        error = 'not attempted'
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            if attempt > 1:
+                transfer.notes.append(
+                    f'WARNING: Download attempt {attempt - 1}/{DOWNLOAD_ATTEMPTS} failed for {image["filename"]}: {error}'
+                )
+                time.sleep(attempt - 1)
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            validator = None
+            if offset:
+                transfer.notes.append(f'Resuming {image["filename"]} at byte {offset}')
+                if os.path.exists(etag_file):
+                    with open(etag_file, encoding='utf-8') as f:
+                        validator = f.read().strip() or None
+            try:
+                size, total, etag = self._client().download(image, part, offset, validator)
+            except ComfyError as e:
+                # The server refused the range or the file: start over
+                error = str(e)
+                self._discard(part)
+                continue
+            except NETWORK_ERRORS as e:
+                # Connection broke off: keep the partial file and resume
+                error = str(e) or type(e).__name__
+                continue
+            if etag:
+                with open(etag_file, 'w', encoding='utf-8') as f:
+                    f.write(etag)
+            if total is not None and size < total:
+                # Body cut short without an error: resume as well
+                error = f'connection closed at byte {size} of {total}'
+                continue
+            error = verify(part, total)
+            if error is None:
+                self._commit(transfer, part)
+                return
+            self._discard(part)
+        self._discard(part)
+        transfer.error = error
+
+    def _discard(self, part: str):
+        for path in (part, f'{part}.etag'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _commit(self, transfer: Transfer, staged: str):
+        """Atomic rename of a verified file into the output folder"""
+        transfer.size = os.path.getsize(staged)
+        transfer.sha256 = sha256sum(staged)
+        with self._lock:
+            path = unique_path(os.path.join(self.local_output, transfer.image['filename']))
+            os.replace(staged, path)
+        if os.path.exists(f'{staged}.etag'):
+            os.remove(f'{staged}.etag')
+        transfer.path = path
+
+    # ------------------------------------------------------------------
+    # rsync over SSH
+    # ------------------------------------------------------------------
+
+    def _rsync(self, transfers: List[Transfer]) -> List[Transfer]:
+        """Pull output images in one rsync call; returns the transfers still to do over HTTP"""
+        source = self.rsync
+        wanted = [t for t in transfers if (t.image.get('type') or 'output') == 'output']
+        if not wanted:
+            return transfers
+        target = os.path.join(self.staging, 'rsync')
+        relative = [os.path.join(t.image.get('subfolder') or '', t.image['filename']) for t in wanted]
+        command = [
+            'rsync', '--archive', '--partial', '--files-from=-',
+            '-e', f'ssh -p {source.port} -o BatchMode=yes -o ConnectTimeout=10 '
+                  f'-o StrictHostKeyChecking=accept-new',
+            f'{source.user}@{source.host}:{source.output_dir.rstrip("/")}/', f'{target}/',
+        ]
+        try:
+            result = subprocess.run(command, input='\n'.join(relative) + '\n', capture_output=True,
+                                    text=True, timeout=max(self.timeout, 60) * len(wanted))
+            failure = result.stderr.strip().splitlines()[-1] if result.returncode else None
+        except (OSError, subprocess.SubprocessError) as e:
+            failure = str(e)
+
+        for transfer, name in zip(wanted, relative):
+            staged = os.path.join(target, name)
+            error = verify(staged, None) if os.path.exists(staged) else (failure or 'not transferred')
+            if error is None:
+                transfer.via = 'rsync'
+                self._commit(transfer, staged)
+            else:
+                transfer.notes.append(f'WARNING: rsync from {source} failed for {name}: {error}; using HTTP')
+                if os.path.exists(staged):
+                    os.remove(staged)
+        return [t for t in transfers if t.path is None]
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Workflow templates: placeholder substitution, UI→API conversion, seeds
+
+A workflow file is read, parsed and converted to API format once. Each
+generation then substitutes its values (${PROMPT}, ${SEED}, ...) into a copy
+of the parsed graph, so prompts containing quotes, backslashes or newlines
+never pass through a shell or a JSON text template.
+"""
+
+import copy
+import json
+import os
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from . import tracing
+
+# envsubst syntax: ${NAME} or $NAME
+VARIABLE = re.compile(r'\$\{(\w+)\}|\$(\w+)')
+
+# UI-only node types that have no API equivalent
+UI_ONLY_NODES = {'Note', 'MarkdownNote', 'Reroute', 'PrimitiveNode'}
+
+# Samplers whose seed input is forced to an integer
+SEED_INPUTS = {'KSampler': 'seed'}
+
+
+class WorkflowError(ValueError):
+    """The workflow file cannot be turned into an API prompt"""
+
+
+def is_ui_format(workflow) -> bool:
+    return isinstance(workflow, dict) and isinstance(workflow.get('nodes'), list)
+
+
+def unwrap(workflow):
+    """The prompt graph of {"prompt": {...}} files, else the workflow itself"""
+    if isinstance(workflow, dict) and isinstance(workflow.get('prompt'), dict):
+        return workflow['prompt']
+    return workflow
+
+
+def validate_structure(workflow):
+    """Raise WorkflowError unless workflow is UI format or an API prompt graph"""
+    if is_ui_format(workflow):
+        return
+    graph = unwrap(workflow)
+    if isinstance(graph, dict) and any(
+        isinstance(node, dict) and 'class_type' in node for node in graph.values()
+    ):
+        return
+    raise WorkflowError('Workflow format not recognized (expected UI format or API format nodes)')
+
+
+# Node modes of the UI format: muted nodes are dropped, bypassed ones wired through
+MODE_MUTED = 2
+MODE_BYPASSED = 4
+
+# Input types edited with a widget (combo inputs are a list of choices)
+WIDGET_TYPES = {'INT', 'FLOAT', 'STRING', 'BOOLEAN', 'COMBO'}
+
+# Values of the "control after generate" widget that follows seed inputs
+CONTROL_VALUES = {'fixed', 'increment', 'decrement', 'randomize'}
+
+# INT inputs that get a control widget even without control_after_generate
+SEED_NAMES = {'seed', 'noise_seed'}
+
+# Source of an unconnected input
+_UNCONNECTED = object()
+
+
+def _active_nodes(ui_workflow: Dict) -> List[Dict]:
+    return [
+        node for node in ui_workflow['nodes']
+        if node.get('type') not in UI_ONLY_NODES and node.get('mode') not in (MODE_MUTED, MODE_BYPASSED)
+    ]
+
+
+def required_classes(ui_workflow: Dict) -> Set[str]:
+    """Node classes whose definitions convert_ui_to_api needs"""
+    return {node.get('type') for node in _active_nodes(ui_workflow)} if is_ui_format(ui_workflow) else set()
+
+
+def _widget_inputs(definition: Dict) -> List[Tuple[str, List]]:
+    """(name, spec) of the widget inputs of a node definition, in widget order"""
+    inputs = definition.get('input') or {}
+    order = definition.get('input_order') or {}
+    widgets = []
+    for section in ('required', 'optional'):
+        specs = inputs.get(section) or {}
+        for name in order.get(section) or list(specs):
+            spec = specs.get(name)
+            if not isinstance(spec, list) or not spec:
+                continue
+            options = spec[1] if len(spec) > 1 and isinstance(spec[1], dict) else {}
+            if (isinstance(spec[0], list) or spec[0] in WIDGET_TYPES) and not options.get('forceInput'):
+                widgets.append((name, spec))
+    return widgets
+
+
+def _extra_widget(name: str, spec: List, value) -> bool:
+    """Whether value is a UI-only widget following input name (seed control, upload button)"""
+    options = spec[1] if len(spec) > 1 and isinstance(spec[1], dict) else {}
+    if options.get('control_after_generate') or (spec[0] == 'INT' and name in SEED_NAMES):
+        return value in CONTROL_VALUES
+    if options.get('image_upload') or options.get('video_upload') or options.get('audio_upload'):
+        return value in ('image', 'video', 'audio')
+    return False
+
+
+def _map_widgets(widgets_values, definition: Dict) -> Dict:
+    """{input name: value} for the widgets_values of a node"""
+    widgets = _widget_inputs(definition)
+    if isinstance(widgets_values, dict):
+        # Some custom nodes save their widgets by name
+        return {name: widgets_values[name] for name, _ in widgets if name in widgets_values}
+    values = list(widgets_values or [])
+    mapped = {}
+    position = 0
+    for name, spec in widgets:
+        if position >= len(values):
+            break
+        mapped[name] = values[position]
+        position += 1
+        if position < len(values) and _extra_widget(name, spec, values[position]):
+            position += 1
+    return mapped
+
+
+def convert_ui_to_api(ui_workflow: Dict, node_definitions: Dict) -> Dict:
+    """API format of a workflow (returned as-is if it already is)
+
+    node_definitions maps class types to their /object_info entries. Widget
+    values are mapped to the widget inputs (required, then optional) in
+    order, skipping the UI-only seed control and upload widgets; inputs fed
+    by a PrimitiveNode get its value, Reroute chains and bypassed nodes are
+    followed to the real source. Raises WorkflowError for node classes
+    without a definition.
+    """
+    if not is_ui_format(ui_workflow):
+        return ui_workflow
+
+    active = _active_nodes(ui_workflow)
+    unknown = sorted({node.get('type') for node in active} - set(node_definitions))
+    if unknown:
+        raise WorkflowError(f"No node definitions for: {', '.join(map(str, unknown))} "
+                            f'(missing custom nodes, or group/subgraph nodes saved by a newer frontend)')
+
+    nodes = {node['id']: node for node in ui_workflow['nodes']}
+    # link_id -> (source_node_id, output_slot)
+    links = {link[0]: (link[1], link[2]) for link in ui_workflow.get('links') or []}
+
+    def source(link_id, depth=0):
+        """[node_id, slot], (constant,) for a PrimitiveNode, or _UNCONNECTED"""
+        if link_id not in links or depth > len(nodes):
+            return _UNCONNECTED
+        node_id, slot = links[link_id]
+        node = nodes.get(node_id) or {}
+        node_type = node.get('type')
+        if node_type == 'PrimitiveNode':
+            values = node.get('widgets_values') or []
+            return (values[0],) if values else _UNCONNECTED
+        if node_type == 'Reroute':
+            inputs = node.get('inputs') or []
+            return source(inputs[0].get('link'), depth + 1) if inputs else _UNCONNECTED
+        if node.get('mode') == MODE_BYPASSED:
+            # Passed through from the first input of the output's type
+            outputs = node.get('outputs') or []
+            output_type = outputs[slot].get('type') if slot < len(outputs) else None
+            for item in node.get('inputs') or []:
+                if item.get('type') == output_type and item.get('link') is not None:
+                    return source(item['link'], depth + 1)
+            return _UNCONNECTED
+        if node.get('mode') == MODE_MUTED:
+            return _UNCONNECTED
+        return [str(node_id), slot]
+
+    api_workflow = {}
+    for node in active:
+        node_type = node['type']
+        inputs = _map_widgets(node.get('widgets_values'), node_definitions[node_type])
+
+        # Connections (and widgets converted to inputs) override widget values
+        for item in node.get('inputs') or []:
+            if item.get('link') is None:
+                continue
+            value = source(item['link'])
+            if value is _UNCONNECTED:
+                continue
+            inputs[item.get('widget', {}).get('name') or item.get('name', '')] = (
+                value[0] if isinstance(value, tuple) else value
+            )
+
+        api_workflow[str(node['id'])] = {'class_type': node_type, 'inputs': inputs}
+
+    return api_workflow
+
+
+def substitute(value, values: Dict[str, str], escape: bool = False):
+    """envsubst over the strings of a parsed workflow (or over raw text)
+
+    Names missing from values fall back to the environment, then to ''.
+    escape JSON-escapes the replacements (for substitution into JSON text).
+    """
+    if isinstance(value, str):
+        def replace(match):
+            name = match.group(1) or match.group(2)
+            text = str(values.get(name, os.environ.get(name, '')))
+            return json.dumps(text)[1:-1] if escape else text
+        return VARIABLE.sub(replace, value)
+    if isinstance(value, dict):
+        return {key: substitute(item, values, escape) for key, item in value.items()}
+    if isinstance(value, list):
+        return [substitute(item, values, escape) for item in value]
+    return value
+
+
+def set_seed(workflow: Dict, seed: int) -> int:
+    """Set the seed of every KSampler node; returns the number of nodes changed"""
+    count = 0
+    for node in workflow.values():
+        if not isinstance(node, dict):
+            continue
+        input_name = SEED_INPUTS.get(node.get('class_type'))
+        if input_name and input_name in node.get('inputs', {}):
+            node['inputs'][input_name] = int(seed)
+            count += 1
+    return count
+
+
+class WorkflowTemplate:
+    """A workflow file parsed and converted once, rendered per generation"""
+
+    def __init__(self, path: str, node_definitions: Callable[[Iterable[str]], Dict]):
+        self.path = path
+        self._fetch_definitions = node_definitions   # class types -> definitions (SchemaStore)
+        self._definitions: Optional[Dict] = None
+        with open(path, encoding='utf-8') as f:
+            self.text = f.read()
+        try:
+            workflow = json.loads(self.text)
+        except ValueError:
+            # Placeholders outside JSON strings: substitute the text per render
+            self.api = None
+        else:
+            validate_structure(workflow)
+            self.api = self._to_api(workflow)
+
+    @property
+    def converted(self) -> bool:
+        return self._definitions is not None
+
+    def _to_api(self, workflow) -> Dict:
+        workflow = unwrap(workflow)
+        if is_ui_format(workflow):
+            # Only UI format needs node definitions; looked up once per template
+            if self._definitions is None:
+                self._definitions = {}
+            with tracing.tracer.span('convert_ui_to_api_format', nodes=len(workflow.get('nodes') or [])):
+                missing = required_classes(workflow) - set(self._definitions)
+                if missing:
+                    self._definitions.update(self._fetch_definitions(missing) or {})
+                workflow = convert_ui_to_api(workflow, self._definitions)
+        return workflow
+
+    def render(self, values: Dict[str, str]) -> Dict:
+        """API prompt graph with values substituted and KSampler seeds set"""
+        if self.api is not None:
+            workflow = substitute(copy.deepcopy(self.api), values)
+        else:
+            try:
+                workflow = json.loads(substitute(self.text, values, escape=True))
+            except ValueError as e:
+                raise WorkflowError(f'Workflow is not valid JSON after substitution: {e}')
+            validate_structure(workflow)
+            workflow = self._to_api(workflow)
+        if values.get('SEED'):
+            set_seed(workflow, int(values['SEED']))
+        return workflow